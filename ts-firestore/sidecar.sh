@@ -0,0 +1,10 @@
+#!/bin/bash
+
+NODE=`which node` || '/usr/bin/node'
+
+tmp=`realpath "${0}"`
+BASE=`dirname "${tmp}"`
+
+export NODE_PATH="${BASE}/node_modules"
+
+exec "${NODE}" "${BASE}/dist/sidecar.js" $@
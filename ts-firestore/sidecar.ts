@@ -0,0 +1,82 @@
+import * as readline from "readline";
+import {closeGuild, GuildSession, openGuild, queryJobs} from "./src/db";
+
+/*
+    long-lived firestore sidecar.
+
+    stdin / stdout 으로 한 줄에 JSON-RPC 2.0 메시지 1개.
+        -> {"jsonrpc":"2.0","id":1,"method":"getJobs","params":{"token":"...","guildId":"...","firebaseConfig":{...}}}
+        <- {"jsonrpc":"2.0","id":1,"result":[{...}, ...]}
+    - 로그인한 firebase app 은 guild 별로 재사용한다. (id token 은 firebase sdk 가 갱신한다)
+    - 조회가 실패하면 app 을 버리고, 다음 요청의 token 으로 다시 로그인한다.
+    - stdout 은 응답 전용. log 는 stderr 로.
+*/
+const sessions: { [guildId: string]: { session: Promise<GuildSession> } } = {};
+
+function getSession(token: string, guildId: string, firebaseConfig: { [key: string]: string }): Promise<GuildSession> {
+    // 같은 guild 의 jobs 는 어느 계정으로 로그인해도 같으므로 guild 별로 1개만 둔다.
+    const cached = sessions[guildId];
+    if (cached) {
+        return cached.session;
+    }
+
+    const session = openGuild(token, guildId, firebaseConfig);
+    sessions[guildId] = {session: session};
+    // 로그인 실패는 cache 하지 않는다.
+    session.catch(() => {
+        if (sessions[guildId] && sessions[guildId].session === session) delete sessions[guildId];
+    });
+    return session;
+}
+
+const methods: { [key: string]: (params: any) => Promise<any> } = {
+    ping: async () => "pong",
+    getJobs: async (params) => {
+        const sessionPromise = getSession(params.token, params.guildId, params.firebaseConfig);
+        const session = await sessionPromise;
+        try {
+            return await queryJobs(session);
+        } catch (e) {
+            // 다음 요청은 다시 로그인한다.
+            if (sessions[params.guildId] && sessions[params.guildId].session === sessionPromise) delete sessions[params.guildId];
+            closeGuild(session).catch(() => undefined);
+            throw e;
+        }
+    },
+    close: async () => {
+        setImmediate(() => process.exit(0));
+        return true;
+    },
+};
+
+function reply(message: object) {
+    process.stdout.write(JSON.stringify({jsonrpc: "2.0", ...message}) + "\n");
+}
+
+async function handle(line: string) {
+    let request: any;
+    try {
+        request = JSON.parse(line);
+    } catch (e) {
+        reply({id: null, error: {code: -32700, message: "Parse error"}});
+        return;
+    }
+
+    const method = methods[request.method];
+    if (method === undefined) {
+        reply({id: request.id, error: {code: -32601, message: `Method not found : ${request.method}`}});
+        return;
+    }
+
+    try {
+        reply({id: request.id, result: await method(request.params || {})});
+    } catch (e) {
+        console.error(`# ${request.method} failed :`, e);
+        reply({id: request.id, error: {code: -32000, message: `${e}`}});
+    }
+}
+
+process.chdir(__dirname);
+readline.createInterface({input: process.stdin}).on("line", (line) => {
+    if (line.trim()) handle(line);
+}).on("close", () => process.exit(0));
@@ -1,29 +1,49 @@
-import { initializeApp} from "firebase/app";
+import {deleteApp, FirebaseApp, initializeApp} from "firebase/app";
 import {getAuth, signInWithCustomToken} from "firebase/auth";
-import {collection, doc, getDoc, getDocs, getFirestore, limit, query } from "firebase/firestore";
-import {getDocFromServer, getDocsFromServer} from "@firebase/firestore";
+import {collection, Firestore, getFirestore, limit, query} from "firebase/firestore";
+import {getDocsFromServer} from "@firebase/firestore";
 
-export async function getJobs(token: string, guildId: string, firebaseConfig: { [key: string]: string }): Promise<string> {
-    const app = initializeApp(firebaseConfig);
+export type GuildSession = {
+    app: FirebaseApp,
+    db: Firestore,
+    guildId: string,
+}
+
+let appSeq = 0;
+
+export async function openGuild(token: string, guildId: string, firebaseConfig: { [key: string]: string }): Promise<GuildSession> {
+    // sidecar 에서는 여러 app 을 같이 쓰므로 이름을 다르게 준다.
+    const app = initializeApp(firebaseConfig, `guild-${guildId}-${++appSeq}`);
     const auth = getAuth(app);
 
-    console.log(`# 4. let userCredential = await signInWithCustomToken(auth, token)`)
-    let userCredential = await signInWithCustomToken(auth, token)
-    const user = userCredential.user;
-    const path = `env/prod/guilds/${guildId}/jobs`;
+    console.error(`# signInWithCustomToken(auth, token) : guild ${guildId}`)
+    try {
+        await signInWithCustomToken(auth, token);
+    } catch (e) {
+        // 실패한 app 은 session 으로 돌려주지 않으므로 여기서 지운다.
+        await deleteApp(app).catch(() => undefined);
+        throw e;
+    }
+
+    return {app: app, db: getFirestore(app), guildId: guildId};
+}
 
-    console.log(`# 5. const db = getFirestore(app);`)
-    const db = getFirestore(app);
-    const usersCollectionRef = collection(db, path);
+export async function closeGuild(session: GuildSession) {
+    await deleteApp(session.app);
+}
+
+export async function queryJobs(session: GuildSession): Promise<object[]> {
+    const path = `env/prod/guilds/${session.guildId}/jobs`;
     const q = query(
-        usersCollectionRef,
+        collection(session.db, path),
         limit(10)
     );
 
-    console.log(`# 6. data = await getDocs(q);`)
     const querySnapshot = await getDocsFromServer(q)
-    const newData = querySnapshot.docs.map(doc => ({...doc.data()}))
-    return JSON.stringify(newData);
+    return querySnapshot.docs.map(doc => ({...doc.data()}))
 }
 
-
+export async function getJobs(token: string, guildId: string, firebaseConfig: { [key: string]: string }): Promise<string> {
+    const session = await openGuild(token, guildId, firebaseConfig);
+    return JSON.stringify(await queryJobs(session));
+}
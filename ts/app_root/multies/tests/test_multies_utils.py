@@ -0,0 +1,56 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+
+from app_root.multies.utils import MultiStrategy
+from app_root.users.models import User
+
+
+class FakeQueryset:
+    def __init__(self, users):
+        self.users = users
+
+    def all(self):
+        return self.users
+
+
+def test_multi_strategy():
+    now = timezone.now()
+    next_event = {
+        1: now - timedelta(seconds=1),
+        2: now + timedelta(milliseconds=300),
+        3: now + timedelta(hours=1),
+    }
+    due = dict(next_event)
+    called = []
+    done = threading.Event()
+
+    def runner(user_id):
+        called.append((user_id, timezone.now()))
+        next_event[user_id] = timezone.now() + timedelta(hours=1)
+        if len(called) == 2:
+            done.set()
+
+    def find_next_event_time(user_id, now):
+        return next_event[user_id]
+
+    users = [User(id=1), User(id=2), User(id=3), User(id=4, has_error=True)]
+    scheduler = MultiStrategy(queryset=FakeQueryset(users), workers=2, runner=runner)
+
+    with mock.patch(
+        "app_root.multies.utils.find_next_event_time", find_next_event_time
+    ):
+        thread = threading.Thread(target=scheduler.run)
+        thread.start()
+        assert done.wait(timeout=5)
+        scheduler.stop()
+        thread.join(timeout=5)
+
+    # 실행 시간 순서대로, 시간이 된 계정만 1번씩.
+    assert [user_id for user_id, _ in called] == [1, 2]
+    assert called[1][1] >= due[2]
+
+    # 끝난 계정은 새 next_event 로 다시 heap 에 들어간다.
+    assert scheduler.scheduled == {k: next_event[k] for k in (1, 2, 3)}
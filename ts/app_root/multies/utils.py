@@ -1,26 +1,39 @@
-from datetime import datetime
-from queue import PriorityQueue
-from typing import Dict
+import heapq
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime, timedelta
+from typing import Dict, List, Set, Callable, Optional
+
+from django.db import close_old_connections
+from django.utils import timezone
 
 from app_root.multies.flows import FLOWS_CREATE_RUN_VERSION
 from app_root.servers.models import RunVersion
+from app_root.servers.leases import (
+    HEARTBEAT_INTERVAL,
+    worker_heartbeat,
+    worker_get_ring,
+    worker_cleanup,
+    worker_remove,
+)
 from app_root.users.models import User
 
 """
     Union Dependency.
-    
+
     Player Dependency.
-    
-    
+
+
     check_queue - priority queue
     command_queue - just queue
-    
+
     for loop
         call `check_xxxx` functions
             return [
                 (before_sleep, command, after_sleep),
             ]
-    
+
     MessageQueue = {
         version_id: {
             last_dt,
@@ -29,38 +42,239 @@ from app_root.users.models import User
     }
 """
 
+# 다음 이벤트 시간을 알 수 없을 때 다시 확인하는 간격.
+IDLE_INTERVAL = timedelta(minutes=1)
+# 오류 상태의 계정을 다시 확인하는 간격.
+ERROR_INTERVAL = timedelta(minutes=10)
+# 새 계정 / 비활성 계정을 반영하는 간격.
+REFRESH_INTERVAL = timedelta(minutes=5)
+
 
 class Message:
     event_time: datetime
     flow_id: int
-    version: RunVersion
+    user_id: int
 
-    def __init__(self, *, version: RunVersion, event_time: datetime, flow_id: int):
+    def __init__(self, *, user_id: int, event_time: datetime, flow_id: int):
         self.event_time = event_time
         self.flow_id = flow_id
-        self.version = version
+        self.user_id = user_id
 
     def __lt__(self, other):
-        l = (self.event_time, self.flow_id, self.version_id)
-        r = (other.event_time, other.flow_id, other.version_id)
+        l = (self.event_time, self.flow_id, self.user_id)
+        r = (other.event_time, other.flow_id, other.user_id)
 
         return l < r
 
 
+def run_strategy(user_id: int):
+    """
+        worker thread 에서 계정 1개를 처리한다.
+    :param user_id:
+    :return:
+    """
+    from app_root.strategies.utils import Strategy
+
+    close_old_connections()
+    try:
+        strategy = Strategy(user_id=user_id)
+        strategy.run()
+    finally:
+        close_old_connections()
+
+
+def find_next_event_time(user_id: int, now: datetime) -> datetime:
+    """
+        계정의 다음 실행 시간. (마지막 RunVersion 기준)
+    :param user_id:
+    :param now:
+    :return:
+    """
+    instance = RunVersion.objects.filter(user_id=user_id).order_by("-pk").first()
+
+    if not instance:
+        return now
+    if instance.is_queued_task:
+        return now
+    if instance.is_error_task:
+        return now + ERROR_INTERVAL
+    if instance.next_event_datetime:
+        return instance.next_event_datetime
+    return now + IDLE_INTERVAL
+
+
 class MultiStrategy:
-    users: Dict[int, User] = {}  # [user.id, User]
-    queues: PriorityQueue
+    """
+    RunVersion.next_event_datetime 순서의 min-heap 으로 여러 계정을 실행한다.
 
-    MAPPING = {
-        # FLOWS_CREATE_RUN_VERSION: create_run_version,
-    }
+        - 다음 계정의 실행 시간까지 sleep. (worker 가 끝나면 바로 깨어난다)
+        - 실행 시간이 된 계정은 worker pool 에서 Strategy.run()
+        - 끝나면 새 next_event_datetime 으로 다시 heap 에 넣는다.
+        - 같은 계정은 동시에 1개만 실행한다.
+        - worker_name 이 있으면 heartbeat 를 보내고, consistent hash ring 으로 이 worker 에 할당된 계정만 실행한다.
+    """
+
+    users: Dict[int, User]  # [user.id, User]
+    queues: List[Message]
+    scheduled: Dict[int, datetime]  # [user.id, event_time] heap 에 유효한 항목
+    running: Set[int]
+
+    def __init__(
+        self,
+        queryset,
+        workers: int = 4,
+        runner: Callable[[int], None] = run_strategy,
+        clock: Callable[[], datetime] = timezone.now,
+        worker_name: Optional[str] = None,
+    ):
+        self.queryset = queryset
+        self.worker_name = worker_name
+        self.refresh_interval = REFRESH_INTERVAL
+        if worker_name:
+            # lease 가 만료되기 전에 heartbeat.
+            self.refresh_interval = min(REFRESH_INTERVAL, HEARTBEAT_INTERVAL)
+        self.workers = workers
+        self.runner = runner
+        self.clock = clock
 
-    def __init__(self, queryset):
         self.users = {}
-        self.queues = PriorityQueue()
-        self.versions = {}
+        self.queues = []
+        self.scheduled = {}
+        self.running = set()
+
+        # done callback 이 submit 한 thread 에서 바로 호출될 수 있다.
+        self.lock = threading.RLock()
+        self.wakeup = threading.Condition(self.lock)
+        self.stopped = False
+        self.refreshed_at = None
+
+    ###########################################################################
+    # heap
+    ###########################################################################
+    def push(self, user_id: int, event_time: datetime):
+        """
+        heap 에 넣는다. 이미 있으면 새 시간으로 대체한다. (lock 안에서 호출)
+        """
+        self.scheduled[user_id] = event_time
+        heapq.heappush(
+            self.queues,
+            Message(
+                user_id=user_id, event_time=event_time, flow_id=FLOWS_CREATE_RUN_VERSION
+            ),
+        )
+        self.wakeup.notify()
+
+    def peek(self) -> Optional[Message]:
+        """
+        유효한 가장 빠른 항목. (대체된 항목은 버린다)
+        """
+        while self.queues:
+            msg = self.queues[0]
+            if self.scheduled.get(msg.user_id) == msg.event_time:
+                return msg
+            heapq.heappop(self.queues)
+        return None
+
+    def pop_due(self, now: datetime) -> List[int]:
+        ret = []
+        while True:
+            msg = self.peek()
+            if not msg or msg.event_time > now:
+                break
+            heapq.heappop(self.queues)
+            del self.scheduled[msg.user_id]
+            ret.append(msg.user_id)
+        return ret
+
+    ###########################################################################
+    # users
+    ###########################################################################
+    def refresh_users(self, now: datetime):
+        """
+        활성 계정 목록을 다시 읽어 새 계정은 추가, 비활성 계정은 제외한다.
+        """
+        users = {
+            o.id: o for o in self.queryset.all() if o.is_active and not o.has_error
+        }
+
+        if self.worker_name:
+            worker_heartbeat(worker_name=self.worker_name, now=now)
+            worker_cleanup(now=now)
+            ring = worker_get_ring(now=now)
+            users = {k: v for k, v in users.items() if ring.get(k) == self.worker_name}
+
+        for user_id in list(self.scheduled):
+            if user_id not in users:
+                del self.scheduled[user_id]
+
+        for user_id in users:
+            if user_id in self.users or user_id in self.running:
+                continue
+            self.push(user_id, find_next_event_time(user_id=user_id, now=now))
+
+        self.users = users
+        self.refreshed_at = now
+
+    ###########################################################################
+    # worker
+    ###########################################################################
+    def on_done(self, user_id: int, future: Future):
+        exc = future.exception()
+        if exc:
+            print(f"[MultiStrategy] user_id={user_id} failed : {exc}")
+            traceback.print_exception(exc)
+
+        now = self.clock()
+        try:
+            next_time = find_next_event_time(user_id=user_id, now=now)
+        except Exception:
+            next_time = now + ERROR_INTERVAL
+        finally:
+            close_old_connections()
+
+        with self.lock:
+            self.running.discard(user_id)
+            if user_id in self.users and not self.stopped:
+                self.push(user_id, next_time)
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.wakeup.notify_all()
+
+    def run(self, max_sleep: Optional[float] = None):
+        """
+            stop() 이 호출될 때 까지 실행한다.
+        :param max_sleep: sleep 최대 시간 (초). 지정하지 않으면 다음 이벤트 / REFRESH_INTERVAL 까지.
+        :return:
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            with self.lock:
+                while not self.stopped:
+                    now = self.clock()
+                    refresh_at = self.refreshed_at and (
+                        self.refreshed_at + self.refresh_interval
+                    )
+                    if not refresh_at or now >= refresh_at:
+                        self.refresh_users(now=now)
+
+                    for user_id in self.pop_due(now=now):
+                        self.running.add(user_id)
+                        print(f"[MultiStrategy] run user_id={user_id}")
+                        future = executor.submit(self.runner, user_id)
+                        future.add_done_callback(
+                            lambda f, user_id=user_id: self.on_done(user_id, f)
+                        )
+
+                    wake_at = self.refreshed_at + self.refresh_interval
+                    msg = self.peek()
+                    if msg:
+                        wake_at = min(wake_at, msg.event_time)
 
-        for o in queryset.all():
-            self.users.update({o.id: o})
+                    timeout = max(0.0, (wake_at - self.clock()).total_seconds())
+                    if max_sleep is not None:
+                        timeout = min(timeout, max_sleep)
+                    self.wakeup.wait(timeout=timeout)
 
-    # def run(self):
+        if self.worker_name:
+            worker_remove(worker_name=self.worker_name)
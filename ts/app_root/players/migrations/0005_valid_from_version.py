@@ -0,0 +1,366 @@
+# Generated by Django 4.1.4 on 2026-10-19 11:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("servers", "0003_user_lease"),
+        ("players", "0004_alter_playercompetition_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="playerachievement",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerbuilding",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playercityloopparcel",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playercitylooptask",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playercompetition",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playercontract",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playercontractlist",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerdailyoffer",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerdailyoffercontainer",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerdailyofferitem",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerdailyreward",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerdestination",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerfactory",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerfactoryproductorder",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playergift",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerjob",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerleaderboard",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerleaderboardprogress",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playermap",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerquest",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playershipoffer",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playertrain",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerunlockedcontent",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playervisitedregion",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerwarehouse",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerwhistle",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="playerwhistleitem",
+            name="valid_from_version",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="servers.runversion",
+            ),
+        ),
+    ]
@@ -1,10 +1,12 @@
 import datetime
 import json
-from functools import cached_property
+from functools import cached_property, lru_cache
 from typing import List, Tuple, Dict, Optional, Type
 
 from django.conf import settings
-from django.db import models
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Case, Q, Value, When
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
@@ -14,7 +16,157 @@ from core.utils import convert_time, convert_datetime
 BUFFER_TIME = datetime.timedelta(seconds=5)
 
 
+def previous_version_id(version) -> Optional[int]:
+    """
+        같은 계정의 바로 이전 version. (version 에 캐시)
+    :param version: RunVersion
+    :return:
+    """
+    ret = getattr(version, "__previous_version_id", None)
+    if ret is None:
+        ret = (
+            type(version)
+            .objects.filter(user_id=version.user_id, id__lt=version.id)
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .first()
+        ) or 0
+        setattr(version, "__previous_version_id", ret)
+    return ret or None
+
+
+@lru_cache(maxsize=None)
+def child_relations(model: Type[models.Model]) -> List[Tuple[Type[models.Model], str]]:
+    """
+        model 을 가리키는 Player* FK. [(자식 model, FK attname)]
+    :param model:
+    :return:
+    """
+    return [
+        (child, field.attname)
+        for child in apps.get_models()
+        if issubclass(child, BaseVersionMixin)
+        for field in child._meta.concrete_fields
+        if field.many_to_one and field.related_model is model
+    ]
+
+
+def split_rows(
+    model: Type[models.Model],
+    version,
+    rows: List["BaseVersionMixin"],
+    parents: Dict[str, Dict[int, int]],
+) -> Dict[int, int]:
+    """
+        carry forward 된 row 의 DB 값을 이전 version 의 새 row (history) 로 복사한다.
+        - 현재 row 는 pk 를 그대로 두고 version 에서만 유효한 row 가 된다.
+        - 이전 version 에서만 유효한 자식 row 는 history 를 가리킨다.
+        - carry forward 된 자식 row 도 같은 방법으로 나눈다. (자식의 history 는 부모의 history 를 가리킨다)
+    :param model:
+    :param version: RunVersion
+    :param rows: version 의 carry forward 된 row (DB 값)
+    :param parents: {FK attname: {부모 pk: 부모 history pk}}
+    :return: {pk: history pk}
+    """
+    if not rows:
+        return {}
+
+    prev_id = previous_version_id(version)
+    ret = {}
+    for row in rows:
+        history = model(
+            **{
+                f.attname: getattr(row, f.attname)
+                for f in model._meta.concrete_fields
+                if not f.primary_key
+            }
+        )
+        history.version_id = prev_id or row.valid_from_version_id
+        for attname, mapping in parents.items():
+            parent_id = getattr(history, attname)
+            setattr(history, attname, mapping.get(parent_id, parent_id))
+        # 자식 row 가 가리킬 pk 가 필요하다. (MySQL 의 bulk_create 는 pk 를 채우지 않는다)
+        history.save(force_insert=True)
+        ret[row.pk] = history.pk
+
+    model.objects.filter(pk__in=ret.keys()).update(valid_from_version=None)
+
+    for child, attname in child_relations(model):
+        child.objects.filter(
+            **{f"{attname}__in": ret.keys(), "version_id__lt": version.id}
+        ).update(
+            **{
+                attname: Case(
+                    *[When(**{attname: pk}, then=Value(h)) for pk, h in ret.items()]
+                )
+            }
+        )
+        carried = list(
+            child.objects.filter(
+                **{
+                    f"{attname}__in": ret.keys(),
+                    "version_id": version.id,
+                    "valid_from_version_id__lt": version.id,
+                }
+            )
+        )
+        split_rows(child, version, carried, {attname: ret})
+
+    return ret
+
+
+class BaseVersionQuerySet(models.QuerySet):
+    """
+    Player* row 는 at_version 으로 읽는다.
+    """
+
+    def at_version(self, version) -> "BaseVersionQuerySet":
+        """
+            version 시점에 유효한 row.
+            carry forward 된 row 는 같은 계정의 이후 version 에 있다.
+        :param version: RunVersion
+        :return:
+        """
+        run_version = self.model._meta.get_field("version").related_model
+        version_ids = run_version.objects.filter(
+            user_id=version.user_id, id__gte=version.id
+        ).values("id")
+        return self.filter(version_id__in=version_ids).filter(
+            Q(version_id=version.id) | Q(valid_from_version_id__lte=version.id)
+        )
+
+    def split_history(self, version) -> Dict[int, int]:
+        """
+            version 에서 update / delete 하기 전에 부른다. (split_rows)
+        :param version: RunVersion
+        :return: {pk: history pk}
+        """
+        rows = list(
+            self.filter(
+                version_id=version.id, valid_from_version_id__lt=version.id
+            ).order_by()
+        )
+        with transaction.atomic(using=self.db):
+            return split_rows(self.model, version, rows, {})
+
+
 class BaseVersionMixin(models.Model):
+    """
+    Player* row 의 유효 범위. (copy on write)
+
+        - valid_from_version 이 없으면 version 에서만 유효한 row.
+        - 있으면 valid_from_version ~ version 까지 유효한 row. (init data sync 로 carry forward)
+        - version 의 row 는 objects.at_version(version) 으로 읽는다. (FK 로 찾는 자식 row 도)
+        - carry forward 된 row 를 바꾸거나 지우기 전에 split_history 를 부른다.
+          이전 값은 이전 version 의 row 로 남고, 이전 version 의 자식 row 는 그 row 를 가리킨다.
+
+            PlayerTrain.split_history(version=version, instances=[train])
+            train.save(update_fields=["level_id"])
+    """
+
+    # init data sync 에서 같은 row 로 판단하는 필드. (없으면 모든 값이 같을 때만 재사용)
+    SYNC_KEY: Tuple[str, ...] = ()
+
     version = models.ForeignKey(
         to="servers.RunVersion",
         on_delete=models.DO_NOTHING,
@@ -23,6 +175,44 @@ class BaseVersionMixin(models.Model):
         blank=False,
         db_constraint=False,
     )
+    valid_from_version = models.ForeignKey(
+        to="servers.RunVersion",
+        on_delete=models.DO_NOTHING,
+        related_name="+",
+        null=True,
+        blank=True,
+        default=None,
+        db_constraint=False,
+    )
+
+    objects = BaseVersionQuerySet.as_manager()
+
+    @property
+    def has_history(self) -> bool:
+        """
+        이전 version 부터 유효한 row 인지. (query 없이 instance 값으로 판단)
+        """
+        return (
+            self.valid_from_version_id is not None
+            and self.valid_from_version_id < self.version_id
+        )
+
+    @classmethod
+    def split_history(cls, version, instances: List["BaseVersionMixin"]):
+        """
+            instance 를 save / delete 하기 전에 부른다.
+            carry forward 된 instance 가 없으면 query 하지 않는다.
+        :param version: RunVersion
+        :param instances:
+        :return:
+        """
+        instances = [o for o in instances if o.pk and o.has_history]
+        if not instances:
+            return
+
+        cls.objects.filter(pk__in=[o.pk for o in instances]).split_history(version)
+        for instance in instances:
+            instance.valid_from_version_id = None
 
     @classmethod
     def sub_model(cls) -> Optional[Type["BaseVersionMixin"]]:
@@ -39,6 +229,8 @@ class BaseVersionMixin(models.Model):
 
 
 class PlayerBuildingMixin(BaseVersionMixin):
+    SYNC_KEY = ("instance_id",)
+
     instance_id = models.IntegerField(_("instance id"), null=True, blank=False)
     definition_id = models.IntegerField(_("instance id"), null=True, blank=False)
     rotation = models.IntegerField(_("instance id"), null=True, blank=False)
@@ -157,6 +349,8 @@ class PlayerBuildingMixin(BaseVersionMixin):
 
 
 class PlayerDestinationMixin(BaseVersionMixin):
+    SYNC_KEY = ("location_id",)
+
     location = models.ForeignKey(
         to="servers.TSLocation",
         on_delete=models.DO_NOTHING,
@@ -256,6 +450,8 @@ class PlayerDestinationMixin(BaseVersionMixin):
 
 
 class PlayerFactoryMixin(BaseVersionMixin):
+    SYNC_KEY = ("factory_id",)
+
     factory = models.ForeignKey(
         to="servers.TSFactory",
         on_delete=models.DO_NOTHING,
@@ -470,6 +666,8 @@ class PlayerFactoryProductOrderMixin(BaseVersionMixin):
 
 
 class PlayerJobMixin(BaseVersionMixin):
+    SYNC_KEY = ("job_id",)
+
     job_id = models.CharField(_("job id"), max_length=100, null=False, blank=False)
 
     job_location = models.ForeignKey(
@@ -767,6 +965,8 @@ class PlayerJobMixin(BaseVersionMixin):
 
 
 class PlayerContractListMixin(BaseVersionMixin):
+    SYNC_KEY = ("contract_list_id",)
+
     contract_list_id = models.IntegerField(
         _("contract list id"), null=False, blank=False, default=0
     )
@@ -861,6 +1061,8 @@ class PlayerContractListMixin(BaseVersionMixin):
 
 
 class PlayerContractMixin(BaseVersionMixin):
+    SYNC_KEY = ("contract_list_id", "slot")
+
     contract_list = models.ForeignKey(
         to="players.PlayerContractList",
         on_delete=models.DO_NOTHING,
@@ -1191,6 +1393,8 @@ class PlayerLeaderBoardProgressMixin(BaseVersionMixin):
 
 
 class PlayerTrainMixin(BaseVersionMixin):
+    SYNC_KEY = ("instance_id",)
+
     instance_id = models.IntegerField(
         _("instance_id"), null=False, blank=False, default=0
     )
@@ -1369,6 +1573,8 @@ class PlayerTrainMixin(BaseVersionMixin):
 
 
 class PlayerWarehouseMixin(BaseVersionMixin):
+    SYNC_KEY = ("article_id",)
+
     article = models.ForeignKey(
         to="servers.TSArticle",
         on_delete=models.DO_NOTHING,
@@ -1410,6 +1616,8 @@ class PlayerWarehouseMixin(BaseVersionMixin):
 
 
 class PlayerWhistleMixin(BaseVersionMixin):
+    SYNC_KEY = ("category", "position")
+
     category = models.IntegerField(_("category"), null=False, blank=False, default=0)
     position = models.IntegerField(_("position"), null=False, blank=False, default=0)
     spawn_time = models.DateTimeField(
@@ -1557,6 +1765,8 @@ class PlayerWhistleItemMixin(BaseVersionMixin):
 
 
 class PlayerAchievementMixin(BaseVersionMixin):
+    SYNC_KEY = ("achievement",)
+
     achievement = models.CharField(
         _("achievement"), max_length=255, null=False, blank=False, default=""
     )
@@ -1699,6 +1909,8 @@ class PlayerDailyRewardMixin(BaseVersionMixin):
 
 
 class PlayerMapMixin(BaseVersionMixin):
+    SYNC_KEY = ("region_name", "spot_id")
+
     region_name = models.CharField(
         _("region name"), max_length=20, null=False, blank=False, default=""
     )
@@ -1802,6 +2014,8 @@ class PlayerMapMixin(BaseVersionMixin):
 
 
 class PlayerQuestMixin(BaseVersionMixin):
+    SYNC_KEY = ("job_location_id",)
+
     job_location = models.ForeignKey(
         to="servers.TSJobLocation",
         on_delete=models.DO_NOTHING,
@@ -1857,6 +2071,8 @@ class PlayerQuestMixin(BaseVersionMixin):
 
 
 class PlayerVisitedRegionMixin(BaseVersionMixin):
+    SYNC_KEY = ("region_id",)
+
     region = models.ForeignKey(
         to="servers.TSRegion",
         on_delete=models.DO_NOTHING,
@@ -1979,6 +2195,8 @@ class PlayerShipOfferMixin(BaseVersionMixin):
 
 
 class PlayerCompetitionMixin(BaseVersionMixin, ContentCategoryMixin):
+    SYNC_KEY = ("competition_id",)
+
     type = models.CharField(
         _("Type"), max_length=20, null=False, blank=False, default=""
     )
@@ -2337,6 +2555,8 @@ class PlayerDailyOfferItemMixin(BaseVersionMixin):
 
 
 class PlayerCityLoopParcelMixin(BaseVersionMixin):
+    SYNC_KEY = ("parcel",)
+
     parcel = models.IntegerField(_("parcel"), null=False, blank=False, default=0)
 
     class Meta:
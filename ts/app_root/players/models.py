@@ -86,10 +86,11 @@ class PlayerJob(PlayerJobMixin, BaseModelMixin, TimeStampedMixin):
         :return:
         """
         if self.is_union_job:
+            # 이전 version 의 leader board 도 같은 job 을 가리킨다.
             return sum(
-                PlayerLeaderBoardProgress.objects.filter(
-                    leader_board__player_job_id=self.id
-                ).values_list("progress", flat=True)
+                PlayerLeaderBoardProgress.objects.at_version(self.version)
+                .filter(leader_board__player_job_id=self.id)
+                .values_list("progress", flat=True)
             )
         else:
             return self.current_article_amount
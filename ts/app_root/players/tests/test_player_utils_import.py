@@ -1,9 +1,24 @@
+import json
 import shutil
 from unittest import mock
 
 import pytest
 from django.conf import settings
+from django.utils import timezone
 
+from app_root.players.mixins import BaseVersionMixin
+from app_root.players.models import (
+    PlayerWarehouse,
+    PlayerTrain,
+    PlayerJob,
+    PlayerFactory,
+    PlayerFactoryProductOrder,
+    PlayerContractList,
+    PlayerContract,
+    PlayerWhistle,
+    PlayerWhistleItem,
+    PlayerBuilding,
+)
 from app_root.players.utils_import import InitdataHelper
 from app_root.servers.models import (
     RunVersion,
@@ -25,9 +40,10 @@ from app_root.servers.utils_import import (
     SQLDefinitionHelper,
     LoginHelper,
 )
+from app_root.strategies.managers import factory_get_queue
 from app_root.users.models import User
 from core.tests.factory import AbstractFakeResp
-from core.utils import hash10
+from core.utils import hash10, convert_datetime
 
 
 @pytest.fixture(scope="function")
@@ -147,6 +163,241 @@ def test_utils_initdata_competition(
     user.refresh_from_db()
 
 
+def version_rows(queryset):
+    """
+    row 값. (다른 Player* row 를 가리키는 FK 는 제외)
+    """
+    model = queryset.model
+    skip = {"id", "created", "modified", "version_id", "valid_from_version_id"}
+    fields = [
+        f.attname
+        for f in model._meta.concrete_fields
+        if f.attname not in skip
+        and not (f.is_relation and issubclass(f.related_model, BaseVersionMixin))
+    ]
+    return sorted(queryset.values_list(*fields), key=repr)
+
+
+SYNC_MODELS = (
+    PlayerWarehouse,
+    PlayerTrain,
+    PlayerJob,
+    PlayerFactory,
+    PlayerFactoryProductOrder,
+    PlayerContractList,
+    PlayerContract,
+    PlayerWhistle,
+    PlayerWhistleItem,
+    PlayerBuilding,
+)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "filename1, filename2",
+    [
+        ("gaolious_2022.12.30-1.json", "gaolious_2022.12.30-1.json"),
+        ("gaolious_2022.12.30-1.json", "gaolious_2022.12.30-2.json"),
+        ("gaolious_2023.02.05.json", "gaolious_2023.02.07.json"),
+    ],
+)
+def test_utils_initdata_sync(multidb, filename1, filename2):
+    path = settings.DJANGO_PATH / "fixtures" / "init_data"
+    user = User.objects.create_user(
+        username="test", android_id="test", game_access_token="1", player_id="1"
+    )
+    other = User.objects.create_user(
+        username="other", android_id="other", game_access_token="1", player_id="1"
+    )
+
+    prev = RunVersion.objects.create(
+        user_id=user.id, level_id=1, init_recv_1=timezone.now()
+    )
+    InitdataHelper(version=prev).parse_data(data=(path / filename1).read_text("utf-8"))
+    prev_count = PlayerWarehouse.objects.filter(version_id=prev.id).count()
+    prev_rows = {
+        model: version_rows(model.objects.filter(version_id=prev.id))
+        for model in SYNC_MODELS
+    }
+
+    # 이전 version 과 비교해서 저장.
+    version = RunVersion.objects.create(user_id=user.id, level_id=1)
+    helper = InitdataHelper(version=version, sync=True)
+    helper.parse_data(data=(path / filename2).read_text("utf-8"))
+
+    # 전체 저장.
+    expected = RunVersion.objects.create(user_id=other.id, level_id=1)
+    InitdataHelper(version=expected).parse_data(
+        data=(path / filename2).read_text("utf-8")
+    )
+
+    for model in SYNC_MODELS:
+        assert version_rows(model.objects.filter(version_id=version.id)) == (
+            version_rows(model.objects.filter(version_id=expected.id))
+        )
+        assert version_rows(model.objects.at_version(version)) == (
+            version_rows(model.objects.filter(version_id=expected.id))
+        )
+        # 이전 version 의 값은 그대로 남는다.
+        assert version_rows(model.objects.at_version(prev)) == prev_rows[model]
+
+    for contract in PlayerContract.objects.filter(version_id=version.id):
+        assert contract.contract_list.version_id == version.id
+
+    if filename1 == filename2:
+        assert helper.sync_stats["PlayerWarehouse"] == {
+            "carried": prev_count,
+            "updated": 0,
+            "inserted": 0,
+        }
+
+
+@pytest.mark.django_db
+def test_utils_initdata_sync_factory_queue(multidb):
+    path = settings.DJANGO_PATH / "fixtures" / "init_data"
+    user = User.objects.create_user(
+        username="test", android_id="test", game_access_token="1", player_id="1"
+    )
+    other = User.objects.create_user(
+        username="other", android_id="other", game_access_token="1", player_id="1"
+    )
+    text = (path / "gaolious_2023.02.07.json").read_text("utf-8")
+
+    prev = RunVersion.objects.create(
+        user_id=user.id, level_id=1, init_recv_1=timezone.now()
+    )
+    InitdataHelper(version=prev).parse_data(
+        data=(path / "gaolious_2023.02.05.json").read_text("utf-8")
+    )
+    version = RunVersion.objects.create(user_id=user.id, level_id=1)
+    InitdataHelper(version=version, sync=True).parse_data(data=text)
+
+    expected = RunVersion.objects.create(user_id=other.id, level_id=1)
+    InitdataHelper(version=expected).parse_data(data=text)
+
+    def queue_rows(v):
+        ret = {}
+        for player_factory in PlayerFactory.objects.at_version(v):
+            queue = factory_get_queue(version=v, factory_id=player_factory.factory_id)
+            completed, processing, waiting = queue.split(now=v.now)
+            ret[player_factory.factory_id] = (
+                [(o.article_id, o.index) for o in queue.orders],
+                len(completed),
+                len(processing),
+                len(waiting),
+            )
+        return ret
+
+    # 이전 version 의 주문도 carry forward 된 공장을 가리킨다.
+    version.now = expected.now = convert_datetime(json.loads(text)["Time"])
+    assert queue_rows(version) == queue_rows(expected)
+
+
+@pytest.mark.django_db
+def test_version_history(multidb):
+    path = settings.DJANGO_PATH / "fixtures" / "init_data" / "gaolious_2023.02.05.json"
+    user = User.objects.create_user(
+        username="test", android_id="test", game_access_token="1", player_id="1"
+    )
+    prev = RunVersion.objects.create(
+        user_id=user.id, level_id=1, init_recv_1=timezone.now()
+    )
+    InitdataHelper(version=prev).parse_data(data=path.read_text("utf-8"))
+    version = RunVersion.objects.create(user_id=user.id, level_id=1)
+    InitdataHelper(version=version, sync=True).parse_data(data=path.read_text("utf-8"))
+
+    warehouse = PlayerWarehouse.objects.filter(version_id=version.id).first()
+    amount = warehouse.amount
+    assert warehouse.has_history
+    assert warehouse.valid_from_version_id == prev.id
+
+    # 현재 version 에서 바꾸기 전에 나누면 이전 값은 이전 version 에 남는다.
+    PlayerWarehouse.split_history(version=version, instances=[warehouse])
+    warehouse.amount = amount + 10
+    warehouse.save(update_fields=["amount"])
+    assert not warehouse.has_history
+    qs = PlayerWarehouse.objects.filter(article_id=warehouse.article_id)
+    assert qs.at_version(version).get().amount == amount + 10
+    assert qs.at_version(prev).get().amount == amount
+
+    # 지우면 이전 version 에서만 유효한 row 로 남는다.
+    job = PlayerJob.objects.filter(version_id=version.id).first()
+    job_rows = version_rows(PlayerJob.objects.at_version(prev))
+    PlayerJob.split_history(version=version, instances=[job])
+    job.delete()
+    assert not PlayerJob.objects.at_version(version).filter(id=job.id).exists()
+    assert (
+        PlayerJob.objects.at_version(prev)
+        .filter(job_location_id=job.job_location_id)
+        .exists()
+    )
+    assert version_rows(PlayerJob.objects.at_version(prev)) == job_rows
+
+    # 이전 version 의 자식 row 는 이전 값의 부모를 가리킨다.
+    order = PlayerFactoryProductOrder.objects.at_version(version).first()
+    factory = PlayerFactory.objects.get(id=order.player_factory_id)
+    slot_count = factory.slot_count
+    PlayerFactory.split_history(version=version, instances=[factory])
+    factory.slot_count = slot_count + 1
+    factory.save(update_fields=["slot_count"])
+
+    def parents(v):
+        return {
+            o.player_factory.slot_count
+            for o in PlayerFactoryProductOrder.objects.at_version(v)
+            .filter(player_factory__factory_id=factory.factory_id)
+            .select_related("player_factory")
+        }
+
+    assert parents(version) == {slot_count + 1}
+    assert parents(prev) == {slot_count}
+
+
+@pytest.mark.django_db
+def test_version_history_bulk(multidb):
+    path = settings.DJANGO_PATH / "fixtures" / "init_data" / "gaolious_2023.02.05.json"
+    user = User.objects.create_user(
+        username="test", android_id="test", game_access_token="1", player_id="1"
+    )
+    prev = RunVersion.objects.create(
+        user_id=user.id, level_id=1, init_recv_1=timezone.now()
+    )
+    InitdataHelper(version=prev).parse_data(data=path.read_text("utf-8"))
+    version = RunVersion.objects.create(user_id=user.id, level_id=1)
+    InitdataHelper(version=version, sync=True).parse_data(data=path.read_text("utf-8"))
+
+    prev_rows = {
+        model: version_rows(model.objects.at_version(prev))
+        for model in (PlayerWarehouse, PlayerTrain, PlayerJob)
+    }
+
+    # QuerySet.update
+    queryset = PlayerWarehouse.objects.at_version(version)
+    queryset.split_history(version)
+    queryset.update(amount=0)
+    assert set(
+        PlayerWarehouse.objects.at_version(version).values_list("amount", flat=True)
+    ) == {0}
+
+    # bulk_update
+    trains = list(PlayerTrain.objects.at_version(version))
+    for train in trains:
+        train.region = 0
+    PlayerTrain.split_history(version=version, instances=trains)
+    PlayerTrain.objects.bulk_update(trains, ["region"])
+    assert not PlayerTrain.objects.at_version(version).exclude(region=0).exists()
+
+    # QuerySet.delete
+    queryset = PlayerJob.objects.at_version(version)
+    queryset.split_history(version)
+    queryset.delete()
+    assert not PlayerJob.objects.at_version(version).exists()
+
+    # 이전 version 의 값은 그대로 남는다.
+    for model, rows in prev_rows.items():
+        assert version_rows(model.objects.at_version(prev)) == rows
+
+
 #
 # @pytest.mark.django_db
 # @pytest.mark.parametrize('filename, population, num_buildings, num_destination', [
@@ -1,11 +1,12 @@
 import json
 import sys
-from typing import Dict, Callable, Iterator, Tuple
+from typing import Dict, Callable, Iterator, Tuple, Optional, Type
 
 from django.conf import settings
 from django.utils import timezone
 
 from app_root.mixins import ImportHelperMixin
+from app_root.players.mixins import BaseVersionMixin
 from app_root.players.models import (
     PlayerBuilding,
     PlayerDestination,
@@ -36,6 +37,8 @@ from app_root.players.models import (
     PlayerCityLoopParcel,
 )
 from app_root.servers.models import EndPoint, RunVersion
+from core.models.utils import sync_instances
+from core.sharedcache import get_shared_cache
 
 LOGGING_MENU = "plyaers.import"
 
@@ -44,6 +47,54 @@ class InitdataHelper(ImportHelperMixin):
     BASE_PATH = settings.SITE_PATH / "download" / "init_data"
     NAME = "init_data"
 
+    sync: bool
+    sync_stats: Dict[str, Dict[str, int]]
+
+    def __init__(self, version: RunVersion, use_cache: bool = False, **kwargs):
+        """
+        :param sync: True 이면 이전 version 의 row 와 비교해서 바뀐 row 만 저장한다.
+        """
+        super().__init__(version=version, use_cache=use_cache, **kwargs)
+        self.sync = kwargs.get("sync", False)
+        self.sync_stats = {}
+        self._prev_version_id = None
+
+    @property
+    def prev_version_id(self) -> Optional[int]:
+        if self._prev_version_id is None:
+            prev = (
+                RunVersion.objects.filter(
+                    user_id=self.version.user_id,
+                    id__lt=self.version.id,
+                    init_recv_1__isnull=False,
+                )
+                .order_by("-pk")
+                .only("id")
+                .first()
+            )
+            self._prev_version_id = prev.id if prev else 0
+        return self._prev_version_id or None
+
+    def bulk_create(self, model: Type[BaseVersionMixin], bulk_list, batch_size=None):
+        """
+        sync 모드이면 이전 version 의 row 를 재사용하고 바뀐 row 만 저장.
+        """
+        if not self.sync or not self.prev_version_id:
+            model.objects.bulk_create(bulk_list, batch_size)
+            return
+
+        stats = sync_instances(
+            model=model,
+            instances=bulk_list,
+            scope_field="version_id",
+            prev_scope=self.prev_version_id,
+            curr_scope=self.version.id,
+            keys=model.SYNC_KEY,
+            history_field="valid_from_version_id",
+            batch_size=batch_size or 100,
+        )
+        self.sync_stats.update({model.__name__: stats})
+
     def get_urls(self) -> Iterator[Tuple[str, str, str, str]]:
         idx = 1
 
@@ -209,7 +260,7 @@ class InitdataHelper(ImportHelperMixin):
                 data=gifts, version_id=self.version.id
             )
             if bulk_list:
-                PlayerGift.objects.bulk_create(bulk_list)
+                self.bulk_create(PlayerGift, bulk_list)
 
         self.print_remain("_parse_init_gifts", data)
 
@@ -232,7 +283,7 @@ class InitdataHelper(ImportHelperMixin):
                 data=competitions, version_id=self.version.id
             )
             if bulk_list:
-                PlayerCompetition.objects.bulk_create(bulk_list)
+                self.bulk_create(PlayerCompetition, bulk_list)
 
         self.print_remain("_parse_init_competitions", data)
         pass
@@ -255,7 +306,7 @@ class InitdataHelper(ImportHelperMixin):
                 data=data, version_id=self.version.id
             )
             if bulk_list:
-                PlayerCityLoopTask.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerCityLoopTask, bulk_list, 100)
 
             population = data.get("Population")
 
@@ -270,7 +321,7 @@ class InitdataHelper(ImportHelperMixin):
                     data=buildings, version_id=self.version.id
                 )
                 if bulk_list:
-                    PlayerBuilding.objects.bulk_create(bulk_list, 100)
+                    self.bulk_create(PlayerBuilding, bulk_list, 100)
 
             parcels = data.get("Parcels")
             if parcels:
@@ -278,7 +329,7 @@ class InitdataHelper(ImportHelperMixin):
                     data=parcels, version_id=self.version.id
                 )
                 if bulk_list:
-                    PlayerCityLoopParcel.objects.bulk_create(bulk_list, 100)
+                    self.bulk_create(PlayerCityLoopParcel, bulk_list, 100)
 
     def _parse_init_event(self, data):
         """
@@ -353,7 +404,7 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerDestination.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerDestination, bulk_list, 100)
 
     def _parse_init_factories(self, data):
         """
@@ -398,10 +449,10 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if factory_bulk_list:
-                PlayerFactory.objects.bulk_create(factory_bulk_list, 100)
+                self.bulk_create(PlayerFactory, factory_bulk_list, 100)
 
             if product_bulk_list:
-                PlayerFactoryProductOrder.objects.bulk_create(product_bulk_list, 100)
+                self.bulk_create(PlayerFactoryProductOrder, product_bulk_list, 100)
 
         self.print_remain("_parse_init_factories", data)
 
@@ -495,7 +546,7 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerJob.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerJob, bulk_list, 100)
 
         self.print_remain("_parse_init_jobs", data)
 
@@ -564,7 +615,7 @@ class InitdataHelper(ImportHelperMixin):
                 data=quests, version_id=self.version.id
             )
             if bulk_list:
-                PlayerQuest.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerQuest, bulk_list, 100)
 
         visited_regions = data.get("VisitedRegions")
         if visited_regions:
@@ -572,7 +623,7 @@ class InitdataHelper(ImportHelperMixin):
                 data=visited_regions, version_id=self.version.id
             )
             if bulk_list:
-                PlayerVisitedRegion.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerVisitedRegion, bulk_list, 100)
 
         self.print_remain("_parse_init_regions", data)
 
@@ -653,7 +704,7 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerTrain.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerTrain, bulk_list, 100)
 
         self.print_remain("_parse_init_trains", data)
 
@@ -691,7 +742,7 @@ class InitdataHelper(ImportHelperMixin):
                 self.print_remain("_parse_init_warehouse", articles)
 
                 if bulk_list:
-                    PlayerWarehouse.objects.bulk_create(bulk_list, 100)
+                    self.bulk_create(PlayerWarehouse, bulk_list, 100)
 
     def _parse_init_whistles(self, data):
         """
@@ -713,10 +764,10 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerWhistle.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerWhistle, bulk_list, 100)
 
             if bulk_item_list:
-                PlayerWhistleItem.objects.bulk_create(bulk_item_list, 100)
+                self.bulk_create(PlayerWhistleItem, bulk_item_list, 100)
 
         self.print_remain("_parse_init_whistles", data)
 
@@ -733,7 +784,7 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerShipOffer.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerShipOffer, bulk_list, 100)
 
         self.print_remain("_parse_init_ship_offers", data)
 
@@ -766,17 +817,17 @@ class InitdataHelper(ImportHelperMixin):
                 data=contract_list, version_id=self.version.id
             )
             if bulk_list:
-                PlayerContractList.objects.bulk_create(bulk_list)
+                self.bulk_create(PlayerContractList, bulk_list)
 
         if contracts:
             contract_list = list(
-                PlayerContractList.objects.filter(version_id=self.version.id).all()
+                PlayerContractList.objects.at_version(self.version).all()
             )
             bulk_list, _ = PlayerContract.create_instance(
                 data=contracts, version_id=self.version.id, contract_list=contract_list
             )
             if bulk_list:
-                PlayerContract.objects.bulk_create(bulk_list)
+                self.bulk_create(PlayerContract, bulk_list)
 
         self.print_remain("_parse_init_contracts", data)
 
@@ -865,7 +916,7 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerAchievement.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerAchievement, bulk_list, 100)
 
         self.print_remain("_parse_init_achievements", data)
 
@@ -903,7 +954,7 @@ class InitdataHelper(ImportHelperMixin):
         )
 
         if bulk_list:
-            PlayerDailyReward.objects.bulk_create(bulk_list, 100)
+            self.bulk_create(PlayerDailyReward, bulk_list, 100)
 
         self.print_remain("_parse_init_daily_reward", data)
 
@@ -933,7 +984,7 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerUnlockedContent.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerUnlockedContent, bulk_list, 100)
 
         self.print_remain("_parse_init_unlocked_contents", data)
 
@@ -945,7 +996,7 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerDailyOfferContainer.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerDailyOfferContainer, bulk_list, 100)
 
         daily_offer = data.get("DailyOffer")
         if daily_offer:
@@ -954,9 +1005,9 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerDailyOffer.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerDailyOffer, bulk_list, 100)
             if sub_bulk_list:
-                PlayerDailyOfferItem.objects.bulk_create(sub_bulk_list, 100)
+                self.bulk_create(PlayerDailyOfferItem, sub_bulk_list, 100)
 
         self.print_remain("_parse_init_shop", data)
 
@@ -968,7 +1019,7 @@ class InitdataHelper(ImportHelperMixin):
             )
 
             if bulk_list:
-                PlayerMap.objects.bulk_create(bulk_list, 100)
+                self.bulk_create(PlayerMap, bulk_list, 100)
 
         self.print_remain("_parse_init_maps", data)
 
@@ -1036,7 +1087,23 @@ class LeaderboardHelper(ImportHelperMixin):
         url = url.replace(":bracket:", "1")
         # :id:&Type=:category:&Bracket=:bracket:
 
-        return self.get(url=url, headers=headers, params=param)
+        if self.use_cache or not self.version.guild_id:
+            return self.get(url=url, headers=headers, params=param)
+
+        # 같은 guild 의 계정은 먼저 가져온 계정의 응답을 같이 쓴다.
+        fetched = []
+
+        def fetch():
+            fetched.append(True)
+            return self.get(url=url, headers=headers, params=param)
+
+        data = get_shared_cache().get_or_fetch(
+            key=f"guild:{self.version.guild_id}:leaderboard:{job.job_id}", fetch=fetch
+        )
+        if not fetched and data is not None:
+            # replay 를 위해 받은 것 처럼 남긴다.
+            self.version.save_cache(name=f"{self.NAME}_get", data=data)
+        return data
 
     def parse_data(self, data, **kwargs) -> str:
         """
@@ -1055,14 +1122,15 @@ class LeaderboardHelper(ImportHelperMixin):
             'LeaderboardId' = {str} '015bf3d8-d688-4cd0-b2c3-57b61f4e3373'
             'LeaderboardGroupId' = {str} '3a3dfa63-2e0f-4a40-b36c-08d252db9c2b'
             """
-            PlayerLeaderBoard.objects.filter(
-                version_id=self.version.id,
-                player_job_id=self.player_job_id,
-            ).delete()
-            PlayerLeaderBoardProgress.objects.filter(
-                version_id=self.version.id,
-                leader_board__player_job_id=self.player_job_id,
+            leader_boards = PlayerLeaderBoard.objects.at_version(self.version).filter(
+                player_job_id=self.player_job_id
+            )
+            # 이전 version 의 leader board / progress 는 history 로 남긴다.
+            leader_boards.split_history(self.version)
+            PlayerLeaderBoardProgress.objects.at_version(self.version).filter(
+                leader_board__player_job_id=self.player_job_id
             ).delete()
+            leader_boards.delete()
 
             (
                 bulk_leader_board_list,
@@ -0,0 +1,332 @@
+import gzip
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Optional, Type, Iterator, Dict, Tuple
+
+from django.conf import settings
+from django.db import connections, models, transaction, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from app_root.servers.models import RunVersion
+from app_root.servers.retention import retention_models
+from core.models.utils import chunk_list
+
+###########################################################################
+# 오래된 RunVersion 의 cold storage
+#
+#   - 계정 / 일자 별로 같은 schema 의 SQLite 파일에 Player* row 를 복사하고 gzip 압축.
+#       {ARCHIVE_PATH}/{username}/{YYYY-MM-DD}.sqlite3.gz
+#   - 복사한 RunVersion / Player* row 는 hot DB 에서 지운다.
+#   - 이후 version 까지 유효한 row (copy on write) 는 그 날의 마지막 version 까지 유효한 row 로 복사.
+#   - archive_open(version) 안에서는 RunVersion / Player* 조회가 archive 로 route 된다.
+#
+#       with archive_open(version):
+#           ts_dump(version)
+###########################################################################
+ARCHIVE_PATH = settings.SITE_PATH / "archive"
+ARCHIVE_SUFFIX = ".sqlite3.gz"
+COPY_CHUNK_SIZE = 2000
+
+_local = threading.local()
+_alias_counter = itertools.count(1)
+
+
+@lru_cache(maxsize=None)
+def archive_models() -> Tuple[Type[models.Model], ...]:
+    return (RunVersion, *retention_models())
+
+
+def archive_day(version: RunVersion) -> date:
+    return timezone.localdate(version.created)
+
+
+def archive_path(username: str, day: date, path: Optional[Path] = None) -> Path:
+    return (path or ARCHIVE_PATH) / username / f"{day:%Y-%m-%d}{ARCHIVE_SUFFIX}"
+
+
+def archive_days(username: str, path: Optional[Path] = None) -> List[date]:
+    """
+        archive 된 일자 목록
+    :param username:
+    :param path:
+    :return:
+    """
+    account_path = (path or ARCHIVE_PATH) / username
+    if not account_path.exists():
+        return []
+
+    return sorted(
+        datetime.strptime(o.name[: -len(ARCHIVE_SUFFIX)], "%Y-%m-%d").date()
+        for o in account_path.glob(f"*{ARCHIVE_SUFFIX}")
+    )
+
+
+###########################################################################
+# SQLite connection
+###########################################################################
+def _connect(filename: Path) -> str:
+    """
+        SQLite 파일을 임시 database alias 로 등록한다.
+    :param filename:
+    :return: alias
+    """
+    alias = f"archive_{next(_alias_counter)}"
+    databases = connections.configure_settings(
+        {
+            DEFAULT_DB_ALIAS: dict(connections.settings[DEFAULT_DB_ALIAS]),
+            alias: {"ENGINE": "django.db.backends.sqlite3", "NAME": str(filename)},
+        }
+    )
+    connections.settings[alias] = databases[alias]
+
+    with connections[alias].cursor() as cursor:
+        # 다른 table (User, TS*) 은 archive 에 없다.
+        cursor.execute("PRAGMA foreign_keys = OFF")
+    return alias
+
+
+def _disconnect(alias: str):
+    connections[alias].close()
+    del connections[alias]
+    del connections.settings[alias]
+
+
+def _create_tables(alias: str):
+    tables = set(connections[alias].introspection.table_names())
+    with connections[alias].schema_editor() as editor:
+        for model in archive_models():
+            if model._meta.db_table not in tables:
+                editor.create_model(model)
+
+
+@contextmanager
+def _sqlite_file(filename: Path, create: bool = False) -> Iterator[str]:
+    """
+        gzip 된 SQLite 파일을 임시 파일로 풀고 alias 를 넘긴다.
+        create 이면 종료할 때 다시 압축해서 저장한다.
+    :param filename:
+    :param create:
+    :return:
+    """
+    fd, tmp_name = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+    tmp = Path(tmp_name)
+
+    try:
+        if filename.exists():
+            with gzip.open(filename, "rb") as fin, open(tmp, "wb") as fout:
+                shutil.copyfileobj(fin, fout)
+
+        alias = _connect(tmp)
+        try:
+            if create:
+                _create_tables(alias)
+            yield alias
+        finally:
+            _disconnect(alias)
+
+        if create:
+            filename.parent.mkdir(0o755, True, exist_ok=True)
+            partial = filename.with_name(filename.name + ".tmp")
+            with open(tmp, "rb") as fin, gzip.open(partial, "wb") as fout:
+                shutil.copyfileobj(fin, fout)
+            os.replace(partial, filename)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+###########################################################################
+# read
+###########################################################################
+class ArchiveRouter:
+    """
+    archive_open() 안에서 RunVersion / Player* 는 archive 에서, 나머지는 default 에서 읽는다.
+    """
+
+    @staticmethod
+    def _route(model) -> Optional[str]:
+        alias = getattr(_local, "alias", None)
+        if not alias:
+            return None
+        if model in archive_models():
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        return self._route(model)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db.startswith("archive_"):
+            return False
+        return None
+
+
+@contextmanager
+def archive_open(
+    version: RunVersion, path: Optional[Path] = None
+) -> Iterator[Optional[str]]:
+    """
+        version 이 archive 되어 있으면 archive 를 열고 조회를 route 한다.
+    :param version:
+    :param path:
+    :return: alias. archive 가 없으면 None
+    """
+    filename = archive_path(version.user.username, archive_day(version), path=path)
+    if not filename.exists():
+        yield None
+        return
+
+    prev = getattr(_local, "alias", None)
+    with _sqlite_file(filename) as alias:
+        _local.alias = alias
+        try:
+            yield alias
+        finally:
+            _local.alias = prev
+
+
+def archive_versions(
+    username: str, day: date, path: Optional[Path] = None
+) -> List[RunVersion]:
+    """
+        archive 된 version 목록. (archive_open 에 넘길 수 있다)
+    :param username:
+    :param day:
+    :param path:
+    :return:
+    """
+    filename = archive_path(username, day, path=path)
+    if not filename.exists():
+        return []
+
+    with _sqlite_file(filename) as alias:
+        ret = list(RunVersion.objects.using(alias).order_by("id").all())
+
+    for version in ret:
+        version._state.db = DEFAULT_DB_ALIAS
+    return ret
+
+
+###########################################################################
+# write
+###########################################################################
+class Archiver:
+    """
+    cutoff 이전에 생성된 version 의 Player* row 를 archive 로 옮긴다.
+    하루 단위로 파일을 만들므로 cutoff 는 그 날의 시작 (local time) 으로 내린다.
+
+        Archiver(cutoff=timezone.now() - timedelta(days=3)).run()
+    """
+
+    cutoff: datetime
+    path: Path
+    stats: Dict[str, int]
+
+    def __init__(self, cutoff: datetime, path: Optional[Path] = None):
+        # 끝나지 않은 날을 archive 하면 다음 실행에서 같은 파일에 carry forward 된 row 를 다시 넣어야 한다.
+        self.cutoff = timezone.localtime(cutoff).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.path = path or ARCHIVE_PATH
+        self.stats = {}
+
+    def groups(self) -> Dict[tuple, List[RunVersion]]:
+        """
+        {(user_id, day): [version, ...]}
+        """
+        ret = {}
+        queryset = (
+            RunVersion.objects.filter(created__lt=self.cutoff)
+            .select_related("user")
+            .order_by("id")
+        )
+        for version in queryset.iterator(chunk_size=COPY_CHUNK_SIZE):
+            ret.setdefault((version.user_id, archive_day(version)), []).append(version)
+        return ret
+
+    def copy_rows(self, alias: str, model: Type[models.Model], rows) -> int:
+        count = 0
+        bulk_list = []
+        for row in rows:
+            bulk_list.append(row)
+            if len(bulk_list) >= COPY_CHUNK_SIZE:
+                model.objects.using(alias).bulk_create(bulk_list, ignore_conflicts=True)
+                count += len(bulk_list)
+                bulk_list = []
+        if bulk_list:
+            model.objects.using(alias).bulk_create(bulk_list, ignore_conflicts=True)
+            count += len(bulk_list)
+        return count
+
+    def delete_rows(self, model: Type[models.Model], version_ids: List[int]):
+        db = model.objects.db
+        ops = connections[db].ops
+        table = ops.quote_name(model._meta.db_table)
+        column = ops.quote_name(model._meta.get_field("version").column)
+
+        with connections[db].cursor() as cursor:
+            for chunk in chunk_list(version_ids, 500):
+                placeholder = ", ".join(["%s"] * len(chunk))
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE {column} IN ({placeholder})", chunk
+                )
+
+    def archive(self, username: str, day: date, versions: List[RunVersion]):
+        version_ids = [o.id for o in versions]
+        last_id = version_ids[-1]
+        filename = archive_path(username, day, path=self.path)
+
+        with _sqlite_file(filename, create=True) as alias, transaction.atomic(
+            using=alias
+        ):
+            self.copy_rows(alias, RunVersion, versions)
+
+            for model in retention_models():
+                queryset = model.objects.using(DEFAULT_DB_ALIAS)
+                count = self.copy_rows(
+                    alias,
+                    model,
+                    queryset.filter(version_id__in=version_ids).iterator(
+                        chunk_size=COPY_CHUNK_SIZE
+                    ),
+                )
+
+                # 이후 version 까지 유효한 row 는 이 날의 마지막 version 까지 유효한 row 로 복사.
+                def carried():
+                    for row in (
+                        queryset.filter(
+                            version__user_id=versions[0].user_id,
+                            version_id__gt=last_id,
+                            valid_from_version_id__lte=last_id,
+                        )
+                        .order_by()
+                        .iterator(chunk_size=COPY_CHUNK_SIZE)
+                    ):
+                        row.version_id = last_id
+                        yield row
+
+                count += self.copy_rows(alias, model, carried())
+                name = model.__name__
+                self.stats[name] = self.stats.get(name, 0) + count
+
+        # archive 파일이 저장된 후에 지운다.
+        for model in retention_models():
+            self.delete_rows(model, version_ids)
+        for chunk in chunk_list(version_ids, 500):
+            RunVersion.objects.filter(id__in=chunk).delete()
+
+        print(f"[Archive] {username} {day} : {len(version_ids)} versions -> {filename}")
+
+    def run(self):
+        for (user_id, day), versions in self.groups().items():
+            self.archive(versions[0].user.username, day, versions)
@@ -0,0 +1,232 @@
+import os
+import socket
+import threading
+from bisect import bisect
+from datetime import datetime, timedelta
+from hashlib import md5
+from typing import List, Optional, Iterable
+
+from django.conf import settings
+from django.db import transaction, connection
+from django.utils import timezone
+
+from app_root.servers.models import UserLease, Worker
+
+###########################################################################
+# 계정 lease
+#
+#   여러 host 의 worker 가 같은 DB 를 사용할 때 계정은 1개의 worker 만 처리한다.
+#   - worker 는 heartbeat 로 살아 있음을 알린다.
+#   - 계정은 살아 있는 worker 의 consistent hash ring 으로 할당된다.
+#   - lease 는 LEASE_TTL 동안 유효하고, 처리중에는 HEARTBEAT_INTERVAL 마다 갱신한다.
+#   - worker 가 죽으면 lease 가 만료되고, ring 에서 빠져 다른 worker 가 가져간다.
+#   - lease 를 잃으면 (갱신 실패) 다음 command / phase 에서 LeaseLost 로 중단한다.
+#   - WORKER_EXPIRE 동안 heartbeat 가 없는 worker 는 지운다. (hostname:pid 는 실행마다 바뀐다)
+###########################################################################
+LEASE_TTL = timedelta(seconds=90)
+HEARTBEAT_INTERVAL = timedelta(seconds=30)
+WORKER_EXPIRE = timedelta(hours=1)
+RING_REPLICAS = 64
+
+
+class LeaseLost(Exception):
+    """
+    처리중에 다른 worker 가 계정 lease 를 가져갔다.
+    """
+
+
+def get_worker_name() -> str:
+    """
+    settings.WORKER_NAME 또는 hostname:pid
+    """
+    name = getattr(settings, "WORKER_NAME", None)
+    if name:
+        return name
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _hash(key: str) -> int:
+    return int(md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class ConsistentHashRing:
+    """
+    worker 이름의 consistent hash ring.
+
+        ring = ConsistentHashRing(['host-a', 'host-b'])
+        ring.get(user_id) => 'host-a'
+
+    worker 가 추가 / 제거되어도 다른 worker 의 계정은 대부분 그대로 유지된다.
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int = RING_REPLICAS):
+        self.nodes = sorted(set(nodes))
+        self.keys = []
+        self.values = []
+
+        points = []
+        for node in self.nodes:
+            for i in range(replicas):
+                points.append((_hash(f"{node}#{i}"), node))
+        points.sort()
+
+        for k, v in points:
+            self.keys.append(k)
+            self.values.append(v)
+
+    def get(self, key) -> Optional[str]:
+        if not self.keys:
+            return None
+        idx = bisect(self.keys, _hash(str(key))) % len(self.keys)
+        return self.values[idx]
+
+
+###########################################################################
+# Worker
+###########################################################################
+def worker_heartbeat(worker_name: str, now: Optional[datetime] = None) -> Worker:
+    now = now or timezone.now()
+    instance, _ = Worker.objects.update_or_create(
+        name=worker_name, defaults={"heartbeat_at": now}
+    )
+    return instance
+
+
+def worker_find_alive(now: Optional[datetime] = None) -> List[str]:
+    now = now or timezone.now()
+    return list(
+        Worker.objects.filter(heartbeat_at__gte=now - LEASE_TTL)
+        .order_by("name")
+        .values_list("name", flat=True)
+    )
+
+
+def worker_get_ring(now: Optional[datetime] = None) -> ConsistentHashRing:
+    return ConsistentHashRing(nodes=worker_find_alive(now=now))
+
+
+def worker_cleanup(now: Optional[datetime] = None) -> int:
+    """
+    WORKER_EXPIRE 동안 heartbeat 가 없는 worker 를 지운다.
+    """
+    now = now or timezone.now()
+    deleted, _ = Worker.objects.filter(heartbeat_at__lt=now - WORKER_EXPIRE).delete()
+    return deleted
+
+
+def worker_remove(worker_name: str):
+    Worker.objects.filter(name=worker_name).delete()
+
+
+###########################################################################
+# Lease
+###########################################################################
+def lease_acquire(
+    user_id: int, worker_name: str, now: Optional[datetime] = None
+) -> Optional[UserLease]:
+    """
+        계정 lease 획득. 다른 worker 가 유효한 lease 를 가지고 있으면 None.
+
+    :param user_id:
+    :param worker_name:
+    :param now:
+    :return:
+    """
+    now = now or timezone.now()
+
+    with transaction.atomic(using=UserLease.objects.db):
+        UserLease.objects.get_or_create(user_id=user_id)
+        lease = UserLease.objects.select_for_update().get(user_id=user_id)
+
+        if (
+            lease.worker_name
+            and lease.worker_name != worker_name
+            and lease.expires_at
+            and lease.expires_at > now
+        ):
+            return None
+
+        lease.worker_name = worker_name
+        lease.expires_at = now + LEASE_TTL
+        lease.save(update_fields=["worker_name", "expires_at"])
+
+    return lease
+
+
+def lease_renew(lease: UserLease, now: Optional[datetime] = None) -> bool:
+    """
+    lease 연장. 이미 다른 worker 가 가져갔으면 False.
+    """
+    now = now or timezone.now()
+    expires_at = now + LEASE_TTL
+    updated = UserLease.objects.filter(
+        id=lease.id, worker_name=lease.worker_name
+    ).update(expires_at=expires_at, modified=now)
+    if updated:
+        lease.expires_at = expires_at
+    return updated > 0
+
+
+def lease_release(lease: UserLease):
+    UserLease.objects.filter(id=lease.id, worker_name=lease.worker_name).update(
+        worker_name="", expires_at=None, modified=timezone.now()
+    )
+
+
+class LeaseKeeper:
+    """
+    with 블럭 동안 HEARTBEAT_INTERVAL 마다 lease 와 worker heartbeat 를 갱신한다.
+
+    with LeaseKeeper(lease) as keeper:
+        lease_attach(version=version, keeper=keeper)
+        strategy...
+        keeper.check() / lease_check(version=version) => lease 를 잃었으면 LeaseLost
+    """
+
+    def __init__(self, lease: UserLease, interval: timedelta = HEARTBEAT_INTERVAL):
+        self.lease = lease
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        self.lost = False
+
+    def _run(self):
+        try:
+            while not self.stopped.wait(self.interval.total_seconds()):
+                worker_heartbeat(worker_name=self.lease.worker_name)
+                if not lease_renew(lease=self.lease):
+                    self.lost = True
+                    print(f"[Lease] lost lease of user_id={self.lease.user_id}")
+                    break
+        finally:
+            connection.close()
+
+    def check(self):
+        if self.lost:
+            raise LeaseLost(f"lost lease of user_id={self.lease.user_id}")
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stopped.set()
+        self.thread.join()
+        lease_release(lease=self.lease)
+
+
+def lease_attach(version, keeper: LeaseKeeper):
+    """
+    version 으로 command 를 보내기 전에 lease 를 확인하도록 keeper 를 연결한다.
+    """
+    setattr(version, "__lease_keeper", keeper)
+
+
+def lease_check(version):
+    """
+    연결된 keeper 가 lease 를 잃었으면 LeaseLost. (keeper 가 없으면 확인하지 않는다)
+    """
+    keeper: Optional[LeaseKeeper] = getattr(version, "__lease_keeper", None)
+    if keeper:
+        keeper.check()
@@ -0,0 +1,89 @@
+# Generated by Django 4.1.4 on 2026-10-19 11:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("servers", "0002_alter_tsmilestone_rewards_alter_tsuserlevel_rewards"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Worker",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "created",
+                    models.DateTimeField(
+                        blank=True, editable=False, verbose_name="created date"
+                    ),
+                ),
+                (
+                    "modified",
+                    models.DateTimeField(
+                        blank=True, editable=False, verbose_name="modified date"
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(max_length=100, unique=True, verbose_name="name"),
+                ),
+                ("heartbeat_at", models.DateTimeField(verbose_name="heartbeat at")),
+            ],
+            options={
+                "verbose_name": "Worker",
+                "verbose_name_plural": "Workers",
+            },
+        ),
+        migrations.CreateModel(
+            name="UserLease",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "created",
+                    models.DateTimeField(
+                        blank=True, editable=False, verbose_name="created date"
+                    ),
+                ),
+                (
+                    "modified",
+                    models.DateTimeField(
+                        blank=True, editable=False, verbose_name="modified date"
+                    ),
+                ),
+                (
+                    "worker_name",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=100,
+                        verbose_name="worker name",
+                    ),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        blank=True, default=None, null=True, verbose_name="expires at"
+                    ),
+                ),
+                (
+                    "user",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "User Lease",
+                "verbose_name_plural": "User Leases",
+            },
+        ),
+    ]
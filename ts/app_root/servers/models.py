@@ -1,4 +1,5 @@
 import json
+import logging
 import sys
 from datetime import timedelta
 from decimal import Decimal
@@ -7,12 +8,13 @@ from pathlib import Path
 from typing import List, Dict, Tuple
 
 from django.conf import settings
-from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from app_root.servers.mixins import ContentCategoryMixin, RarityMixin, EraMixin
+from core.logsink import get_log_sink
+from core.recordstore import RecordStore
 from core.models.mixins import BaseModelMixin, TimeStampedMixin, TaskModelMixin
 from core.utils import hash10, convert_number_as_int
 
@@ -203,60 +205,94 @@ class RunVersion(BaseModelMixin, TimeStampedMixin, TaskModelMixin):
         account_path.mkdir(0o755, True, exist_ok=True)
         return account_path
 
-    def save_cache(self, name, data):
-        account_path = self.get_account_path()
+    @cached_property
+    def record_stores(self) -> Dict[str, RecordStore]:
+        return {}
+
+    def get_record_store(self, name) -> RecordStore:
+        store = self.record_stores.get(name)
+        if store is None:
+            store = RecordStore(self.get_account_path() / name)
+            self.record_stores.update({name: store})
+        return store
+
+    def close_record_stores(self):
+        """
+        get_record_store 로 연 mmap 을 닫는다.
+        """
+        for store in self.record_stores.values():
+            store.close()
+        self.record_stores.clear()
 
+    def save_cache(self, name, data):
+        """
+            응답을 {name}.dat / {name}.idx 에 추가한다. (core.recordstore)
+        :param name:
+        :param data:
+        :return:
+        """
         if "pytest" not in sys.modules:
-            log_filepath = account_path / f"{name}.txt"
-            with open(log_filepath, "at", encoding="UTF-8") as fout:
-                fout.write(data)
-                fout.write("\n")
+            self.get_record_store(name).append(data)
 
     def read_cache(self, name, idx):
-        account_path = self.get_account_path()
-
-        log_filepath = account_path / f"{name}.txt"
-        if log_filepath.exists():
-            return log_filepath.read_text(encoding="UTF-8").split("\n")[idx]
+        """
+            save_cache 로 저장한 idx 번째 응답. (없으면 "")
+        :param name:
+        :param idx:
+        :return:
+        """
+        store = self.get_record_store(name)
+        if store.exists():
+            return store.get(idx)
         return ""
 
-    def add_log(self, msg, **kwargs):
-        account_path = (
-            settings.SITE_PATH / "log" / f"{self.user.username}" / f"{self.id}"
-        )
-        account_path.mkdir(0o755, True, exist_ok=True)
-        elapse = (
-            (self.now - self.login_server) if self.now and self.login_server else "-"
+    @cached_property
+    def log_path(self) -> Path:
+        return (
+            settings.SITE_PATH
+            / "log"
+            / f"{self.user.username}"
+            / f"{self.id}"
+            / f"{self.__class__.__name__}.ndjson"
         )
 
-        if "pytest" not in sys.modules:
-            log_filepath: Path = account_path / f"{self.__class__.__name__}.log"
-
-            with open(log_filepath, "at", encoding="UTF-8") as fout:
-                fout.write(
-                    "\n############################################################\n"
-                )
-                fout.write(
-                    f"# Time : Now[{self.now}] | Login[{self.login_server}] | Elapsed[{elapse}] | Command No[{self.command_no}]\n"
-                )
-                fout.write(f"# {msg}\n")
-                fout.write(
-                    "############################################################\n"
-                )
-                if kwargs:
-                    fout.write(json.dumps(kwargs, indent=2, cls=DjangoJSONEncoder))
+    def add_log(self, msg, **kwargs):
+        """
+            한 줄 JSON 으로 기록한다. (core.logsink 의 writer thread 가 쓴다)
+        :param msg:
+        :param kwargs: JSON 으로 변환 가능한 값
+        :return:
+        """
+        sink = get_log_sink()
+        if "pytest" in sys.modules or not sink.is_enabled(logging.INFO):
+            return
+
+        sink.emit(
+            path=self.log_path,
+            record={
+                "level": "INFO",
+                "now": self.now,
+                "login": self.login_server,
+                "elapsed": (self.now - self.login_server)
+                if self.now and self.login_server
+                else None,
+                "command_no": self.command_no,
+                "msg": msg,
+                "data": dict(kwargs) if kwargs else None,
+            },
+            level=logging.INFO,
+        )
 
     def add_debug(self, msg: str):
-        account_path = (
-            settings.SITE_PATH / "log" / f"{self.user.username}" / f"{self.id}"
+        sink = get_log_sink()
+        if "pytest" in sys.modules or not sink.is_enabled(logging.DEBUG):
+            return
+
+        sink.emit(
+            path=self.log_path,
+            record={"level": "DEBUG", "now": self.now, "msg": msg},
+            level=logging.DEBUG,
         )
-        account_path.mkdir(0o755, True, exist_ok=True)
-
-        if "pytest" not in sys.modules:
-            log_filepath: Path = account_path / f"{self.__class__.__name__}.log"
-
-            with open(log_filepath, "at", encoding="UTF-8") as fout:
-                fout.write(f"[{self.now}] {msg}\n")
 
 
 class EndPoint(BaseModelMixin, TimeStampedMixin):
@@ -1095,3 +1131,41 @@ class TSTrainUpgrade(BaseModelMixin, TimeStampedMixin, ContentCategoryMixin):
                 ret.update({_id: _amount})
 
         return ret
+
+
+class Worker(BaseModelMixin, TimeStampedMixin):
+    """
+    bot worker (host / process). heartbeat 가 끊긴 worker 의 계정은 다른 worker 에 할당된다.
+    """
+
+    name = models.CharField(_("name"), max_length=100, unique=True)
+    heartbeat_at = models.DateTimeField(_("heartbeat at"), null=False, blank=False)
+
+    class Meta:
+        verbose_name = "Worker"
+        verbose_name_plural = "Workers"
+
+
+class UserLease(BaseModelMixin, TimeStampedMixin):
+    """
+    계정 소유권. expires_at 이 지나면 다른 worker 가 가져갈 수 있다.
+    """
+
+    user = models.OneToOneField(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        related_name="+",
+        null=False,
+        blank=False,
+        db_constraint=False,
+    )
+    worker_name = models.CharField(
+        _("worker name"), max_length=100, blank=True, null=False, default=""
+    )
+    expires_at = models.DateTimeField(
+        _("expires at"), null=True, blank=True, default=None
+    )
+
+    class Meta:
+        verbose_name = "User Lease"
+        verbose_name_plural = "User Leases"
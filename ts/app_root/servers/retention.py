@@ -0,0 +1,286 @@
+import time
+from datetime import datetime
+from typing import List, Optional, Type, Tuple
+
+from django.apps import apps
+from django.db import connections, models
+
+from app_root.servers.models import RunVersion
+
+###########################################################################
+# 오래된 RunVersion 정리
+#
+#   - Player* table 은 version_id 범위 단위로 raw DELETE. (delete collector 를 거치지 않는다)
+#   - 한번에 versions_per_batch 개의 version 범위만 지우고, 지운 시간 * throttle 만큼 쉰다.
+#   - MySQL 에서 version_id 로 partition 된 table 은 범위 전체가 지워지는 partition 을 DROP.
+#   - copy on write 로 이후 version 까지 유효한 row 는 version_id 가 더 크므로 지워지지 않는다.
+###########################################################################
+VERSIONS_PER_BATCH = 20
+THROTTLE = 1.0
+PARTITION_STEP = 10000
+PARTITION_AHEAD = 2
+
+
+def retention_models() -> List[Type[models.Model]]:
+    """
+    version_id 를 가진 Player* model. (자식 model 먼저)
+    """
+    from app_root.players.mixins import BaseVersionMixin
+
+    ret = [
+        model
+        for model in apps.get_app_config("players").get_models()
+        if issubclass(model, BaseVersionMixin)
+    ]
+
+    def depth(model) -> int:
+        parents = [
+            f.related_model
+            for f in model._meta.concrete_fields
+            if f.is_relation and f.related_model in ret and f.related_model != model
+        ]
+        return 1 + max((depth(p) for p in parents), default=0)
+
+    return sorted(ret, key=lambda m: -depth(m))
+
+
+def retention_bound(before: datetime) -> Optional[int]:
+    """
+        before 이전에 생성된 마지막 version id. (version id 는 생성 순서)
+    :param before:
+    :return:
+    """
+    return (
+        RunVersion.objects.filter(created__lte=before)
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+def last_version_id() -> int:
+    return RunVersion.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+###########################################################################
+# MySQL partition
+###########################################################################
+def is_mysql(model: Type[models.Model]) -> bool:
+    return connections[model.objects.db].vendor == "mysql"
+
+
+def partition_list(model: Type[models.Model]) -> List[Tuple[str, Optional[int]]]:
+    """
+        [(partition name, version_id 상한 (미만)), ...] MAXVALUE 는 None
+    :param model:
+    :return:
+    """
+    if not is_mysql(model):
+        return []
+
+    with connections[model.objects.db].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            """,
+            [model._meta.db_table],
+        )
+        return [
+            (name, None if desc == "MAXVALUE" else int(desc))
+            for name, desc in cursor.fetchall()
+        ]
+
+
+def partition_bounds(max_version_id: int, step: int, ahead: int) -> List[int]:
+    """
+        step 단위의 partition 상한 목록. 현재 max version 이후 ahead 개 까지.
+    :param max_version_id:
+    :param step:
+    :param ahead:
+    :return:
+    """
+    last = (max_version_id // step + 1 + ahead) * step
+    return list(range(step, last + 1, step))
+
+
+def partition_create(model: Type[models.Model], step: int = PARTITION_STEP):
+    """
+        version_id 범위로 partition 한다. (MySQL, 1번만)
+        partition key 는 모든 unique key 에 포함되어야 하므로 primary key 를 (id, version_id) 로 바꾼다.
+    :param model:
+    :param step:
+    :return:
+    """
+    if not is_mysql(model) or partition_list(model):
+        return
+
+    table = model._meta.db_table
+    bounds = partition_bounds(last_version_id(), step, PARTITION_AHEAD)
+    partitions = ", ".join(f"PARTITION p{b} VALUES LESS THAN ({b})" for b in bounds)
+
+    print(f"[Retention] partition {table} : {len(bounds)} partitions")
+    with connections[model.objects.db].cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `version_id`)"
+        )
+        cursor.execute(
+            f"ALTER TABLE `{table}` PARTITION BY RANGE (`version_id`) "
+            f"({partitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+
+
+def partition_extend(model: Type[models.Model], step: int = PARTITION_STEP):
+    """
+        새 version 이 pmax 에 쌓이지 않도록 partition 을 미리 추가한다.
+    :param model:
+    :param step:
+    :return:
+    """
+    partitions = partition_list(model)
+    if not partitions:
+        return
+
+    last = max((b for _, b in partitions if b), default=0)
+    bounds = [
+        b
+        for b in partition_bounds(last_version_id(), step, PARTITION_AHEAD)
+        if b > last
+    ]
+    if not bounds:
+        return
+
+    table = model._meta.db_table
+    partitions = ", ".join(f"PARTITION p{b} VALUES LESS THAN ({b})" for b in bounds)
+    print(f"[Retention] partition {table} : add {len(bounds)} partitions")
+    with connections[model.objects.db].cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE `{table}` REORGANIZE PARTITION pmax INTO "
+            f"({partitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+
+
+def partition_drop(model: Type[models.Model], bound: int) -> int:
+    """
+        모든 row 가 bound 이하인 partition 을 DROP.
+    :param model:
+    :param bound: 지울 마지막 version id
+    :return: DROP 한 partition 의 상한 (이 미만의 version 은 지워졌다). 없으면 0
+    """
+    names = [
+        (name, b)
+        for name, b in partition_list(model)
+        if b is not None and b <= bound + 1
+    ]
+    if not names:
+        return 0
+
+    table = model._meta.db_table
+    print(f"[Retention] {table} : drop {', '.join(n for n, _ in names)}")
+    with connections[model.objects.db].cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE `{table}` DROP PARTITION {', '.join(n for n, _ in names)}"
+        )
+    return max(b for _, b in names)
+
+
+###########################################################################
+# range delete
+###########################################################################
+class Retention:
+    """
+    bound 이하의 version 을 지운다.
+
+        Retention(bound=retention_bound(timezone.now() - timedelta(days=3))).run()
+    """
+
+    bound: int
+    versions_per_batch: int
+    throttle: float
+    deleted: int
+
+    def __init__(
+        self,
+        bound: int,
+        versions_per_batch: int = VERSIONS_PER_BATCH,
+        throttle: float = THROTTLE,
+        sleep=time.sleep,
+    ):
+        """
+        :param bound: 지울 마지막 version id
+        :param versions_per_batch: 1번의 DELETE 에 포함할 version 수
+        :param throttle: 지우는데 걸린 시간 * throttle 만큼 쉰다. (0 이면 쉬지 않는다)
+        :param sleep:
+        """
+        self.bound = bound
+        self.versions_per_batch = versions_per_batch
+        self.throttle = throttle
+        self.sleep = sleep
+        self.deleted = 0
+
+    def version_windows(self) -> List[Tuple[int, int]]:
+        """
+            bound 이하의 version id 를 versions_per_batch 개 씩 나눈 연속된 (min, max)
+            version 이 먼저 지워진 row 도 포함된다.
+        :return:
+        """
+        id_list = list(
+            RunVersion.objects.filter(id__lte=self.bound)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        ret = []
+        lo = 0
+        for i in range(0, len(id_list), self.versions_per_batch):
+            hi = id_list[i : i + self.versions_per_batch][-1]
+            ret.append((lo, hi))
+            lo = hi + 1
+        return ret
+
+    def execute(self, model: Type[models.Model], sql: str, params: list) -> int:
+        started = time.monotonic()
+        with connections[model.objects.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            count = max(cursor.rowcount, 0)
+
+        if self.throttle > 0:
+            self.sleep((time.monotonic() - started) * self.throttle)
+        return count
+
+    def delete_model(self, model: Type[models.Model], windows: List[Tuple[int, int]]):
+        ops = connections[model.objects.db].ops
+        table = ops.quote_name(model._meta.db_table)
+        column = ops.quote_name(model._meta.get_field("version").column)
+        start = partition_drop(model, self.bound)
+
+        count = 0
+        for idx, (lo, hi) in enumerate(windows, 1):
+            if hi < start:
+                continue
+            count += self.execute(
+                model,
+                f"DELETE FROM {table} WHERE {column} >= %s AND {column} <= %s",
+                [lo, hi],
+            )
+            print(
+                f"[Retention] {table} : version {lo} ~ {hi} ({idx}/{len(windows)}) / {count} rows"
+            )
+        self.deleted += count
+
+    def run(self):
+        windows = self.version_windows()
+        if not windows:
+            print("[Retention] nothing to delete")
+            return
+
+        for model in retention_models():
+            self.delete_model(model, windows)
+
+        for idx, (lo, hi) in enumerate(windows, 1):
+            RunVersion.objects.filter(id__gte=lo, id__lte=hi).delete()
+            print(f"[Retention] RunVersion : {lo} ~ {hi} ({idx}/{len(windows)})")
+
+        print(f"[Retention] deleted {self.deleted} rows / {len(windows)} batches")
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from app_root.players.models import PlayerWarehouse
+from app_root.servers.archives import (
+    Archiver,
+    archive_days,
+    archive_open,
+    archive_versions,
+    archive_day,
+)
+from app_root.servers.models import RunVersion
+from app_root.users.models import User
+
+
+@pytest.mark.django_db
+def test_archive(multidb, tmp_path):
+    user = User.objects.create_user(username="test", android_id="test")
+    old = timezone.now() - timedelta(days=5)
+
+    versions = [
+        RunVersion.objects.create(user_id=user.id, level_id=1, created=old)
+        for _ in range(3)
+    ]
+    live = RunVersion.objects.create(user_id=user.id, level_id=1)
+
+    for version in versions + [live]:
+        PlayerWarehouse.objects.create(version_id=version.id, article_id=1, amount=1)
+    # 첫 version 부터 live version 까지 유효한 row. (copy on write)
+    PlayerWarehouse.objects.create(
+        version_id=live.id,
+        valid_from_version_id=versions[0].id,
+        article_id=2,
+        amount=2,
+    )
+
+    archiver = Archiver(cutoff=timezone.now() - timedelta(days=3), path=tmp_path)
+    archiver.run()
+
+    day = archive_day(versions[0])
+    assert archive_days("test", path=tmp_path) == [day]
+    assert archiver.stats["PlayerWarehouse"] == 4
+
+    # hot DB 에는 live version 만 남는다.
+    assert list(RunVersion.objects.values_list("id", flat=True)) == [live.id]
+    assert PlayerWarehouse.objects.count() == 2
+
+    archived = archive_versions("test", day, path=tmp_path)
+    assert [o.id for o in archived] == [o.id for o in versions]
+
+    with archive_open(archived[-1], path=tmp_path) as alias:
+        assert alias
+        assert RunVersion.objects.filter(id=versions[0].id).exists()
+        assert archived[-1].user.username == "test"
+        rows = PlayerWarehouse.objects.at_version(archived[-1])
+        assert sorted(rows.values_list("article_id", "amount")) == [(1, 1), (2, 2)]
+
+    with archive_open(live, path=tmp_path) as alias:
+        assert alias is None
+        assert PlayerWarehouse.objects.filter(version_id=live.id).count() == 2
+
+
+@pytest.mark.django_db
+def test_archive_complete_days(multidb, tmp_path):
+    user = User.objects.create_user(username="test", android_id="test")
+    cutoff = timezone.localtime(timezone.now() - timedelta(days=3)).replace(
+        hour=12, minute=0, second=0, microsecond=0
+    )
+    before = RunVersion.objects.create(
+        user_id=user.id, level_id=1, created=cutoff - timedelta(hours=13)
+    )
+    same_day = RunVersion.objects.create(
+        user_id=user.id, level_id=1, created=cutoff - timedelta(hours=1)
+    )
+
+    Archiver(cutoff=cutoff, path=tmp_path).run()
+
+    # cutoff 가 속한 날은 끝난 후에 한번에 archive 한다.
+    assert archive_days("test", path=tmp_path) == [archive_day(before)]
+    assert list(RunVersion.objects.values_list("id", flat=True)) == [same_day.id]
@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from app_root.servers.leases import (
+    ConsistentHashRing,
+    LEASE_TTL,
+    WORKER_EXPIRE,
+    LeaseKeeper,
+    LeaseLost,
+    lease_acquire,
+    lease_attach,
+    lease_check,
+    lease_renew,
+    lease_release,
+    worker_heartbeat,
+    worker_find_alive,
+    worker_cleanup,
+)
+from app_root.servers.models import RunVersion, Worker
+from app_root.users.models import User
+
+
+def test_consistent_hash_ring():
+    ring = ConsistentHashRing(nodes=["a", "b", "c"])
+    before = {user_id: ring.get(user_id) for user_id in range(1000)}
+    assert set(before.values()) == {"a", "b", "c"}
+
+    # worker 가 빠지면 그 worker 의 계정만 다른 worker 로 이동한다.
+    ring = ConsistentHashRing(nodes=["a", "b"])
+    for user_id, node in before.items():
+        if node != "c":
+            assert ring.get(user_id) == node
+
+    assert ConsistentHashRing(nodes=[]).get(1) is None
+
+
+@pytest.mark.django_db
+def test_lease(multidb):
+    user = User.objects.create_user(username="test", android_id="test")
+    now = timezone.now()
+
+    lease = lease_acquire(user_id=user.id, worker_name="a", now=now)
+    assert lease
+    assert lease_acquire(user_id=user.id, worker_name="a", now=now)
+    assert not lease_acquire(user_id=user.id, worker_name="b", now=now)
+
+    # heartbeat 가 끊기면 다른 worker 가 가져간다.
+    later = now + LEASE_TTL + timedelta(seconds=1)
+    lease_b = lease_acquire(user_id=user.id, worker_name="b", now=later)
+    assert lease_b
+    assert not lease_renew(lease=lease, now=later)
+    assert lease_renew(lease=lease_b, now=later)
+
+    lease_release(lease=lease_b)
+    assert lease_acquire(user_id=user.id, worker_name="a", now=later)
+
+    worker_heartbeat(worker_name="a", now=now)
+    worker_heartbeat(worker_name="b", now=later)
+    assert worker_find_alive(now=later) == ["b"]
+
+
+@pytest.mark.django_db
+def test_lease_lost(multidb):
+    user = User.objects.create_user(username="test", android_id="test")
+    now = timezone.now()
+
+    lease = lease_acquire(user_id=user.id, worker_name="a", now=now)
+    keeper = LeaseKeeper(lease=lease)
+    version = RunVersion(user_id=user.id)
+
+    # keeper 가 없는 version (simulator 등) 은 확인하지 않는다.
+    lease_check(version=version)
+
+    lease_attach(version=version, keeper=keeper)
+    lease_check(version=version)
+
+    # 다른 worker 가 가져가면 갱신에 실패하고, 다음 확인에서 중단한다.
+    later = now + LEASE_TTL + timedelta(seconds=1)
+    assert lease_acquire(user_id=user.id, worker_name="b", now=later)
+    keeper.lost = not lease_renew(lease=lease, now=later)
+    with pytest.raises(LeaseLost):
+        lease_check(version=version)
+
+
+@pytest.mark.django_db
+def test_worker_cleanup(multidb):
+    now = timezone.now()
+    worker_heartbeat(
+        worker_name="host:1", now=now - WORKER_EXPIRE - timedelta(seconds=1)
+    )
+    worker_heartbeat(worker_name="host:2", now=now)
+
+    assert worker_cleanup(now=now) == 1
+    assert list(Worker.objects.values_list("name", flat=True)) == ["host:2"]
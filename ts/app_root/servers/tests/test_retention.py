@@ -0,0 +1,60 @@
+import pytest
+
+from app_root.players.models import PlayerWarehouse, PlayerWhistle, PlayerWhistleItem
+from app_root.servers.models import RunVersion
+from app_root.servers.retention import Retention, partition_bounds, retention_models
+from app_root.users.models import User
+
+
+def test_retention_models():
+    models = retention_models()
+    assert len(models) == 27
+    # 자식 model 먼저.
+    assert models.index(PlayerWhistleItem) < models.index(PlayerWhistle)
+
+
+def test_partition_bounds():
+    assert partition_bounds(max_version_id=0, step=100, ahead=1) == [100, 200]
+    assert partition_bounds(max_version_id=250, step=100, ahead=2) == [
+        100,
+        200,
+        300,
+        400,
+        500,
+    ]
+
+
+@pytest.mark.django_db
+def test_retention(multidb):
+    user = User.objects.create_user(username="test", android_id="test")
+    versions = [
+        RunVersion.objects.create(user_id=user.id, level_id=1) for _ in range(5)
+    ]
+
+    for version in versions:
+        PlayerWarehouse.objects.create(version_id=version.id, article_id=1, amount=1)
+    # 첫 version 부터 마지막 version 까지 유효한 row. (copy on write)
+    PlayerWarehouse.objects.create(
+        version_id=versions[-1].id,
+        valid_from_version_id=versions[0].id,
+        article_id=2,
+        amount=2,
+    )
+
+    sleeps = []
+    retention = Retention(
+        bound=versions[2].id, versions_per_batch=2, throttle=1.0, sleep=sleeps.append
+    )
+    retention.run()
+
+    assert retention.deleted == 3
+    assert len(sleeps) == 27 * 2
+    assert list(RunVersion.objects.values_list("id", flat=True).order_by("id")) == [
+        versions[3].id,
+        versions[4].id,
+    ]
+    assert sorted(PlayerWarehouse.objects.values_list("version_id", "article_id")) == [
+        (versions[3].id, 1),
+        (versions[4].id, 1),
+        (versions[4].id, 2),
+    ]
@@ -35,7 +35,7 @@ class EndpointHelper(ImportHelperMixin):
     NAME = "endpoint"
 
     def get_urls(self) -> Iterator[Tuple[str, str, str, str]]:
-        yield "https://game.trainstation2.com/get-endpoints", "ep_sent", "ep_server", "ep_recv"
+        yield f"{settings.GAME_SERVER_URL}/get-endpoints", "ep_sent", "ep_server", "ep_recv"
 
     def get_data(self, url, **kwargs) -> str:
         mask = (
@@ -0,0 +1,571 @@
+import contextlib
+import functools
+import io
+import json
+import pkgutil
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional, Callable, Any
+from unittest import mock
+
+from django.db import connections
+
+from app_root.players.models import PlayerJob
+from app_root.players.utils_import import InitdataHelper
+from app_root.servers.models import RunVersion, SQLDefinition
+from app_root.servers.utils_import import SQLDefinitionHelper
+from app_root.strategies.data_types import Material, MaterialStrategy
+from app_root.strategies.dumps import ts_dump
+from app_root.strategies.managers import jobs_find_union_priority
+from app_root.strategies.simulator import FIXTURE_PATH, prepare_version, Simulator
+from app_root.strategies.strategy_materials import (
+    build_article_sources,
+    build_article_graph,
+    build_factory_strategy,
+    expand_material_strategy,
+)
+from app_root.strategies.synthetic import SyntheticAccount
+
+###########################################################################
+# Benchmark
+#
+#   fixtures (definition sqlite, init data) 로 hot path 의 wall time / query 수 / peak memory 를 잰다.
+#   - 벤치마크는 setup (시간에 넣지 않음) 을 하고 측정할 함수를 돌려준다.
+#   - 1번째 실행 : query 수, peak memory (tracemalloc) / 나머지 repeat 번 : wall time
+#   - version 의 cache 가 남지 않도록 실행할 때 마다 setup 을 다시 한다.
+#   - 결과는 json 으로 저장하고, baseline 보다 threshold 이상 나빠지면 regression 으로 본다.
+#     (query 수는 시간과 달리 흔들리지 않으므로 1개라도 늘면 regression)
+#   - definition / 계정을 만들고 지우므로 운영 DB 에서 실행하지 않는다.
+#
+#       results = run_benchmarks(repeat=5)
+#       regressions = compare_baseline(results, load_results(BASELINE_PATH), threshold=0.2)
+###########################################################################
+DEFINITION_PATH = FIXTURE_PATH / "207.003.sqlite"
+INIT_FILES = ["init_data/gaolious_2023.02.07.json"]
+# parse_data 로 읽을 init data. (벤치마크 마다 새 version 에 읽는다)
+PARSE_FILES = ["init_data/gaolious_2023.02.07.json", "strategies/6/6_0.json"]
+BASELINE_PATH = FIXTURE_PATH / "benchmark" / "baseline.json"
+USERNAME = "benchmark"
+REPEAT = 5
+THRESHOLD = 0.2
+
+
+class BenchmarkResult:
+    name: str
+    wall: List[float]
+    queries: int
+    peak_memory: int
+
+    def __init__(self, name: str, wall: List[float], queries: int, peak_memory: int):
+        self.name = name
+        self.wall = wall
+        self.queries = queries
+        self.peak_memory = peak_memory
+
+    @property
+    def wall_min(self) -> float:
+        return min(self.wall) if self.wall else 0.0
+
+    @property
+    def wall_median(self) -> float:
+        return statistics.median(self.wall) if self.wall else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "wall_min": round(self.wall_min, 6),
+            "wall_median": round(self.wall_median, 6),
+            "repeat": len(self.wall),
+            "queries": self.queries,
+            "peak_memory": self.peak_memory,
+        }
+
+    def dump(self):
+        print(
+            f"{self.name:28s}"
+            f" | min {self.wall_min * 1000:10.2f} ms"
+            f" | median {self.wall_median * 1000:10.2f} ms"
+            f" | {self.queries:6d} queries"
+            f" | peak {self.peak_memory / 1024 / 1024:8.2f} MiB"
+        )
+
+
+class BenchmarkState:
+    """
+    벤치마크가 같이 쓰는 fixture.
+    """
+
+    version_id: int
+    definition: SQLDefinition
+    parse_texts: List[str]
+
+    def __init__(self, version_id: int, definition: SQLDefinition, parse_texts):
+        self.version_id = version_id
+        self.definition = definition
+        self.parse_texts = parse_texts
+
+    @property
+    def version(self) -> RunVersion:
+        """
+        cache 가 없는 새 version
+        """
+        return RunVersion.objects.get(id=self.version_id)
+
+
+###########################################################################
+# benchmarks
+#   setup 을 하고 측정할 함수를 돌려준다.
+###########################################################################
+def bench_read_sqlite(state: BenchmarkState) -> Callable[[], Any]:
+    helper = SQLDefinitionHelper(version=state.version)
+    return lambda: helper.read_sqlite(instance=state.definition)
+
+
+def bench_parse_data(state: BenchmarkState) -> Callable[[], Any]:
+    def run():
+        for text in state.parse_texts:
+            helper.parse_data(data=text)
+
+    version = state.version
+    helper = InitdataHelper(
+        version=RunVersion.objects.create(user_id=version.user_id, level_id=1)
+    )
+    return run
+
+
+def bench_build_article_sources(state: BenchmarkState) -> Callable[[], Any]:
+    version = state.version
+    return lambda: build_article_sources(version=version)
+
+
+def bench_build_factory_strategy(state: BenchmarkState) -> Callable[[], Any]:
+    version = state.version
+    article_graph = build_article_graph(
+        article_source=build_article_sources(version=version)
+    )
+
+    # job 에 필요한 재료 전부 (Strategy 의 ship / job 재료 대신)
+    requires = Material()
+    for job in PlayerJob.objects.at_version(version).all():
+        requires.add(article_id=job.required_article_id, amount=job.required_amount)
+
+    # article graph 를 만들며 생긴 cache 를 버린다.
+    version = state.version
+    return lambda: build_factory_strategy(
+        version=version, requires=requires, article_graph=article_graph
+    )
+
+
+def bench_jobs_find_union_priority(state: BenchmarkState) -> Callable[[], Any]:
+    version = state.version
+    return lambda: jobs_find_union_priority(version=version, with_warehouse_limit=True)
+
+
+def bench_expand_material_strategy(state: BenchmarkState) -> Callable[[], Any]:
+    version = state.version
+    article_source = build_article_sources(version=version)
+    article_graph = build_article_graph(article_source=article_source)
+
+    # job 에 필요한 재료 전부
+    requires = Material()
+    for job in PlayerJob.objects.at_version(version).all():
+        requires.add(article_id=job.required_article_id, amount=job.required_amount)
+
+    # article source 를 만들며 생긴 cache 를 버린다.
+    version = state.version
+    return lambda: expand_material_strategy(
+        version=version,
+        requires=requires,
+        article_source=article_source,
+        strategy=MaterialStrategy(),
+        article_graph=article_graph,
+    )
+
+
+def bench_ts_dump(state: BenchmarkState) -> Callable[[], Any]:
+    version = state.version
+    return lambda: ts_dump(
+        version=version, background=False, to_json=True, to_stdout=False
+    )
+
+
+BENCHMARKS: Dict[str, Callable[[BenchmarkState], Callable[[], Any]]] = {
+    "read_sqlite": bench_read_sqlite,
+    "parse_data": bench_parse_data,
+    "build_article_sources": bench_build_article_sources,
+    "build_factory_strategy": bench_build_factory_strategy,
+    "jobs_find_union_priority": bench_jobs_find_union_priority,
+    "expand_material_strategy": bench_expand_material_strategy,
+    "ts_dump": bench_ts_dump,
+}
+
+
+@contextlib.contextmanager
+def count_queries() -> Dict[str, int]:
+    """
+    모든 DB (archive 포함) 의 query 수
+    """
+    stats = {"queries": 0}
+
+    def wrapper(execute, sql, params, many, context):
+        stats["queries"] += 1
+        return execute(sql, params, many, context)
+
+    with contextlib.ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(wrapper))
+        yield stats
+
+
+def measure(
+    name: str, setup: Callable[[], Callable[[], Any]], repeat: int = REPEAT
+) -> BenchmarkResult:
+    """
+    :param name:
+    :param setup: 측정할 함수를 돌려준다. 실행할 때 마다 부른다.
+    :param repeat: wall time 을 잴 횟수
+    :return:
+    """
+    func = setup()
+    tracemalloc.start()
+    try:
+        with count_queries() as stats, contextlib.redirect_stdout(io.StringIO()):
+            func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    wall = []
+    for _ in range(repeat):
+        func = setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            func()
+            wall.append(time.perf_counter() - started)
+
+    return BenchmarkResult(
+        name=name, wall=wall, queries=stats["queries"], peak_memory=peak_memory
+    )
+
+
+def ensure_definition(version: RunVersion, definition: Path) -> SQLDefinition:
+    """
+    prepare_version 은 TS* table 이 비어 있을 때만 definition 을 읽으므로, 다른 definition 을 읽은 DB 면 읽는다.
+    """
+    instance = SQLDefinition.objects.filter(version=definition.stem).first()
+    if not instance:
+        instance = SQLDefinition.objects.create(
+            version=definition.stem,
+            checksum="benchmark",
+            url=f"file://{definition}",
+            download_path=definition,
+        )
+        SQLDefinitionHelper(version=version).read_sqlite(instance=instance)
+    return instance
+
+
+def prepare_state(
+    init_files: List[str] = INIT_FILES,
+    parse_files: List[str] = PARSE_FILES,
+    definition: Path = DEFINITION_PATH,
+) -> BenchmarkState:
+    with contextlib.redirect_stdout(io.StringIO()):
+        version = prepare_version(
+            username=USERNAME, init_files=init_files, definition=definition
+        )
+
+    return BenchmarkState(
+        version_id=version.id,
+        definition=ensure_definition(version=version, definition=definition),
+        parse_texts=[
+            (FIXTURE_PATH / filename).read_text(encoding="utf-8")
+            for filename in parse_files
+        ],
+    )
+
+
+def run_benchmarks(
+    names: Optional[List[str]] = None,
+    repeat: int = REPEAT,
+    init_files: List[str] = INIT_FILES,
+    parse_files: List[str] = PARSE_FILES,
+    definition: Path = DEFINITION_PATH,
+) -> List[BenchmarkResult]:
+    """
+    :param names: BENCHMARKS 의 key. None 이면 전부
+    :param repeat:
+    :param init_files: 벤치마크 계정의 init data. (fixtures 기준 경로)
+    :param parse_files: parse_data 로 읽을 init data. (fixtures 기준 경로)
+    :param definition: definition sqlite
+    :return:
+    """
+    state = prepare_state(
+        init_files=init_files, parse_files=parse_files, definition=definition
+    )
+    version = state.version
+
+    ret = []
+    # version 의 시간으로 고정해야 query 수가 흔들리지 않는다.
+    with mock.patch("django.utils.timezone.now") as p:
+        p.return_value = version.now
+        for name in names or list(BENCHMARKS):
+            ret.append(
+                measure(
+                    name=name,
+                    setup=lambda: BENCHMARKS[name](state),
+                    repeat=repeat,
+                )
+            )
+    return ret
+
+
+def _write_json(path: Path, data: Dict[str, Any]):
+    path.parent.mkdir(0o755, True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+
+
+def save_results(path: Path, results: List[BenchmarkResult]):
+    _write_json(path, {o.name: o.to_dict() for o in results})
+
+
+def load_results(path: Path) -> Dict[str, Dict[str, Any]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def update_baseline(path: Path, results: List[BenchmarkResult]):
+    """
+    실행한 벤치마크만 baseline 을 바꾼다.
+    """
+    baseline = load_results(path)
+    baseline.update({o.name: o.to_dict() for o in results})
+    _write_json(path, baseline)
+
+
+def compare_baseline(
+    results: List[BenchmarkResult],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float = THRESHOLD,
+) -> List[str]:
+    """
+    :param results:
+    :param baseline: load_results()
+    :param threshold: wall time, peak memory 가 baseline 의 (1 + threshold) 배를 넘으면 regression
+    :return: regression 설명
+    """
+    ret = []
+    for result in results:
+        base = baseline.get(result.name)
+        if not base:
+            continue
+
+        if result.queries > base["queries"]:
+            ret.append(f"{result.name} : queries {base['queries']} -> {result.queries}")
+
+        if result.wall_min > base["wall_min"] * (1 + threshold):
+            ret.append(
+                f"{result.name} : wall {base['wall_min'] * 1000:.2f} ms"
+                f" -> {result.wall_min * 1000:.2f} ms"
+            )
+
+        if result.peak_memory > base["peak_memory"] * (1 + threshold):
+            ret.append(
+                f"{result.name} : peak memory {base['peak_memory']}"
+                f" -> {result.peak_memory}"
+            )
+    return ret
+
+
+###########################################################################
+# Scaling
+#
+#   SyntheticAccount 로 만든 계정에 Strategy.process 를 1번 실행하고 phase 별 시간 / query 수를 잰다.
+#   (Simulator 로 실행하므로 서버 요청은 보내지 않는다)
+#   - phase 는 Strategy 가 부르는 함수. 다른 phase 안에서 불리면 양쪽에 같이 들어간다. (ex. expand_material_strategy)
+#
+#       results = run_scaling(trains=[10, 50, 100, 250, 500], union_jobs=20)
+#       dump_scaling(results)
+###########################################################################
+PHASES = [
+    "app_root.strategies.utils.build_article_sources",
+    "app_root.strategies.utils.build_article_graph",
+    "app_root.strategies.utils.build_factory_strategy",
+    "app_root.strategies.utils.check_factory",
+    "app_root.strategies.utils.strategy_collect_reward_commands",
+    "app_root.strategies.utils.collect_job_complete",
+    "app_root.strategies.utils.check_union_job_complete",
+    "app_root.strategies.utils.check_upgrade_train",
+    "app_root.strategies.utils.strategy_dispatching_gold_destinations",
+    "app_root.strategies.utils.Strategy._command_union_job",
+    "app_root.strategies.utils.jobs_find_union_priority",
+    "app_root.strategies.utils.Strategy._command_story_job",
+    "app_root.strategies.utils.command_ship_trade",
+    "app_root.strategies.utils.expand_material_strategy",
+    "app_root.strategies.utils.command_collect_materials_if_possible",
+    "app_root.strategies.utils.command_collect_factory_product_redundancy",
+    "app_root.strategies.utils.command_factory_strategy",
+    "app_root.strategies.utils.Strategy.on_finally",
+]
+SCALING_TRAINS = [10, 50, 100, 250, 500]
+SCALING_UNION_JOBS = 20
+
+
+class PhaseTimer:
+    """
+    Simulator 의 patches 로 phase 함수를 감싸서 시간 / query 수를 더한다.
+
+        timer = PhaseTimer()
+        with count_queries() as stats:
+            timer.stats = stats
+            Simulator(version=version, max_iterations=1, patches=timer.patches()).run()
+    """
+
+    phases: Dict[str, Dict[str, float]]
+
+    def __init__(self, targets: Optional[List[str]] = None):
+        self.targets = targets or PHASES
+        self.phases = {}
+        self.stats = {"queries": 0}
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        phase = self.phases.setdefault(name, {"calls": 0, "wall": 0.0, "queries": 0})
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            queries = self.stats["queries"]
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                phase["calls"] += 1
+                phase["wall"] += time.perf_counter() - started
+                phase["queries"] += self.stats["queries"] - queries
+
+        return wrapper
+
+    def patches(self) -> Dict[str, Callable]:
+        return {
+            target: self.wrap(target.rsplit(".", 1)[-1], pkgutil.resolve_name(target))
+            for target in self.targets
+        }
+
+
+class ScalingResult:
+    trains: int
+    union_jobs: int
+    wall: float
+    queries: int
+    phases: Dict[str, Dict[str, float]]
+    error: Optional[Exception]
+
+    def __init__(self, trains, union_jobs, wall, queries, phases, error):
+        self.trains = trains
+        self.union_jobs = union_jobs
+        self.wall = wall
+        self.queries = queries
+        self.phases = phases
+        self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trains": self.trains,
+            "union_jobs": self.union_jobs,
+            "wall": round(self.wall, 6),
+            "queries": self.queries,
+            "phases": {
+                name: {**phase, "wall": round(phase["wall"], 6)}
+                for name, phase in self.phases.items()
+            },
+            "error": repr(self.error) if self.error else None,
+        }
+
+
+def run_scaling(
+    trains: List[int] = SCALING_TRAINS,
+    union_jobs: int = SCALING_UNION_JOBS,
+    definition: Path = DEFINITION_PATH,
+    seed: int = 0,
+    max_wall: Optional[float] = None,
+    **kwargs,
+) -> List[ScalingResult]:
+    """
+    :param trains: 기차 수 별로 계정을 만든다. (작은 것 부터)
+    :param union_jobs:
+    :param definition: definition sqlite
+    :param seed:
+    :param max_wall: 초. Strategy.process 가 이보다 오래 걸리면 더 큰 계정은 실행하지 않는다.
+    :param kwargs: SyntheticAccount.generate 의 나머지 인자 (jobs, contracts, factories, slot_count, ...)
+    :return:
+    """
+    generator = SyntheticAccount(definition=definition.stem, seed=seed)
+
+    ret = []
+    for count in trains:
+        text = generator.generate_text(trains=count, union_jobs=union_jobs, **kwargs)
+        with contextlib.redirect_stdout(io.StringIO()):
+            version = prepare_version(
+                username=f"{USERNAME}_{count}",
+                init_files=[],
+                definition=definition,
+                init_texts=[text],
+            )
+            ensure_definition(version=version, definition=definition)
+
+        timer = PhaseTimer()
+        simulator = Simulator(
+            version=version, max_iterations=1, patches=timer.patches()
+        )
+        with count_queries() as stats:
+            timer.stats = stats
+            report = simulator.run()
+
+        ret.append(
+            ScalingResult(
+                trains=count,
+                union_jobs=union_jobs,
+                wall=report.wall,
+                queries=stats["queries"],
+                phases=timer.phases,
+                error=report.error,
+            )
+        )
+        if max_wall is not None and report.wall > max_wall:
+            print(f"trains={count} : {report.wall:.1f} s > {max_wall} s. stop.")
+            break
+    return ret
+
+
+def dump_scaling(results: List[ScalingResult]):
+    """
+    phase x 기차 수 표. (ms / query 수)
+    """
+    print(f"{'trains':45s}" + "".join(f" | {o.trains:16d}" for o in results))
+    rows = [("Strategy.process", [(o.wall, o.queries) for o in results])]
+    for target in PHASES:
+        name = target.rsplit(".", 1)[-1]
+        rows.append(
+            (
+                name,
+                [
+                    (
+                        o.phases.get(name, {}).get("wall", 0.0),
+                        o.phases.get(name, {}).get("queries", 0),
+                    )
+                    for o in results
+                ],
+            )
+        )
+    for name, values in rows:
+        print(
+            f"{name:45s}"
+            + "".join(f" | {wall * 1000:9.1f} {queries:6d}" for wall, queries in values)
+        )
+    for result in results:
+        if result.error:
+            print(f"error : trains={result.trains} {result.error!r}")
+
+
+def save_scaling(path: Path, results: List[ScalingResult]):
+    _write_json(path, {"scaling": [o.to_dict() for o in results]})
@@ -28,6 +28,7 @@ from app_root.players.models import (
     PlayerBuilding,
     PlayerCityLoopTask,
 )
+from app_root.servers.leases import lease_check
 from app_root.servers.models import (
     RunVersion,
     EndPoint,
@@ -368,9 +369,11 @@ class TrainDispatchToJobCommand(BaseCommand):
         self.train = train
         self.job = job
         self.amount = amount
-        self.leaderboard = PlayerLeaderBoard.objects.filter(
-            player_job_id=job.id
-        ).first()
+        self.leaderboard = (
+            PlayerLeaderBoard.objects.at_version(self.version)
+            .filter(player_job_id=job.id)
+            .first()
+        )
 
     def get_parameters(self) -> dict:
         """
@@ -516,6 +519,9 @@ class DailyRewardClaimCommand(BaseCommand):
             self.reward.day = (self.reward.day + 1) % 5
             self.reward.available_from = self.reward.available_from + timedelta(days=1)
             self.reward.expire_at = self.reward.expire_at + timedelta(days=1)
+            PlayerDailyReward.split_history(
+                version=self.version, instances=[self.reward]
+            )
             self.reward.save(
                 update_fields=[
                     "day",
@@ -606,6 +612,9 @@ class DailyRewardClaimWithVideoCommand(BaseCommand):
             self.reward.day = (self.reward.day + 1) % 5
             self.reward.available_from = self.reward.available_from + timedelta(days=1)
             self.reward.expire_at = self.reward.expire_at + timedelta(days=1)
+            PlayerDailyReward.split_history(
+                version=self.version, instances=[self.reward]
+            )
             self.reward.save(
                 update_fields=[
                     "day",
@@ -683,7 +692,11 @@ class CollectWhistle(BaseCommand):
         }
 
     def post_processing(self, server_data: Dict):
-        for item in PlayerWhistleItem.objects.filter(player_whistle=self.whistle).all():
+        for item in (
+            PlayerWhistleItem.objects.at_version(self.version)
+            .filter(player_whistle=self.whistle)
+            .all()
+        ):
             if item.item_id == 8 and item.amount:
                 warehouse_add_article(
                     version=self.version, article_id=item.value, amount=item.amount
@@ -822,6 +835,7 @@ class GuildJobCompleteCommand(BaseCommand):
         }
 
     def post_processing(self, server_data: Dict):
+        PlayerJob.split_history(version=self.version, instances=[self.job])
         self.job.delete()
 
 
@@ -1164,9 +1178,11 @@ class CityLoopBuildingReplaceCommand(BaseCommand):
 
     def post_processing(self, server_data: Dict):
         self.building.upgrade_task = ""
+        PlayerBuilding.split_history(version=self.version, instances=[self.building])
         self.building.save(update_fields=["upgrade_task"])
-        task = PlayerCityLoopTask.objects.filter(version_id=self.version.id).first()
+        task = PlayerCityLoopTask.objects.at_version(self.version).first()
         if task:
+            PlayerCityLoopTask.split_history(version=self.version, instances=[task])
             task.next_replace_at = self.version.now + timedelta(hours=4)
             task.save(update_fields=["next_replace_at"])
 
@@ -1201,9 +1217,11 @@ class CityLoopBuildingReplaceInstantlyCommand(BaseCommand):
 
     def post_processing(self, server_data: Dict):
         self.building.upgrade_task = ""
+        PlayerBuilding.split_history(version=self.version, instances=[self.building])
         self.building.save(update_fields=["upgrade_task"])
-        task = PlayerCityLoopTask.objects.filter(version_id=self.version.id).first()
+        task = PlayerCityLoopTask.objects.at_version(self.version).first()
         if task:
+            PlayerCityLoopTask.split_history(version=self.version, instances=[task])
             task.next_video_replace_at = self.version.now + timedelta(hours=1)
             task.save(update_fields=["next_video_replace_at"])
 
@@ -1505,11 +1523,16 @@ class RunCommand(ImportHelperMixin):
             if bulk_list:
                 for instance in bulk_list:
                     instance: PlayerContractList
-                    old = PlayerContractList.objects.filter(
-                        version_id=self.version.id,
-                        contract_list_id=instance.contract_list_id,
-                    ).first()
+                    old = (
+                        PlayerContractList.objects.at_version(self.version)
+                        .filter(contract_list_id=instance.contract_list_id)
+                        .first()
+                    )
                     if old:
+                        # carry forward 된 row 면 이전 값을 이전 version 에 남긴다.
+                        PlayerContractList.split_history(
+                            version=self.version, instances=[old]
+                        )
                         instance.id = old.id
                         instance.save()
                 bulk_list = [o for o in bulk_list if not o.id]
@@ -1538,7 +1561,7 @@ class RunCommand(ImportHelperMixin):
         contracts = data.get("Contract", [])
         if contracts:
             contract_list = list(
-                PlayerContractList.objects.filter(version_id=self.version.id).all()
+                PlayerContractList.objects.at_version(self.version).all()
             )
             bulk_list, _ = PlayerContract.create_instance(
                 data=contracts, version_id=self.version.id, contract_list=contract_list
@@ -1546,10 +1569,15 @@ class RunCommand(ImportHelperMixin):
 
             if bulk_list:
                 for instance in bulk_list:
-                    old = PlayerContract.objects.filter(
-                        version_id=self.version.id, slot=instance.slot
-                    ).first()
+                    old = (
+                        PlayerContract.objects.at_version(self.version)
+                        .filter(slot=instance.slot)
+                        .first()
+                    )
                     if old:
+                        PlayerContract.split_history(
+                            version=self.version, instances=[old]
+                        )
                         instance.id = old.id
                         instance.save()
                 bulk_list = [o for o in bulk_list if not o.id]
@@ -1581,10 +1609,13 @@ class RunCommand(ImportHelperMixin):
 
             for instance in bulk_list:
                 instance: PlayerQuest
-                old = PlayerQuest.objects.filter(
-                    version_id=self.version.id, job_location_id=instance.job_location_id
-                ).first()
+                old = (
+                    PlayerQuest.objects.at_version(self.version)
+                    .filter(job_location_id=instance.job_location_id)
+                    .first()
+                )
                 if old:
+                    PlayerQuest.split_history(version=self.version, instances=[old])
                     instance.id = old.id
                 instance.save()
 
@@ -1626,10 +1657,15 @@ class RunCommand(ImportHelperMixin):
             )
             if bulk_list:
                 for instance in bulk_list:
-                    old = PlayerAchievement.objects.filter(
-                        version_id=self.version.id, achievement=instance.achievement
-                    ).first()
+                    old = (
+                        PlayerAchievement.objects.at_version(self.version)
+                        .filter(achievement=instance.achievement)
+                        .first()
+                    )
                     if old:
+                        PlayerAchievement.split_history(
+                            version=self.version, instances=[old]
+                        )
                         instance.id = old.id
                         instance.save()
                 bulk_list = [o for o in bulk_list if not o.id]
@@ -1655,14 +1691,17 @@ class RunCommand(ImportHelperMixin):
             building_id = data.pop("BuildingId", None)
             upgrade_task = data.pop("UpgradeTask", "")
             if building_id:
-                bld = PlayerBuilding.objects.filter(
-                    version=self.version, instance_id=building_id
-                ).first()
+                bld = (
+                    PlayerBuilding.objects.at_version(self.version)
+                    .filter(instance_id=building_id)
+                    .first()
+                )
                 bld.upgrade_task = (
                     json.dumps(upgrade_task, separators=(",", ":"))
                     if upgrade_task
                     else ""
                 )
+                PlayerBuilding.split_history(version=self.version, instances=[bld])
                 bld.save(update_fields=["upgrade_task"])
 
     def reduce(self, data):
@@ -1728,6 +1767,8 @@ def send_commands(commands: Union[BaseCommand, List[BaseCommand]]):
     if not isinstance(commands, list):
         commands = [commands]
 
+    lease_check(version=commands[0].version)
+
     cmd = RunCommand(version=commands[0].version, commands=commands)
     cmd.run()
 
@@ -0,0 +1,139 @@
+from typing import List, Dict, Tuple, Set
+
+from app_root.players.models import PlayerContract
+
+
+###########################################################################
+# Contract 선택
+#
+#   필요한 article 들을 채우는 contract 의 부분집합을 고른다. (각 contract 는 1번만 사용)
+#   - 상태 : 필요 article 의 dense vector (필요 수량에서 cap) -> 최소 비용
+#   - 비용 : contract 가 소비하는 재료의 희소성 (창고 수량 대비 소비량, 부족분은 크게)
+#   - 창고 : 보상 - 소비 로 늘어나는 창고 사용량이 남은 공간을 넘지 않아야 한다.
+#     (이미 창고가 넘친 경우 남은 공간은 0 - 창고 사용량을 늘리지 않는 contract 만 고른다)
+#   모두 채울 수 없으면 가장 많이 채우는 조합 중 비용이 최소인 조합.
+#   상태가 MAX_STATES 를 넘으면 많이 채운 상태부터 MAX_STATES 개만 남기므로 근사해이다.
+###########################################################################
+MAX_STATES = 4096
+SHORTAGE_PENALTY = 1000
+
+
+def contract_input_cost(
+    contract: PlayerContract, stock: Dict[int, int], now=None
+) -> float:
+    """
+        contract 의 재료 소비 비용.
+
+    :param contract:
+    :param stock: article_id 별 창고 수량
+    :param now: 지정된 경우 아직 사용할 수 없는 contract 는 비용을 조금 더한다.
+    :return:
+    """
+    ret = 0.0
+    for article_id, amount in contract.conditions_to_article_dict.items():
+        has = stock.get(article_id, 0)
+        ret += amount / max(1, has)
+        if has < amount:
+            ret += (amount - has) / max(1, amount) * SHORTAGE_PENALTY
+
+    if now and contract.usable_from and contract.usable_from > now:
+        ret += 0.5
+
+    return ret
+
+
+def select_contracts(
+    requires: Dict[int, int],
+    contracts: List[PlayerContract],
+    stock: Dict[int, int],
+    space_articles: Set[int],
+    free_capacity: int,
+    now=None,
+) -> List[PlayerContract]:
+    """
+        requires 를 최소 비용으로 채우는 contract 조합. (0/1 knapsack DP, MAX_STATES 에서 자른다)
+
+    :param requires: article_id 별 필요 수량
+    :param contracts: 후보 contract
+    :param stock: article_id 별 창고 수량
+    :param space_articles: 창고 공간을 차지하는 article_id
+    :param free_capacity: 남은 창고 공간 (음수면 0)
+    :param now:
+    :return:
+    """
+    article_ids = [k for k, v in requires.items() if v > 0]
+    if not article_ids or not contracts:
+        return []
+
+    free_capacity = max(0, free_capacity)
+    index = {article_id: i for i, article_id in enumerate(article_ids)}
+    need = tuple(requires[article_id] for article_id in article_ids)
+
+    # dense vector 로 변환.
+    candidates = []
+    seen = set()
+    for contract in contracts:
+        if contract.id in seen:
+            continue
+        seen.add(contract.id)
+
+        reward = [0] * len(article_ids)
+        for article_id, amount in contract.reward_to_article_dict.items():
+            if article_id in index:
+                reward[index[article_id]] += amount
+        if not any(reward):
+            continue
+
+        space = sum(
+            amount
+            for article_id, amount in contract.reward_to_article_dict.items()
+            if article_id in space_articles
+        ) - sum(
+            amount
+            for article_id, amount in contract.conditions_to_article_dict.items()
+            if article_id in space_articles
+        )
+        cost = contract_input_cost(contract=contract, stock=stock, now=now)
+        candidates.append((contract, tuple(reward), space, cost))
+
+    # coverage -> (cost, space, chosen)
+    zero = tuple(0 for _ in need)
+    states: Dict[Tuple[int, ...], Tuple[float, int, Tuple[int, ...]]] = {
+        zero: (0.0, 0, ())
+    }
+
+    for idx, (contract, reward, space, cost) in enumerate(candidates):
+        next_states = dict(states)
+        for coverage, (total_cost, total_space, chosen) in states.items():
+            new_coverage = tuple(
+                min(n, c + r) for n, c, r in zip(need, coverage, reward)
+            )
+            if new_coverage == coverage:
+                continue
+
+            new_space = total_space + space
+            if new_space > free_capacity:
+                continue
+
+            new_cost = total_cost + cost
+            best = next_states.get(new_coverage)
+            if best is None or (new_cost, new_space) < (best[0], best[1]):
+                next_states[new_coverage] = (new_cost, new_space, chosen + (idx,))
+
+        states = next_states
+        if len(states) > MAX_STATES:
+            states = dict(
+                sorted(
+                    states.items(),
+                    key=lambda x: (-_covered_ratio(need, x[0]), x[1][0]),
+                )[:MAX_STATES]
+            )
+
+    _, (_, _, chosen) = min(
+        states.items(), key=lambda x: (-_covered_ratio(need, x[0]), x[1][0])
+    )
+    return [candidates[idx][0] for idx in chosen]
+
+
+def _covered_ratio(need: Tuple[int, ...], coverage: Tuple[int, ...]) -> float:
+    return sum(c / n for n, c in zip(need, coverage))
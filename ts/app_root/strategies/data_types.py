@@ -1,3 +1,6 @@
+import copy
+import math
+from datetime import datetime, timedelta
 from typing import List, Dict, Type, Optional, Tuple
 
 from app_root.players.models import (
@@ -77,6 +80,8 @@ class FactoryStrategy:
     destination_products: List[TSProduct]
 
     strategy_article_count: Dict[int, int]  # 미리 생성해놔야 하는 개수.
+    demand_article_count: Dict[int, int]  # 필요 수량을 채우는 주문 수. (넘는 완료 주문은 수령)
+    plan: Optional["FactoryPlan"]
     waiting_article_count: Dict[int, int]
     processing_article_count: Dict[int, int]
     completed_article_count: Dict[int, int]
@@ -92,6 +97,8 @@ class FactoryStrategy:
         self.destination_products = destination_products
 
         self.strategy_article_count = {}
+        self.demand_article_count = {}
+        self.plan = None
         self.waiting_article_count = {}
         self.processing_article_count = {}
         self.completed_article_count = {}
@@ -248,3 +255,177 @@ class MaterialStrategy:
     def pop_factory_prepare(self, factory_id: int):
         ret = self.factory_prepare[factory_id].pop(0)
         return ret
+
+
+class ArticleGraph:
+    """
+    article -> product -> 재료 article 의 생산 그래프.
+
+    article 의 공급원은 material_strategy_add_queue 와 동일한 우선순위(contract > destination > product)로 정하고,
+    product 로만 만들 수 있는 article 만 재료 article 로의 edge 를 가진다.
+
+    order : 소비하는 article 이 재료 article 보다 먼저 오는 topological 순서 (product article 만)
+    """
+
+    SOURCE_CONTRACT = "contract"
+    SOURCE_DESTINATION = "destination"
+    SOURCE_PRODUCT = "product"
+
+    sources: Dict[int, str]
+    products: Dict[int, TSProduct]
+    inputs: Dict[int, Dict[int, int]]
+    order: List[int]
+
+    def __init__(self, article_source: Dict[int, ArticleSource]):
+        self.sources = {}
+        self.products = {}
+        self.inputs = {}
+
+        for article_id, source in article_source.items():
+            if source.contracts:
+                self.sources[article_id] = self.SOURCE_CONTRACT
+            elif source.destinations:
+                self.sources[article_id] = self.SOURCE_DESTINATION
+            elif source.products:
+                product = source.products[0]
+                self.sources[article_id] = self.SOURCE_PRODUCT
+                self.products[article_id] = product
+                self.inputs[article_id] = product.conditions_to_article_dict
+
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[int]:
+        # 재료 article 을 먼저 방문하는 DFS post-order 의 역순.
+        # cycle 이 있다면 되돌아가는 edge 는 무시한다.
+        visited: Dict[int, bool] = {}  # False: 방문중, True: 완료
+        post_order = []
+
+        for root in self.products:
+            if root in visited:
+                continue
+            visited[root] = False
+            stack = [(root, iter(self.inputs[root]))]
+            while stack:
+                article_id, children = stack[-1]
+                for child in children:
+                    if child in self.products and child not in visited:
+                        visited[child] = False
+                        stack.append((child, iter(self.inputs[child])))
+                        break
+                else:
+                    visited[article_id] = True
+                    post_order.append(article_id)
+                    stack.pop()
+
+        post_order.reverse()
+        return post_order
+
+    def is_product(self, article_id: int) -> bool:
+        return article_id in self.products
+
+    def extend(self, products: Dict[int, TSProduct]) -> "ArticleGraph":
+        """
+            graph 에 없는 product article 을 추가한 graph. (self 는 바꾸지 않는다)
+            factory queue 의 product 가 contract / destination 으로 공급되는 article 일 때.
+
+        :param products: article_id 별 product
+        :return:
+        """
+        missing = {k: v for k, v in products.items() if k not in self.products}
+        if not missing:
+            return self
+
+        ret = copy.copy(self)
+        ret.sources = dict(self.sources)
+        ret.products = dict(self.products)
+        ret.inputs = dict(self.inputs)
+        for article_id, product in missing.items():
+            ret.sources[article_id] = self.SOURCE_PRODUCT
+            ret.products[article_id] = product
+            ret.inputs[article_id] = product.conditions_to_article_dict
+
+        ret.order = ret._topological_order()
+        return ret
+
+    def expand(
+        self, requires: Dict[int, int], available: Optional[Dict[int, int]] = None
+    ) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """
+            requires 를 만들기 위한 전체 bill of materials 를 한번에 계산.
+
+        :param requires: article_id 별 필요 수량
+        :param available: article_id 별 이미 확보된 수량 (창고, 공장 완료/진행중 등)
+        :return:
+            demand : article_id 별 총 필요 수량 (재료 포함)
+            crafts : product article_id 별 생산 횟수
+        """
+        available = available or {}
+        demand = dict(requires)
+        crafts = {}
+
+        for article_id in self.order:
+            need = demand.get(article_id, 0) - available.get(article_id, 0)
+            if need <= 0:
+                continue
+
+            cnt = math.ceil(need / max(1, self.products[article_id].article_amount))
+            crafts[article_id] = cnt
+
+            for k, v in self.inputs[article_id].items():
+                demand[k] = demand.get(k, 0) + v * cnt
+
+        return demand, crafts
+
+
+class FactoryPlan:
+    """
+    공장 1개의 생산 계획.
+
+    공장은 주문을 순서대로 1개씩 생산하므로, 계획된 주문의 예상 완료시간은
+    현재 대기열이 끝나는 시간(busy_until) 부터 craft_time 을 누적한 값이다.
+    """
+
+    player_factory: PlayerFactory
+    now: datetime
+    busy_until: datetime
+
+    # TSProduct, 예상 완료시간
+    orders: List[Tuple[TSProduct, datetime]]
+
+    def __init__(self, player_factory: PlayerFactory, now: datetime):
+        self.player_factory = player_factory
+        self.now = now
+        self.busy_until = now
+        self.orders = []
+
+    def add_order(self, product: TSProduct):
+        finish_time = self.finish_time + timedelta(seconds=product.craft_time)
+        self.orders.append((product, finish_time))
+
+    @property
+    def finish_time(self) -> datetime:
+        if self.orders:
+            return self.orders[-1][1]
+        return self.busy_until
+
+    @property
+    def makespan(self) -> int:
+        """
+        현재 시간부터 계획된 마지막 주문이 끝날 때 까지 (초)
+        """
+        return int((self.finish_time - self.now).total_seconds())
+
+    @property
+    def article_count(self) -> Dict[int, int]:
+        ret = {}
+        for product, _ in self.orders:
+            ret.setdefault(int(product.article_id), 0)
+            ret[int(product.article_id)] += 1
+        return ret
+
+    @property
+    def output_per_hour(self) -> float:
+        seconds = sum(product.craft_time for product, _ in self.orders)
+        if seconds <= 0:
+            return 0.0
+        return len(self.orders) * 3600 / seconds
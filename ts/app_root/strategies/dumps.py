@@ -1,9 +1,26 @@
+"""
+    strategies > dumps
+
+    계정 state 를 text / JSON 으로 남긴다.
+
+    - collect_* : caller thread 에서 state 를 읽어 JSON 으로 쓸 수 있는 값 (dict / list / str) 으로 만든다.
+                  여러 section 이 같이 쓰는 row (warehouse, train, job, article) 는 DumpState 에서 한번만 읽는다.
+    - render_*  : collect 한 값으로 text 를 만든다. (DB 를 읽지 않는다)
+    - ts_dump   : render / 파일 쓰기 / 출력은 background thread 에서 한다. (background=False 이면 바로)
+    - 설정 : settings.TS_DUMP
+        ex) TS_DUMP = {"enabled": True, "background": True, "sections": ["default", "factory"], "json": True, "stdout": True}
+"""
+import atexit
 import datetime
 import json
-from typing import List, Dict
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import cached_property
+from typing import List, Dict, Optional, Iterable, Callable, Tuple, Any
 
 from django.conf import settings
-from django.db.models import F
+from django.core.serializers.json import DjangoJSONEncoder
 
 from app_root.players.models import (
     PlayerDestination,
@@ -15,10 +32,10 @@ from app_root.players.models import (
     PlayerShipOffer,
     PlayerDailyReward,
     PlayerWhistle,
-    PlayerDailyOfferContainer,
     PlayerDailyOffer,
     PlayerDailyOfferItem,
     PlayerTrain,
+    PlayerJob,
     PlayerCompetition,
     PlayerVisitedRegion,
     PlayerMap,
@@ -26,38 +43,153 @@ from app_root.players.models import (
 )
 from app_root.servers.models import RunVersion, TSArticle, TSDestination, TSJobLocation
 from app_root.strategies.managers import (
-    find_xp,
-    find_key,
-    find_gem,
-    find_gold,
+    FactoryQueue,
     trains_find,
     jobs_find,
-    destination_find,
-    warehouse_used_capacity,
     warehouse_max_capacity,
     container_offer_find_iter,
-    factory_find_product_orders,
     article_find_destination,
 )
-from app_root.utils import get_curr_server_datetime, get_remain_time
+from app_root.utils import get_remain_time
 from core.models.utils import chunk_list
 
+_logger = logging.getLogger("default")
 
-def ts_dump_default(version: RunVersion) -> List[str]:
+LINE = "-" * 80
+
+
+class DumpState:
+    """
+    dump 1번에 읽는 state. 여러 section 이 같이 쓰는 row 는 한번만 읽는다.
+    """
+
+    version: RunVersion
+
+    def __init__(self, version: RunVersion):
+        self.version = version
+        self.now = version.now
+        self._articles: Dict[int, TSArticle] = {}
+
+    @cached_property
+    def warehouse(self) -> Dict[int, PlayerWarehouse]:
+        return {
+            o.article_id: o
+            for o in PlayerWarehouse.objects.at_version(self.version)
+            .select_related("article")
+            .all()
+        }
+
+    @cached_property
+    def trains(self) -> List[PlayerTrain]:
+        return trains_find(version=self.version)
+
+    @cached_property
+    def working_trains(self) -> List[PlayerTrain]:
+        """
+        trains_find(is_idle=False) 와 같다.
+        """
+        return [
+            o for o in self.trains if not (o.is_idle(now=self.now) and not o.has_load)
+        ]
+
+    @cached_property
+    def jobs(self) -> List[PlayerJob]:
+        return jobs_find(version=self.version)
+
+    def amount(self, article_id: int) -> int:
+        warehouse = self.warehouse.get(article_id)
+        return warehouse.amount if warehouse else 0
+
+    def articles(self, article_ids: Iterable[int]) -> Dict[int, TSArticle]:
+        """
+        없는 article 만 읽는다.
+        """
+        article_ids = set(article_ids)
+        missing = article_ids - self._articles.keys()
+        if missing:
+            self._articles.update(TSArticle.objects.in_bulk(missing))
+        return {k: self._articles[k] for k in article_ids if k in self._articles}
+
+    def factory_queues(self, factories: List[PlayerFactory]) -> Dict[int, FactoryQueue]:
+        """
+        Strategy 가 이번 실행에서 만든 공장 대기열 (factory_get_queue) 이 있으면 그대로 쓰고,
+        없는 공장의 주문만 한번에 읽는다.
+        """
+        queues: Dict[int, FactoryQueue] = dict(
+            getattr(self.version, "__factory_queues", None) or {}
+        )
+
+        missing = {o.id: o for o in factories if o.factory_id not in queues}
+        if missing:
+            orders: Dict[int, List[PlayerFactoryProductOrder]] = {}
+            queryset = (
+                PlayerFactoryProductOrder.objects.at_version(self.version)
+                .filter(player_factory_id__in=missing.keys())
+                .select_related("article")
+                .order_by("index")
+            )
+            for order in queryset.all():
+                orders.setdefault(order.player_factory_id, []).append(order)
+
+            for player_factory in missing.values():
+                queues[player_factory.factory_id] = FactoryQueue(
+                    player_factory=player_factory,
+                    orders=orders.get(player_factory.id, []),
+                )
+        return queues
+
+
+def _train_row(train: PlayerTrain) -> Dict:
+    return {
+        "instance_id": train.instance_id,
+        "capacity": train.capacity(),
+        "era": train.train.get_era_display(),
+        "rarity": train.train.get_rarity_display(),
+        "name": train.train.asset_name,
+    }
+
+
+def _article_rows(
+    articles: Dict[int, TSArticle], article_dict: Dict[int, int]
+) -> List[Tuple[int, str, int]]:
+    return [
+        (article_id, articles[article_id].name, amount)
+        for article_id, amount in article_dict.items()
+    ]
+
+
+###########################################################################
+# 기본
+###########################################################################
+def collect_default(state: DumpState) -> Dict:
+    version = state.version
+    return {
+        "level": version.level_id,
+        "xp": state.amount(PlayerWarehouse.ARTICLE_XP),
+        "level_xp": version.level.xp,
+        "key": state.amount(PlayerWarehouse.ARTICLE_KEY),
+        "gem": state.amount(PlayerWarehouse.ARTICLE_GEM),
+        "gold": state.amount(PlayerWarehouse.ARTICLE_GOLD),
+        "population": version.population,
+        # warehouse_used_capacity 와 같다.
+        "warehouse_used": sum(
+            o.amount for o in state.warehouse.values() if o.article.type in (2, 3)
+        ),
+        "warehouse_max": warehouse_max_capacity(version),
+    }
+
+
+def render_default(data: Dict) -> List[str]:
     ret = []
-    line = "-" * 80
-    ##########################################################################################
-    # 기본
-    ##########################################################################################
-    lv = f"Lv. {version.level_id}"
-    xp = f"XP: {find_xp(version):,d} / {version.level.xp:,d}"
-    key = f"Key: {find_key(version):,d}"
-    gem = f"Gem: {find_gem(version):,d}"
-    gold = f"Gold: {find_gold(version):,d}"
-    population = f"Population: {version.population:,d}"
-    warehouse = f"Warehouse : {warehouse_used_capacity(version)} / {warehouse_max_capacity(version)}"
+    lv = f"Lv. {data['level']}"
+    xp = f"XP: {data['xp']:,d} / {data['level_xp']:,d}"
+    key = f"Key: {data['key']:,d}"
+    gem = f"Gem: {data['gem']:,d}"
+    gold = f"Gold: {data['gold']:,d}"
+    population = f"Population: {data['population']:,d}"
+    warehouse = f"Warehouse : {data['warehouse_used']} / {data['warehouse_max']}"
     ret.append("# [Default]")
-    ret.append(line)
+    ret.append(LINE)
     ret.append(
         f"{lv:10s} | {xp:20s} | {key:10s} | {gem:10s} | {gold:10s} | {population}"
     )
@@ -66,298 +198,334 @@ def ts_dump_default(version: RunVersion) -> List[str]:
     return ret
 
 
-def ts_dump_working_dispatcher(version: RunVersion) -> List[str]:
-    line = "-" * 80
-    ret = []
-    ##########################################################################################
-    # dispatcher
-    ##########################################################################################
-    trains = list(trains_find(version=version, is_idle=False))
-
-    normal_dispatchers: Dict[str, Dict[int, List]] = {}
-    union_dispatchers: Dict[str, Dict[int, List]] = {}
-    working_normal_dispatcher_count = 0
-    working_union_dispatcher_count = 0
-    jobs = {}
-    destinations = {}
-
-    """
-        + Union Dispatcher
-            - Job
-                - Trains
-            - Destination
-                - Trains
-
-        + Normal Dispatcher
-            - Job
-                - Trains
-            - Destination
-                - Trains
-    """
-
-    def add_normal_dispatcher(route_type: str, key: int, train: object):
-        normal_dispatchers.setdefault(route_type, {})
-        normal_dispatchers[route_type].setdefault(key, [])
-        normal_dispatchers[route_type][key].append(train)
+###########################################################################
+# dispatcher
+#
+#   + Union Dispatcher
+#       - Job
+#           - Trains
+#       - Destination
+#           - Trains
+#
+#   + Normal Dispatcher
+#       - Job
+#           - Trains
+#       - Destination
+#           - Trains
+###########################################################################
+def collect_working_dispatcher(state: DumpState) -> Dict:
+    version = state.version
+    trains = state.working_trains
+
+    jobs: Dict[int, PlayerJob] = {}
+    for job in state.jobs:
+        jobs.setdefault(job.job_location_id, job)
+
+    destinations = TSDestination.objects.select_related("region").in_bulk(
+        [o.route_definition_id for o in trains if o.is_destination_route]
+    )
 
-    def add_union_dispatcher(route_type: str, key: int, train: object):
-        union_dispatchers.setdefault(route_type, {})
-        union_dispatchers[route_type].setdefault(key, [])
-        union_dispatchers[route_type][key].append(train)
+    groups = {"normal": {}, "union": {}}
 
     for train in trains:
         is_union = False
         data = None
 
         if train.is_job_route:
-            ret_list = list(
-                jobs_find(version=version, job_location_id=train.route_definition_id)
-            )
-            if ret_list:
-                data = ret_list[0]
+            data = jobs.get(train.route_definition_id)
+            if data:
                 is_union = data.job_location.region.is_union
-                jobs.setdefault(data.id, data)
 
         elif train.is_destination_route:
-            data = destination_find(
-                version=version, destination_id=train.route_definition_id
-            )
-            is_union = data.region.is_union
-            destinations.setdefault(data.id, data)
+            data = destinations.get(train.route_definition_id)
+            if data:
+                is_union = data.region.is_union
 
         if not data:
             continue
 
-        if is_union:
-            working_union_dispatcher_count += 1
-            add_union_dispatcher(route_type=train.route_type, key=data.id, train=train)
-        else:
-            working_normal_dispatcher_count += 1
-            add_normal_dispatcher(route_type=train.route_type, key=data.id, train=train)
+        group = groups["union" if is_union else "normal"].setdefault(
+            (train.route_type, data.id),
+            {"route_type": train.route_type, "title": f"{data}", "trains": []},
+        )
+        row = _train_row(train)
+        row["remain"] = get_remain_time(
+            version=version, finish_at=train.route_arrival_time
+        )
+        row["finish_at"] = train.route_arrival_time.astimezone(settings.KST)
+        group["trains"].append(row)
 
-    ret.append(
-        f"# [Dispatcher - Normal Working {working_normal_dispatcher_count} / {version.dispatchers + 2}]"
-    )
-    ret.append(line)
-
-    for route_type in normal_dispatchers:
-        data_dict = jobs if route_type == "job" else destinations
-        for pk in normal_dispatchers[route_type]:
-            ret.append(f" + {route_type} : {data_dict[pk]}")
-            for train in normal_dispatchers[route_type][pk]:
-                instance_id = f"{train.instance_id:3d}"
-                capacity = f"{train.capacity():4d}"
-                era = f"{train.train.get_era_display():2s}"
-                rarity = f"{train.train.get_rarity_display():2s}"
-                name = f"{train.train.asset_name:27s}"
-                remain_time = f"{get_remain_time(version=version, finish_at=train.route_arrival_time)}"
-                ret.append(
-                    f"    Id:{instance_id} / Capacity:{capacity} / era:{era} / rarity:{rarity} / name:{name} / remain:{remain_time} / finish at: {train.route_arrival_time.astimezone(settings.KST)}"
-                )
+    def ordered(route_groups: Dict) -> List[Dict]:
+        # route_type 별로 모은다. (처음 나온 순서)
+        route_types = list(
+            dict.fromkeys(o["route_type"] for o in route_groups.values())
+        )
+        return [
+            o
+            for route_type in route_types
+            for o in route_groups.values()
+            if o["route_type"] == route_type
+        ]
+
+    return {
+        "normal": ordered(groups["normal"]),
+        "normal_max": version.dispatchers + 2,
+        "union": ordered(groups["union"]),
+        "union_max": version.guild_dispatchers + 2,
+    }
+
+
+def render_working_dispatcher(data: Dict) -> List[str]:
+    ret = []
+
+    normal_count = sum(len(o["trains"]) for o in data["normal"])
+    ret.append(f"# [Dispatcher - Normal Working {normal_count} / {data['normal_max']}]")
+    ret.append(LINE)
+    for group in data["normal"]:
+        ret.append(f" + {group['route_type']} : {group['title']}")
+        for train in group["trains"]:
+            ret.append(
+                f"    Id:{train['instance_id']:3d} / Capacity:{train['capacity']:4d} / era:{train['era']:2s} / rarity:{train['rarity']:2s} / name:{train['name']:27s} / remain:{train['remain']} / finish at: {train['finish_at']}"
+            )
     ret.append("")
 
-    ret.append(
-        f"# [Dispatcher - Union Working {working_union_dispatcher_count} / {version.guild_dispatchers + 2}]"
-    )
-    ret.append(line)
-    for route_type in union_dispatchers:
-        data_dict = jobs if route_type == "job" else destinations
-        for pk in union_dispatchers[route_type]:
-            ret.append(f" + {route_type} : {data_dict[pk]}")
-            for train in union_dispatchers[route_type][pk]:
-                instance_id = f"{train.instance_id:3d}"
-                capacity = f"{train.capacity():4d}"
-                era = f"{train.train.get_era_display():2s}"
-                rarity = f"{train.train.get_rarity_display():2s}"
-                name = f"{train.train.asset_name:27s}"
-                ret.append(
-                    f"    Id:{instance_id} / Capacity:{capacity} / era:{era} / rarity:{rarity} / name:{name}"
-                )
+    union_count = sum(len(o["trains"]) for o in data["union"])
+    ret.append(f"# [Dispatcher - Union Working {union_count} / {data['union_max']}]")
+    ret.append(LINE)
+    for group in data["union"]:
+        ret.append(f" + {group['route_type']} : {group['title']}")
+        for train in group["trains"]:
+            ret.append(
+                f"    Id:{train['instance_id']:3d} / Capacity:{train['capacity']:4d} / era:{train['era']:2s} / rarity:{train['rarity']:2s} / name:{train['name']:27s}"
+            )
     ret.append("")
 
     return ret
 
 
-def ts_dump_train(version: RunVersion) -> List[str]:
-    line = "-" * 80
-    ret = []
+###########################################################################
+# train
+###########################################################################
+def collect_train(state: DumpState) -> List[Dict]:
+    version = state.version
     region_dict: Dict[int, List[PlayerTrain]] = {}
     duplications: Dict[int, int] = {}
 
-    for train in list(trains_find(version=version)):
-        region = train.get_region()
+    for train in state.trains:
         duplications.setdefault(train.train_id, 0)
         duplications[train.train_id] += 1
-        if region not in region_dict:
-            region_dict.update({region: []})
+        region_dict.setdefault(train.get_region(), []).append(train)
 
-        region_dict[region].append(train)
-
-    for region in region_dict:
-        region_dict[region].sort(
-            key=lambda x: (x.capacity(), x.train.rarity), reverse=True
+    ret = []
+    for region, trains in region_dict.items():
+        trains = sorted(
+            trains, key=lambda x: (x.capacity(), x.train.rarity), reverse=True
         )
-
-    for region in region_dict:
-        ret.append(f"# [Train region - {region}]")
-        ret.append(line)
-        for train in region_dict[region]:
-            instance_id = f"{train.instance_id:3d}"
-            capacity = f"{train.capacity():4d}"
-            era = f"{train.train.get_era_display():2s}"
-            rarity = f"{train.train.get_rarity_display():2s}"
-            name = f"{train.train.asset_name:27s}"
-            remain_time = "IDLE"
-            duplicates = ""
-            if duplications[train.train_id] >= 2:
-                duplicates = f"/ DUP {duplications[train.train_id]}"
+        rows = []
+        for train in trains:
+            status = "IDLE"
             if train.is_working(version.now):
+                remain = get_remain_time(
+                    version=version, finish_at=train.route_arrival_time
+                )
                 if train.is_job_route:
-                    remain_time = f"JOB {get_remain_time(version=version, finish_at=train.route_arrival_time)}"
+                    status = f"JOB {remain}"
                 elif train.is_destination_route:
-                    remain_time = f"DEST {get_remain_time(version=version, finish_at=train.route_arrival_time)}"
+                    status = f"DEST {remain}"
                 else:
-                    remain_time = f"??? {get_remain_time(version=version, finish_at=train.route_arrival_time)}"
+                    status = f"??? {remain}"
 
+            row = _train_row(train)
+            row["status"] = status
+            row["duplicates"] = duplications[train.train_id]
+            rows.append(row)
+        ret.append({"region": region, "trains": rows})
+    return ret
+
+
+def render_train(data: List[Dict]) -> List[str]:
+    ret = []
+    for region in data:
+        ret.append(f"# [Train region - {region['region']}]")
+        ret.append(LINE)
+        for train in region["trains"]:
+            duplicates = ""
+            if train["duplicates"] >= 2:
+                duplicates = f"/ DUP {train['duplicates']}"
             ret.append(
-                f"    #{instance_id}|[{capacity}/{era}/{rarity}] / name:{name} / {remain_time}{duplicates}"
+                f"    #{train['instance_id']:3d}|[{train['capacity']:4d}/{train['era']:2s}/{train['rarity']:2s}] / name:{train['name']:27s} / {train['status']}{duplicates}"
             )
     ret.append("")
     return ret
 
 
-def ts_dump_jobs(version: RunVersion) -> List[str]:
-    ret = []
-    line = "-" * 80
+###########################################################################
+# jobs
+###########################################################################
+JOB_GROUPS = (
+    ("union", "Union Jobs", "is_union_job"),
+    ("event", "Event Jobs", "is_event_job"),
+    ("story", "Story Jobs", "is_story_job"),
+    ("side", "Side Jobs", "is_side_job"),
+)
 
-    ret.append(f"# [Jobs]")
-    ret.append(line)
-    union_jobs = list(jobs_find(version=version, union_jobs=True))
-    if len(union_jobs) > 0:
-        ret.append("Union Jobs")
-        for job in union_jobs:
-            ret.append(f"    {job}")
-    else:
-        ret.append("Union Jobs 없음")
-
-    event_jobs = list(jobs_find(version=version, event_jobs=True))
-    if len(event_jobs) > 0:
-        ret.append("Event Jobs")
-        for job in event_jobs:
-            ret.append(f"    {job}")
-    else:
-        ret.append("Event Jobs 없음")
-
-    story_jobs = list(jobs_find(version=version, story_jobs=True))
-    if len(story_jobs) > 0:
-        ret.append("Story Jobs")
-        for job in story_jobs:
-            ret.append(f"    {job}")
-    else:
-        ret.append("Story Jobs 없음")
-
-    story_jobs = list(jobs_find(version=version, side_jobs=True))
-    if len(story_jobs) > 0:
-        ret.append("Side Jobs")
-        for job in story_jobs:
-            ret.append(f"    {job}")
-    else:
-        ret.append("Side Jobs 없음")
 
+def collect_jobs(state: DumpState) -> Dict:
+    return {
+        key: [f"{job}" for job in state.jobs if getattr(job, field)]
+        for key, _, field in JOB_GROUPS
+    }
+
+
+def render_jobs(data: Dict) -> List[str]:
+    ret = []
+    ret.append(f"# [Jobs]")
+    ret.append(LINE)
+    for key, title, _ in JOB_GROUPS:
+        if data[key]:
+            ret.append(title)
+            for job in data[key]:
+                ret.append(f"    {job}")
+        else:
+            ret.append(f"{title} 없음")
     ret.append("")
     return ret
 
 
-def ts_dump_gold_destination(version: RunVersion) -> List[str]:
+###########################################################################
+# Gold Destination
+###########################################################################
+def collect_gold_destination(state: DumpState) -> List[Dict]:
+    version = state.version
     ret = []
-    line = "-" * 80
-
-    ret.append(f"# [Gold Destination]")
-    ret.append(line)
     for destination in (
-        PlayerDestination.objects.filter(version_id=version.id).order_by("pk").all()
+        PlayerDestination.objects.at_version(version).order_by("pk").all()
     ):
         if destination.is_available(now=version.now):
             remain_time = "사용가능"
         else:
             remain_time = f"{get_remain_time(version=version, finish_at=destination.train_limit_refresh_at)}"
-        ret.append(f" - Location : {destination.location_id} / remain: {remain_time}")
-    ret.append("")
+        ret.append({"location_id": destination.location_id, "remain": remain_time})
     return ret
 
 
-def ts_dump_destination(version: RunVersion) -> List[str]:
+def render_gold_destination(data: List[Dict]) -> List[str]:
     ret = []
-    line = "-" * 80
+    ret.append(f"# [Gold Destination]")
+    ret.append(LINE)
+    for row in data:
+        ret.append(f" - Location : {row['location_id']} / remain: {row['remain']}")
+    ret.append("")
+    return ret
 
-    ret.append(f"# [Destination]")
-    ret.append(line)
+
+###########################################################################
+# Destination (지역 지도)
+###########################################################################
+def collect_destination(state: DumpState) -> Dict:
+    version = state.version
 
     visited_region_list = sorted(
         list(
-            PlayerVisitedRegion.objects.filter(version_id=version.id).values_list(
+            PlayerVisitedRegion.objects.at_version(version).values_list(
                 "region_id", flat=True
             )
         )
     )
 
-    queryset = TSDestination.objects.filter(region__in=visited_region_list).order_by(
-        "pk"
+    destinations = [
+        (o.location_id, o.region_id)
+        for o in TSDestination.objects.filter(region__in=visited_region_list)
+        .order_by("pk")
+        .all()
+    ]
+
+    quest_list = set(
+        PlayerQuest.objects.at_version(version)
+        .filter(milestone__gt=0)
+        .values_list("job_location_id", flat=True)
     )
-    for destination in queryset.all():
-        ret.append(f"""  - {destination.location_id} {destination.region_id} """)
-    ret.append("")
 
-    quest_list = {
-        o.job_location_id: o
-        for o in PlayerQuest.objects.filter(
-            version_id=version.id, milestone__gt=0
-        ).all()
-    }
+    maps = {}
+    for row in (
+        PlayerMap.objects.at_version(version)
+        .filter(region_name__in=[f"region_{region}" for region in visited_region_list])
+        .all()
+    ):
+        if row.is_resolved:
+            maps.setdefault(row.region_name, []).append(row)
+
+    job_locations = TSJobLocation.objects.in_bulk(
+        [row.spot_id for rows in maps.values() for row in rows]
+    )
 
+    regions = []
     for region in visited_region_list:
-        ret.append(f" # Region : {region}")
-        ret.append(line)
         draw = [[None for _ in range(10)] for _ in range(3)]
-        queryset = PlayerMap.objects.filter(
-            version_id=version.id, region_name=f"region_{region}"
-        ).all()
-        for row in queryset.all():
-            if row.is_resolved:
-                draw[row.position_y][row.position_x] = row.spot_id
+        for row in maps.get(f"region_{region}", []):
+            draw[row.position_y][row.position_x] = row.spot_id
 
+        cells = []
         for y in range(len(draw)):
             t = []
             for x in range(len(draw[y])):
-                instance = None
-                s = " " * 12
-
-                if draw[y][x]:
-                    instance = TSJobLocation.objects.filter(id=draw[y][x]).first()
-                    if instance:
-                        if draw[y][x] in quest_list:
-                            s = f" *[{instance.id:3d}:{instance.location_id:3d}] "
-                        else:
-                            s = f"  [{instance.id:3d}:{instance.location_id:3d}] "
-                t.append(s)
-            ret.append("".join(t))
+                instance = job_locations.get(draw[y][x]) if draw[y][x] else None
+                if instance:
+                    t.append(
+                        [instance.id, instance.location_id, draw[y][x] in quest_list]
+                    )
+                else:
+                    t.append(None)
+            cells.append(t)
+        regions.append({"region": region, "cells": cells})
+
     fd = article_find_destination(version=version)
-    for article_id in fd:
-        s = []
-        for dest in fd[article_id]:
-            s.append(f"JobLocationId={dest.id} / LocationId={dest.location_id}")
-        ret.append(f'article_id: {article_id} | {", ".join(s)}')
-    return ret
+    articles = {
+        article_id: [(dest.id, dest.location_id) for dest in fd[article_id]]
+        for article_id in fd
+    }
+
+    return {"destinations": destinations, "regions": regions, "articles": articles}
 
 
-def ts_dump_factory(version: RunVersion, factory_id: int = None):
+def render_destination(data: Dict) -> List[str]:
     ret = []
-    line = "-" * 80
+    ret.append(f"# [Destination]")
+    ret.append(LINE)
+    for location_id, region_id in data["destinations"]:
+        ret.append(f"""  - {location_id} {region_id} """)
+    ret.append("")
 
-    ret.append("# [Factory]")
-    ret.append(line)
+    for region in data["regions"]:
+        ret.append(f" # Region : {region['region']}")
+        ret.append(LINE)
+        for cells in region["cells"]:
+            t = []
+            for cell in cells:
+                if not cell:
+                    t.append(" " * 12)
+                elif cell[2]:
+                    t.append(f" *[{cell[0]:3d}:{cell[1]:3d}] ")
+                else:
+                    t.append(f"  [{cell[0]:3d}:{cell[1]:3d}] ")
+            ret.append("".join(t))
+
+    for article_id, destinations in data["articles"].items():
+        s = [
+            f"JobLocationId={job_location_id} / LocationId={location_id}"
+            for job_location_id, location_id in destinations
+        ]
+        ret.append(f'article_id: {article_id} | {", ".join(s)}')
+    return ret
+
+
+###########################################################################
+# Factory
+###########################################################################
+def collect_factory(state: DumpState, factory_id: int = None) -> List[Dict]:
+    version = state.version
     queryset = (
-        PlayerFactory.objects.filter(version_id=version.id)
+        PlayerFactory.objects.at_version(version)
         .order_by("id")
         .select_related("factory")
         .all()
@@ -365,102 +533,135 @@ def ts_dump_factory(version: RunVersion, factory_id: int = None):
     if factory_id:
         queryset = queryset.filter(factory_id=factory_id)
 
-    for factory in queryset.all():
-        ret.append(f"""  Factory - #{factory.factory_id} {factory.factory}""")
+    factories = list(queryset)
+    queues = state.factory_queues(factories)
+
+    def rows(orders: List[PlayerFactoryProductOrder]):
+        return [(o.article_id, o.article.name, o.amount) for o in orders]
 
-        completed_list, processing_list, waiting_list = factory_find_product_orders(
-            version=version, factory_id=factory.factory_id
+    ret = []
+    for factory in factories:
+        completed_list, processing_list, waiting_list = queues[
+            factory.factory_id
+        ].split(now=version.now)
+        ret.append(
+            {
+                "factory_id": factory.factory_id,
+                "name": f"{factory.factory}",
+                "waiting": rows(waiting_list),
+                "processing": rows(processing_list),
+                "completed": rows(completed_list),
+            }
         )
+    return ret
 
-        a = [
-            f"[#{o.article_id:3d}|{o.article.name:10s}|{o.amount}개]"
-            for o in completed_list
-        ]
-        b = [
-            f"[#{o.article_id:3d}|{o.article.name:10s}|{o.amount}개]"
-            for o in processing_list
-        ]
-        c = [
-            f"[#{o.article_id:3d}|{o.article.name:10s}|{o.amount}개]"
-            for o in waiting_list
-        ]
 
-        ret.append(f"""    대기 : {' '.join(c)}""")
-        ret.append(f"""    생성 : {' '.join(b)}""")
-        ret.append(f"""    완료 : {' '.join(a)}""")
+def render_factory(data: List[Dict]) -> List[str]:
+    ret = []
+    ret.append("# [Factory]")
+    ret.append(LINE)
+
+    def orders(rows) -> str:
+        return " ".join(
+            f"[#{article_id:3d}|{name:10s}|{amount}개]"
+            for article_id, name, amount in rows
+        )
+
+    for factory in data:
+        ret.append(f"""  Factory - #{factory['factory_id']} {factory['name']}""")
+        ret.append(f"""    대기 : {orders(factory['waiting'])}""")
+        ret.append(f"""    생성 : {orders(factory['processing'])}""")
+        ret.append(f"""    완료 : {orders(factory['completed'])}""")
 
     ret.append("")
     return ret
 
 
-def ts_dump_warehouse(version: RunVersion) -> List[str]:
-    ret = []
-    line = "-" * 80
-
-    ret.append("# [Warehouse]")
-    ret.append(line)
-    now = get_curr_server_datetime(version=version)
+###########################################################################
+# Warehouse
+###########################################################################
+def collect_warehouse(state: DumpState) -> List[Dict]:
+    version = state.version
+    warehouses = sorted(
+        (
+            o
+            for o in state.warehouse.values()
+            if o.article.level_from <= version.level_id
+        ),
+        key=lambda o: o.article.type,
+    )
 
-    queryset = (
-        PlayerWarehouse.objects.filter(
-            version_id=version.id, article__level_from__lte=version.level_id
+    countable: Dict[int, List[Tuple[int, str, int]]] = {}
+    for warehouse in warehouses:
+        countable.setdefault(warehouse.article.type, []).append(
+            (warehouse.article_id, warehouse.article.name, warehouse.amount)
         )
-        .order_by("article__type")
-        .select_related("article")
-        .all()
-    )
 
-    countable: Dict[int, List[PlayerWarehouse]] = {}
+    return [
+        {"article_type": article_type, "articles": rows}
+        for article_type, rows in countable.items()
+    ]
 
-    for warehouse in queryset:
-        warehouse: PlayerWarehouse
-        countable.setdefault(warehouse.article.type, [])
-        countable[warehouse.article.type].append(warehouse)
 
-    for article_type in countable:
-        ret.append(f"  + [Article Type : {article_type}]")
-        for rows in chunk_list(countable[article_type], chunk_size=6):
+def render_warehouse(data: List[Dict]) -> List[str]:
+    ret = []
+    ret.append("# [Warehouse]")
+    ret.append(LINE)
+
+    for row in data:
+        ret.append(f"  + [Article Type : {row['article_type']}]")
+        for rows in chunk_list(row["articles"], chunk_size=6):
             s = [
-                f"[{o.article_id:6d}|{o.article.name:18s}:{o.amount:5d}]" for o in rows
+                f"[{article_id:6d}|{name:18s}:{amount:5d}]"
+                for article_id, name, amount in rows
             ]
-
             ret.append(f"""    {' '.join(s)}""")
 
     ret.append("")
     return ret
 
 
-def ts_dump_ship(version: RunVersion) -> List[str]:
-    ret = []
-    line = "-" * 80
+###########################################################################
+# Ship
+###########################################################################
+def collect_ship(state: DumpState) -> List[Dict]:
+    version = state.version
+    ships = list(PlayerShipOffer.objects.at_version(version).all())
+    articles = state.articles(
+        article_id
+        for ship in ships
+        for article_id in (
+            *ship.reward_to_article_dict.keys(),
+            *ship.conditions_to_article_dict.keys(),
+        )
+    )
 
-    ret.append("# [Ship]")
-    ret.append(line)
-    now = get_curr_server_datetime(version=version)
-    queryset = PlayerShipOffer.objects.filter(version_id=version.id).all()
-
-    for ship in queryset:
-        reward_dict = ship.reward_to_article_dict
-        reward_articles = {
-            o.id: o for o in TSArticle.objects.filter(id__in=reward_dict.keys()).all()
+    return [
+        {
+            "arrival_at": get_remain_time(version=version, finish_at=ship.arrival_at),
+            "expire_at": get_remain_time(version=version, finish_at=ship.expire_at),
+            "conditions": _article_rows(articles, ship.conditions_to_article_dict),
+            "rewards": _article_rows(articles, ship.reward_to_article_dict),
         }
-        str_reward = [
-            f"""[{article_id}|{reward_articles[article_id].name}:{article_amount}]"""
-            for article_id, article_amount in reward_dict.items()
-        ]
+        for ship in ships
+    ]
 
-        condition_dict = ship.conditions_to_article_dict
-        condition_articles = {
-            o.id: o
-            for o in TSArticle.objects.filter(id__in=condition_dict.keys()).all()
-        }
+
+def render_ship(data: List[Dict]) -> List[str]:
+    ret = []
+    ret.append("# [Ship]")
+    ret.append(LINE)
+    for ship in data:
         str_condition = [
-            f"""[{article_id}|{condition_articles[article_id].name}:{article_amount}]"""
-            for article_id, article_amount in condition_dict.items()
+            f"""[{article_id}|{name}:{amount}]"""
+            for article_id, name, amount in ship["conditions"]
+        ]
+        str_reward = [
+            f"""[{article_id}|{name}:{amount}]"""
+            for article_id, name, amount in ship["rewards"]
         ]
-
         ret.append(
-            f"""   ArriveAt:{get_remain_time(version=version, finish_at=ship.arrival_at)} | ExpireAt:{get_remain_time(version=version, finish_at=ship.expire_at)}"""
+            f"""   ArriveAt:{ship['arrival_at']} | ExpireAt:{ship['expire_at']}"""
         )
         ret.append(f"""   conditions : {' '.join(str_condition)}""")
         ret.append(f"""   reward : {' '.join(str_reward)}""")
@@ -468,129 +669,167 @@ def ts_dump_ship(version: RunVersion) -> List[str]:
     return ret
 
 
-def ts_dump_contract(version: RunVersion) -> List[str]:
-    ret = []
-    line = "-" * 80
-
-    ret.append("# [Contract]")
-    ret.append(line)
-    now = get_curr_server_datetime(version=version)
+###########################################################################
+# Contract
+###########################################################################
+def collect_contract(state: DumpState) -> List[Dict]:
+    version = state.version
+    now = version.now
 
-    for contract_list in PlayerContractList.objects.filter(version_id=version.id).all():
-        available_to = get_remain_time(
-            version=version, finish_at=contract_list.available_to
-        )
-        next_replace_at = get_remain_time(
-            version=version, finish_at=contract_list.next_replace_at
-        )
-        next_video_replace_at = get_remain_time(
-            version=version, finish_at=contract_list.next_video_replace_at
-        )
-        next_video_rent_at = get_remain_time(
-            version=version, finish_at=contract_list.next_video_rent_at
-        )
-        next_video_speed_up_at = get_remain_time(
-            version=version, finish_at=contract_list.next_video_speed_up_at
+    contract_lists = list(PlayerContractList.objects.at_version(version).all())
+    contracts: Dict[int, List[PlayerContract]] = {}
+    for contract in (
+        PlayerContract.objects.at_version(version)
+        .filter(contract_list_id__in=[o.id for o in contract_lists])
+        .all()
+    ):
+        contracts.setdefault(contract.contract_list_id, []).append(contract)
+
+    articles = state.articles(
+        article_id
+        for rows in contracts.values()
+        for contract in rows
+        for article_id in (
+            *contract.reward_to_article_dict.keys(),
+            *contract.conditions_to_article_dict.keys(),
         )
-        expires_at = get_remain_time(
-            version=version, finish_at=contract_list.expires_at
+    )
+
+    def remain(finish_at):
+        return get_remain_time(version=version, finish_at=finish_at)
+
+    ret = []
+    for contract_list in contract_lists:
+        ret.append(
+            {
+                "contract_list_id": contract_list.contract_list_id,
+                "available_to": remain(contract_list.available_to),
+                "expires_at": remain(contract_list.expires_at),
+                "next_replace_at": remain(contract_list.next_replace_at),
+                "next_video_replace_at": remain(contract_list.next_video_replace_at),
+                "next_video_rent_at": remain(contract_list.next_video_rent_at),
+                "next_video_speed_up_at": remain(contract_list.next_video_speed_up_at),
+                "contracts": [
+                    {
+                        "slot": contract.slot,
+                        "available": contract.is_available(now),
+                        "conditions": _article_rows(
+                            articles, contract.conditions_to_article_dict
+                        ),
+                        "rewards": _article_rows(
+                            articles, contract.reward_to_article_dict
+                        ),
+                        "usable_from": remain(contract.usable_from),
+                        "expires_at": remain(contract.expires_at),
+                        "available_from": remain(contract.available_from),
+                        "available_to": remain(contract.available_to),
+                    }
+                    for contract in contracts.get(contract_list.id, [])
+                ],
+            }
         )
+    return ret
+
+
+def render_contract(data: List[Dict]) -> List[str]:
+    ret = []
+    ret.append("# [Contract]")
+    ret.append(LINE)
 
-        ret.append(f"""# Contract List ID #{contract_list.contract_list_id}""")
+    for contract_list in data:
+        ret.append(f"""# Contract List ID #{contract_list['contract_list_id']}""")
         ret.append(
-            f"""   Available : {available_to} | Expires At: {expires_at} | Next Replace : {next_replace_at}"""
+            f"""   Available : {contract_list['available_to']} | Expires At: {contract_list['expires_at']} | Next Replace : {contract_list['next_replace_at']}"""
         )
         ret.append(
-            f"""   Video : Replace : {next_video_replace_at} | Rent At: {next_video_rent_at} | SpeedUp At: {next_video_speed_up_at}"""
+            f"""   Video : Replace : {contract_list['next_video_replace_at']} | Rent At: {contract_list['next_video_rent_at']} | SpeedUp At: {contract_list['next_video_speed_up_at']}"""
         )
 
-        for contract in PlayerContract.objects.filter(
-            contract_list_id=contract_list.id
-        ).all():
-            reward_dict = contract.reward_to_article_dict
-            reward_articles = {
-                o.id: o
-                for o in TSArticle.objects.filter(id__in=reward_dict.keys()).all()
-            }
+        for contract in contract_list["contracts"]:
             str_reward = [
-                f"""[{article_id}|{reward_articles[article_id].name[:10]}:{article_amount}]"""
-                for article_id, article_amount in reward_dict.items()
+                f"""[{article_id}|{name[:10]}:{amount}]"""
+                for article_id, name, amount in contract["rewards"]
             ]
-
-            condition_dict = contract.conditions_to_article_dict
-            condition_articles = {
-                o.id: o
-                for o in TSArticle.objects.filter(id__in=condition_dict.keys()).all()
-            }
             str_condition = [
-                f"""[{article_id}|{condition_articles[article_id].name[:10]}:{article_amount}]"""
-                for article_id, article_amount in condition_dict.items()
+                f"""[{article_id}|{name[:10]}:{amount}]"""
+                for article_id, name, amount in contract["conditions"]
             ]
-
-            if contract.is_available(now):
-                msg = "가능"
-            else:
-                msg = "대기"
-            usable_from = get_remain_time(
-                version=version, finish_at=contract.usable_from
-            )
-            expires_at = get_remain_time(version=version, finish_at=contract.expires_at)
-            available_from = get_remain_time(
-                version=version, finish_at=contract.available_from
-            )
-            available_to = get_remain_time(
-                version=version, finish_at=contract.available_to
-            )
+            msg = "가능" if contract["available"] else "대기"
             ret.append(
-                f"""   Slot : {contract.slot:2d} | {msg} / 필요: {' '.join(str_condition):24s} / 보상: {' '.join(str_reward):24s} | usable_from : {usable_from} | expires_at : {expires_at} | available:[{available_from} ~ {available_to}]"""
+                f"""   Slot : {contract['slot']:2d} | {msg} / 필요: {' '.join(str_condition):24s} / 보상: {' '.join(str_reward):24s} | usable_from : {contract['usable_from']} | expires_at : {contract['expires_at']} | available:[{contract['available_from']} ~ {contract['available_to']}]"""
             )
     ret.append("")
     return ret
 
 
-def ts_dump_daily_reward(version: RunVersion):
-    ret = []
-    line = "-" * 80
+###########################################################################
+# Daily Reward
+###########################################################################
+def collect_daily_reward(state: DumpState) -> List[Dict]:
+    version = state.version
+    return [
+        {
+            "available_from": get_remain_time(
+                version=version, finish_at=daily.available_from
+            ),
+            "expire_at": get_remain_time(version=version, finish_at=daily.expire_at),
+            "rewards": daily.rewards,
+            "pool_id": daily.pool_id,
+            "day": daily.day,
+        }
+        for daily in PlayerDailyReward.objects.at_version(version).all()
+    ]
+
 
+def render_daily_reward(data: List[Dict]) -> List[str]:
+    ret = []
     ret.append("# [Daily Reward]")
-    ret.append(line)
-    now = get_curr_server_datetime(version=version)
-    queryset = PlayerDailyReward.objects.filter(version_id=version.id).all()
-    for daily in queryset:
+    ret.append(LINE)
+    for daily in data:
         ret.append(
-            f"""   AvailableFrom : {get_remain_time(version=version, finish_at=daily.available_from)} | ExpireAt : {get_remain_time(version=version, finish_at=daily.expire_at)}"""
+            f"""   AvailableFrom : {daily['available_from']} | ExpireAt : {daily['expire_at']}"""
         )
-        ret.append(f"""   rewards : {daily.rewards}""")
-        ret.append(f"""   pool_id : {daily.pool_id} | day : {daily.day}""")
-        pass
+        ret.append(f"""   rewards : {daily['rewards']}""")
+        ret.append(f"""   pool_id : {daily['pool_id']} | day : {daily['day']}""")
     ret.append("")
     return ret
 
 
-def ts_dump_daily_offer(version: RunVersion):
-    ret = []
-    line = "-" * 80
+###########################################################################
+# Daily Offer
+###########################################################################
+def collect_daily_offer(state: DumpState) -> List[Dict]:
+    version = state.version
 
-    ret.append("# [Daily Offer]")
-    ret.append(line)
-    now = get_curr_server_datetime(version=version)
-    queryset = PlayerDailyOffer.objects.filter(version_id=version.id).all()
-    for daily in queryset:
-        ret.append(
-            f"""   expire_at : {get_remain_time(version=version, finish_at=daily.expire_at)} | expires_at : {get_remain_time(version=version, finish_at=daily.expires_at)}"""
-        )
+    offers = list(PlayerDailyOffer.objects.at_version(version).all())
+    items: Dict[int, List[PlayerDailyOfferItem]] = {}
+    for item in (
+        PlayerDailyOfferItem.objects.at_version(version)
+        .filter(daily_offer_id__in=[o.id for o in offers])
+        .select_related("price")
+        .all()
+    ):
+        items.setdefault(item.daily_offer_id, []).append(item)
 
-        for item in PlayerDailyOfferItem.objects.filter(daily_offer_id=daily.id).all():
-            purchased = "가능" if item.purchased == False else "완료"
+    item_rewards = {
+        item.id: json.loads(item.reward)["Items"]
+        for rows in items.values()
+        for item in rows
+    }
+    articles = state.articles(
+        reward.get("Value") for rewards in item_rewards.values() for reward in rewards
+    )
 
-            required = f"""[{item.price_id}|{item.price.name}:{item.price_amount}]"""
+    ret = []
+    for daily in offers:
+        rows = []
+        for item in items.get(daily.id, []):
             rewards = []
-            for reward in json.loads(item.reward)["Items"]:
-                _id = reward.get("Id")
+            for reward in item_rewards[item.id]:
                 _value = reward.get("Value")
                 _amount = reward.get("Amount")
 
-                article = TSArticle.objects.filter(id=_value).first()
+                article = articles.get(_value)
                 if not article:
                     rewards.append(f"""[{reward}]""")
                 elif _amount:
@@ -598,130 +837,386 @@ def ts_dump_daily_offer(version: RunVersion):
                 else:
                     rewards.append(f"""[{article.id}|{article.name}]""")
 
-            ret.append(
-                f"""       Slot: {item.slot:2d} | {purchased} | {required:20s} | {','.join(rewards)}"""
+            rows.append(
+                {
+                    "slot": item.slot,
+                    "purchased": item.purchased,
+                    "price": (item.price_id, item.price.name, item.price_amount),
+                    "rewards": rewards,
+                }
             )
 
-    ret.append("")
+        ret.append(
+            {
+                "expire_at": get_remain_time(
+                    version=version, finish_at=daily.expire_at
+                ),
+                "expires_at": get_remain_time(
+                    version=version, finish_at=daily.expires_at
+                ),
+                "items": rows,
+            }
+        )
     return ret
 
 
-def ts_dump_offer_container(version: RunVersion):
+def render_daily_offer(data: List[Dict]) -> List[str]:
     ret = []
-    line = "-" * 80
+    ret.append("# [Daily Offer]")
+    ret.append(LINE)
+    for daily in data:
+        ret.append(
+            f"""   expire_at : {daily['expire_at']} | expires_at : {daily['expires_at']}"""
+        )
+        for item in daily["items"]:
+            purchased = "완료" if item["purchased"] else "가능"
+            price_id, price_name, price_amount = item["price"]
+            required = f"""[{price_id}|{price_name}:{price_amount}]"""
+            ret.append(
+                f"""       Slot: {item['slot']:2d} | {purchased} | {required:20s} | {','.join(item['rewards'])}"""
+            )
 
-    ret.append("# [Offer Container]")
-    ret.append(line)
+    ret.append("")
+    return ret
 
-    now = get_curr_server_datetime(version=version)
+
+###########################################################################
+# Offer Container
+###########################################################################
+def collect_offer_container(state: DumpState) -> List[Dict]:
+    version = state.version
+    ret = []
     for offer in container_offer_find_iter(version=version, available_only=False):
         next_event = offer.last_bought_at + datetime.timedelta(
             seconds=offer.offer_container.cooldown_duration
         )
         ret.append(
-            f"""   offer_container: {offer.offer_container_id}, Cnt:{offer.count}, Last Bought: {offer.last_bought_at}, Next : {next_event}|remain:{get_remain_time(version=version, finish_at=next_event)}"""
+            {
+                "offer_container_id": offer.offer_container_id,
+                "count": offer.count,
+                "last_bought_at": offer.last_bought_at,
+                "next_event": next_event,
+                "remain": get_remain_time(version=version, finish_at=next_event),
+            }
         )
-        pass
-    ret.append("")
     return ret
 
 
-def ts_dump_whistle(version: RunVersion):
+def render_offer_container(data: List[Dict]) -> List[str]:
     ret = []
-    line = "-" * 80
+    ret.append("# [Offer Container]")
+    ret.append(LINE)
+    for offer in data:
+        ret.append(
+            f"""   offer_container: {offer['offer_container_id']}, Cnt:{offer['count']}, Last Bought: {offer['last_bought_at']}, Next : {offer['next_event']}|remain:{offer['remain']}"""
+        )
+    ret.append("")
+    return ret
 
-    ret.append("# [Whistle]")
-    ret.append(line)
 
-    now = get_curr_server_datetime(version=version)
-    queryset = PlayerWhistle.objects.filter(version_id=version.id).all()
-    for whistle in queryset:
+###########################################################################
+# Whistle
+###########################################################################
+def collect_whistle(state: DumpState) -> List[Dict]:
+    version = state.version
+    return [
+        {
+            "category": whistle.category,
+            "position": whistle.position,
+            "spawn_time": get_remain_time(
+                version=version, finish_at=whistle.spawn_time
+            ),
+            "collectable_from": get_remain_time(
+                version=version, finish_at=whistle.collectable_from
+            ),
+            "expires_at": get_remain_time(
+                version=version, finish_at=whistle.expires_at
+            ),
+        }
+        for whistle in PlayerWhistle.objects.at_version(version).all()
+    ]
+
+
+def render_whistle(data: List[Dict]) -> List[str]:
+    ret = []
+    ret.append("# [Whistle]")
+    ret.append(LINE)
+    for whistle in data:
         ret.append(
-            f"""   category: {whistle.category} | Position: {whistle.position} | spawn_time : {get_remain_time(version=version, finish_at=whistle.spawn_time)} | collectable_from : {get_remain_time(version=version, finish_at=whistle.collectable_from)} | expires_at : {get_remain_time(version=version, finish_at=whistle.expires_at)}"""
+            f"""   category: {whistle['category']} | Position: {whistle['position']} | spawn_time : {whistle['spawn_time']} | collectable_from : {whistle['collectable_from']} | expires_at : {whistle['expires_at']}"""
         )
     ret.append("")
     return ret
 
 
-def ts_dump_competition(version: RunVersion):
-    ret = []
-    line = "-" * 80
+###########################################################################
+# Competition
+###########################################################################
+def collect_competition(state: DumpState) -> List[Dict]:
+    version = state.version
+    return [
+        {
+            "type": competition.type,
+            "scope": competition.scope,
+            "competition_id": competition.competition_id,
+            "starts_at": get_remain_time(
+                version=version, finish_at=competition.starts_at
+            ),
+            "finishes_at": get_remain_time(
+                version=version, finish_at=competition.finishes_at
+            ),
+            "activated_at": get_remain_time(
+                version=version, finish_at=competition.activated_at
+            ),
+            "expires_at": get_remain_time(
+                version=version, finish_at=competition.expires_at
+            ),
+            "progress": competition.progress,
+        }
+        for competition in PlayerCompetition.objects.at_version(version).all()
+    ]
 
-    ret.append("# [Competition]")
-    ret.append(line)
 
-    queryset = PlayerCompetition.objects.filter(version=version).all()
-    for competition in queryset:
-        starts_at = (
-            f"{get_remain_time(version=version, finish_at=competition.starts_at)}"
-        )
-        finishes_at = (
-            f"{get_remain_time(version=version, finish_at=competition.finishes_at)}"
-        )
-        expires_at = (
-            f"{get_remain_time(version=version, finish_at=competition.expires_at)}"
-        )
-        activated_at = (
-            f"{get_remain_time(version=version, finish_at=competition.activated_at)}"
-        )
+def render_competition(data: List[Dict]) -> List[str]:
+    ret = []
+    ret.append("# [Competition]")
+    ret.append(LINE)
+    for competition in data:
         # version_id = 2 and type = 'union' and scope = 'group'
         ret.append(
-            f"""   - Competition|{competition.type:8s}|{competition.scope:6s}[{competition.competition_id}] Start:{starts_at} | Finish:{finishes_at} | Activate:{activated_at} | Expire:{expires_at}"""
+            f"""   - Competition|{competition['type']:8s}|{competition['scope']:6s}[{competition['competition_id']}] Start:{competition['starts_at']} | Finish:{competition['finishes_at']} | Activate:{competition['activated_at']} | Expire:{competition['expires_at']}"""
         )
-        ret.append(f"""     Progress:{competition.progress}""")
-        pass
+        ret.append(f"""     Progress:{competition['progress']}""")
     ret.append("")
     return ret
 
 
-def ts_dump(version: RunVersion):
-    ret = []
-    ret += ts_dump_default(version=version)
+###########################################################################
+# sections
+###########################################################################
+DUMP_SECTIONS: Dict[str, Tuple[Callable[..., Any], Callable[[Any], List[str]]]] = {
+    "default": (collect_default, render_default),
+    "dispatcher": (collect_working_dispatcher, render_working_dispatcher),
+    "train": (collect_train, render_train),
+    "jobs": (collect_jobs, render_jobs),
+    "gold_destination": (collect_gold_destination, render_gold_destination),
+    "destination": (collect_destination, render_destination),
+    "factory": (collect_factory, render_factory),
+    "ship": (collect_ship, render_ship),
+    "warehouse": (collect_warehouse, render_warehouse),
+    "contract": (collect_contract, render_contract),
+    "daily_reward": (collect_daily_reward, render_daily_reward),
+    "daily_offer": (collect_daily_offer, render_daily_offer),
+    "offer_container": (collect_offer_container, render_offer_container),
+    "whistle": (collect_whistle, render_whistle),
+    "competition": (collect_competition, render_competition),
+}
+DEFAULT_DUMP_SECTIONS = [o for o in DUMP_SECTIONS if o != "destination"]
+
+
+def _dump_section(name: str, version: RunVersion, **kwargs) -> List[str]:
+    collect, render = DUMP_SECTIONS[name]
+    return render(collect(DumpState(version), **kwargs))
 
-    ret += ts_dump_working_dispatcher(version=version)
 
-    ret += ts_dump_train(version=version)
+def ts_dump_default(version: RunVersion) -> List[str]:
+    return _dump_section("default", version)
 
-    ret += ts_dump_jobs(version=version)
 
-    ret += ts_dump_gold_destination(version=version)
+def ts_dump_working_dispatcher(version: RunVersion) -> List[str]:
+    return _dump_section("dispatcher", version)
 
-    # ret += ts_dump_destination(version=version)
 
-    ret += ts_dump_factory(version=version)
+def ts_dump_train(version: RunVersion) -> List[str]:
+    return _dump_section("train", version)
 
-    # ship
-    ret += ts_dump_ship(version=version)
 
-    # warehouse
-    ret += ts_dump_warehouse(version=version)
+def ts_dump_jobs(version: RunVersion) -> List[str]:
+    return _dump_section("jobs", version)
 
-    # contract
-    ret += ts_dump_contract(version=version)
 
-    # daily reward
-    ret += ts_dump_daily_reward(version=version)
+def ts_dump_gold_destination(version: RunVersion) -> List[str]:
+    return _dump_section("gold_destination", version)
 
-    # daily offer
-    ret += ts_dump_daily_offer(version=version)
 
-    # offer container
-    ret += ts_dump_offer_container(version=version)
+def ts_dump_destination(version: RunVersion) -> List[str]:
+    return _dump_section("destination", version)
 
-    # whistle
-    ret += ts_dump_whistle(version=version)
 
-    # competition
-    ret += ts_dump_competition(version=version)
+def ts_dump_factory(version: RunVersion, factory_id: int = None) -> List[str]:
+    return _dump_section("factory", version, factory_id=factory_id)
+
+
+def ts_dump_warehouse(version: RunVersion) -> List[str]:
+    return _dump_section("warehouse", version)
+
+
+def ts_dump_ship(version: RunVersion) -> List[str]:
+    return _dump_section("ship", version)
+
+
+def ts_dump_contract(version: RunVersion) -> List[str]:
+    return _dump_section("contract", version)
+
+
+def ts_dump_daily_reward(version: RunVersion) -> List[str]:
+    return _dump_section("daily_reward", version)
+
+
+def ts_dump_daily_offer(version: RunVersion) -> List[str]:
+    return _dump_section("daily_offer", version)
+
+
+def ts_dump_offer_container(version: RunVersion) -> List[str]:
+    return _dump_section("offer_container", version)
+
+
+def ts_dump_whistle(version: RunVersion) -> List[str]:
+    return _dump_section("whistle", version)
+
+
+def ts_dump_competition(version: RunVersion) -> List[str]:
+    return _dump_section("competition", version)
+
+
+###########################################################################
+# ts_dump
+###########################################################################
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_dump_settings() -> Dict:
+    return getattr(settings, "TS_DUMP", {})
+
+
+def is_dump_enabled() -> bool:
+    """
+    False 이면 Strategy 는 dump 하지 않는다. (scripts/dump.py 로 필요할 때만)
+    """
+    return get_dump_settings().get("enabled", True)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    파일 별 순서를 지키기 위해 thread 는 1개.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="ts_dump"
+                )
+                atexit.register(_executor.shutdown)
+    return _executor
+
+
+def flush_dumps():
+    """
+    background 로 넘긴 dump 를 모두 쓸 때 까지 기다린다.
+    """
+    if _executor is not None:
+        _executor.submit(lambda: None).result()
+
+
+def collect_dump(version: RunVersion, sections: List[str]) -> Dict[str, Any]:
+    state = DumpState(version)
+    return {name: DUMP_SECTIONS[name][0](state) for name in sections}
+
+
+def render_dump(data: Dict[str, Any]) -> List[str]:
+    ret = []
+    for name, section in data.items():
+        ret += DUMP_SECTIONS[name][1](section)
+    return ret
+
+
+def write_dump(base_path, filename: str, record: Dict, to_json: bool, to_stdout: bool):
+    """
+        render 후 {filename}.txt (와 {filename}.ndjson) 에 이어 쓴다.
+    :param base_path:
+    :param filename: 확장자 없는 파일 이름
+    :param record: {"version_id", "now", "sections": {name: collect 값}}
+    :param to_json:
+    :param to_stdout:
+    :return:
+    """
+    rows = [f" {row:80s}" for row in render_dump(record["sections"])]
 
-    base_path = settings.SITE_PATH / "dump" / f"{version.user.username}"
     base_path.mkdir(0o755, True, exist_ok=True)
+    with open(base_path / f"{filename}.txt", "at") as fout:
+        fout.write("".join(row + "\n" for row in rows))
+
+    if to_json:
+        with open(base_path / f"{filename}.ndjson", "at") as fout:
+            fout.write(
+                json.dumps(
+                    record,
+                    cls=DjangoJSONEncoder,
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                )
+                + "\n"
+            )
+
+    if to_stdout:
+        print("\n".join(rows) + "\n")
+
+
+def _write_dump_safe(*args, **kwargs):
+    try:
+        write_dump(*args, **kwargs)
+    except Exception as e:
+        _logger.exception(f"[ts_dump] write failed : {e}")
 
+
+def ts_dump(
+    version: RunVersion,
+    sections: Optional[List[str]] = None,
+    background: Optional[bool] = None,
+    to_json: Optional[bool] = None,
+    to_stdout: Optional[bool] = None,
+) -> Optional[Future]:
+    """
+        state 를 읽는 것 까지만 caller thread 에서 하고, render / 쓰기는 background thread 에서 한다.
+        인자가 None 이면 settings.TS_DUMP 를 따른다.
+
+    :param version:
+    :param sections: DUMP_SECTIONS 의 key. 기본은 DEFAULT_DUMP_SECTIONS
+    :param background: False 이면 바로 쓴다.
+    :param to_json: text 파일 옆에 같은 이름의 .ndjson 파일도 쓴다.
+    :param to_stdout: 화면에도 출력
+    :return: background 이면 Future
+    """
+    conf = get_dump_settings()
+    if sections is None:
+        sections = conf.get("sections") or DEFAULT_DUMP_SECTIONS
+    if background is None:
+        background = conf.get("background", True)
+    if to_json is None:
+        to_json = conf.get("json", True)
+    if to_stdout is None:
+        to_stdout = conf.get("stdout", True)
+
+    record = {
+        "version_id": version.id,
+        "now": version.now,
+        "sections": collect_dump(version=version, sections=sections),
+    }
+
+    base_path = settings.SITE_PATH / "dump" / f"{version.user.username}"
     str_dt = version.created.strftime("%Y%m%d_%H%M%S")
-    filename = base_path / f"{version.id}_{str_dt}.txt"
-    with open(filename, "at") as fout:
-        for row in ret:
-            s = f" {row:80s}"
-            print(s)
-            fout.write(s + "\n")
-        print()
+    kwargs = dict(
+        base_path=base_path,
+        filename=f"{version.id}_{str_dt}",
+        record=record,
+        to_json=to_json,
+        to_stdout=to_stdout,
+    )
+
+    if background:
+        return _get_executor().submit(_write_dump_safe, **kwargs)
+
+    write_dump(**kwargs)
+    return None
@@ -0,0 +1,125 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import List, Dict
+
+from app_root.players.models import PlayerFactory, PlayerFactoryProductOrder
+from app_root.servers.models import TSProduct
+from app_root.strategies.data_types import FactoryPlan
+
+
+###########################################################################
+# Factory 생산 계획
+#
+#   공장은 대기열의 주문을 1개씩 순서대로 생산한다. (병렬 생산 없음)
+#   - 대기열(processing + waiting) 은 slot_count 개 까지.
+#   - 빈 slot 에 어떤 제품을 넣을지 : 필요 수량을 가장 빨리 채우는 제품 (craft_time / 채워지는 수량) 부터.
+#   - 넣은 주문의 순서 : Smith's rule (craft_time / weight) 로 가중 완료시간 합을 최소화.
+#   - 필요 수량이 모두 채워져도 slot 이 남으면 주문 수가 적은 제품으로 채운다. (slot 을 놀리지 않는다)
+###########################################################################
+def factory_busy_until(
+    orders: List[PlayerFactoryProductOrder], now: datetime
+) -> datetime:
+    """
+        processing + waiting 주문이 모두 끝나는 예상 시간.
+
+    :param orders: index 순서의 processing + waiting 주문
+    :param now:
+    :return:
+    """
+    ret = now
+    for order in orders:
+        if order.finish_time:
+            ret = max(ret, order.finish_time)
+        else:
+            ret += timedelta(seconds=order.craft_time)
+    return ret
+
+
+def plan_factory_orders(
+    player_factory: PlayerFactory,
+    products: List[TSProduct],
+    completed: List[PlayerFactoryProductOrder],
+    processing: List[PlayerFactoryProductOrder],
+    waiting: List[PlayerFactoryProductOrder],
+    demand: Dict[int, int],
+    now: datetime,
+) -> FactoryPlan:
+    """
+        빈 slot 에 넣을 주문과 순서, 예상 완료시간을 계산한다.
+
+    :param player_factory:
+    :param products: 이 공장에서 생산할 수 있는 제품
+    :param completed:
+    :param processing:
+    :param waiting:
+    :param demand: article_id 별 필요 수량
+    :param now:
+    :return:
+    """
+    plan = FactoryPlan(player_factory=player_factory, now=now)
+    plan.busy_until = factory_busy_until(orders=processing + waiting, now=now)
+
+    free_slot = player_factory.slot_count - len(processing) - len(waiting)
+    if free_slot < 1 or not products:
+        return plan
+
+    in_factory_amount = {}
+    in_factory_count = {}
+    for order in completed + processing + waiting:
+        in_factory_amount.setdefault(order.article_id, 0)
+        in_factory_amount[order.article_id] += order.amount
+        in_factory_count.setdefault(order.article_id, 0)
+        in_factory_count[order.article_id] += 1
+
+    remain = {}
+    for product in products:
+        article_id = int(product.article_id)
+        remain[article_id] = demand.get(article_id, 0) - in_factory_amount.get(
+            article_id, 0
+        )
+
+    # 1. 필요 수량을 채우는 주문 - 채워지는 수량 대비 craft_time 이 짧은 제품부터.
+    selected = []  # (product, weight)
+    heap = []
+    for idx, product in enumerate(products):
+        article_id = int(product.article_id)
+        if remain[article_id] > 0:
+            fill = min(product.article_amount, remain[article_id])
+            heapq.heappush(heap, (product.craft_time / max(1, fill), idx))
+
+    while heap and len(selected) < free_slot:
+        _, idx = heapq.heappop(heap)
+        product = products[idx]
+        article_id = int(product.article_id)
+
+        fill = min(product.article_amount, remain[article_id])
+        selected.append((product, fill))
+        remain[article_id] -= product.article_amount
+
+        if remain[article_id] > 0:
+            fill = min(product.article_amount, remain[article_id])
+            heapq.heappush(heap, (product.craft_time / max(1, fill), idx))
+
+    # 2. 남는 slot - 주문 수가 적은 제품, 같으면 craft_time 이 짧은 제품.
+    count = dict(in_factory_count)
+    for product, _ in selected:
+        count.setdefault(int(product.article_id), 0)
+        count[int(product.article_id)] += 1
+
+    while len(selected) < free_slot:
+        product = min(
+            products,
+            key=lambda p: (count.get(int(p.article_id), 0), p.craft_time),
+        )
+        selected.append((product, 0))
+        count.setdefault(int(product.article_id), 0)
+        count[int(product.article_id)] += 1
+
+    # 3. Smith's rule - craft_time / weight 오름차순. (weight 0 인 여분 주문은 맨 뒤)
+    selected.sort(
+        key=lambda x: (x[1] <= 0, x[0].craft_time / max(1, x[1]), x[0].craft_time)
+    )
+    for product, _ in selected:
+        plan.add_order(product)
+
+    return plan
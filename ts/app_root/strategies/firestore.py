@@ -1,12 +1,18 @@
+import atexit
+import itertools
 import json
 import subprocess
-from pathlib import Path
+import threading
+import time
+from typing import Optional, List, Dict, Any
 
 from django.conf import settings
+from django.utils import timezone
 
 from app_root.players.models import PlayerJob, PlayerVisitedRegion
 from app_root.players.utils_import import InitdataHelper
 from app_root.servers.models import RunVersion, TSRegion
+from core.sharedcache import get_shared_cache
 from core.utils import convert_number_as_int
 
 projectId = "trainstation-2-30223076"
@@ -17,7 +23,237 @@ storageBucket = f"{projectId}.appspot.com"
 appId = "1:389445276055:android:efbd60f62f7fb4bb"
 
 
+class FirestoreSidecarError(Exception):
+    pass
+
+
+class FirestoreSidecar:
+    """
+    ts-firestore/sidecar.sh (node) 를 띄워두고 한 줄에 1개씩 JSON-RPC 로 요청한다.
+    node 시작 / firebase 초기화 / 로그인은 guild 별로 처음 한번만 한다.
+
+        sidecar = get_firestore_sidecar()
+        jobs = sidecar.call("getJobs", {"token": ..., "guildId": ..., "firebaseConfig": ...})
+
+    - 여러 thread 에서 같이 요청할 수 있다. (응답은 id 로 찾는다)
+    - process 가 죽었거나 응답이 timeout 이면 다음 요청에서 다시 띄운다.
+    - node 의 log (stderr) 는 LOG_PATH/firestore_sidecar.log
+    """
+
+    command: List[str]
+    timeout: float
+    process: Optional[subprocess.Popen]
+    pending: Dict[int, Dict]
+
+    def __init__(self, command: Optional[List[str]] = None, timeout: float = 30.0):
+        self.command = command or [
+            str(settings.SOURCE_PATH / "ts-firestore" / "sidecar.sh")
+        ]
+        self.timeout = timeout
+        self.process = None
+        self.pending = {}
+        self.starts = 0
+
+        self.seq = itertools.count(1)
+        self.lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> subprocess.Popen:
+        with self.lock:
+            if self.is_alive():
+                return self.process
+            self._stop()
+
+            try:
+                with open(settings.LOG_PATH / "firestore_sidecar.log", "ab") as stderr:
+                    process = subprocess.Popen(
+                        self.command,
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE,
+                        stderr=stderr,
+                    )
+            except OSError as e:
+                raise FirestoreSidecarError(f"cannot start sidecar : {e}") from e
+
+            self.process = process
+            self.starts += 1
+            threading.Thread(
+                target=self._read, args=(process,), name="FirestoreSidecar", daemon=True
+            ).start()
+            return process
+
+    def stop(self):
+        with self.lock:
+            self._stop()
+
+    def _stop(self):
+        process, self.process = self.process, None
+        if not process:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+        self._fail_pending(process)
+
+    def _read(self, process: subprocess.Popen):
+        for line in process.stdout:
+            try:
+                response = json.loads(line)
+            except ValueError:
+                continue
+            with self.pending_lock:
+                pending = self.pending.pop(response.get("id"), None)
+            if pending:
+                pending["response"] = response
+                pending["event"].set()
+
+        # stdout 이 닫혔으면 process 가 아직 끝나지 않았어도 버린다.
+        with self.lock:
+            if self.process is process:
+                self._stop()
+        self._fail_pending(process)
+
+    def _fail_pending(self, process: subprocess.Popen):
+        """
+        process 가 끝나면 응답을 기다리는 요청은 바로 실패한다.
+        """
+        with self.pending_lock:
+            ids = [k for k, v in self.pending.items() if v["process"] is process]
+            for request_id in ids:
+                self.pending.pop(request_id)["event"].set()
+
+    def call(
+        self, method: str, params: Optional[Dict] = None, timeout: float = None
+    ) -> Any:
+        process = self.start()
+
+        request_id = next(self.seq)
+        pending = {"event": threading.Event(), "response": None, "process": process}
+        with self.pending_lock:
+            self.pending[request_id] = pending
+
+        message = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": method,
+            "params": params or {},
+        }
+        try:
+            with self.lock:
+                if self.process is not process:
+                    raise ValueError("sidecar stopped")
+                process.stdin.write(json.dumps(message).encode("utf-8") + b"\n")
+                process.stdin.flush()
+        except (OSError, ValueError) as e:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            raise FirestoreSidecarError(
+                f"{method} : cannot write to sidecar : {e}"
+            ) from e
+
+        if not pending["event"].wait(self.timeout if timeout is None else timeout):
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            # 응답이 없는 sidecar 는 다시 띄운다.
+            with self.lock:
+                if self.process is process:
+                    self._stop()
+            raise FirestoreSidecarError(f"{method} : timeout")
+
+        response = pending["response"]
+        if response is None:
+            raise FirestoreSidecarError(f"{method} : sidecar exited")
+        if "error" in response:
+            raise FirestoreSidecarError(
+                f"{method} : {(response['error'] or {}).get('message')}"
+            )
+        return response.get("result")
+
+
+_sidecar: Optional[FirestoreSidecar] = None
+_sidecar_lock = threading.Lock()
+# sidecar 가 실패하면 이 시간 동안은 run.sh 만 쓴다.
+SIDECAR_RETRY_SECONDS = 600
+_sidecar_failed_at: Optional[float] = None
+
+
+def get_sidecar_settings() -> Dict:
+    return getattr(settings, "FIRESTORE_SIDECAR", {})
+
+
+def get_firestore_sidecar() -> FirestoreSidecar:
+    """
+        process 의 FirestoreSidecar. settings.FIRESTORE_SIDECAR 로 설정한다.
+        ex) FIRESTORE_SIDECAR = {"enabled": True, "timeout": 30} (기본은 꺼져 있다)
+    :return:
+    """
+    global _sidecar
+    if _sidecar is None:
+        with _sidecar_lock:
+            if _sidecar is None:
+                kwargs = {
+                    k: v for k, v in get_sidecar_settings().items() if k != "enabled"
+                }
+                _sidecar = FirestoreSidecar(**kwargs)
+                atexit.register(_sidecar.stop)
+    return _sidecar
+
+
+def get_firebase_config(version: RunVersion) -> Dict:
+    return {
+        "token": version.firebase_token,
+        "guildId": version.guild_id,
+        "firebaseConfig": {
+            "apiKey": apiKey,
+            "authDomain": authDomain,
+            "projectId": projectId,
+            "storageBucket": storageBucket,
+            "databaseURL": databaseURL,
+            "appId": appId,
+        },
+    }
+
+
+def fetch_guild_jobs(version: RunVersion):
+    """
+    sidecar 로 guild jobs 를 읽어 guild_jobs.json 에 쓴다. (run.sh 와 같은 결과)
+    """
+    jobs = get_firestore_sidecar().call("getJobs", get_firebase_config(version))
+
+    config_path = version.get_account_path()
+    with open(config_path / "guild_jobs.json", "wt") as fout:
+        fout.write(json.dumps(jobs))
+
+
+def is_sidecar_available() -> bool:
+    """
+    settings 에서 켰고, 최근 SIDECAR_RETRY_SECONDS 동안 실패하지 않았으면 True
+    """
+    if not get_sidecar_settings().get("enabled", False):
+        return False
+    return (
+        _sidecar_failed_at is None
+        or time.monotonic() - _sidecar_failed_at >= SIDECAR_RETRY_SECONDS
+    )
+
+
 def run_nodejs(version: RunVersion):
+    global _sidecar_failed_at
+    if is_sidecar_available():
+        try:
+            fetch_guild_jobs(version=version)
+            _sidecar_failed_at = None
+            return
+        except FirestoreSidecarError as e:
+            _sidecar_failed_at = time.monotonic()
+            print(f"[Firestore] sidecar failed : {e} | run.sh")
+
     config_path = version.get_account_path()
 
     cwd = settings.SOURCE_PATH / "ts-firestore"
@@ -45,18 +281,7 @@ def run_nodejs(version: RunVersion):
 
 
 def write_fireston_json(version: RunVersion):
-    config = {
-        "token": version.firebase_token,
-        "guildId": version.guild_id,
-        "firebaseConfig": {
-            "apiKey": apiKey,
-            "authDomain": authDomain,
-            "projectId": projectId,
-            "storageBucket": storageBucket,
-            "databaseURL": databaseURL,
-            "appId": appId,
-        },
-    }
+    config = get_firebase_config(version)
 
     config_path = version.get_account_path()
 
@@ -64,6 +289,111 @@ def write_fireston_json(version: RunVersion):
         fout.write(json.dumps(config))
 
 
+def get_max_region(version: RunVersion) -> int:
+    """
+    방문한 region 중 가장 높은 region 의 순서. (relative_region 의 기준)
+    """
+    regions = list(
+        TSRegion.objects.filter(content_category=1)
+        .order_by("level_from", "ordering")
+        .all()
+    )
+    regions_map = {r.id: idx for idx, r in enumerate(regions, 1)}
+    max_region = 0
+    for visited in PlayerVisitedRegion.objects.at_version(version).all():
+        max_region = max(max_region, regions_map.get(visited.region_id, 0))
+    return max_region
+
+
+def convert_relative_region(requirements: str, max_region: int) -> str:
+    """
+    relative_region 요구사항을 region 으로 바꾼다.
+
+    :param requirements: PlayerJob.requirements (json)
+    :param max_region: get_max_region()
+    :return:
+    """
+    requirements = json.loads(requirements) if requirements else []
+
+    for requirement in requirements:
+        if requirement.get("Type") == "relative_region":
+            requirement["Value"] = max_region + convert_number_as_int(
+                requirement.get("Value")
+            )
+            requirement["Type"] = "region"
+
+    return json.dumps(requirements, separators=(",", ":")) if requirements else ""
+
+
+def merge_guild_jobs(version: RunVersion, data: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    guild jobs 를 version 의 PlayerJob 에 합친다.
+        - 같은 job_location 에 같은 job 이 있으면 completed_at, collectable_from 만 갱신
+        - 같은 job_location 에 다른 job 이 있으면 무시
+        - 없으면 추가 (relative_region -> region)
+
+    :param version:
+    :param data: guild_jobs.json
+    :return: {'inserted': n, 'updated': n, 'matched': n}
+    """
+    bulk_list, _ = PlayerJob.create_instance(data=data, version_id=version.id)
+
+    exists_map: Dict[int, PlayerJob] = {}
+    for job in PlayerJob.objects.at_version(version).order_by("id").all():
+        exists_map.setdefault(job.job_location_id, job)
+
+    max_region = None
+    inserted: List[PlayerJob] = []
+    updated: Dict[int, PlayerJob] = {}
+    update_fields = set()
+    matched = 0
+
+    instance: PlayerJob
+    for instance in bulk_list:
+        exists = exists_map.get(instance.job_location_id)
+
+        if exists:
+            if exists.job_id == instance.job_id:
+                matched += 1
+                for field in ("completed_at", "collectable_from"):
+                    if getattr(exists, field) != getattr(instance, field):
+                        setattr(exists, field, getattr(instance, field))
+                        if exists.pk:
+                            update_fields.add(field)
+                            updated[exists.pk] = exists
+            continue
+
+        if max_region is None:
+            max_region = get_max_region(version=version)
+
+        instance.requirements = convert_relative_region(
+            requirements=instance.requirements, max_region=max_region
+        )
+        exists_map[instance.job_location_id] = instance
+        inserted.append(instance)
+
+    if updated:
+        now = timezone.now()
+        changed = list(updated.values())
+        for job in changed:
+            job.modified = now
+
+        PlayerJob.split_history(version=version, instances=changed)
+        PlayerJob.objects.bulk_update(changed, sorted(update_fields) + ["modified"])
+
+    if inserted:
+        PlayerJob.objects.bulk_create(inserted, 100)
+        for instance in inserted:
+            print(
+                f"added new guild job: {instance.job_id} / location id: {instance.job_location_id}"
+            )
+
+    if matched:
+        version.set_completed(save=True, update_fields=[])
+
+    return {"inserted": len(inserted), "updated": len(updated), "matched": matched}
+
+
 def read_fireston_json(version: RunVersion):
     config_path = version.get_account_path()
     jobs = config_path / "guild_jobs.json"
@@ -71,59 +401,36 @@ def read_fireston_json(version: RunVersion):
         txt = jobs.read_text(encoding="utf-8")
         json_data = json.loads(txt, strict=False)
 
-        bulk_list, _ = PlayerJob.create_instance(data=json_data, version_id=version.id)
+        merge_guild_jobs(version=version, data=json_data)
 
-        regions = list(
-            TSRegion.objects.filter(content_category=1)
-            .order_by("level_from", "ordering")
-            .all()
-        )
-        regions_map = {r.id: idx for idx, r in enumerate(regions, 1)}
-        max_region = 0
-        for visited in PlayerVisitedRegion.objects.filter(version_id=version.id).all():
-            max_region = max(max_region, regions_map.get(visited.region_id, 0))
-
-        for instance in bulk_list:
-            exists = PlayerJob.objects.filter(
-                version_id=version.id, job_location_id=instance.job_location_id
-            ).first()
-
-            if exists:
-                if exists.job_id == instance.job_id:
-                    exists.completed_at = instance.completed_at
-                    exists.collectable_from = instance.collectable_from
-                    exists.save()
-                    version.set_completed(save=True, update_fields=[])
-                continue
 
-            instance: PlayerJob
-            requirements = json.loads(instance.requirements)
+def fetch_guild_jobs_text(version: RunVersion) -> Optional[str]:
+    """
+    node 로 guild_jobs.json 을 만들고 내용을 돌려준다. (없으면 None)
+    """
+    write_fireston_json(version=version)
 
-            for idx, requirement in enumerate(requirements):
-                _value = convert_number_as_int(requirement.get("Value"))
-                _type = requirement.get("Type")
+    run_nodejs(
+        version=version,
+    )
 
-                if _type == "relative_region":
-                    _value = max_region + _value
-                    requirements[idx]["Value"] = _value
-                    requirements[idx]["Type"] = "region"
-            instance.requirements = (
-                json.dumps(requirements, separators=(",", ":")) if requirements else ""
-            )
-            instance.save()
-            print(
-                f"added new guild job: {instance.job_id} / location id: {instance.job_location_id}"
-            )
+    jobs = version.get_account_path() / "guild_jobs.json"
+    if jobs.exists():
+        return jobs.read_text(encoding="utf-8")
+    return None
 
 
 def execute_firestore(version: RunVersion):
     if not version.guild_id:
         return
 
-    write_fireston_json(version=version)
-
-    run_nodejs(
-        version=version,
+    # 같은 guild 의 계정은 먼저 가져온 계정의 jobs 를 같이 쓴다.
+    text = get_shared_cache().get_or_fetch(
+        key=f"guild:{version.guild_id}:jobs",
+        fetch=lambda: fetch_guild_jobs_text(version=version),
     )
+    if text is not None:
+        with open(version.get_account_path() / "guild_jobs.json", "wt") as fout:
+            fout.write(text)
 
     read_fireston_json(version=version)
@@ -0,0 +1,269 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection, close_old_connections
+from django.test import override_settings
+
+from app_root.servers.models import EndPoint, RunVersion
+from app_root.servers.retention import retention_models
+from app_root.strategies.standin import StandInServer
+from app_root.users.models import User
+from core.models.utils import chunk_list
+
+###########################################################################
+# Load driver
+#
+#   StandInServer 에 N 개의 synthetic 계정으로 Strategy.run 을 실행한다.
+#   - 계정 / round 마다 실행 시간, DB query 수 / 시간을 기록한다.
+#   - 서버 쪽 요청 별 응답 시간도 같이 출력한다.
+#   - sleep (command jitter, Game:Sleep) 과 firestore (node) 는 실행하지 않는다.
+#   - EndPoint 는 global table 이므로 load test 용 DB 에서만 실행한다. (is_loadtest_database)
+#     끝나면 EndPoint 를 실행 전으로 되돌리고, synthetic 계정의 RunVersion / Player* row 를 지운다.
+#
+#       report = LoadDriver(accounts=100, workers=8).run()
+#       report.dump()
+###########################################################################
+USERNAME_PREFIX = "loadtest"
+
+
+class LoadTestDatabaseError(Exception):
+    """
+    load test 용 DB 가 아니다.
+    """
+
+
+def is_loadtest_database() -> bool:
+    """
+        settings.LOADTEST_DATABASE = True 인 DB 또는 sqlite 에서만 실행한다.
+    :return:
+    """
+    return bool(getattr(settings, "LOADTEST_DATABASE", False)) or (
+        connection.vendor == "sqlite"
+    )
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+        nearest-rank percentile
+    :param values:
+    :param p: 0 ~ 100
+    :return:
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LoadRun:
+    """
+    계정 1개의 Strategy.run 1번.
+    """
+
+    username: str
+    wall: float
+    queries: int
+    query_time: float
+    error: Optional[Exception]
+
+    def __init__(self, *, username, wall, queries, query_time, error):
+        self.username = username
+        self.wall = wall
+        self.queries = queries
+        self.query_time = query_time
+        self.error = error
+
+
+class LoadReport:
+    runs: List[LoadRun]
+    requests: Dict[str, List[float]]
+    elapsed: float
+
+    def __init__(self):
+        self.runs = []
+        self.requests = {}
+        self.elapsed = 0.0
+
+    @property
+    def errors(self) -> List[LoadRun]:
+        return [o for o in self.runs if o.error]
+
+    @property
+    def throughput(self) -> float:
+        """
+        초당 Strategy.run 수
+        """
+        return len(self.runs) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def request_count(self) -> int:
+        return sum(len(o) for o in self.requests.values())
+
+    @property
+    def queries(self) -> int:
+        return sum(o.queries for o in self.runs)
+
+    @property
+    def query_time(self) -> float:
+        return sum(o.query_time for o in self.runs)
+
+    @staticmethod
+    def _latency(values: List[float]) -> str:
+        return " / ".join(
+            f"p{p} {percentile(values, p) * 1000:8.2f} ms" for p in (50, 90, 99)
+        )
+
+    def dump(self):
+        print(
+            f"runs {len(self.runs)} ({len(self.errors)} errors) in {self.elapsed:.2f} s"
+            f" | {self.throughput:.2f} runs/s"
+            f" | {self.request_count / self.elapsed if self.elapsed else 0:.2f} requests/s"
+        )
+        print(f"run      | {self._latency([o.wall for o in self.runs])}")
+        print(
+            f"db       | {self.queries} queries"
+            f" ({self.queries / len(self.runs) if self.runs else 0:.1f} / run)"
+            f" | {self.query_time:.2f} s"
+            f" ({self.query_time / self.elapsed * 100 if self.elapsed else 0:.1f} % of wall)"
+        )
+        for path, values in sorted(self.requests.items()):
+            print(f"  {path:45s} {len(values):6d} | {self._latency(values)}")
+        for run in self.errors[:10]:
+            print(f"error : {run.username} {run.error!r}")
+
+
+class LoadDriver:
+    accounts: int
+    workers: int
+    rounds: int
+    report: LoadReport
+
+    def __init__(
+        self,
+        accounts: int = 10,
+        workers: int = 4,
+        rounds: int = 1,
+        seeds: Optional[List[str]] = None,
+        prefix: str = USERNAME_PREFIX,
+        keep: bool = False,
+    ):
+        """
+        :param accounts: synthetic 계정 수
+        :param workers: 동시에 실행할 thread 수 (1 이면 현재 thread 에서 실행)
+        :param rounds: 계정 별 Strategy.run 횟수
+        :param seeds: 계정의 init data fixture (StandInServer)
+        :param prefix: synthetic 계정 username prefix
+        :param keep: True 이면 끝난 후 계정을 지우지 않는다.
+        """
+        self.accounts = accounts
+        self.workers = workers
+        self.rounds = rounds
+        self.prefix = prefix
+        self.keep = keep
+        self.server = StandInServer(seeds=seeds)
+        self.report = LoadReport()
+        self.lock = threading.Lock()
+
+    def create_users(self) -> List[User]:
+        ret = []
+        for idx in range(self.accounts):
+            username = f"{self.prefix}_{idx:05d}"
+            user = User.objects.filter(username=username).first()
+            if not user:
+                user = User.objects.create_user(
+                    username=username, android_id=f"{self.prefix[:8]}{idx:08d}"
+                )
+            ret.append(user)
+        return ret
+
+    def delete_users(self, users: List[User]):
+        """
+        synthetic 계정과 계정의 RunVersion / Player* row 를 지운다.
+        """
+        user_ids = [o.id for o in users]
+        version_ids = list(
+            RunVersion.objects.filter(user_id__in=user_ids).values_list("id", flat=True)
+        )
+        for chunk in chunk_list(version_ids, 500):
+            for model in retention_models():
+                model.objects.filter(version_id__in=chunk).delete()
+            RunVersion.objects.filter(id__in=chunk).delete()
+        User.objects.filter(id__in=user_ids).delete()
+
+    def run_one(self, user: User):
+        from app_root.strategies.utils import Strategy
+
+        stats = {"queries": 0, "time": 0.0}
+
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats["queries"] += 1
+                stats["time"] += time.perf_counter() - started
+
+        error = None
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            try:
+                Strategy(user_id=user.id, worker_name=f"{self.prefix}-driver").run()
+            except Exception as e:
+                error = e
+
+        run = LoadRun(
+            username=user.username,
+            wall=time.perf_counter() - started,
+            queries=stats["queries"],
+            query_time=stats["time"],
+            error=error,
+        )
+        with self.lock:
+            self.report.runs.append(run)
+
+    def run_in_thread(self, user: User):
+        close_old_connections()
+        try:
+            self.run_one(user)
+        finally:
+            connection.close()
+
+    def run(self) -> LoadReport:
+        if not is_loadtest_database():
+            raise LoadTestDatabaseError(
+                f"{connection.vendor} : set settings.LOADTEST_DATABASE on a load test DB"
+            )
+
+        # 로그인 (EndpointHelper) 이 EndPoint 를 stand-in url 로 바꾼다.
+        endpoints = list(EndPoint.objects.all())
+        users = self.create_users()
+        self.server.start()
+
+        try:
+            with override_settings(GAME_SERVER_URL=self.server.url), mock.patch(
+                "app_root.strategies.commands.sleep"
+            ), mock.patch("app_root.strategies.firestore.run_nodejs"):
+                started = time.perf_counter()
+                for _ in range(self.rounds):
+                    if self.workers <= 1:
+                        for user in users:
+                            self.run_one(user)
+                    else:
+                        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                            list(executor.map(self.run_in_thread, users))
+                self.report.elapsed = time.perf_counter() - started
+        finally:
+            self.server.stop()
+            self.report.requests = self.server.stats()
+            EndPoint.objects.all().delete()
+            EndPoint.objects.bulk_create(endpoints)
+            if not self.keep:
+                self.delete_users(users)
+
+        return self.report
@@ -1,7 +1,9 @@
+import heapq
 import math
-from collections import OrderedDict
+from array import array
+from collections import deque
 from datetime import timedelta, datetime
-from typing import List, Set, Dict, Type, Optional, Tuple, Union
+from typing import List, Set, Dict, Type, Optional, Tuple, Union, Deque
 
 from django.conf import settings
 
@@ -119,7 +121,9 @@ def jobs_find(
     :param expired_jobs:
     :return:
     """
-    queryset = PlayerJob.objects.filter(version_id=version.id).all()
+    queryset = PlayerJob.objects.at_version(version).select_related(
+        "required_article", "job_location__region"
+    )
     article_dict = {}
 
     ret = []
@@ -201,10 +205,10 @@ def jobs_find_locked_job_location_ids(
     }
     quests = {
         q.job_location_id: (q.milestone, q.progress)
-        for q in PlayerQuest.objects.filter(version_id=version.id).all()
+        for q in PlayerQuest.objects.at_version(version).all()
     }
 
-    for pm in PlayerMap.objects.filter(version_id=version.id).all():
+    for pm in PlayerMap.objects.at_version(version).all():
         next_spot_ids = pm.next_spot_ids
         for spot_id in next_spot_ids:
             if spot_id not in precondition_jobs:
@@ -241,6 +245,7 @@ def jobs_find_locked_job_location_ids(
 def jobs_set_collect(version: RunVersion, job: PlayerJob):
     if job:
         job.collectable_from = version.now + timedelta(days=365)
+        PlayerJob.split_history(version=version, instances=[job])
         job.save(update_fields=["collectable_from"])
 
 
@@ -274,7 +279,7 @@ def trains_find(
     ret = []
 
     queryset = (
-        PlayerTrain.objects.filter(version_id=version.id)
+        PlayerTrain.objects.at_version(version)
         .prefetch_related("level", "train", "load")
         .all()
     )
@@ -361,6 +366,7 @@ def trains_unload(version: RunVersion, train: PlayerTrain):
     train.has_load = False
     train.load_amount = 0
     train.load_id = None
+    PlayerTrain.split_history(version=version, instances=[train])
     train.save(
         update_fields=[
             "has_load",
@@ -410,6 +416,7 @@ def trains_set_destination(
     train.route_definition_id = definition_id
     train.route_departure_time = departure_at
     train.route_arrival_time = arrival_at
+    PlayerTrain.split_history(version=version, instances=[train])
     train.save(
         update_fields=[
             "has_load",
@@ -457,6 +464,7 @@ def jobs_set_dispatched(
             job.collectable_from = arrival_at
             update_fields.append("collectable_from")
 
+        PlayerJob.split_history(version=version, instances=[job])
         job.save(update_fields=update_fields)
 
 
@@ -498,6 +506,7 @@ def trains_set_job(
     train.route_definition_id = definition_id
     train.route_departure_time = departure_at
     train.route_arrival_time = arrival_at
+    PlayerTrain.split_history(version=version, instances=[train])
     train.save(
         update_fields=[
             "route_type",
@@ -516,6 +525,7 @@ def trains_set_upgrade(
 ):
     if train:
         train.level_id = upgrade.train_level
+        PlayerTrain.split_history(version=version, instances=[train])
         train.save(update_fields=["level_id"])
 
         for article_id, article_amount in upgrade.price_to_dict.items():
@@ -584,7 +594,7 @@ def article_find_destination(
 ) -> Dict[int, List[TSDestination]]:
     visited_region_list = sorted(
         list(
-            PlayerVisitedRegion.objects.filter(version_id=version.id).values_list(
+            PlayerVisitedRegion.objects.at_version(version).values_list(
                 "region_id", flat=True
             )
         )
@@ -633,7 +643,11 @@ def article_find_contract(
 
     ret = {}
 
-    for contract_list in PlayerContractList.objects.filter(version_id=version.id).all():
+    contracts_by_list: Dict[int, List[PlayerContract]] = {}
+    for contract in PlayerContract.objects.at_version(version).all():
+        contracts_by_list.setdefault(contract.contract_list_id, []).append(contract)
+
+    for contract_list in PlayerContractList.objects.at_version(version).all():
         # contract_list.contract_list_id == 1 => ship.
 
         # fixme: expired check
@@ -646,9 +660,7 @@ def article_find_contract(
             ):
                 continue
 
-        for contract in PlayerContract.objects.filter(
-            contract_list_id=contract_list.id
-        ).all():
+        for contract in contracts_by_list.get(contract_list.id, []):
             # fixme: expired check
             # fixme: article exist in reward?
             # yield contract
@@ -699,7 +711,7 @@ def article_source_find_jobs(version: RunVersion, article_id: int) -> List[Playe
     """
     ret = []
 
-    for job in PlayerJob.objects.filter(version_id=version.id).all():
+    for job in PlayerJob.objects.at_version(version).all():
         rewards = job.reward_to_article_dict
 
         found = False
@@ -725,7 +737,7 @@ def destination_find(version: RunVersion, destination_id: int) -> TSDestination:
 # Gold Destination 검색 함수
 ###########################################################################
 def destination_gold_find_iter(version: RunVersion) -> List[PlayerDestination]:
-    queryset = PlayerDestination.objects.filter(version_id=version.id).order_by("pk")
+    queryset = PlayerDestination.objects.at_version(version).order_by("pk")
     return list(queryset.all())
 
 
@@ -737,6 +749,7 @@ def Player_destination_set_used(version: RunVersion, dest: PlayerDestination):
         dest.train_limit_refresh_time = version.now + timedelta(
             seconds=dest.definition.refresh_time
         )
+        PlayerDestination.split_history(version=version, instances=[dest])
         dest.save(
             update_fields=[
                 "train_limit_refresh_at",
@@ -751,6 +764,7 @@ def Player_destination_set_used(version: RunVersion, dest: PlayerDestination):
 def contract_set_used(version: RunVersion, contract: PlayerContract):
     if contract:
         contract.expires_at = version.init_server_1 + timedelta(hours=-24)
+        PlayerContract.split_history(version=version, instances=[contract])
         contract.save(
             update_fields=[
                 "expires_at",
@@ -761,6 +775,7 @@ def contract_set_used(version: RunVersion, contract: PlayerContract):
 def contract_set_active(version: RunVersion, contract: PlayerContract):
     if contract:
         contract.expires_at = version.now + timedelta(hours=10)
+        PlayerContract.split_history(version=version, instances=[contract])
         contract.save(
             update_fields=[
                 "expires_at",
@@ -771,12 +786,20 @@ def contract_set_active(version: RunVersion, contract: PlayerContract):
 def contract_get_ship(version: RunVersion) -> PlayerContract:
     delta = timedelta(minutes=1)
 
-    for contract_list in PlayerContractList.objects.filter(
-        version_id=version.id, contract_list_id=3
-    ).all():
-        for contract in PlayerContract.objects.filter(
-            contract_list_id=contract_list.id
-        ).all():
+    contract_lists = list(
+        PlayerContractList.objects.at_version(version).filter(contract_list_id=3).all()
+    )
+
+    contracts_by_list: Dict[int, List[PlayerContract]] = {}
+    for contract in (
+        PlayerContract.objects.at_version(version)
+        .filter(contract_list_id__in=[o.id for o in contract_lists])
+        .all()
+    ):
+        contracts_by_list.setdefault(contract.contract_list_id, []).append(contract)
+
+    for contract_list in contract_lists:
+        for contract in contracts_by_list.get(contract_list.id, []):
             # fixme: expired check
             # fixme: article exist in reward?
             # yield contract
@@ -804,9 +827,11 @@ def factory_find_need_create(version: RunVersion) -> List[TSFactory]:
     for factory in TSFactory.objects.filter(
         type=1, level_from__lte=version.level_id
     ).all():
-        player_factory = PlayerFactory.objects.filter(
-            version_id=version.id, factory_id=factory.id
-        ).first()
+        player_factory = (
+            PlayerFactory.objects.at_version(version)
+            .filter(factory_id=factory.id)
+            .first()
+        )
         if player_factory:
             continue
         ret.append(factory)
@@ -840,12 +865,208 @@ def factory_find_possible_products(
 def factory_find_player_factory(
     version: RunVersion, factory_id=None
 ) -> List[PlayerFactory]:
-    queryset = PlayerFactory.objects.filter(version=version).all()
+    queryset = PlayerFactory.objects.at_version(version).all()
     if factory_id:
         queryset = queryset.filter(factory_id=factory_id)
     return list(queryset.all())
 
 
+class FactoryQueue:
+    """
+    PlayerFactory 1개의 주문 대기열 (메모리).
+
+    orders      : index 순서의 전체 주문
+    order_ids   : orders 의 id
+    finish_heap : (finish_time, index, order_id) - 완료시간이 정해진 주문. (수거된 주문은 lazy 삭제)
+    waiting     : 완료시간이 아직 없는 주문 (slot 밖) - slot 이 비면 앞에서부터 완료시간이 정해진다.
+    """
+
+    player_factory: PlayerFactory
+    orders: List[PlayerFactoryProductOrder]
+    order_ids: Set[int]
+    finish_heap: List[Tuple[datetime, int, int]]
+    waiting: Deque[PlayerFactoryProductOrder]
+
+    def __init__(
+        self, player_factory: PlayerFactory, orders: List[PlayerFactoryProductOrder]
+    ):
+        self.player_factory = player_factory
+        self.orders = orders
+        self.order_ids = {order.id for order in orders}
+        self.finish_heap = []
+        self.waiting = deque()
+
+        for order in orders:
+            order.player_factory = player_factory
+            if order.finish_time:
+                heapq.heappush(
+                    self.finish_heap, (order.finish_time, order.index, order.id)
+                )
+            else:
+                self.waiting.append(order)
+
+    @property
+    def slot_count(self) -> int:
+        return self.player_factory.slot_count
+
+    def completed_count(self, now: datetime) -> int:
+        """
+        앞에서부터 완료된 주문 수. (slot_count 까지만 본다)
+        """
+        ret = 0
+        for order in self.orders:
+            if ret >= self.slot_count or order.is_processing(now=now):
+                break
+            ret += 1
+        return ret
+
+    def split(
+        self, now: datetime
+    ) -> Tuple[
+        List[PlayerFactoryProductOrder],
+        List[PlayerFactoryProductOrder],
+        List[PlayerFactoryProductOrder],
+    ]:
+        """
+        completed, processing, waiting 으로 분류.
+        완료된 주문 다음 1개가 processing, 나머지는 waiting.
+        """
+        idx = self.completed_count(now=now)
+        return self.orders[:idx], self.orders[idx : idx + 1], self.orders[idx + 1 :]
+
+    def next_finish_time(self, now: datetime) -> Optional[datetime]:
+        """
+        now 이후 가장 먼저 완료되는 시간.
+        """
+        while self.finish_heap:
+            finish_time, _, order_id = self.finish_heap[0]
+            if order_id in self.order_ids and finish_time > now:
+                return finish_time
+            heapq.heappop(self.finish_heap)
+        return None
+
+    def can_order(self, now: datetime) -> bool:
+        if len(self.orders) - self.completed_count(now=now) >= self.slot_count:
+            return False
+        return True
+
+    def order(
+        self, version: RunVersion, product: TSProduct
+    ) -> Optional[PlayerFactoryProductOrder]:
+        """
+        주문 추가. 마지막 주문이 끝나는 시간(또는 지금) 부터 생산된다.
+        """
+        if not self.can_order(now=version.now):
+            return None
+
+        index = len(self.orders) + 1
+        finish_time = version.now + timedelta(seconds=product.craft_time)
+
+        if self.orders:
+            last = self.orders[-1]
+            if len(self.orders) < self.slot_count and last.finish_time:
+                finish_time = max(version.now, last.finish_time) + timedelta(
+                    seconds=product.craft_time
+                )
+            else:
+                finish_time = None
+
+        instance = PlayerFactoryProductOrder.objects.create(
+            version=version,
+            player_factory=self.player_factory,
+            article_id=product.article_id,
+            index=index,
+            amount=product.article_amount,
+            craft_time=product.craft_time,
+            finish_time=finish_time,
+            finishes_at=finish_time,
+        )
+        self.orders.append(instance)
+        self.order_ids.add(instance.id)
+        if finish_time:
+            heapq.heappush(self.finish_heap, (finish_time, index, instance.id))
+        else:
+            self.waiting.append(instance)
+
+        return instance
+
+    def collect(self, version: RunVersion, order: PlayerFactoryProductOrder) -> bool:
+        """
+        완료된 주문을 꺼내고, 남은 주문의 index / 완료시간을 다시 계산해서 한번에 저장.
+        """
+        if not order.is_completed(now=version.now):
+            return False
+
+        self.orders = [o for o in self.orders if o.id != order.id]
+        self.order_ids.discard(order.id)
+        PlayerFactoryProductOrder.split_history(version=version, instances=[order])
+        order.delete()
+
+        changed = []
+        now = version.now
+        for index, next_order in enumerate(self.orders, 1):
+            is_changed = next_order.index != index
+            next_order.index = index
+
+            if next_order.finish_time and now < next_order.finish_time:
+                now = next_order.finish_time
+
+            if index <= self.slot_count and not next_order.finish_time:
+                finish_time = now + timedelta(seconds=next_order.craft_time)
+                next_order.finish_time = finish_time
+                next_order.finishes_at = finish_time
+                now = finish_time
+                is_changed = True
+
+                if self.waiting and self.waiting[0].id == next_order.id:
+                    self.waiting.popleft()
+                heapq.heappush(self.finish_heap, (finish_time, index, next_order.id))
+
+            if is_changed:
+                changed.append(next_order)
+
+        if changed:
+            PlayerFactoryProductOrder.split_history(version=version, instances=changed)
+            PlayerFactoryProductOrder.objects.bulk_update(
+                changed, ["index", "finish_time", "finishes_at"]
+            )
+
+        return True
+
+
+def factory_get_queue(version: RunVersion, factory_id: int) -> Optional[FactoryQueue]:
+    """
+    RunVersion 단위로 캐시되는 공장 대기열.
+    """
+    queues: Dict[int, FactoryQueue] = getattr(version, "__factory_queues", None)
+    if queues is None:
+        queues = {}
+        setattr(version, "__factory_queues", queues)
+
+    factory_id = int(factory_id)
+    if factory_id not in queues:
+        player_factory = (
+            PlayerFactory.objects.at_version(version)
+            .filter(factory_id=factory_id)
+            .first()
+        )
+        if not player_factory:
+            return None
+
+        queryset = (
+            PlayerFactoryProductOrder.objects.at_version(version)
+            .filter(player_factory=player_factory)
+            .prefetch_related("article")
+            .order_by("index")
+            .all()
+        )
+        queues[factory_id] = FactoryQueue(
+            player_factory=player_factory, orders=list(queryset)
+        )
+
+    return queues[factory_id]
+
+
 def factory_find_product_orders(
     version: RunVersion, factory_id: int, article_id: int = None
 ) -> Tuple[
@@ -853,33 +1074,11 @@ def factory_find_product_orders(
     List[PlayerFactoryProductOrder],
     List[PlayerFactoryProductOrder],
 ]:
-    player_factory = PlayerFactory.objects.filter(
-        version=version, factory_id=factory_id
-    ).first()
-    queryset = (
-        PlayerFactoryProductOrder.objects.filter(
-            player_factory=player_factory,
-        )
-        .prefetch_related("article")
-        .order_by("index")
-        .all()
-    )
-    completed_list: List[PlayerFactoryProductOrder] = []
-    processing_list: List[PlayerFactoryProductOrder] = []
-    waiting_list: List[PlayerFactoryProductOrder] = []
-
-    idx = 0
-    order_list = list(queryset.all())
-
-    for order in order_list:
-        if len(waiting_list) > 0 or len(processing_list) > 0:
-            waiting_list.append(order)
-        elif len(completed_list) >= player_factory.slot_count or order.is_processing(
-            now=version.now
-        ):
-            processing_list.append(order)
-        else:
-            completed_list.append(order)
+    queue = factory_get_queue(version=version, factory_id=factory_id)
+    if not queue:
+        return [], [], []
+
+    completed_list, processing_list, waiting_list = queue.split(now=version.now)
 
     if article_id:
         completed_list = [o for o in completed_list if o.article_id == article_id]
@@ -908,9 +1107,6 @@ def factory_find_destination_and_factory_only_products(
 
 
 def factory_collect_product(version: RunVersion, order: PlayerFactoryProductOrder):
-    player_factory = order.player_factory
-    slot_count = player_factory.slot_count
-
     if not order.is_completed(now=version.now):
         return
 
@@ -919,99 +1115,27 @@ def factory_collect_product(version: RunVersion, order: PlayerFactoryProductOrde
         version=version, article_id=order.article_id, amount=order.amount
     )
 
-    completed, processing, waiting = factory_find_product_orders(
-        version=version, factory_id=player_factory.factory_id
-    )
-    order_list = completed + processing + waiting
-
-    order_list = [o for o in order_list if o.id != order.id]
-
     # 기존 데이터 index 변경, 완료시간 변경.
-    order.delete()
-    now = version.now
-    for index, next_order in enumerate(order_list, 1):
-        param = {}
-
-        param.update({"index": [next_order.index, index]})
-        next_order.index = index
-        update_fields = ["index"]
-
-        if next_order.finish_time and now < next_order.finish_time:
-            now = next_order.finish_time
-
-        if next_order.index <= slot_count and not next_order.finish_time:
-            finish_time = now + timedelta(seconds=next_order.craft_time)
-
-            param.update({"finish_time": [next_order.finish_time, finish_time]})
-            next_order.finish_time = finish_time
-            update_fields.append("finish_time")
-
-            param.update({"finishes_at": [next_order.finishes_at, finish_time]})
-            next_order.finishes_at = finish_time
-            update_fields.append("finishes_at")
-            now = finish_time
-
-        next_order.save(update_fields=update_fields)
+    queue = factory_get_queue(
+        version=version, factory_id=order.player_factory.factory_id
+    )
+    queue.collect(version=version, order=order)
 
 
 def factory_can_order_product(version: RunVersion, product: TSProduct) -> bool:
-    player_factory = PlayerFactory.objects.filter(
-        version=version, factory_id=product.factory_id
-    ).first()
-    slot_count = player_factory.slot_count
-
-    completed, processing, waiting = factory_find_product_orders(
-        version=version, factory_id=product.factory_id
-    )
-    order_list = completed + processing + waiting
-    if len(processing) + len(waiting) >= slot_count:
+    queue = factory_get_queue(version=version, factory_id=product.factory_id)
+    if not queue:
         return False
-    return True
+    return queue.can_order(now=version.now)
 
 
 def factory_order_product(version: RunVersion, product: TSProduct):
-    player_factory = PlayerFactory.objects.filter(
-        version=version, factory_id=product.factory_id
-    ).first()
-    slot_count = player_factory.slot_count
-
-    completed, processing, waiting = factory_find_product_orders(
-        version=version, factory_id=product.factory_id
-    )
-    order_list = completed + processing + waiting
-
-    if len(processing) + len(waiting) >= slot_count:
+    queue = factory_get_queue(version=version, factory_id=product.factory_id)
+    if not queue:
         return
 
-    player_factory = player_factory
-    article_id = product.article_id
-    index = 1
-    amount = product.article_amount
-    craft_time = product.craft_time
-    finish_time = version.now + timedelta(seconds=product.craft_time)
-    finishes_at = finish_time
-
-    if len(order_list) < 1:
-        pass
-    elif 1 <= len(order_list) < slot_count:
-        index = len(order_list) + 1
-        finish_time = order_list[-1].finish_time + timedelta(seconds=product.craft_time)
-        finishes_at = finish_time
-    else:
-        index = len(order_list) + 1
-        finish_time = None
-        finishes_at = None
-
-    PlayerFactoryProductOrder.objects.create(
-        version=version,
-        player_factory=player_factory,
-        article_id=article_id,
-        index=index,
-        amount=amount,
-        craft_time=craft_time,
-        finish_time=finish_time,
-        finishes_at=finishes_at,
-    )
+    if not queue.order(version=version, product=product):
+        return
 
     # 사용된 재료 빼고
     required_article_ids = list(map(int, product.article_ids.split(";")))
@@ -1045,6 +1169,8 @@ def factory_order_product(version: RunVersion, product: TSProduct):
 
 
 class TRAIN:
+    __slots__ = ("instance_id", "capacity")
+
     instance_id: int
     capacity: int
 
@@ -1054,6 +1180,8 @@ class TRAIN:
 
 
 class JOB:
+    __slots__ = ("article_id", "total_count", "curr_count", "sp")
+
     article_id: int
     total_count: int
     curr_count: int
@@ -1067,10 +1195,10 @@ class JOB:
 
 
 class WAREHOUSE:
+    __slots__ = ("article_id", "article_amount")
+
     article_id: int
     article_amount: int
-    factory_count: int
-    contract_count: int
 
     def __init__(self, article_id: int, amount: int):
         self.article_id = article_id
@@ -1078,57 +1206,151 @@ class WAREHOUSE:
 
 
 class JobDisptchingMixin:
+    """
+    train / job 을 0..n-1 의 dense index 로 매핑해서 탐색한다.
+    (inner loop 에서 dict hashing 없이 array / bitmask 만 사용)
+
+    trains[i], jobs[j] : 추가된 순서대로의 TRAIN / JOB
+    compatibility[i] : i 번째 train 이 운송 가능한 job index 의 bitmask (bit j)
+    """
+
+    INFINITY_HOUR = 1000000
+    MAX_TRAINS = 15
+    MAX_DEPTH = 7
+
     number_of_dispatchers: int
-    trains: Dict[int, TRAIN]
-    jobs: Dict[int, JOB]
+
+    train_ids: List[int]
+    train_index: Dict[int, int]
+    trains: List[TRAIN]
+
+    job_ids: List[int]
+    job_index: Dict[int, int]
+    jobs: List[JOB]
+
+    compatibility: List[int]
     warehouse: Dict[int, WAREHOUSE]
 
-    train_job_relation: Dict[int, List[int]]
+    # dispatching() 에서 만들어지는 vector
+    train_capacity: array
+    job_total: array
+    job_curr: array
+    job_remain: array
+    job_stock: array
+    job_sp: array
+    article_count: int
+
+    train_order: List[int]
+    assigned_job_amount: array
+    assign: List[Tuple[int, int, int]]
+    best_score: Optional[Tuple[int, float, int]]
+    best_assign: List[Tuple[int, int, int]]
 
     def __init__(self, dispatcher):
         self.number_of_dispatchers = dispatcher
-        self.trains = {}
-        self.jobs = OrderedDict({})
+
+        self.train_ids = []
+        self.train_index = {}
+        self.trains = []
+
+        self.job_ids = []
+        self.job_index = {}
+        self.jobs = []
+
+        self.compatibility = []
         self.warehouse = {}
-        self.train_job_relation = {}
+
+        self.train_order = []
+        self.assigned_job_amount = array("q")
+        self.assign = []
+        self.best_score = None
+        self.best_assign = []
 
     def add_job_train(self, job: PlayerJob, trains: List[PlayerTrain]):
-        self.jobs.update(
-            {
-                job.id: JOB(
-                    article_id=job.required_article_id,
-                    total_count=job.required_amount,
-                    curr_count=job.current_progress,
-                    sp=job.reward_to_article_dict.get(100003, 0)
-                    or job.reward_to_article_dict.get(100000, 0),
-                )
-            }
+        instance = JOB(
+            article_id=job.required_article_id,
+            total_count=job.required_amount,
+            curr_count=job.current_progress,
+            sp=job.reward_to_article_dict.get(100003, 0)
+            or job.reward_to_article_dict.get(100000, 0),
         )
-        for train in trains:
-            self.trains.update(
-                {
-                    train.id: TRAIN(
-                        instance_id=train.instance_id, capacity=train.capacity()
-                    )
-                }
-            )
 
-            if train.id not in self.train_job_relation:
-                self.train_job_relation.update({train.id: []})
+        j = self.job_index.get(job.id)
+        if j is None:
+            j = len(self.jobs)
+            self.job_index[job.id] = j
+            self.job_ids.append(job.id)
+            self.jobs.append(instance)
+        else:
+            self.jobs[j] = instance
 
-            self.train_job_relation[train.id].append(job.id)
+        for train in trains:
+            i = self.train_index.get(train.id)
+            if i is None:
+                i = len(self.trains)
+                self.train_index[train.id] = i
+                self.train_ids.append(train.id)
+                self.trains.append(None)
+                self.compatibility.append(0)
+
+            self.trains[i] = TRAIN(
+                instance_id=train.instance_id, capacity=train.capacity()
+            )
+            self.compatibility[i] |= 1 << j
 
     def add_warehouse(self, article_id, amount):
         self.warehouse.update(
             {article_id: WAREHOUSE(article_id=article_id, amount=amount)}
         )
 
-    best_score: Tuple[int, float, int]
-    best_assign: List[Tuple[int, int, int]] = []
+    def _build_vectors(self):
+        self.train_capacity = array("q", (t.capacity for t in self.trains))
+        self.job_total = array("q", (j.total_count for j in self.jobs))
+        self.job_curr = array("q", (j.curr_count for j in self.jobs))
+        self.job_remain = array(
+            "q", (max(0, j.total_count - j.curr_count) for j in self.jobs)
+        )
+        self.job_stock = array(
+            "q",
+            (
+                self.warehouse[j.article_id].article_amount
+                if j.article_id in self.warehouse
+                else 0
+                for j in self.jobs
+            ),
+        )
+        self.job_sp = array("d", (j.sp for j in self.jobs))
+        self.article_count = len({j.article_id for j in self.jobs})
+
+    def _to_model_ids(
+        self, assign: List[Tuple[int, int, int]]
+    ) -> List[Tuple[int, int, int]]:
+        return [(self.train_ids[i], self.job_ids[j], amount) for i, j, amount in assign]
+
+    def get_progress(self) -> Tuple[float, int]:
+        """
+            현재 assign 상태의 (sp 기대값, 최소 완료 횟수)
+        :return:
+        """
+        ret = 0
+        hours = None
+        assigned = self.assigned_job_amount
+        for j, remain in enumerate(self.job_remain):
+            if remain < 1:
+                count = 0
+            elif assigned[j] < 1:
+                count = self.INFINITY_HOUR
+            else:
+                count = math.ceil(remain / assigned[j])
+                ret += self.job_sp[j] / remain * assigned[j]
+
+            if hours is None or count < hours:
+                hours = count
 
-    train_id_list: List[int] = []
-    assigned_job_amount: Dict[int, int] = {}
-    assign: List[Tuple[int, int, int]] = []
+        return ret, hours
+
+    def get_score(self, used_dispatcher: int) -> Tuple[int, float, int]:
+        raise NotImplementedError
 
     def recur(
         self, idx: int, used_dispatcher: int, with_warehouse_limit: bool, depth=0
@@ -1138,58 +1360,42 @@ class JobDisptchingMixin:
 
             if not self.best_score or self.best_score < score:
                 self.best_score = score
-                self.best_assign = [
-                    (train_id, job_id, amount)
-                    for train_id, job_id, amount in self.assign
-                ]
+                self.best_assign = self.assign.copy()
                 print(f" - Job Dispatch Updated : Score[{self.best_score}]")
-                print(f"     assign : {self.best_assign}")
+                print(f"     assign : {self._to_model_ids(self.best_assign)}")
 
         if used_dispatcher >= self.number_of_dispatchers:
             return
-        if idx >= len(self.train_id_list):
+        if idx >= len(self.train_order):
             return
-        if depth >= 7:
+        if depth >= self.MAX_DEPTH:
             return
 
-        train_id = self.train_id_list[idx]
+        i = self.train_order[idx]
+        train_capacity = self.train_capacity[i]
+        assigned = self.assigned_job_amount
 
-        train_capacity = self.trains[train_id].capacity
-        possible_job_id_list = []
+        mask = self.compatibility[i]
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            j = low.bit_length() - 1
 
-        for job_id in self.train_job_relation[train_id]:
-            total = self.jobs[job_id].total_count
-            curr = min(
-                total, self.jobs[job_id].curr_count + self.assigned_job_amount[job_id]
-            )
-            if curr < total:
-                possible_job_id_list.append(job_id)
-
-        for job_id in possible_job_id_list:
-            total = self.jobs[job_id].total_count
-            curr = min(
-                total, self.jobs[job_id].curr_count + self.assigned_job_amount[job_id]
-            )
+            total = self.job_total[j]
+            curr = min(total, self.job_curr[j] + assigned[j])
+            if curr >= total:
+                continue
 
-            amount = max(0, total - curr)
-            amount = min(amount, train_capacity)
+            amount = min(total - curr, train_capacity)
 
             if with_warehouse_limit:
-                required_article_id = self.jobs[job_id].article_id
-                has_amount = (
-                    self.warehouse[required_article_id].article_amount
-                    if required_article_id in self.warehouse
-                    else 0
-                )
-                available_amount = max(0, has_amount - self.assigned_job_amount[job_id])
-
-                amount = min(available_amount, amount)
+                amount = min(max(0, self.job_stock[j] - assigned[j]), amount)
 
             if amount <= 0:
                 continue
 
-            self.assigned_job_amount[job_id] += amount
-            self.assign.append((train_id, job_id, amount))
+            assigned[j] += amount
+            self.assign.append((i, j, amount))
 
             self.recur(
                 idx=idx + 1,
@@ -1198,7 +1404,7 @@ class JobDisptchingMixin:
                 depth=depth + 1,
             )
 
-            self.assigned_job_amount[job_id] -= amount
+            assigned[j] -= amount
             del self.assign[-1]
 
         self.recur(
@@ -1213,97 +1419,36 @@ class JobDisptchingMixin:
         :return:
             train_id, job_id, amount
         """
-        self.train_id_list = sorted(
-            self.train_job_relation.keys(),
-            key=lambda k: self.trains[k].capacity,
+        self._build_vectors()
+
+        self.train_order = sorted(
+            range(len(self.trains)),
+            key=lambda i: self.train_capacity[i],
             reverse=True,
-        )
-        self.train_id_list = self.train_id_list[:15]
+        )[: self.MAX_TRAINS]
         self.best_score = None
-        self.assigned_job_amount = {job_id: 0 for job_id in self.jobs}
+        self.assigned_job_amount = array("q", bytes(8 * len(self.jobs)))
         self.best_assign = []
         self.assign = []
 
         self.recur(idx=0, used_dispatcher=0, with_warehouse_limit=with_warehouse_limit)
 
-        return self.best_assign
+        return self._to_model_ids(self.best_assign)
 
 
 class JobDisptchingMaxProfit(JobDisptchingMixin):
     def get_score(self, used_dispatcher: int) -> Tuple[int, float, int]:
-        ret = 0
+        ret, hours = self.get_progress()
 
-        count = {}
-        required_articles = {}
-        INFINITY_HOUR = 1000000
-
-        for job_id, amount in self.assigned_job_amount.items():
-            count.update({job_id: 0})
-
-            total = self.jobs[job_id].total_count
-            curr = min(total, self.jobs[job_id].curr_count)
-            required_articles.update({self.jobs[job_id].article_id: True})
-
-            remain = total - curr
-            if remain < 1:
-                continue
-            if self.assigned_job_amount[job_id] < 1:
-                count.update({job_id: INFINITY_HOUR})
-            else:
-                count.update(
-                    {job_id: math.ceil(remain / self.assigned_job_amount[job_id])}
-                )
-
-        for job_id, amount in self.assigned_job_amount.items():
-            remain = max(
-                0, self.jobs[job_id].total_count - self.jobs[job_id].curr_count
-            )
-            if remain > 0:
-                ret += self.jobs[job_id].sp / remain * self.assigned_job_amount[job_id]
-                # ret += self.assigned_job_amount[job_id] / remain
-
-        hours = min(count.values())
-
-        # return len(required_articles), ret, -hours
+        # return self.article_count, ret, -hours
         return 0, ret, -hours
 
 
 class JobDisptchingPrepareBeforeCompetiton(JobDisptchingMixin):
     def get_score(self, used_dispatcher: int) -> Tuple[int, float, int]:
-        ret = 0
+        ret, hours = self.get_progress()
 
-        count = {}
-        required_articles = {}
-        INFINITY_HOUR = 1000000
-
-        for job_id, amount in self.assigned_job_amount.items():
-            count.update({job_id: 0})
-
-            total = self.jobs[job_id].total_count
-            curr = min(total, self.jobs[job_id].curr_count)
-            required_articles.update({self.jobs[job_id].article_id: True})
-
-            remain = total - curr
-            if remain < 1:
-                continue
-            if self.assigned_job_amount[job_id] < 1:
-                count.update({job_id: INFINITY_HOUR})
-            else:
-                count.update(
-                    {job_id: math.ceil(remain / self.assigned_job_amount[job_id])}
-                )
-
-        for job_id, amount in self.assigned_job_amount.items():
-            remain = max(
-                0, self.jobs[job_id].total_count - self.jobs[job_id].curr_count
-            )
-            if remain > 0:
-                ret += self.jobs[job_id].sp / remain * self.assigned_job_amount[job_id]
-                # ret += self.assigned_job_amount[job_id] / remain
-
-        hours = min(count.values())
-
-        return len(required_articles), ret, -hours
+        return self.article_count, ret, -hours
 
 
 def jobs_find_union_priority(
@@ -1615,22 +1760,29 @@ def get_number_of_working_dispatchers(version: RunVersion) -> Tuple[int, int]:
 
     trains = list(trains_find(version=version, is_idle=False))
 
+    # train 마다 검색하지 않고 한번만 읽는다.
+    jobs_by_location = {}
+    if any(train.is_job_route for train in trains):
+        for job in jobs_find(version=version):
+            jobs_by_location.setdefault(job.job_location_id, job)
+
+    destinations = {}
+
     for train in trains:
         is_union = False
         data = None
 
         if train.is_job_route:
-            ret_list = list(
-                jobs_find(version=version, job_location_id=train.route_definition_id)
-            )
-            if ret_list:
-                data = ret_list[0]
+            data = jobs_by_location.get(train.route_definition_id)
+            if data:
                 is_union = data.job_location.region.is_union
 
         elif train.is_destination_route:
-            data = destination_find(
-                version=version, destination_id=train.route_definition_id
-            )
+            if train.route_definition_id not in destinations:
+                destinations[train.route_definition_id] = destination_find(
+                    version=version, destination_id=train.route_definition_id
+                )
+            data = destinations[train.route_definition_id]
             is_union = data.region.is_union
 
         if is_union:
@@ -1654,9 +1806,11 @@ def warehouse_add_article(
     :param amount:
     :return:
     """
-    instance = PlayerWarehouse.objects.filter(
-        version_id=version.id, article_id=article_id
-    ).first()
+    instance = (
+        PlayerWarehouse.objects.at_version(version)
+        .filter(article_id=article_id)
+        .first()
+    )
     if not instance:
         instance = PlayerWarehouse.objects.create(
             version_id=version.id, article_id=article_id, amount=0
@@ -1671,6 +1825,7 @@ def warehouse_add_article(
 
     instance.amount += amount
     if instance.amount >= 0:
+        PlayerWarehouse.split_history(version=version, instances=[instance])
         instance.save(update_fields=["amount"])
         return True
 
@@ -1693,14 +1848,29 @@ def warehouse_can_add(version: RunVersion, article_id: Type[int], amount: int) -
 
 
 def warehouse_get_amount(version: RunVersion, article_id: Union[int, Type[int]]) -> int:
-    article = PlayerWarehouse.objects.filter(
-        version_id=version.id, article_id=article_id
-    ).first()
+    article = (
+        PlayerWarehouse.objects.at_version(version)
+        .filter(article_id=article_id)
+        .first()
+    )
     if article:
         return article.amount
     return 0
 
 
+def warehouse_get_amounts(version: RunVersion) -> Dict[int, int]:
+    """
+        article_id 별 창고 수량. (1 query)
+    :param version:
+    :return:
+    """
+    ret = {}
+    queryset = PlayerWarehouse.objects.at_version(version).order_by("-pk")
+    for article_id, amount in queryset.values_list("article_id", "amount"):
+        ret.update({article_id: amount})
+    return ret
+
+
 def warehouse_can_add_with_rewards(
     version: RunVersion, reward: List[Dict], multiply: int = 1
 ) -> bool:
@@ -1714,9 +1884,11 @@ def warehouse_can_add_with_rewards(
         if _id != 8:
             continue
 
-        pw = PlayerWarehouse.objects.filter(
-            version_id=version.id, article_id=article_id
-        ).first()
+        pw = (
+            PlayerWarehouse.objects.at_version(version)
+            .filter(article_id=article_id)
+            .first()
+        )
         article = TSArticle.objects.filter(id=article_id).first()
 
         cnt = pw.amount if pw else 0
@@ -1741,7 +1913,7 @@ def warehouse_max_capacity(version: RunVersion) -> int:
 
 
 def warehouse_used_capacity(version: RunVersion):
-    queryset = PlayerWarehouse.objects.filter(version_id=version.id)
+    queryset = PlayerWarehouse.objects.at_version(version)
     data_list = list(
         queryset.filter(article__type__in=[2, 3]).values_list("amount", flat=True)
     )
@@ -1775,6 +1947,8 @@ def warehouse_countable(
 ) -> Dict[int, Tuple[TSArticle, int]]:
     ret = {}
 
+    amounts = warehouse_get_amounts(version=version)
+
     queryset = TSArticle.objects.all()
     for article in queryset.all():
         if not article.is_take_up_space:
@@ -1789,7 +1963,7 @@ def warehouse_countable(
                 {
                     article.id: (
                         article,
-                        warehouse_get_amount(version=version, article_id=article.id),
+                        amounts.get(article.id, 0),
                     )
                 }
             )
@@ -1800,7 +1974,7 @@ def warehouse_countable(
                 {
                     article.id: (
                         article,
-                        warehouse_get_amount(version=version, article_id=article.id),
+                        amounts.get(article.id, 0),
                     )
                 }
             )
@@ -1811,7 +1985,7 @@ def warehouse_countable(
                 {
                     article.id: (
                         article,
-                        warehouse_get_amount(version=version, article_id=article.id),
+                        amounts.get(article.id, 0),
                     )
                 }
             )
@@ -1821,30 +1995,38 @@ def warehouse_countable(
 
 
 def find_xp(version: RunVersion) -> int:
-    instance = PlayerWarehouse.objects.filter(
-        version_id=version.id, article_id=PlayerWarehouse.ARTICLE_XP
-    ).first()
+    instance = (
+        PlayerWarehouse.objects.at_version(version)
+        .filter(article_id=PlayerWarehouse.ARTICLE_XP)
+        .first()
+    )
     return instance.amount
 
 
 def find_key(version: RunVersion) -> int:
-    instance = PlayerWarehouse.objects.filter(
-        version_id=version.id, article_id=PlayerWarehouse.ARTICLE_KEY
-    ).first()
+    instance = (
+        PlayerWarehouse.objects.at_version(version)
+        .filter(article_id=PlayerWarehouse.ARTICLE_KEY)
+        .first()
+    )
     return instance.amount
 
 
 def find_gem(version: RunVersion) -> int:
-    instance = PlayerWarehouse.objects.filter(
-        version_id=version.id, article_id=PlayerWarehouse.ARTICLE_GEM
-    ).first()
+    instance = (
+        PlayerWarehouse.objects.at_version(version)
+        .filter(article_id=PlayerWarehouse.ARTICLE_GEM)
+        .first()
+    )
     return instance.amount
 
 
 def find_gold(version: RunVersion) -> int:
-    instance = PlayerWarehouse.objects.filter(
-        version_id=version.id, article_id=PlayerWarehouse.ARTICLE_GOLD
-    ).first()
+    instance = (
+        PlayerWarehouse.objects.at_version(version)
+        .filter(article_id=PlayerWarehouse.ARTICLE_GOLD)
+        .first()
+    )
     return instance.amount
 
 
@@ -1883,7 +2065,7 @@ def daily_reward_get_reward(version: RunVersion) -> PlayerDailyReward:
     :return:
     """
     INTERVAL_SECOND = 12 * 60
-    queryset = PlayerDailyReward.objects.filter(version_id=version.id).all()
+    queryset = PlayerDailyReward.objects.at_version(version).all()
 
     if (
         version.login_server
@@ -1900,7 +2082,7 @@ def daily_reward_get_reward(version: RunVersion) -> PlayerDailyReward:
 
 
 def daily_reward_get_next_event_time(version: RunVersion) -> datetime:
-    queryset = PlayerDailyReward.objects.filter(version_id=version.id).all()
+    queryset = PlayerDailyReward.objects.at_version(version).all()
     for reward in queryset:
         return max(version.now, reward.available_from)
 
@@ -1914,7 +2096,7 @@ def daily_offer_get_slots(
     availble_gem: bool = None,
     available_gold: bool = None,
 ):
-    queryset = PlayerDailyOffer.objects.filter(version_id=version.id).all()
+    queryset = PlayerDailyOffer.objects.at_version(version).all()
 
     ret = []
 
@@ -1925,7 +2107,8 @@ def daily_offer_get_slots(
             continue
 
         for item in (
-            PlayerDailyOfferItem.objects.filter(daily_offer_id=daily.id)
+            PlayerDailyOfferItem.objects.at_version(version)
+            .filter(daily_offer_id=daily.id)
             .prefetch_related("price")
             .all()
         ):
@@ -1961,7 +2144,7 @@ def daily_offer_get_slots(
 def daily_offer_get_next_event_time(version: RunVersion) -> datetime:
     now = version.now
     ret = now
-    queryset = PlayerDailyOffer.objects.filter(version_id=version.id).all()
+    queryset = PlayerDailyOffer.objects.at_version(version).all()
     delta = timedelta(seconds=10)
 
     for daily in queryset:
@@ -1988,6 +2171,7 @@ def daily_offer_set_used(version: RunVersion, offer_item: PlayerDailyOfferItem):
 
         offer_item.purchased = True
         offer_item.purchase_count += 1
+        PlayerDailyOfferItem.split_history(version=version, instances=[offer_item])
         offer_item.save(
             update_fields=[
                 "purchased",
@@ -2003,7 +2187,7 @@ def daily_offer_set_used(version: RunVersion, offer_item: PlayerDailyOfferItem):
 
 def whistle_get_collectable_list(version: RunVersion) -> List[PlayerWhistle]:
     now: datetime = version.now
-    queryset = PlayerWhistle.objects.filter(version_id=version.id, category=1).all()
+    queryset = PlayerWhistle.objects.at_version(version).filter(category=1).all()
 
     ret = []
     if not now or not version.init_recv_1:
@@ -2058,7 +2242,14 @@ def whistle_remove(version: RunVersion, whistle: PlayerWhistle) -> bool:
             before_expires_at=whistle.expires_at,
             after_expires_at=now,
         )
-        PlayerWhistleItem.objects.filter(player_whistle=whistle).delete()
+        # 이전 version 의 item 은 whistle 의 history 로 옮겨진다.
+        PlayerWhistle.split_history(version=version, instances=[whistle])
+        for item in (
+            PlayerWhistleItem.objects.at_version(version)
+            .filter(player_whistle=whistle)
+            .all()
+        ):
+            item.delete()
         whistle.delete()
         return True
 
@@ -2100,7 +2291,8 @@ def container_offer_find_iter(
 ) -> List[PlayerDailyOfferContainer]:
     now = version.now
     queryset = (
-        PlayerDailyOfferContainer.objects.filter(version_id=version.id)
+        PlayerDailyOfferContainer.objects.at_version(version)
+        .select_related("offer_container")
         .order_by("id")
         .all()
     )
@@ -2133,6 +2325,7 @@ def container_offer_set_used(version: RunVersion, offer: PlayerDailyOfferContain
     now = version.now
     offer.last_bought_at = now
     offer.count += 1
+    PlayerDailyOfferContainer.split_history(version=version, instances=[offer])
     offer.save(
         update_fields=[
             "last_bought_at",
@@ -2145,14 +2338,14 @@ def container_offer_set_used(version: RunVersion, offer: PlayerDailyOfferContain
 # ship
 ###########################################################################
 def ship_find_iter(version: RunVersion) -> List[PlayerShipOffer]:
-    queryset = PlayerShipOffer.objects.filter(version_id=version.id).all()
+    queryset = PlayerShipOffer.objects.at_version(version).all()
     return list(queryset.all())
 
 
 def ship_get_conditions(version: RunVersion) -> Dict[int, int]:
     ret = {}
 
-    queryset = PlayerShipOffer.objects.filter(version_id=version.id).all()
+    queryset = PlayerShipOffer.objects.at_version(version).all()
     for ship in queryset:
         conditions_dict = ship.conditions_to_article_dict
 
@@ -2174,6 +2367,7 @@ def achievement_set_used(version: RunVersion, achievement: PlayerAchievement):
         level=[achievement.level, achievement.level + 1],
     )
     achievement.level += 1
+    PlayerAchievement.split_history(version=version, instances=[achievement])
     achievement.save(update_fields=["level"])
 
 
@@ -2201,6 +2395,7 @@ def collect_gift(version: RunVersion, gift: PlayerGift):
                 article_id=article_id,
                 amount=amount,
             )
+        PlayerGift.split_history(version=version, instances=[gift])
         gift.delete()
 
 
@@ -2211,6 +2406,7 @@ def cityloop_building_set_upgrade(version: RunVersion, building: PlayerBuilding)
     if building:
         building.upgrade_task = ""
         building.level += 1
+        PlayerBuilding.split_history(version=version, instances=[building])
         building.save(
             update_fields=[
                 "upgrade_task",
@@ -2234,8 +2430,7 @@ def competition_find_iter(
     competition_type: List[str],
     scope: List[str],
 ) -> List[PlayerCompetition]:
-    queryset = PlayerCompetition.objects.filter(
-        version_id=version.id,
+    queryset = PlayerCompetition.objects.at_version(version).filter(
         content_category__in=content_category,
         type__in=competition_type,
         level_from__lte=version.level_id,
@@ -0,0 +1,269 @@
+import json
+import shutil
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Callable
+from unittest import mock
+
+from django.db import connection
+
+from app_root.mixins import ImportHelperMixin
+from app_root.servers.models import RunVersion
+from core.sharedcache import SharedCache
+from core.utils import convert_datetime
+
+###########################################################################
+# Offline replay
+#
+#   녹화된 RunVersion 의 응답 (save_cache) 으로 Strategy 를 다시 실행한다.
+#   - ImportHelperMixin.get / post : 요청 이름 (NAME_get / NAME_post) 별로 녹화된 순서대로 응답.
+#   - timezone.now : 응답의 서버 Time 으로 움직이는 가상 시계.
+#   - sleep : 쉬지 않고 가상 시계만 움직인다.
+#   - firestore : 녹화된 guild_jobs.json 을 복사한다. (node 실행 안함)
+#   - guild 공유 cache (SharedCache) 는 쓰지 않는다. (다른 계정의 응답을 쓰지 않도록)
+#   - 요청 사이의 코드 (step) 마다 CPU 시간 / DB query 수를 기록한다.
+#   - 기본 runner 는 녹화된 init data 로 만든 replay 계정의 version 으로 Strategy.process 를 실행한다.
+#     (source 계정의 lease / 최신 version 은 건드리지 않는다)
+#
+#       report = ReplaySession(source=version).run()
+#       report.dump()
+###########################################################################
+
+
+class ReplayExhausted(Exception):
+    """
+    녹화된 응답보다 요청이 많다.
+    """
+
+    def __init__(self, name: str, idx: int):
+        super(ReplayExhausted, self).__init__(f"no recorded response : {name}[{idx}]")
+        self.name = name
+        self.idx = idx
+
+
+class VirtualClock:
+    now_at: datetime
+
+    def __init__(self, start: datetime):
+        self.now_at = start
+
+    def now(self) -> datetime:
+        return self.now_at
+
+    def sleep(self, seconds: float):
+        self.now_at += timedelta(seconds=seconds)
+
+    def update(self, server_time: Optional[datetime]):
+        """
+        서버 시간으로 이동. (뒤로는 가지 않는다)
+        """
+        if server_time and server_time > self.now_at:
+            self.now_at = server_time
+
+
+class ReplayStep:
+    """
+    요청 1번 까지의 실행 구간.
+    """
+
+    name: str
+    idx: int
+    server_time: Optional[datetime]
+    cpu: float
+    wall: float
+    queries: int
+
+    def __init__(self, *, name, idx, server_time, cpu, wall, queries):
+        self.name = name
+        self.idx = idx
+        self.server_time = server_time
+        self.cpu = cpu
+        self.wall = wall
+        self.queries = queries
+
+    def __str__(self):
+        return (
+            f"{self.name:30s}[{self.idx:3d}] | cpu {self.cpu * 1000:9.2f} ms"
+            f" | wall {self.wall * 1000:9.2f} ms | query {self.queries:5d}"
+            f" | {self.server_time or '-'}"
+        )
+
+
+class ReplayReport:
+    steps: List[ReplayStep]
+    error: Optional[Exception]
+
+    def __init__(self):
+        self.steps = []
+        self.error = None
+
+    @property
+    def cpu(self) -> float:
+        return sum(o.cpu for o in self.steps)
+
+    @property
+    def wall(self) -> float:
+        return sum(o.wall for o in self.steps)
+
+    @property
+    def queries(self) -> int:
+        return sum(o.queries for o in self.steps)
+
+    def dump(self):
+        for step in self.steps:
+            print(step)
+        print(
+            f"total {len(self.steps)} steps | cpu {self.cpu * 1000:.2f} ms"
+            f" | wall {self.wall * 1000:.2f} ms | query {self.queries}"
+        )
+        if self.error:
+            print(f"error : {self.error!r}")
+
+
+class ReplaySession:
+    source: RunVersion
+    cursors: Dict[str, int]
+    clock: VirtualClock
+    report: ReplayReport
+
+    def __init__(self, source: RunVersion):
+        self.source = source
+        self.cursors = {}
+        self.clock = VirtualClock(
+            start=source.login_server or source.init_server_1 or source.created
+        )
+        self.report = ReplayReport()
+
+        self.queries = 0
+        self.step_cpu = 0.0
+        self.step_wall = 0.0
+
+    ###########################################################################
+    # responses
+    ###########################################################################
+    def response(self, name: str) -> str:
+        idx = self.cursors.get(name, 0)
+        store = self.source.get_record_store(name)
+        if idx >= len(store):
+            self.end_step(name=name, idx=idx, server_time=None)
+            raise ReplayExhausted(name=name, idx=idx)
+
+        self.cursors[name] = idx + 1
+        data = store.get(idx)
+
+        server_time = None
+        try:
+            server_time = convert_datetime(json.loads(data, strict=False).get("Time"))
+        except Exception:
+            pass
+
+        self.end_step(name=name, idx=idx, server_time=server_time)
+        self.clock.update(server_time)
+        return data
+
+    def get(self, helper: ImportHelperMixin, url, headers, params) -> str:
+        return self.response(f"{helper.NAME}_get")
+
+    def post(self, helper: ImportHelperMixin, url, headers, payload) -> str:
+        return self.response(f"{helper.NAME}_post")
+
+    def run_nodejs(self, version: RunVersion):
+        src = self.source.get_account_path() / "guild_jobs.json"
+        if src.exists():
+            shutil.copyfile(src, version.get_account_path() / "guild_jobs.json")
+
+    ###########################################################################
+    # measure
+    ###########################################################################
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def start_step(self):
+        self.queries = 0
+        self.step_cpu = time.thread_time()
+        self.step_wall = time.perf_counter()
+
+    def end_step(self, name: str, idx: int, server_time: Optional[datetime]):
+        self.report.steps.append(
+            ReplayStep(
+                name=name,
+                idx=idx,
+                server_time=server_time,
+                cpu=time.thread_time() - self.step_cpu,
+                wall=time.perf_counter() - self.step_wall,
+                queries=self.queries,
+            )
+        )
+        self.start_step()
+
+    ###########################################################################
+    # run
+    ###########################################################################
+    def prepare_version(self) -> RunVersion:
+        """
+            source 의 녹화된 init data 로 replay 계정의 version 을 만든다.
+        :return:
+        """
+        from app_root.players.utils_import import InitdataHelper
+        from app_root.strategies.simulator import prepare_version
+
+        name = f"{InitdataHelper.NAME}_get"
+        store = self.source.get_record_store(name)
+        if not len(store):
+            raise ReplayExhausted(name=name, idx=0)
+
+        # init data 는 version 을 만들 때 읽었다.
+        self.cursors[name] = len(store)
+        return prepare_version(
+            username=f"replay-{self.source.id}",
+            init_files=[],
+            init_texts=[store.get(idx) for idx in range(len(store))],
+        )
+
+    def run(self, runner: Optional[Callable[[], None]] = None) -> ReplayReport:
+        """
+            녹화된 응답으로 runner 를 실행한다.
+        :param runner: 기본은 replay 계정 version 의 Strategy.process()
+        :return:
+        """
+        if runner is None:
+            from app_root.strategies.utils import Strategy
+
+            version = self.prepare_version()
+            strategy = Strategy(user_id=version.user_id, worker_name="replay")
+            strategy.version = version
+            runner = strategy.process
+
+        session = self
+        shared_cache = SharedCache(prefix=f"replay-{id(self)}", ttl=0)
+        with mock.patch(
+            "app_root.strategies.firestore.get_shared_cache", return_value=shared_cache
+        ), mock.patch(
+            "app_root.players.utils_import.get_shared_cache", return_value=shared_cache
+        ), mock.patch.object(
+            ImportHelperMixin,
+            "get",
+            lambda helper, *a, **kw: session.get(helper, *a, **kw),
+        ), mock.patch.object(
+            ImportHelperMixin,
+            "post",
+            lambda helper, *a, **kw: session.post(helper, *a, **kw),
+        ), mock.patch(
+            "django.utils.timezone.now", side_effect=self.clock.now
+        ), mock.patch(
+            "app_root.strategies.commands.sleep", side_effect=self.clock.sleep
+        ), mock.patch(
+            "app_root.strategies.firestore.run_nodejs", side_effect=self.run_nodejs
+        ), connection.execute_wrapper(
+            self.count_query
+        ):
+            self.start_step()
+            try:
+                runner()
+            except Exception as e:
+                self.report.error = e
+            self.end_step(name="finish", idx=0, server_time=None)
+
+        self.source.close_record_stores()
+        return self.report
@@ -0,0 +1,154 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Optional
+
+from django.utils import timezone
+
+from app_root.exceptions import TsRespInvalidOrExpiredSession
+from app_root.players.utils_import import InitdataHelper
+from app_root.servers.models import RunVersion, EndPoint, SQLDefinition
+from app_root.servers.utils_import import (
+    EndpointHelper,
+    LoginHelper,
+    SQLDefinitionHelper,
+)
+from app_root.strategies.commands import FirebaseAuthToken
+
+###########################################################################
+# Session 재사용
+#
+#   새 RunVersion 마다 endpoint / login / definition 을 다시 받지 않는다.
+#   - endpoint, definition : 마지막으로 받은 RunVersion 기준 *_TTL 동안 재사용.
+#   - login (game_access_token) : 토큰이 있으면 재사용. TsRespInvalidOrExpiredSession 일 때만 다시 login.
+#   - firebase token : JWT 의 exp 까지 재사용.
+###########################################################################
+ENDPOINT_TTL = timedelta(hours=6)
+DEFINITION_TTL = timedelta(hours=1)
+FIREBASE_MARGIN = timedelta(minutes=5)
+
+
+def decode_jwt_expires_at(token: str) -> Optional[datetime]:
+    """
+        JWT payload 의 exp. (서명은 확인하지 않는다)
+    :param token:
+    :return:
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        data = json.loads(base64.urlsafe_b64decode(payload.encode("utf-8")))
+        return datetime.fromtimestamp(float(data["exp"]), tz=dt_timezone.utc)
+    except Exception:
+        return None
+
+
+class SessionHelper:
+    version: RunVersion
+    use_cache: bool
+
+    def __init__(self, version: RunVersion, use_cache: bool = False):
+        self.version = version
+        self.use_cache = use_cache
+
+    def _last_version(self, **kwargs) -> Optional[RunVersion]:
+        return (
+            RunVersion.objects.filter(user_id=self.version.user_id, **kwargs)
+            .exclude(id=self.version.id)
+            .order_by("-pk")
+            .first()
+        )
+
+    ###########################################################################
+    # validity
+    ###########################################################################
+    def has_valid_endpoints(self, now: datetime) -> bool:
+        if not EndPoint.get_login_urls() or not EndPoint.get_definition_urls():
+            return False
+        if not EndPoint.get_urls(EndPoint.ENDPOINT_INIT_DATA_URLS):
+            return False
+
+        last = self._last_version(ep_recv__isnull=False)
+        return bool(last and last.ep_recv + ENDPOINT_TTL > now)
+
+    def has_valid_login(self, now: datetime) -> bool:
+        """
+        토큰은 시간으로 만료시키지 않는다. (TsRespInvalidOrExpiredSession 이면 invalidate)
+        """
+        user = self.version.user
+        return bool(user.game_access_token and user.player_id)
+
+    def has_valid_definition(self, now: datetime) -> bool:
+        if not SQLDefinition.objects.exists():
+            return False
+
+        last = self._last_version(sd_recv__isnull=False)
+        return bool(last and last.sd_recv + DEFINITION_TTL > now)
+
+    ###########################################################################
+    # steps
+    ###########################################################################
+    def endpoint(self, force: bool = False):
+        if force or self.use_cache or not self.has_valid_endpoints(timezone.now()):
+            EndpointHelper(version=self.version, use_cache=self.use_cache).run()
+        else:
+            print("[Session] reuse endpoints")
+
+    def login(self, force: bool = False):
+        if force or self.use_cache or not self.has_valid_login(timezone.now()):
+            LoginHelper(version=self.version, use_cache=self.use_cache).run()
+            self.version.user.refresh_from_db()
+        else:
+            print("[Session] reuse game access token")
+
+    def definition(self, force: bool = False):
+        if force or self.use_cache or not self.has_valid_definition(timezone.now()):
+            SQLDefinitionHelper(version=self.version, use_cache=self.use_cache).run()
+        else:
+            print("[Session] reuse definition")
+
+    def firebase(self, force: bool = False):
+        if not force and not self.use_cache:
+            last = self._last_version(firebase_uid__gt="")
+            if last and last.firebase_token:
+                expires_at = decode_jwt_expires_at(last.firebase_token)
+                if expires_at and expires_at > timezone.now() + FIREBASE_MARGIN:
+                    print("[Session] reuse firebase token")
+                    self.version.firebase_token = last.firebase_token
+                    self.version.firebase_uid = last.firebase_uid
+                    self.version.save(update_fields=["firebase_token", "firebase_uid"])
+                    return
+
+        FirebaseAuthToken(version=self.version, use_cache=self.use_cache).run()
+
+    def init_data(self):
+        """
+        init data 는 매번 받는다. session 이 만료되었으면 다시 login 후 1번 더.
+        """
+        try:
+            InitdataHelper(
+                version=self.version, use_cache=self.use_cache, sync=True
+            ).run()
+        except TsRespInvalidOrExpiredSession:
+            print("[Session] invalid or expired session. login again")
+            self.invalidate()
+            self.endpoint()
+            self.login(force=True)
+            InitdataHelper(
+                version=self.version, use_cache=self.use_cache, sync=True
+            ).run()
+
+    def invalidate(self):
+        """
+        다음 실행에서 다시 login 한다.
+        """
+        user = self.version.user
+        user.game_access_token = ""
+        user.save(update_fields=["game_access_token"])
+
+    def run(self):
+        self.endpoint()
+        self.login()
+        self.definition()
+        self.init_data()
+        self.firebase()
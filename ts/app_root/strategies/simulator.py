@@ -0,0 +1,411 @@
+import contextlib
+import heapq
+import io
+import json
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple, Iterator
+from unittest import mock
+
+from django.conf import settings
+
+from app_root.mixins import ImportHelperMixin
+from app_root.players.models import (
+    PlayerContract,
+    PlayerDestination,
+    PlayerFactoryProductOrder,
+    PlayerJob,
+    PlayerTrain,
+    PlayerWarehouse,
+)
+from app_root.players.utils_import import InitdataHelper
+from app_root.servers.models import RunVersion, SQLDefinition, EndPoint
+from app_root.servers.utils_import import SQLDefinitionHelper
+from app_root.strategies.replay import VirtualClock
+from app_root.users.models import User
+from app_root.utils import get_curr_server_str_datetime_s
+from core.utils import hash10, convert_datetime
+
+###########################################################################
+# Discrete-event economy simulator
+#
+#   definition (TS*) 과 init data 로 만든 state (Player*) 에 실제 전략 (Strategy.process) 을 반복 실행한다.
+#   - 서버 요청은 보내지 않는다. command 는 성공 응답을 받은 것으로 하고 post_processing 으로 state 를 바꾼다.
+#   - 시계는 event heap 으로 움직인다.
+#       기차 도착 / factory 생산 완료 / contract 사용 가능 / destination 제한 해제 / job 완료 + 전략이 준 다음 시간.
+#   - 서버가 만드는 변화 (새 job, whistle spawn 등) 는 없다.
+#   - variant 는 mock.patch 대상 {dotted path: 대체 객체} 로 준다.
+#
+#       reports = compare(
+#           init_files=["init_data/gaolious_2023.02.07.json"],
+#           variants={"base": {}, "other": {"app_root.strategies.utils.JobDisptchingMaxProfit": OtherDispatcher}},
+#           days=7,
+#       )
+###########################################################################
+FIXTURE_PATH = settings.DJANGO_PATH / "fixtures"
+DEFAULT_DEFINITION = FIXTURE_PATH / "207.004.sqlite"
+IDLE_STEP = timedelta(hours=1)
+MIN_STEP = timedelta(seconds=1)
+
+
+class SimulationReport:
+    name: str
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    iterations: int
+    events: Counter
+    commands: Counter
+    warehouse_before: Dict[int, int]
+    warehouse_after: Dict[int, int]
+    wall: float
+    error: Optional[Exception]
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = None
+        self.finished_at = None
+        self.iterations = 0
+        self.events = Counter()
+        self.commands = Counter()
+        self.warehouse_before = {}
+        self.warehouse_after = {}
+        self.wall = 0.0
+        self.error = None
+
+    @property
+    def simulated(self) -> timedelta:
+        if not self.started_at or not self.finished_at:
+            return timedelta(0)
+        return self.finished_at - self.started_at
+
+    @property
+    def warehouse_delta(self) -> Dict[int, int]:
+        ret = {}
+        for article_id in set(self.warehouse_before) | set(self.warehouse_after):
+            delta = self.warehouse_after.get(article_id, 0) - self.warehouse_before.get(
+                article_id, 0
+            )
+            if delta:
+                ret[article_id] = delta
+        return ret
+
+    def dump(self):
+        print(
+            f"[{self.name}] {self.simulated} simulated in {self.wall:.2f} s"
+            f" | {self.iterations} iterations | {sum(self.commands.values())} commands"
+        )
+        for name, count in self.commands.most_common():
+            print(f"    command {name:40s} {count:6d}")
+        for name, count in self.events.most_common():
+            print(f"    event   {name:40s} {count:6d}")
+        for article_id, delta in sorted(self.warehouse_delta.items()):
+            print(f"    article #{article_id:<7d} {delta:+,d}")
+        if self.error:
+            print(f"    error : {self.error!r}")
+
+
+class EventHeap:
+    """
+    (시간, 종류, key) heap. 같은 event 는 1번만 넣는다.
+    """
+
+    def __init__(self):
+        self.heap: List[Tuple[datetime, str, str]] = []
+        self.keys = set()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, at: Optional[datetime], kind: str, key: str = ""):
+        if not at or (at, kind, key) in self.keys:
+            return
+        self.keys.add((at, kind, key))
+        heapq.heappush(self.heap, (at, kind, key))
+
+    def pop_after(self, now: datetime) -> Optional[Tuple[datetime, str, str]]:
+        """
+        now 이후의 첫 event. (now 이전의 event 는 버린다)
+        """
+        while self.heap:
+            event = heapq.heappop(self.heap)
+            self.keys.discard(event)
+            if event[0] > now:
+                return event
+        return None
+
+
+def state_events(version: RunVersion) -> Iterator[Tuple[datetime, str, str]]:
+    """
+        state 에서 시간이 정해진 event
+    :param version:
+    :return:
+    """
+    for train in PlayerTrain.objects.at_version(version).filter(
+        route_arrival_time__gt=version.now
+    ):
+        yield train.route_arrival_time, "train_arrival", f"{train.instance_id}"
+
+    for order in PlayerFactoryProductOrder.objects.at_version(version).filter(
+        finishes_at__gt=version.now
+    ):
+        yield order.finishes_at, "factory_finish", f"{order.player_factory_id}"
+
+    for contract in PlayerContract.objects.at_version(version).filter(
+        usable_from__gt=version.now
+    ):
+        yield contract.usable_from, "contract_usable", f"{contract.slot}"
+
+    for dest in PlayerDestination.objects.at_version(version).filter(
+        train_limit_refresh_at__gt=version.now
+    ):
+        yield dest.train_limit_refresh_at, "destination_refresh", f"{dest.location_id}"
+
+    for job in PlayerJob.objects.at_version(version).filter(
+        collectable_from__gt=version.now
+    ):
+        yield job.collectable_from, "job_collectable", f"{job.job_location_id}"
+
+
+def warehouse_snapshot(version: RunVersion) -> Dict[int, int]:
+    return dict(
+        PlayerWarehouse.objects.at_version(version).values_list("article_id", "amount")
+    )
+
+
+def prepare_version(
+    username: str,
+    init_files: List[str],
+    definition: Path = DEFAULT_DEFINITION,
+    init_texts: Optional[List[str]] = None,
+) -> RunVersion:
+    """
+        fixtures 의 init data 로 simulation 용 계정 / version 을 만든다.
+    :param username:
+    :param init_files: fixtures 기준 경로. ex) init_data/gaolious_2023.02.07.json
+    :param definition: definition sqlite. TS* table 이 비어 있을 때만 읽는다.
+    :param init_texts: init_files 다음에 읽을 init data. (ex. SyntheticAccount.generate_text)
+    :return:
+    """
+    user = User.objects.filter(username=username).first()
+    if not user:
+        user = User.objects.create_user(
+            username=username,
+            android_id=username[:20],
+            game_access_token="simulator",
+            player_id="0",
+        )
+    version = RunVersion.objects.create(user_id=user.id, level_id=1)
+
+    if not SQLDefinition.objects.exists():
+        instance = SQLDefinition.objects.create(
+            version=definition.stem,
+            checksum="simulator",
+            url=f"file://{definition}",
+            download_path=definition,
+        )
+        SQLDefinitionHelper(version=version).read_sqlite(instance=instance)
+
+    helper = InitdataHelper(version=version)
+    server_time = None
+    texts = [
+        (FIXTURE_PATH / filename).read_text(encoding="utf-8") for filename in init_files
+    ] + list(init_texts or [])
+    for text in texts:
+        helper.parse_data(data=text)
+        server_time = server_time or json.loads(text, strict=False).get("Time")
+
+    # RunCommand 의 url. (요청은 보내지 않는다)
+    if not EndPoint.get_urls(EndPoint.ENDPOINT_COMMAND_PROCESSING):
+        EndPoint.objects.create(
+            name=EndPoint.ENDPOINT_COMMAND_PROCESSING,
+            name_hash=hash10(EndPoint.ENDPOINT_COMMAND_PROCESSING),
+            url="simulator",
+        )
+
+    version.refresh_from_db()
+    version.now = version.init_server_1 = version.login_server = convert_datetime(
+        server_time
+    )
+    version.set_processing(
+        save=True, update_fields=["now", "init_server_1", "login_server"]
+    )
+    return version
+
+
+class Simulator:
+    """
+    version 의 state 로 days 일 동안 전략을 실행한다. (version 의 Player* row 가 바뀐다)
+
+        report = Simulator(version=version, days=7).run()
+        report.dump()
+    """
+
+    version: RunVersion
+    clock: VirtualClock
+    heap: EventHeap
+    report: SimulationReport
+
+    def __init__(
+        self,
+        version: RunVersion,
+        days: float = 7,
+        name: str = "default",
+        patches: Optional[Dict[str, Any]] = None,
+        max_iterations: int = 100000,
+        verbose: bool = False,
+    ):
+        """
+        :param version: prepare_version 으로 만든 version
+        :param days: simulation 기간
+        :param name: report 이름
+        :param patches: {mock.patch 대상: 대체 객체} 전략 variant
+        :param max_iterations: 전략 실행 횟수 상한
+        :param verbose: False 이면 전략의 print 를 버린다.
+        """
+        self.version = version
+        self.clock = VirtualClock(start=version.now)
+        self.until = version.now + timedelta(days=days)
+        self.patches = patches or {}
+        self.max_iterations = max_iterations
+        self.verbose = verbose
+        self.heap = EventHeap()
+        self.report = SimulationReport(name=name)
+
+    ###########################################################################
+    # server
+    ###########################################################################
+    def response(self, data: Dict) -> str:
+        return json.dumps(
+            {
+                "Success": True,
+                "RequestId": "simulator",
+                "Time": get_curr_server_str_datetime_s(version=self.version),
+                "Data": data,
+            },
+            separators=(",", ":"),
+        )
+
+    def get(self, helper: ImportHelperMixin, url, headers, params) -> str:
+        return self.response({})
+
+    def post(self, helper: ImportHelperMixin, url, headers, payload) -> str:
+        payload = json.loads(payload) if isinstance(payload, str) else payload
+        for command in payload.get("Commands", []):
+            self.report.commands[command.get("Command", "")] += 1
+        return self.response({"CollectionId": payload.get("Id", 0), "Commands": []})
+
+    ###########################################################################
+    # run
+    ###########################################################################
+    def advance(self, at: datetime):
+        self.clock.now_at = at
+        self.version.update_now(at)
+
+    def step(self) -> Optional[datetime]:
+        from app_root.strategies.utils import Strategy
+
+        # 운영처럼 매번 version 을 새로 읽는다. (cache_run_version 으로 남은 값을 버린다)
+        self.version = RunVersion.objects.get(id=self.version.id)
+
+        strategy = Strategy(user_id=self.version.user_id, worker_name="simulator")
+        strategy.version = self.version
+        return strategy.process()
+
+    @contextlib.contextmanager
+    def patched(self):
+        session = self
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(
+                mock.patch.object(
+                    ImportHelperMixin,
+                    "get",
+                    lambda helper, *a, **kw: session.get(helper, *a, **kw),
+                )
+            )
+            stack.enter_context(
+                mock.patch.object(
+                    ImportHelperMixin,
+                    "post",
+                    lambda helper, *a, **kw: session.post(helper, *a, **kw),
+                )
+            )
+            stack.enter_context(
+                mock.patch("django.utils.timezone.now", side_effect=self.clock.now)
+            )
+            # jitter 는 건너뛴다. (Game:Sleep 은 post_processing 에서 version.now 를 움직인다)
+            stack.enter_context(mock.patch("app_root.strategies.commands.sleep"))
+            stack.enter_context(mock.patch.object(RunVersion, "add_log"))
+            stack.enter_context(mock.patch.object(RunVersion, "add_debug"))
+            for target, new in self.patches.items():
+                stack.enter_context(mock.patch(target, new))
+            if not self.verbose:
+                stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            yield
+
+    def run(self) -> SimulationReport:
+        report = self.report
+        report.started_at = self.version.now
+        report.warehouse_before = warehouse_snapshot(self.version)
+
+        started = time.perf_counter()
+        with self.patched():
+            try:
+                while (
+                    self.version.now < self.until
+                    and report.iterations < self.max_iterations
+                ):
+                    report.iterations += 1
+                    next_dt = self.step()
+                    # Game:Sleep 등으로 움직인 시간
+                    self.clock.update(self.version.now)
+
+                    self.heap.push(next_dt, "strategy")
+                    for at, kind, key in state_events(self.version):
+                        self.heap.push(at, kind, key)
+
+                    event = self.heap.pop_after(self.version.now)
+                    if event is None:
+                        event = (self.version.now + IDLE_STEP, "idle", "")
+                    at, kind, _ = event
+                    report.events[kind] += 1
+                    self.advance(min(max(at, self.version.now + MIN_STEP), self.until))
+            except Exception as e:
+                report.error = e
+
+        report.wall = time.perf_counter() - started
+        report.finished_at = self.version.now
+        report.warehouse_after = warehouse_snapshot(self.version)
+        return report
+
+
+def compare(
+    init_files: List[str],
+    variants: Dict[str, Dict[str, Any]],
+    days: float = 7,
+    definition: Path = DEFAULT_DEFINITION,
+    **kwargs,
+) -> List[SimulationReport]:
+    """
+        같은 init data 로 variant 별 simulation.
+    :param init_files:
+    :param variants: {이름: patches}
+    :param days:
+    :param definition:
+    :param kwargs: Simulator 의 나머지 인자
+    :return:
+    """
+    ret = []
+    for name, patches in variants.items():
+        version = prepare_version(
+            username=f"simulator_{name}"[:150],
+            init_files=init_files,
+            definition=definition,
+        )
+        ret.append(
+            Simulator(
+                version=version, days=days, name=name, patches=patches, **kwargs
+            ).run()
+        )
+    return ret
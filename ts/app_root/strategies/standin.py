@@ -0,0 +1,579 @@
+import base64
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Dict, List, Optional, Callable, Tuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+###########################################################################
+# Local stand-in game server
+#
+#   부하 테스트 용 TS2 API 서버. fixtures/ 의 응답으로 시작하고 계정 별 상태를 메모리에 둔다.
+#   - get-endpoints : fixture 의 url 을 이 서버로 바꿔서 응답.
+#   - login : device token (또는 remember me token) 별로 PlayerId / GameAccessToken 발급.
+#   - get-definition : fixtures 의 definition sqlite 를 이 서버에서 다운로드.
+#   - initial-data : 계정 별 init data. (seed fixture 에서 복사)
+#   - run-collection : command 를 계정 상태에 반영. (BaseCommand.post_processing 과 같은 규칙)
+#   - leaderboard, start-game, firebase token
+#   - 서버 시간은 실제 시간. token 이 맞지 않으면 "Invalid or expired session".
+#
+#       server = StandInServer().start()
+#       settings.GAME_SERVER_URL = server.url
+#       ...
+#       server.stop()
+###########################################################################
+FIXTURE_PATH = settings.DJANGO_PATH / "fixtures"
+DEFAULT_SEEDS = ("gaolious_2023.02.07.json",)
+DEFAULT_DEFINITION = "207.004"
+PRODUCTION_URL = "https://game.trainstation2.com"
+
+ARTICLE_ITEM_ID = 8
+
+
+def server_time(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_server_time(value: str) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(
+        tzinfo=dt_timezone.utc
+    )
+
+
+def load_fixture(*names: str) -> Dict:
+    return json.loads(
+        FIXTURE_PATH.joinpath(*names).read_text(encoding="utf-8"), strict=False
+    )
+
+
+def definition_fixture(version: str) -> Path:
+    """
+        fixtures 의 definition sqlite. (fixtures/{version}.sqlite 또는 fixtures/definition/client-data-{version}.sqlite)
+    :param version:
+    :return:
+    """
+    for filename in (
+        FIXTURE_PATH / f"{version}.sqlite",
+        FIXTURE_PATH / "definition" / f"client-data-{version}.sqlite",
+    ):
+        if filename.exists():
+            return filename
+    raise FileNotFoundError(f"definition fixture not found : {version}")
+
+
+class StandInDefinition:
+    """
+    run-collection 에서 필요한 definition. (서버 쪽 데이터이므로 bot 의 TS* table 을 쓰지 않는다)
+    """
+
+    destinations: Dict[int, Dict]
+    products: Dict[Tuple[int, int], Dict]
+
+    def __init__(self, filename: Path):
+        self.destinations = {}
+        self.products = {}
+
+        conn = sqlite3.connect(str(filename))
+        try:
+            conn.row_factory = sqlite3.Row
+            for row in conn.execute(
+                "SELECT id, article_id, travel_duration, capacity FROM destination"
+            ):
+                self.destinations[row["id"]] = dict(row)
+            for row in conn.execute(
+                "SELECT factory_id, article_id, article_amount, craft_time,"
+                " article_ids, article_amounts FROM product"
+            ):
+                self.products[(row["factory_id"], row["article_id"])] = dict(row)
+        finally:
+            conn.close()
+
+
+class StandInAccount:
+    """
+    계정 1개의 상태. (init data 의 Type 별 Data)
+    """
+
+    player_id: str
+    device_token: str
+    game_access_token: str
+    remember_me_token: str
+    sections: Dict[str, Dict]
+    commands: int
+    unhandled: Dict[str, int]
+
+    def __init__(self, player_id: str, device_token: str, seed: Dict):
+        self.player_id = player_id
+        self.device_token = device_token
+        self.game_access_token = str(uuid.uuid4())
+        self.remember_me_token = str(uuid.uuid4())
+        self.sections = {
+            row["Type"]: copy.deepcopy(row["Data"]) for row in seed.get("Data", [])
+        }
+        self.commands = 0
+        self.unhandled = {}
+        self.lock = threading.Lock()
+
+        player = self.sections.get("player")
+        if player is not None:
+            player["PlayerId"] = int(player_id)
+
+    def init_data(self) -> List[Dict]:
+        with self.lock:
+            return [
+                {"Type": name, "Data": copy.deepcopy(data)}
+                for name, data in self.sections.items()
+            ]
+
+    ###########################################################################
+    # state
+    ###########################################################################
+    def _list(self, section: str, key: str) -> List[Dict]:
+        return self.sections.setdefault(section, {}).setdefault(key, [])
+
+    def _train(self, instance_id) -> Optional[Dict]:
+        for train in self._list("trains", "Trains"):
+            if train.get("InstanceId") == instance_id:
+                return train
+        return None
+
+    def warehouse_add(self, article_id: int, amount: int):
+        if not article_id or not amount:
+            return
+        articles = self._list("warehouse", "Articles")
+        for row in articles:
+            if row.get("Id") == article_id:
+                row["Amount"] = row.get("Amount", 0) + amount
+                return
+        articles.append({"Id": article_id, "Amount": amount})
+
+    def reward_add(self, reward: Optional[Dict]):
+        for item in (reward or {}).get("Items", []):
+            if item.get("Id") == ARTICLE_ITEM_ID:
+                self.warehouse_add(item.get("Value"), item.get("Amount", 0))
+
+    ###########################################################################
+    # commands
+    ###########################################################################
+    def apply(self, command: Dict, now: datetime, definition: StandInDefinition):
+        name = command.get("Command", "")
+        params = command.get("Parameters", {}) or {}
+        handler: Optional[Callable] = COMMAND_HANDLERS.get(name)
+
+        with self.lock:
+            self.commands += 1
+            if handler is None:
+                self.unhandled[name] = self.unhandled.get(name, 0) + 1
+                return
+            handler(self, params, now, definition)
+
+    def on_train_unload(self, params, now, definition):
+        train = self._train(params.get("TrainId"))
+        if train:
+            load = train.pop("TrainLoad", None) or {}
+            self.warehouse_add(load.get("Id"), load.get("Amount", 0))
+
+    def on_train_dispatch_destination(self, params, now, definition):
+        train = self._train(params.get("TrainId"))
+        dest = definition.destinations.get(params.get("DestinationId"))
+        if not train or not dest:
+            return
+        train["Route"] = {
+            "RouteType": "destination",
+            "DefinitionId": dest["id"],
+            "DepartureTime": server_time(now),
+            "ArrivalTime": server_time(
+                now + timedelta(seconds=dest["travel_duration"] or 0)
+            ),
+        }
+        train["TrainLoad"] = {"Id": dest["article_id"], "Amount": dest["capacity"]}
+
+    def on_train_dispatch_job(self, params, now, definition):
+        train = self._train(params.get("TrainId"))
+        load = params.get("Load", {}) or {}
+        job = None
+        for row in self._list("jobs", "Jobs"):
+            if row.get("JobLocationId") == params.get("JobLocationId"):
+                job = row
+                break
+        if not train or not job:
+            return
+
+        amount = load.get("Amount", 0)
+        train["Route"] = {
+            "RouteType": "job",
+            "DefinitionId": job["JobLocationId"],
+            "DepartureTime": server_time(now),
+            "ArrivalTime": server_time(now + timedelta(seconds=job.get("Duration", 0))),
+        }
+        job["CurrentArticleAmount"] = job.get("CurrentArticleAmount", 0) + amount
+        self.warehouse_add(load.get("Id"), -amount)
+
+    def on_job_collect(self, params, now, definition):
+        jobs = self._list("jobs", "Jobs")
+        for idx, job in enumerate(jobs):
+            if job.get("JobLocationId") == params.get("JobLocationId"):
+                self.reward_add(job.get("Reward"))
+                del jobs[idx]
+                return
+
+    def on_whistle_collect(self, params, now, definition):
+        whistles = self._list("whistles", "Whistles")
+        for idx, whistle in enumerate(whistles):
+            if whistle.get("Category") == params.get("Category") and whistle.get(
+                "Position"
+            ) == params.get("Position"):
+                self.reward_add(whistle.get("Reward"))
+                del whistles[idx]
+                return
+
+    def _factory(self, factory_id) -> Optional[Dict]:
+        for factory in self._list("factories", "Factories"):
+            if factory.get("DefinitionId") == factory_id:
+                return factory
+        return None
+
+    def on_factory_order(self, params, now, definition):
+        factory = self._factory(params.get("FactoryId"))
+        product = definition.products.get(
+            (params.get("FactoryId"), params.get("ArticleId"))
+        )
+        if not factory or not product:
+            return
+
+        orders = factory.setdefault("ProductOrders", [])
+        if len(orders) >= factory.get("SlotCount", 0):
+            return
+
+        # 앞의 order 가 끝나야 시작한다.
+        started = now
+        if orders:
+            last = parse_server_time(orders[-1].get("FinishesAt"))
+            if last and last > started:
+                started = last
+        finishes_at = server_time(started + timedelta(seconds=product["craft_time"]))
+        orders.append(
+            {
+                "Product": {
+                    "Id": product["article_id"],
+                    "Amount": product["article_amount"],
+                },
+                "CraftTime": str(timedelta(seconds=product["craft_time"])),
+                "FinishTime": finishes_at,
+                "FinishesAt": finishes_at,
+            }
+        )
+        for article_id, amount in zip(
+            product["article_ids"].split(";"), product["article_amounts"].split(";")
+        ):
+            if article_id and amount:
+                self.warehouse_add(int(article_id), -int(amount))
+
+    def on_factory_collect(self, params, now, definition):
+        factory = self._factory(params.get("FactoryId"))
+        if not factory:
+            return
+        orders = factory.get("ProductOrders", [])
+        idx = params.get("Index", 0)
+        if 0 <= idx < len(orders):
+            finishes_at = parse_server_time(orders[idx].get("FinishesAt"))
+            if finishes_at and finishes_at <= now:
+                product = orders.pop(idx).get("Product", {})
+                self.warehouse_add(product.get("Id"), product.get("Amount", 0))
+
+
+COMMAND_HANDLERS: Dict[str, Callable] = {
+    "Game:Heartbeat": lambda *args: None,
+    "Game:Sleep": lambda *args: None,
+    "Game:WakeUp": lambda *args: None,
+    "Train:Unload": StandInAccount.on_train_unload,
+    "Train:DispatchToDestination": StandInAccount.on_train_dispatch_destination,
+    "Train:DispatchToJob": StandInAccount.on_train_dispatch_job,
+    "Job:Collect": StandInAccount.on_job_collect,
+    "Whistle:Collect": StandInAccount.on_whistle_collect,
+    "Factory:OrderProduct": StandInAccount.on_factory_order,
+    "Factory:CollectProduct": StandInAccount.on_factory_collect,
+}
+
+
+class StandInError(Exception):
+    def __init__(self, message: str, error_message: str, code: int):
+        super(StandInError, self).__init__(error_message)
+        self.message = message
+        self.error_message = error_message
+        self.code = code
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: "StandInHTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method: str):
+        started = time.perf_counter()
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        stand_in = self.server.stand_in
+        try:
+            if path == stand_in.definition_path:
+                self.send(
+                    200,
+                    stand_in.definition_file.read_bytes(),
+                    "application/x-sqlite3",
+                )
+                return
+
+            data = stand_in.route(method, path, self.headers, body)
+            resp = {
+                "Success": True,
+                "RequestId": self.headers.get("PXFD-Request-Id", ""),
+                "Time": server_time(stand_in.now()),
+                "Data": data,
+            }
+        except KeyError:
+            self.send(404, b"", "text/plain")
+            return
+        except StandInError as e:
+            resp = {
+                "Success": False,
+                "Error": {
+                    "Message": e.message,
+                    "ErrorMessage": e.error_message,
+                    "Code": e.code,
+                },
+                "RequestId": self.headers.get("PXFD-Request-Id", ""),
+                "Time": server_time(stand_in.now()),
+            }
+        finally:
+            stand_in.record(path, time.perf_counter() - started)
+
+        self.send(
+            200,
+            json.dumps(resp, separators=(",", ":")).encode("utf-8"),
+            "application/json",
+        )
+
+    def send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    stand_in: "StandInServer"
+
+
+class StandInServer:
+    """
+    server = StandInServer(port=0).start()
+    """
+
+    INIT_DATA_PATH = "/api/v2/initial-data/load"
+    INIT_DATA_LEGACY_PATH = "/api/v2/initial-data/legacy"
+
+    accounts: Dict[str, StandInAccount]
+    latencies: Dict[str, List[float]]
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seeds: Optional[List[str]] = None,
+        definition: str = DEFAULT_DEFINITION,
+    ):
+        """
+        :param port: 0 이면 빈 port
+        :param seeds: 계정에 순서대로 배정할 fixtures/init_data 파일 이름
+        :param definition: definition version (seed 의 init data 와 맞아야 한다)
+        """
+        self.host = host
+        self.port = port
+        self.seeds = [
+            load_fixture("init_data", name) for name in (seeds or DEFAULT_SEEDS)
+        ]
+        self.definition_version = definition
+        self.definition_file = definition_fixture(definition)
+        self.definition_path = f"/client-resources/client-data-{definition}.sqlite"
+        self.definition = StandInDefinition(self.definition_file)
+
+        self.accounts = {}
+        self.device_index = {}
+        self.latencies = {}
+        self.lock = threading.Lock()
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def now(self) -> datetime:
+        return datetime.now(tz=dt_timezone.utc).replace(microsecond=0)
+
+    def start(self) -> "StandInServer":
+        self.httpd = StandInHTTPServer((self.host, self.port), StandInHandler)
+        self.httpd.stand_in = self
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="StandInServer", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def record(self, path: str, elapsed: float):
+        with self.lock:
+            self.latencies.setdefault(path, []).append(elapsed)
+
+    ###########################################################################
+    # routes
+    ###########################################################################
+    def route(self, method: str, path: str, headers, body: bytes):
+        if path == "/get-endpoints":
+            return self.get_endpoints()
+        if path in ("/login", "/login/v2"):
+            return self.login(json.loads(body or b"{}"))
+        if path == "/api/v2/get-definition":
+            return self.get_definition()
+
+        account = self.authenticate(headers)
+        if path == self.INIT_DATA_PATH:
+            return account.init_data()
+        if path == self.INIT_DATA_LEGACY_PATH:
+            return []
+        if path == "/api/v2/start-game":
+            return {}
+        if path == "/api/v2/command-processing/run-collection":
+            return self.run_collection(account, json.loads(body or b"{}"))
+        if path == "/api/v2/query/get-leader-board-table":
+            return load_fixture("get_leader_board_table", "gaolious_2023.01.08.json")[
+                "Data"
+            ]
+        if path == "/api/v2/query/get-firebase-auth-token":
+            return self.firebase_auth_token(account)
+        raise KeyError(path)
+
+    def get_endpoints(self) -> Dict:
+        data = load_fixture("endpoints", "gaolious1_2022.12.29.json")["Data"]
+        for row in data.get("Endpoints", []):
+            row["Url"] = row["Url"].replace(PRODUCTION_URL, self.url)
+        data["InitialDataUrls"] = [
+            [self.url + self.INIT_DATA_PATH, self.url + self.INIT_DATA_LEGACY_PATH]
+        ]
+        return data
+
+    def get_definition(self) -> Dict:
+        return {
+            "Version": self.definition_version,
+            "Checksum": hashlib.sha1(self.definition_file.read_bytes()).hexdigest(),
+            "Url": self.url + self.definition_path,
+        }
+
+    def login(self, payload: Dict) -> Dict:
+        identity = payload.get("Identity", "")
+        with self.lock:
+            account = None
+            if payload.get("LoginType") == "remember_me_token":
+                account = next(
+                    (
+                        o
+                        for o in self.accounts.values()
+                        if o.remember_me_token == identity
+                    ),
+                    None,
+                )
+            else:
+                account = self.device_index.get(identity)
+
+            if not account:
+                player_id = str(10000000 + len(self.accounts) + 1)
+                seed = self.seeds[len(self.accounts) % len(self.seeds)]
+                account = StandInAccount(
+                    player_id=player_id, device_token=identity, seed=seed
+                )
+                self.accounts[player_id] = account
+                self.device_index[identity] = account
+            else:
+                account.game_access_token = str(uuid.uuid4())
+
+        return {
+            "PlayerId": account.player_id,
+            "GameAccessToken": account.game_access_token,
+            "AuthenticationToken": account.game_access_token,
+            "RememberMeToken": account.remember_me_token,
+            "SupportUrl": "",
+        }
+
+    def authenticate(self, headers) -> StandInAccount:
+        account = self.accounts.get(headers.get("PXFD-Player-Id", ""))
+        if not account or account.game_access_token != headers.get(
+            "PXFD-Game-Access-Token"
+        ):
+            raise StandInError(
+                message="Unauthorized.",
+                error_message="Invalid or expired session",
+                code=2,
+            )
+        return account
+
+    def run_collection(self, account: StandInAccount, payload: Dict) -> Dict:
+        now = self.now()
+        for command in payload.get("Commands", []):
+            account.apply(command, now=now, definition=self.definition)
+        return {"CollectionId": payload.get("Id", 0), "Commands": []}
+
+    def firebase_auth_token(self, account: StandInAccount) -> Dict:
+        def encode(value: Dict) -> str:
+            return (
+                base64.urlsafe_b64encode(json.dumps(value).encode("utf-8"))
+                .decode("utf-8")
+                .rstrip("=")
+            )
+
+        uid = f"standin_{account.player_id}"
+        exp = (self.now() + timedelta(hours=1)).timestamp()
+        token = f"{encode({'typ': 'JWT'})}.{encode({'uid': uid, 'exp': exp})}.sig"
+        return {"Uid": uid, "Token": token, "Env": "standin"}
+
+    ###########################################################################
+    # stats
+    ###########################################################################
+    def stats(self) -> Dict[str, List[float]]:
+        """
+        {path: [응답 시간 (초), ...]}
+        """
+        with self.lock:
+            ret = {path: list(values) for path, values in self.latencies.items()}
+        return ret
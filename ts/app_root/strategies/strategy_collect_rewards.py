@@ -163,9 +163,11 @@ def collect_whistle(version: RunVersion) -> datetime:
     for whistle in whistle_get_collectable_list(version=version):
         reward = []
         articles_str = []
-        for row in PlayerWhistleItem.objects.filter(
-            player_whistle=whistle, item_id=8
-        ).all():
+        for row in (
+            PlayerWhistleItem.objects.at_version(version)
+            .filter(player_whistle=whistle, item_id=8)
+            .all()
+        ):
             reward.append({"Id": row.item_id, "Value": row.value, "Amount": row.amount})
             article = TSArticle.objects.filter(id=row.value).first()
             articles_str.append(f"""[{article.id}|{article.name}:{row.amount}]""")
@@ -188,7 +190,7 @@ def collect_gift(version: RunVersion):
 
     if len(competition_list) > 0:
         print(f"  - Now Collectible Gift")
-        for gift in PlayerGift.objects.filter(version_id=version.id).all():
+        for gift in PlayerGift.objects.at_version(version).all():
             cmd = CollectGiftCommand(version=version, gift=gift)
             send_commands(commands=cmd)
     else:
@@ -289,7 +291,7 @@ def strategy_collect_achievement_commands(version: RunVersion):
     achievements_dict: Dict[str, TSAchievement] = {
         o.name: o for o in TSAchievement.objects.all()
     }
-    for achievement in PlayerAchievement.objects.filter(version_id=version.id).all():
+    for achievement in PlayerAchievement.objects.at_version(version).all():
         achievement_name = achievement.achievement
         level = achievement.level
         progress = achievement.progress
@@ -331,9 +333,11 @@ def collect_job_complete(version: RunVersion):
                 print(f"""    - {job} | is not collectable: Now[{version.now}]""")
                 continue
 
-            quest = PlayerQuest.objects.filter(
-                version_id=version.id, job_location_id=job.job_location_id
-            ).first()
+            quest = (
+                PlayerQuest.objects.at_version(version)
+                .filter(job_location_id=job.job_location_id)
+                .first()
+            )
             milestone = None
             curr_milestone = "-"
             curr_progress = "-"
@@ -400,7 +404,7 @@ def check_levelup(version: RunVersion):
 def check_expired_contracts(version: RunVersion):
     print(f"# [Strategy Process] - Refresh Expired Contracts")
 
-    for contract_list in PlayerContractList.objects.filter(version_id=version.id).all():
+    for contract_list in PlayerContractList.objects.at_version(version).all():
         if (
             contract_list.expires_at
             and contract_list.is_expired(version.now)
@@ -513,9 +517,11 @@ def check_factory(version: RunVersion):
     for factory in TSFactory.objects.filter(
         type=1, level_from__lte=version.level_id
     ).all():
-        player_factory = PlayerFactory.objects.filter(
-            version_id=version.id, factory_id=factory.id
-        ).first()
+        player_factory = (
+            PlayerFactory.objects.at_version(version)
+            .filter(factory_id=factory.id)
+            .first()
+        )
         if player_factory:
             continue
 
@@ -550,16 +556,18 @@ def _remove_task_from_building(
 
 def check_building(version: RunVersion) -> PlayerBuilding:
     print(f"# [Strategy Process] - Check Building")
-    task = PlayerCityLoopTask.objects.filter(version_id=version.id).first()
+    task = PlayerCityLoopTask.objects.at_version(version).first()
     # parcels = list(PlayerCityLoopParcel.objects.filter(version_id=version.id).values_list('parcel', flat=True))
     if task:
         for curr_try in range(3):
             upgrade_list = []
             task.refresh_from_db()
 
-            for bld in PlayerBuilding.objects.filter(
-                version_id=version.id, parcel_number__gt=0, level__lt=150
-            ).all():
+            for bld in (
+                PlayerBuilding.objects.at_version(version)
+                .filter(parcel_number__gt=0, level__lt=150)
+                .all()
+            ):
                 upgrade_list.append(bld)
 
             if not upgrade_list:
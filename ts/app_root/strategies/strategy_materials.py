@@ -1,5 +1,5 @@
 import math
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 
 from app_root.players.models import (
     PlayerContract,
@@ -32,7 +32,10 @@ from app_root.strategies.data_types import (
     FactoryStrategy,
     ArticleSource,
     MaterialStrategy,
+    ArticleGraph,
 )
+from app_root.strategies.contract_planner import select_contracts
+from app_root.strategies.factory_planner import plan_factory_orders
 from app_root.strategies.managers import (
     ship_find_iter,
     factory_find_player_factory,
@@ -45,6 +48,7 @@ from app_root.strategies.managers import (
     warehouse_max_capacity,
     trains_loads_amount_article_id,
     warehouse_get_amount,
+    warehouse_get_amounts,
     get_number_of_working_dispatchers,
     trains_find,
     warehouse_used_capacity,
@@ -67,41 +71,75 @@ def get_ship_materials(version: RunVersion) -> Material:
 
 
 def build_article_sources(version: RunVersion) -> Dict[int, ArticleSource]:
+    """
+        창고에 넣을 수 있는 article 별 획득 경로. (contract, destination, product)
+
+        contract / destination / product 는 한번씩만 조회해서 article 별로 나눈다.
+    :param version:
+    :return:
+    """
     param = {
         "event": version.do_event_quest,
         "union": version.do_union_quest,
     }
     countables = warehouse_countable(version=version, basic=True, **param)
+
+    contracts = article_find_contract(version=version, available_only=False)
+    destinations = article_find_destination(version=version)
+    products = article_find_product(version=version)
+
     article_source = {}
 
     for article_id, (article, amount) in countables.items():
-        if article_id not in article_source:
-            article_source.update({article_id: ArticleSource(article=article)})
+        source = ArticleSource(article=article)
 
-        contract_list = article_find_contract(
-            version=version, article_id=article_id, available_only=False
-        ).get(article_id, [])
-        for contract in contract_list:
-            article_source[article_id].add_contract(contract=contract)
+        for contract in contracts.get(article_id, []):
+            source.add_contract(contract=contract)
 
-        destination_list = article_find_destination(
-            version=version, article_id=article_id
-        ).get(article_id, [])
-        for destination in destination_list:
-            article_source[article_id].add_destination(dest=destination)
+        for destination in destinations.get(article_id, []):
+            source.add_destination(dest=destination)
 
-        products_list = article_find_product(
-            version=version, article_id=article_id
-        ).get(article_id, [])
-        for product in products_list:
-            article_source[article_id].add_product(product=product)
+        for product in products.get(article_id, []):
+            source.add_product(product=product)
+
+        article_source.update({article_id: source})
 
     return article_source
 
 
-def build_factory_strategy(version: RunVersion) -> Dict[int, FactoryStrategy]:
+def build_factory_strategy(
+    version: RunVersion,
+    requires: Optional[Material] = None,
+    article_graph: Optional[ArticleGraph] = None,
+) -> Dict[int, FactoryStrategy]:
+    """
+        공장별 생산 계획.
+
+        필요 수량 = 공장 제품의 창고 평균 수량 + requires 를 article graph 로 전개한 수량 - 창고 수량
+        빈 slot 에 넣을 주문 순서와 예상 완료시간은 plan_factory_orders 로 계산한다.
+        필요 수량을 채우는 주문 수(demand_article_count) 보다 많은 완료 주문은 command_factory_strategy 에서 수령한다.
+
+    :param version:
+    :param requires:
+    :param article_graph:
+    :return:
+    """
     ret: Dict[int, FactoryStrategy] = {}
 
+    param = {
+        "event": version.do_event_quest,
+        "union": version.do_union_quest,
+    }
+    countables = warehouse_countable(version=version, basic=True, **param)
+    avg_amount = warehouse_avg_count(
+        version=version, warehouse_countable_articles=countables
+    )
+    warehouse_amount = {
+        article_id: amount for article_id, (_, amount) in countables.items()
+    }
+
+    player_factories = []
+    target = Material()
     for player_factory in factory_find_player_factory(version=version):
         if player_factory.factory.is_event:
             continue
@@ -112,41 +150,65 @@ def build_factory_strategy(version: RunVersion) -> Dict[int, FactoryStrategy]:
         ) = factory_find_destination_and_factory_only_products(
             version=version, player_factory=player_factory
         )
-        completed, processing, waiting = factory_find_product_orders(
-            version=version, factory_id=int(player_factory.factory_id)
-        )
+        player_factories.append((player_factory, factory_product_list))
+
+        for product in factory_product_list:
+            target.add(article_id=int(product.article_id), amount=avg_amount)
 
         strategy = FactoryStrategy(
             player_factory=player_factory,
             factory_only_products=factory_product_list,
             destination_products=destination_product_list,
         )
-        strategy.update(completed=completed, processing=processing, waiting=waiting)
-
         ret.update({int(player_factory.factory_id): strategy})
 
-        if len(factory_product_list) == 1:
-            article_id = int(factory_product_list[0].article_id)
-            strategy.strategy_article_count.update(
-                {article_id: player_factory.slot_count * 2}
-            )
+    if requires:
+        target.add_dict(requires.required_articles)
 
-        elif len(factory_product_list) > 1:
-            products = sorted(
-                factory_product_list,
-                key=lambda x: (x.craft_time, x.article_amount),
-                reverse=True,
-            )
+    demand = target.required_articles
+    if article_graph:
+        demand, _ = article_graph.expand(requires=demand, available=warehouse_amount)
 
-            #   아이템 개수 x 2  <= slot count 이 큰 경우 모두 n개씩 할당
-            remain = player_factory.slot_count
-            while remain > 0 and len(products) > 0:
-                cnt = math.ceil(remain / len(products))
-                article_id = int(products[0].article_id)
+    for player_factory, factory_product_list in player_factories:
+        strategy = ret[int(player_factory.factory_id)]
 
-                strategy.strategy_article_count.update({article_id: cnt})
-                remain -= cnt
-                del products[0]
+        completed, processing, waiting = factory_find_product_orders(
+            version=version, factory_id=int(player_factory.factory_id)
+        )
+        strategy.update(completed=completed, processing=processing, waiting=waiting)
+
+        strategy.plan = plan_factory_orders(
+            player_factory=player_factory,
+            products=factory_product_list,
+            completed=completed,
+            processing=processing,
+            waiting=waiting,
+            demand={
+                article_id: amount - warehouse_amount.get(article_id, 0)
+                for article_id, amount in demand.items()
+            },
+            now=version.now,
+        )
+
+        planned = strategy.plan.article_count
+        for product in factory_product_list:
+            article_id = int(product.article_id)
+            remain = demand.get(article_id, 0) - warehouse_amount.get(article_id, 0)
+            strategy.demand_article_count.update(
+                {
+                    article_id: math.ceil(
+                        max(0, remain) / max(1, int(product.article_amount))
+                    )
+                }
+            )
+            strategy.strategy_article_count.update(
+                {
+                    article_id: strategy.completed_article_count.get(article_id, 0)
+                    + strategy.processing_article_count.get(article_id, 0)
+                    + strategy.waiting_article_count.get(article_id, 0)
+                    + planned.get(article_id, 0)
+                }
+            )
 
     return ret
 
@@ -334,6 +396,7 @@ def command_factory_strategy(
 ):
     """
         계획된 개수만큼 Factory를 채운다.
+        주문은 생산 계획(strategy.plan)의 순서대로 넣는다.
     :param version:
     :param factory_strategy_dict:
     :param article_source:
@@ -350,6 +413,7 @@ def command_factory_strategy(
         if isinstance(player_factory, list):
             player_factory = player_factory[0]
 
+        need_more = {}
         for product in strategy.factory_only_products:
             article_id = int(product.article_id)
 
@@ -358,49 +422,60 @@ def command_factory_strategy(
             processing_count = strategy.processing_article_count.get(article_id, 0)
             required_count = strategy.strategy_article_count.get(article_id, 0)
 
-            need_more_count = required_count - (
-                processing_count + waiting_count + completed_count
-            )
+            demand_count = strategy.demand_article_count.get(article_id, 0)
 
-            if need_more_count < 0:
+            # 필요 수량보다 많은 완료 주문은 수령한다.
+            surplus_count = min(
+                completed_count,
+                processing_count + waiting_count + completed_count - demand_count,
+            )
+            if surplus_count > 0:
                 print(
-                    f"    - Factory: {product.factory} | Article[#{product.article_id}|{product.article.name}] | Need {need_more_count} | Try Collect"
+                    f"    - Factory: {product.factory} | Article[#{product.article_id}|{product.article.name}] | Surplus {surplus_count} | Try Collect"
                 )
                 command_collect_factory(
-                    version=version, product=product, count=-need_more_count
+                    version=version, product=product, count=surplus_count
                 )
-                continue
 
-            if need_more_count == 0:
+            need_more_count = required_count - (
+                processing_count + waiting_count + completed_count
+            )
+
+            if need_more_count <= 0:
                 print(
                     f"    - Factory: {product.factory} | Article[#{product.article_id}|{product.article.name}] | Satisfied | PASS"
                 )
                 continue
 
-            available_slot = player_factory.slot_count - (
-                len(processing) + len(waiting)
-            )
+            need_more.update({article_id: need_more_count})
+
+        available_slot = player_factory.slot_count - (len(processing) + len(waiting))
+        planned_orders = strategy.plan.orders if strategy.plan else []
+
+        for product, finish_time in planned_orders:
+            article_id = int(product.article_id)
+            need_more_count = need_more.get(article_id, 0)
+            if need_more_count <= 0:
+                continue
+
             if available_slot <= 0:
                 print(
                     f"    - Factory: {product.factory} | Article[#{product.article_id}|{product.article.name}] | Need {need_more_count} | Available Slot:{available_slot} | Reach to Max Slot"
                 )
-                continue
-            # if len(processing) > 0:
-            #     print(f"    - Factory: {product.factory} | Article[#{product.article_id}|{product.article.name}] | Need {need_more_count} | Available Slot:{available_slot} | Producing Now.")
-            #     continue
-
-            need_more_count = min(1, min(available_slot, need_more_count))
+                break
 
             material = Material()
             material.add_dict(product.conditions_to_article_dict)
 
             if check_all_has_in_warehouse(version=version, requires=material):
                 print(
-                    f"    - Factory: {product.factory} | Article[#{product.article_id}|{product.article.name}] | Need {need_more_count} | Try Order"
+                    f"    - Factory: {product.factory} | Article[#{product.article_id}|{product.article.name}] | Need {need_more_count} | Try Order (Finish:{finish_time})"
                 )
                 command_order_product_in_factory(
                     version=version, product=product, count=1
                 )
+                need_more[article_id] -= 1
+                available_slot -= 1
             else:
                 print(
                     f"    - Factory: {product.factory} | Article[#{product.article_id}|{product.article.name}] | Need {need_more_count} | Not Enough Material"
@@ -438,12 +513,21 @@ def get_destination_materials(version: RunVersion) -> Material:
 
 
 def check_all_has_in_warehouse(version: RunVersion, requires: Material) -> bool:
-    for required_article_id, required_amount in requires.items():
-        if required_amount > warehouse_get_amount(
-            version=version, article_id=required_article_id
-        ):
-            return False
-    return True
+    """
+        requires 의 article 이 모두 창고에 있는지. (창고는 1번만 읽는다)
+    :param version:
+    :param requires:
+    :return:
+    """
+    required = requires.items()
+    if not required:
+        return True
+
+    amounts = warehouse_get_amounts(version=version)
+    return all(
+        required_amount <= amounts.get(required_article_id, 0)
+        for required_article_id, required_amount in required
+    )
 
 
 def command_trade_contract(version: RunVersion, contract: PlayerContract):
@@ -735,37 +819,40 @@ def material_strategy_add_queue(
 ):
     ret = []
 
+    # contract 로 채울 article 은 모아서 한번에 고른다.
+    contract_requires = {}
+    contract_candidates = []
+
     for required_article_id, required_article_amount in requires.items():
         source = article_source.get(required_article_id)
         if not source:
             continue
         if source.contracts:
-            multiply = 1
+            wc = warehouse_count.get(required_article_id)
+            if wc:
+                warehouse_amount = wc[1]
+            else:
+                warehouse_amount = warehouse_get_amount(
+                    version=version, article_id=required_article_id
+                )
 
-            if required_article_amount * multiply < warehouse_get_amount(
-                version=version, article_id=required_article_id
-            ):
+            if required_article_amount < warehouse_amount:
                 ret.append(
                     f"""{'  ' * depth} - Required:[{source.article}] - Enough material (more than x2)| PASS"""
                 )
                 continue
 
-            s = 0
-            for contract in source.contracts:
-                if s >= required_article_amount:
-                    break
-                amount = sum(
-                    [
-                        v
-                        for k, v in contract.reward_to_article_dict.items()
-                        if k == required_article_id
-                    ]
-                )
-                s += amount
-                strategy.push_contract(contract)
-                ret.append(
-                    f"""{'  ' * depth} - Required:[{source.article}] - Contract Slot[{contract.slot}][{amount} 개]"""
-                )
+            contract_requires.update(
+                {
+                    required_article_id: required_article_amount
+                    - max(
+                        0,
+                        warehouse_amount
+                        - strategy.get_used_warehouse(required_article_id),
+                    )
+                }
+            )
+            contract_candidates += source.contracts
 
         elif source.destinations:
             warehouse_amount = 0
@@ -798,6 +885,34 @@ def material_strategy_add_queue(
             )
             strategy.push_factory(source.products[0], required_article_amount)
 
+    if contract_requires:
+        stock = {
+            article_id: amount - strategy.get_used_warehouse(article_id)
+            for article_id, (_, amount) in warehouse_count.items()
+        }
+        free_capacity = warehouse_max_capacity(
+            version=version
+        ) - warehouse_used_capacity(version=version)
+
+        for contract in select_contracts(
+            requires=contract_requires,
+            contracts=contract_candidates,
+            stock=stock,
+            space_articles=set(warehouse_count),
+            free_capacity=free_capacity,
+            now=version.now,
+        ):
+            strategy.push_contract(contract)
+            rewards = {
+                article_id: amount
+                for article_id, amount in contract.reward_to_article_dict.items()
+                if article_id in contract_requires
+            }
+            for article_id, amount in rewards.items():
+                ret.append(
+                    f"""{'  ' * depth} - Required:[{article_source[article_id].article}] - Contract Slot[{contract.slot}][{amount} 개]"""
+                )
+
     print(f"""{'  ' * depth}# material_strategy_add_queue""")
     print("\n".join(ret))
 
@@ -854,141 +969,146 @@ def material_strategy_contract(
             )
 
 
+def build_article_graph(article_source: Dict[int, ArticleSource]) -> ArticleGraph:
+    return ArticleGraph(article_source=article_source)
+
+
 def material_strategy_factory(
     version: RunVersion,
     article_source: Dict[int, ArticleSource],
     strategy: MaterialStrategy,
     warehouse_count: Dict[int, Tuple[TSArticle, int]],
+    article_graph: Optional[ArticleGraph] = None,
 ):
-    max_iter = 10
-    cur_iter = 0
-    player_factories = factory_find_player_factory(version=version)
-    product_orders = {}
-
-    for player_factory in player_factories:
-        factory_id = int(player_factory.factory_id)
-        product_orders.update(
-            {
-                factory_id: factory_find_product_orders(
-                    version=version, factory_id=factory_id
-                )
-            }
-        )
-
-    while not strategy.all_empty_factory():
-        cur_iter += 1
-        if cur_iter >= max_iter:
-            break
-
-        for player_factory in player_factories:
-            factory_id = int(player_factory.factory_id)
-
-            completed, processing, waiting = product_orders[factory_id]
-
-            while not strategy.empty_factory_queue(factory_id=factory_id):
-                product, required_article_amount = strategy.pop_factory(
-                    factory_id=factory_id
-                )
-                required_article_id = product.article_id
-
-                completed_amount = sum(
-                    [c.amount for c in completed if c.article_id == required_article_id]
-                )
-                processing_amount = sum(
-                    [
-                        c.amount
-                        for c in processing
-                        if c.article_id == required_article_id
-                    ]
-                )
-                waiting_amount = sum(
-                    [c.amount for c in waiting if c.article_id == required_article_id]
-                )
-                uncompleted_amount = processing_amount + waiting_amount
-
-                completed_amount -= strategy.get_used_collectable_factory(
-                    product=product
-                )
-                uncompleted_amount -= strategy.get_used_uncollectable_factory(
-                    product=product
-                )
+    """
+        factory queue 의 요구량을 article graph 의 topological 순서로 한번에 전개한다.
 
-                warehouse_amount = 0
-                ret = warehouse_count.get(required_article_id)
-                if ret:
-                    warehouse_amount = ret[1]
+        창고 / 완료된 주문 / 진행중인 주문 순서로 할당하고, 부족분은 prepare 로 넣고
+        그 재료를 하위 article 의 요구량에 더한다. (하위 단계 수에 제한 없음)
 
-                remain_warehouse_amount = (
-                    warehouse_amount - strategy.get_used_warehouse(required_article_id)
-                )
+    :param version:
+    :param article_source:
+    :param strategy:
+    :param warehouse_count:
+    :param article_graph:
+    :return:
+    """
+    if article_graph is None:
+        article_graph = build_article_graph(article_source=article_source)
+
+    requires = {}
+    products = {}
+    for factory_id in list(strategy.factory_queue):
+        while not strategy.empty_factory_queue(factory_id=factory_id):
+            product, required_article_amount = strategy.pop_factory(
+                factory_id=factory_id
+            )
+            article_id = int(product.article_id)
+            products.update({article_id: product})
+            requires.setdefault(article_id, 0)
+            requires[article_id] += required_article_amount
 
-                used_warehouse_amount = min(
-                    required_article_amount, remain_warehouse_amount
-                )
-                if used_warehouse_amount > 0:
-                    strategy.add_used_warehouse(
-                        product.article_id, required_article_amount
-                    )
-                    remain_warehouse_amount -= used_warehouse_amount
-                    required_article_amount -= used_warehouse_amount
+    if not requires:
+        return
 
-                used_completed_product_amount = min(
-                    completed_amount, required_article_amount
-                )
-                if used_completed_product_amount > 0:
-                    strategy.add_collectable_factory(
-                        product, used_completed_product_amount
-                    )
-                    completed_amount -= used_completed_product_amount
-                    required_article_amount -= used_completed_product_amount
+    article_graph = article_graph.extend(products)
 
-                used_uncompleted_product_amount = min(
-                    uncompleted_amount, required_article_amount
-                )
-                if used_uncompleted_product_amount > 0:
-                    strategy.add_uncollectable_factory(
-                        product, used_uncompleted_product_amount
-                    )
-                    uncompleted_amount -= used_uncompleted_product_amount
-                    required_article_amount -= used_uncompleted_product_amount
+    completed_amount = {}
+    uncompleted_amount = {}
+    for player_factory in factory_find_player_factory(version=version):
+        completed, processing, waiting = factory_find_product_orders(
+            version=version, factory_id=int(player_factory.factory_id)
+        )
+        for order in completed:
+            completed_amount.setdefault(order.article_id, 0)
+            completed_amount[order.article_id] += order.amount
+        for order in processing + waiting:
+            uncompleted_amount.setdefault(order.article_id, 0)
+            uncompleted_amount[order.article_id] += order.amount
+
+    available = {}
+    for article_id in article_graph.order:
+        product = products.get(article_id) or article_graph.products[article_id]
+        wc = warehouse_count.get(article_id)
+        warehouse_amount = wc[1] if wc else 0
+        available[article_id] = (
+            max(0, warehouse_amount - strategy.get_used_warehouse(article_id))
+            + max(
+                0,
+                completed_amount.get(article_id, 0)
+                - strategy.get_used_collectable_factory(product=product),
+            )
+            + max(
+                0,
+                uncompleted_amount.get(article_id, 0)
+                - strategy.get_used_uncollectable_factory(product=product),
+            )
+        )
 
-                if required_article_amount > 0:
-                    strategy.add_prepare_factory(product, required_article_amount)
+    demand, crafts = article_graph.expand(requires=requires, available=available)
 
-        material = Material()
+    ret = []
+    for article_id in article_graph.order:
+        required_article_amount = demand.get(article_id, 0)
+        if required_article_amount < 1:
+            continue
 
-        for player_factory in player_factories:
-            factory_id = int(player_factory.factory_id)
-            condition = {}
-            products = {}
+        product = products.get(article_id) or article_graph.products[article_id]
 
-            while not strategy.empty_factory_prepare(factory_id=factory_id):
-                product, amount = strategy.pop_factory_prepare(factory_id=factory_id)
-                article_id = product.article_id
-                products.update({article_id: product})
+        wc = warehouse_count.get(article_id)
+        warehouse_amount = wc[1] if wc else 0
+        remain_warehouse_amount = warehouse_amount - strategy.get_used_warehouse(
+            article_id
+        )
+        used_warehouse_amount = min(required_article_amount, remain_warehouse_amount)
+        if used_warehouse_amount > 0:
+            strategy.add_used_warehouse(article_id, used_warehouse_amount)
+            required_article_amount -= used_warehouse_amount
 
-                condition.setdefault(article_id, 0)
-                condition[article_id] += amount
+        remain_completed_amount = completed_amount.get(
+            article_id, 0
+        ) - strategy.get_used_collectable_factory(product=product)
+        used_completed_product_amount = min(
+            remain_completed_amount, required_article_amount
+        )
+        if used_completed_product_amount > 0:
+            strategy.add_collectable_factory(product, used_completed_product_amount)
+            required_article_amount -= used_completed_product_amount
+
+        remain_uncompleted_amount = uncompleted_amount.get(
+            article_id, 0
+        ) - strategy.get_used_uncollectable_factory(product=product)
+        used_uncompleted_product_amount = min(
+            remain_uncompleted_amount, required_article_amount
+        )
+        if used_uncompleted_product_amount > 0:
+            strategy.add_uncollectable_factory(product, used_uncompleted_product_amount)
+            required_article_amount -= used_uncompleted_product_amount
 
-            for article_id, amount in condition.items():
-                if amount < 1:
-                    continue
+        if required_article_amount > 0:
+            strategy.add_prepare_factory(product, required_article_amount)
+            ret.append(
+                f"""   - Prepare:[{product}] - [{required_article_amount} 개] x {crafts.get(article_id, 0)}회"""
+            )
 
-                product: TSProduct = products[article_id]
-                cnt = math.ceil(amount / product.article_amount)
+    # graph 에서 product 로 전개되지 않는 재료 (contract / destination)
+    material = Material()
+    for article_id, amount in demand.items():
+        if article_graph.is_product(article_id):
+            continue
+        if amount > 0:
+            material.add(article_id=article_id, amount=amount)
 
-                for k, v in product.conditions_to_article_dict.items():
-                    # product#13 / 40개 짜리 - 43개 필요시
-                    # product#13의 부품 * 2배.
-                    material.add(article_id=k, amount=v * cnt)
+    print("""  # material_strategy_factory""")
+    print("\n".join(ret))
 
-        material_strategy_add_queue(
-            version=version,
-            requires=material,
-            article_source=article_source,
-            strategy=strategy,
-            warehouse_count=warehouse_count,
-        )
+    material_strategy_add_queue(
+        version=version,
+        requires=material,
+        article_source=article_source,
+        strategy=strategy,
+        warehouse_count=warehouse_count,
+    )
 
 
 def expand_material_strategy(
@@ -996,12 +1116,14 @@ def expand_material_strategy(
     requires: Material,
     article_source: Dict[int, ArticleSource],
     strategy: MaterialStrategy,
+    article_graph: Optional[ArticleGraph] = None,
 ) -> Tuple[bool, MaterialStrategy]:
     """
         필요한 재료 material 에 대해
 
         창고 수량을 체크하여, 추가 필요분 체크.
 
+    :param article_graph:
     :param strategy:
     :param version:
     :param requires:
@@ -1039,6 +1161,7 @@ def expand_material_strategy(
         article_source=article_source,
         strategy=strategy,
         warehouse_count=warehouse_count,
+        article_graph=article_graph,
     )
 
 
@@ -1078,12 +1201,14 @@ def command_ship_trade(
     requires: Material,
     article_source: Dict[int, ArticleSource],
     strategy: MaterialStrategy,
+    article_graph: Optional[ArticleGraph] = None,
 ):
     expand_material_strategy(
         version=version,
         requires=requires,
         article_source=article_source,
         strategy=strategy,
+        article_graph=article_graph,
     )
     command_material_strategy(version=version, strategy=strategy)
     contract = contract_get_ship(version=version)
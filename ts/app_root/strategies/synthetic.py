@@ -0,0 +1,369 @@
+import copy
+import json
+import random
+import sqlite3
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app_root.servers.mixins import CONTENT_CATEGORY_BASIC, CONTENT_CATEGORY_UNION
+from app_root.strategies.standin import (
+    ARTICLE_ITEM_ID,
+    DEFAULT_DEFINITION,
+    definition_fixture,
+    load_fixture,
+    parse_server_time,
+    server_time,
+)
+
+###########################################################################
+# Synthetic account
+#
+#   scaling test 용 큰 계정의 init data 를 만든다.
+#   - template (fixtures/init_data) 의 init data 에서 trains / jobs / contracts / factories / warehouse 를 바꾼다.
+#     나머지 section (player, regions, destinations ...) 은 template 그대로.
+#   - id 는 definition sqlite 에 있는 것만 쓴다. (기차, job location, factory, product, article, warehouse level)
+#   - 기차 / job 의 region 은 template 에서 방문한 region 까지.
+#   - union job 은 location 마다 1개. (location 보다 많으면 ValueError)
+#   - 같은 seed 면 같은 init data.
+#
+#       generator = SyntheticAccount(seed=1)
+#       text = generator.generate_text(trains=500, union_jobs=20)
+#       InitdataHelper(version=version).parse_data(data=text)
+###########################################################################
+DEFAULT_TEMPLATE = "gaolious_2023.02.07.json"
+# template 에서 가져가는 currency (gold, gem, ...)
+CURRENCY_ARTICLE_MAX_ID = 100
+UNION_JOB_TYPE = 45
+UNION_JOB_LEVEL = 7
+
+
+def craft_time(seconds: int) -> str:
+    """
+    3700 -> '01:01:40'
+    """
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class SyntheticDefinition:
+    """
+    init data 를 만드는 데 필요한 definition. (sqlite 를 직접 읽는다)
+    """
+
+    def __init__(self, filename: Path):
+        conn = sqlite3.connect(str(filename))
+        try:
+            conn.row_factory = sqlite3.Row
+            self.regions = [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT id, content_category FROM region ORDER BY level_from, ordering"
+                )
+            ]
+            self.trains = [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT id, content_category, region, rarity_id, era_id, max_level FROM train"
+                )
+            ]
+            self.job_locations = [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT job_location_id, region_id FROM job_location_v2 ORDER BY job_location_id"
+                )
+            ]
+            self.factories = [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT id, content_category, level_from, max_slot_count FROM factory"
+                    " ORDER BY level_from, id"
+                )
+            ]
+            self.products = [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT factory_id, article_id, article_amount, craft_time, level_from FROM product"
+                )
+            ]
+            self.warehouse_levels = {
+                row["level"]: row["capacity"]
+                for row in conn.execute("SELECT level, capacity FROM warehouse_level")
+            }
+        finally:
+            conn.close()
+
+
+class SyntheticAccount:
+    template: Dict
+    definition: SyntheticDefinition
+
+    def __init__(
+        self,
+        template: str = DEFAULT_TEMPLATE,
+        definition: str = DEFAULT_DEFINITION,
+        seed: int = 0,
+    ):
+        """
+        :param template: fixtures/init_data 의 파일 이름
+        :param definition: definition version (template 과 맞아야 한다)
+        :param seed:
+        """
+        self.template = load_fixture("init_data", template)
+        self.definition = SyntheticDefinition(definition_fixture(definition))
+        self.seed = seed
+
+        self.sections = {row["Type"]: row["Data"] for row in self.template["Data"]}
+        self.now = parse_server_time(self.template["Time"])
+        self.player_level = self.sections["player"]["PlayerLevel"]
+
+        # 방문한 기본 region 의 순서 (firestore.get_max_region 과 같은 기준)
+        regions = [
+            o["id"]
+            for o in self.definition.regions
+            if o["content_category"] == CONTENT_CATEGORY_BASIC
+        ]
+        visited = set(self.sections["regions"]["VisitedRegions"])
+        self.visited_regions = {o for o in regions if o in visited}
+        self.max_region = max(
+            [idx for idx, o in enumerate(regions, 1) if o in visited] or [1]
+        )
+
+    ###########################################################################
+    # sections
+    ###########################################################################
+    def _trains(self, rng: random.Random, count: int) -> List[Dict]:
+        definitions = [
+            o
+            for o in self.definition.trains
+            if o["content_category"] == CONTENT_CATEGORY_BASIC
+            and 1 <= o["region"] <= self.max_region
+        ]
+        ret = []
+        for instance_id in range(1, count + 1):
+            train = rng.choice(definitions)
+            ret.append(
+                {
+                    "InstanceId": instance_id,
+                    "DefinitionId": train["id"],
+                    "Level": rng.randint(1, train["max_level"]),
+                }
+            )
+        return ret
+
+    def _job(
+        self, rng: random.Random, location_id: int, article_id: int, **kwargs
+    ) -> Dict:
+        amount = rng.randint(8, 20) * 10
+        return {
+            "Id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "JobLocationId": location_id,
+            "JobLevel": 1,
+            "JobType": 1,
+            "Duration": 3600,
+            "ConditionMultiplier": 1,
+            "RewardMultiplier": 1,
+            "RequiredArticle": {"Id": article_id, "Amount": amount},
+            "CurrentArticleAmount": 0,
+            "Reward": {
+                "Items": [{"Id": ARTICLE_ITEM_ID, "Value": 1, "Amount": amount * 2}]
+            },
+            "Bonus": {"Reward": {"Items": []}},
+            "Requirements": [
+                {"Type": "region", "Value": rng.randint(1, self.max_region)},
+                {"Type": "rarity", "Value": rng.randint(1, 4)},
+            ],
+            "UnlocksAt": server_time(self.now - timedelta(days=1)),
+            **kwargs,
+        }
+
+    def _jobs(
+        self, rng: random.Random, count: int, union_count: int, articles: List[int]
+    ) -> List[Dict]:
+        union_regions = {
+            o["id"]
+            for o in self.definition.regions
+            if o["content_category"] == CONTENT_CATEGORY_UNION
+        }
+        basic_locations = [
+            o["job_location_id"]
+            for o in self.definition.job_locations
+            if o["region_id"] in self.visited_regions
+        ]
+        union_locations = [
+            o["job_location_id"]
+            for o in self.definition.job_locations
+            if o["region_id"] in union_regions
+        ]
+
+        # 같은 location 의 job 은 1개. (PlayerJob 을 job_location_id 로 찾는다)
+        if union_count > len(union_locations):
+            raise ValueError(
+                f"union_jobs={union_count} : union job location 은 {len(union_locations)} 개"
+            )
+
+        ret = []
+        for location_id in rng.sample(
+            basic_locations, min(count, len(basic_locations))
+        ):
+            ret.append(self._job(rng, location_id, rng.choice(articles)))
+
+        expires_at = server_time(self.now + timedelta(days=7))
+        for location_id in union_locations[:union_count]:
+            job = self._job(
+                rng,
+                location_id,
+                rng.choice(articles),
+                JobType=UNION_JOB_TYPE,
+                JobLevel=UNION_JOB_LEVEL,
+                ExpiresAt=expires_at,
+            )
+            job["RequiredArticle"]["Amount"] *= 50
+            ret.append(job)
+        return ret
+
+    def _contracts(
+        self, rng: random.Random, count: int, articles: List[int]
+    ) -> List[Dict]:
+        contract_list_id = self.sections["contracts"]["ContractLists"][0][
+            "ContractListId"
+        ]
+        usable_from = server_time(self.now - timedelta(hours=1))
+        ret = []
+        for slot in range(1, count + 1):
+            ret.append(
+                {
+                    "Slot": slot,
+                    "ContractListId": contract_list_id,
+                    "Conditions": [
+                        {"Id": article_id, "Amount": rng.randint(5, 40) * 10}
+                        for article_id in rng.sample(
+                            articles, min(len(articles), rng.randint(1, 3))
+                        )
+                    ],
+                    "Reward": {
+                        "Items": [
+                            {"Id": ARTICLE_ITEM_ID, "Value": 3, "Amount": 100 * slot}
+                        ]
+                    },
+                    "UsableFrom": usable_from,
+                    "AvailableFrom": "1970-01-01T00:00:00Z",
+                    "AvailableTo": "2999-12-31T00:00:00Z",
+                }
+            )
+        return ret
+
+    def _factories(self, rng: random.Random, count: int, slot_count: int) -> List[Dict]:
+        factories = [
+            o
+            for o in self.definition.factories
+            if o["content_category"] == CONTENT_CATEGORY_BASIC
+            and o["level_from"] <= self.player_level
+        ][:count]
+
+        ret = []
+        for factory in factories:
+            products = self.factory_products(factory["id"])
+            finish_time = self.now
+            orders = []
+            for _ in range(slot_count):
+                product = rng.choice(products)
+                finish_time += timedelta(seconds=product["craft_time"])
+                orders.append(
+                    {
+                        "Product": {
+                            "Id": product["article_id"],
+                            "Amount": product["article_amount"],
+                        },
+                        "CraftTime": craft_time(product["craft_time"]),
+                        "FinishTime": server_time(finish_time),
+                        "FinishesAt": server_time(finish_time),
+                    }
+                )
+            ret.append(
+                {
+                    "DefinitionId": factory["id"],
+                    "SlotCount": slot_count,
+                    "ProductOrders": orders,
+                }
+            )
+        return ret
+
+    def factory_products(self, factory_id: int) -> List[Dict]:
+        return [
+            o
+            for o in self.definition.products
+            if o["factory_id"] == factory_id and o["level_from"] <= self.player_level
+        ]
+
+    def _warehouse(
+        self, level: int, articles: List[int], amount: Optional[int]
+    ) -> Dict:
+        capacity = self.definition.warehouse_levels[level]
+        if amount is None:
+            amount = capacity // (2 * max(1, len(articles)))
+
+        ret = [
+            o
+            for o in self.sections["warehouse"]["Articles"]
+            if o["Id"] < CURRENCY_ARTICLE_MAX_ID
+        ]
+        ret += [{"Id": article_id, "Amount": amount} for article_id in articles]
+        return {"Level": level, "Articles": ret}
+
+    ###########################################################################
+    # generate
+    ###########################################################################
+    def generate(
+        self,
+        trains: int = 90,
+        jobs: int = 10,
+        union_jobs: int = 4,
+        contracts: int = 10,
+        factories: int = 6,
+        slot_count: int = 6,
+        warehouse_level: Optional[int] = None,
+        warehouse_amount: Optional[int] = None,
+    ) -> Dict:
+        """
+        :param trains: 기차 수 (모두 idle)
+        :param jobs: story job 수 (기본 job location 수 까지)
+        :param union_jobs: union job 수 (union job location 수 까지)
+        :param contracts: contract 수
+        :param factories: factory 수 (player level 로 열린 기본 factory 까지)
+        :param slot_count: factory 별 slot (= 생산중인 주문) 수
+        :param warehouse_level: None 이면 template
+        :param warehouse_amount: article 별 창고 수량. None 이면 capacity 의 절반을 나눈다.
+        :return: init data (server 응답 형식)
+        """
+        rng = random.Random(self.seed)
+
+        factory_list = self._factories(rng, factories, slot_count)
+        articles = sorted(
+            {
+                product["article_id"]
+                for factory in factory_list
+                for product in self.factory_products(factory["DefinitionId"])
+            }
+        )
+
+        sections = copy.deepcopy(self.sections)
+        sections["trains"]["Trains"] = self._trains(rng, trains)
+        sections["jobs"]["Jobs"] = self._jobs(rng, jobs, union_jobs, articles)
+        sections["contracts"]["Contracts"] = self._contracts(rng, contracts, articles)
+        sections["factories"]["Factories"] = factory_list
+        sections["warehouse"] = self._warehouse(
+            level=warehouse_level or self.sections["warehouse"]["Level"],
+            articles=articles,
+            amount=warehouse_amount,
+        )
+
+        return {
+            "Success": True,
+            "RequestId": f"synthetic-{self.seed}",
+            "Time": self.template["Time"],
+            "Data": [{"Type": name, "Data": data} for name, data in sections.items()],
+        }
+
+    def generate_text(self, **kwargs) -> str:
+        return json.dumps(self.generate(**kwargs), separators=(",", ":"))
@@ -0,0 +1,38 @@
+import pytest
+
+from app_root.strategies.benchmark import (
+    run_benchmarks,
+    compare_baseline,
+    save_results,
+    load_results,
+    update_baseline,
+)
+
+
+@pytest.mark.django_db
+def test_benchmark(multidb, settings, tmp_path):
+    settings.SITE_PATH = tmp_path
+    results = run_benchmarks(names=["build_article_sources", "ts_dump"], repeat=2)
+
+    assert [o.name for o in results] == ["build_article_sources", "ts_dump"]
+    for result in results:
+        assert len(result.wall) == 2
+        assert result.queries > 0
+        assert result.peak_memory > 0
+
+    path = tmp_path / "baseline.json"
+    save_results(path, results)
+    baseline = load_results(path)
+    assert compare_baseline(results, baseline) == []
+
+    # query 가 늘거나 threshold 이상 느려지면 regression
+    baseline["ts_dump"]["queries"] -= 1
+    baseline["build_article_sources"]["wall_min"] = results[0].wall_min / 2
+    regressions = compare_baseline(results, baseline, threshold=0.2)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("build_article_sources : wall")
+    assert regressions[1].startswith("ts_dump : queries")
+
+    # 실행한 항목만 바꾼다.
+    update_baseline(path, results[1:])
+    assert load_results(path)["ts_dump"] == results[1].to_dict()
@@ -0,0 +1,72 @@
+import json
+
+from app_root.players.models import PlayerContract
+from app_root.strategies.contract_planner import select_contracts
+
+
+def contract(pk, slot, conditions, rewards):
+    return PlayerContract(
+        id=pk,
+        slot=slot,
+        conditions=json.dumps([{"Id": k, "Amount": v} for k, v in conditions.items()]),
+        reward=json.dumps(
+            {"Items": [{"Id": 8, "Value": k, "Amount": v} for k, v in rewards.items()]}
+        ),
+    )
+
+
+def test_select_contracts():
+    # 107 은 충분, 224 는 부족한 재료.
+    stock = {107: 1000, 224: 10}
+
+    greedy_first = contract(1, 1, {224: 100}, {200: 50})
+    cheap = contract(2, 2, {107: 50}, {200: 30})
+    cheap2 = contract(3, 3, {107: 50}, {200: 30})
+    other = contract(4, 4, {107: 10}, {201: 20})
+
+    selected = select_contracts(
+        requires={200: 50, 201: 10},
+        contracts=[greedy_first, cheap, cheap2, other],
+        stock=stock,
+        space_articles={107, 224, 200, 201},
+        free_capacity=1000,
+    )
+
+    # 부족한 재료(224)를 쓰는 contract 대신, 두 article 을 모두 채우는 최소 비용 조합.
+    assert sorted(c.id for c in selected) == [2, 3, 4]
+
+
+def test_select_contracts_warehouse_capacity():
+    stock = {107: 1000}
+
+    small = contract(1, 1, {107: 10}, {200: 20})
+    large = contract(2, 2, {107: 10}, {200: 100})
+
+    selected = select_contracts(
+        requires={200: 100},
+        contracts=[small, large],
+        stock=stock,
+        space_articles={107, 200},
+        free_capacity=50,
+    )
+
+    # 창고 공간을 넘는 contract 는 고르지 않는다.
+    assert [c.id for c in selected] == [1]
+
+
+def test_select_contracts_full_warehouse():
+    stock = {107: 1000}
+
+    grow = contract(1, 1, {107: 10}, {200: 100})
+    shrink = contract(2, 2, {107: 60}, {200: 50})
+
+    selected = select_contracts(
+        requires={200: 100},
+        contracts=[grow, shrink],
+        stock=stock,
+        space_articles={107, 200},
+        free_capacity=-30,
+    )
+
+    # 창고가 이미 넘쳐도 창고 사용량을 늘리지 않는 contract 는 고른다.
+    assert [c.id for c in selected] == [2]
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from app_root.strategies.dumps import ts_dump, flush_dumps
+from app_root.strategies.simulator import prepare_version
+
+
+@pytest.mark.django_db
+def test_ts_dump(multidb, settings, tmp_path):
+    settings.SITE_PATH = tmp_path
+    settings.TS_DUMP = {"sections": ["default", "warehouse"], "stdout": False}
+    version = prepare_version("dump", ["init_data/gaolious_2023.02.07.json"])
+
+    future = ts_dump(version=version)
+    flush_dumps()
+    assert future.done()
+
+    base_path = tmp_path / "dump" / "dump"
+    str_dt = version.created.strftime("%Y%m%d_%H%M%S")
+    text = (base_path / f"{version.id}_{str_dt}.txt").read_text()
+    assert "# [Default]" in text
+    assert "# [Warehouse]" in text
+    assert "# [Factory]" not in text
+
+    record = json.loads((base_path / f"{version.id}_{str_dt}.ndjson").read_text())
+    assert record["version_id"] == version.id
+    assert list(record["sections"]) == ["default", "warehouse"]
+    assert record["sections"]["default"]["level"] == version.level_id
+
+    # 바로 쓰기 / json 없이
+    assert ts_dump(version=version, background=False, to_json=False) is None
+    assert (base_path / f"{version.id}_{str_dt}.txt").read_text().count(
+        "# [Default]"
+    ) == 2
+    assert (
+        len((base_path / f"{version.id}_{str_dt}.ndjson").read_text().splitlines()) == 1
+    )
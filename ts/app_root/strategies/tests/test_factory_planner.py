@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from app_root.players.models import PlayerFactory, PlayerFactoryProductOrder
+from app_root.servers.models import TSProduct
+from app_root.strategies.factory_planner import plan_factory_orders
+from core.utils import create_datetime as dt
+
+
+def test_plan_factory_orders():
+    now = dt(2023, 3, 1, 0, 0, 0)
+    player_factory = PlayerFactory(slot_count=4)
+
+    fast = TSProduct(article_id=101, article_amount=10, craft_time=60)
+    slow = TSProduct(article_id=102, article_amount=10, craft_time=600)
+
+    processing = [
+        PlayerFactoryProductOrder(
+            article_id=102,
+            amount=10,
+            craft_time=600,
+            finish_time=now + timedelta(seconds=300),
+        )
+    ]
+
+    plan = plan_factory_orders(
+        player_factory=player_factory,
+        products=[slow, fast],
+        completed=[],
+        processing=processing,
+        waiting=[],
+        demand={101: 15, 102: 20},
+        now=now,
+    )
+
+    # 빈 slot 3개 모두 사용, 필요 수량(101: 2회, 102: 1회) 을 먼저 채운다.
+    assert len(plan.orders) == 3
+    assert plan.article_count == {101: 2, 102: 1}
+
+    # 짧은 주문 먼저, 완료시간은 대기열이 끝난 뒤부터 누적된다.
+    assert [int(p.article_id) for p, _ in plan.orders] == [101, 101, 102]
+    assert plan.busy_until == now + timedelta(seconds=300)
+    assert [t for _, t in plan.orders] == [
+        now + timedelta(seconds=360),
+        now + timedelta(seconds=420),
+        now + timedelta(seconds=1020),
+    ]
+    assert plan.makespan == 1020
+
+
+def test_plan_factory_orders_fill_idle_slot():
+    now = dt(2023, 3, 1, 0, 0, 0)
+    player_factory = PlayerFactory(slot_count=2)
+
+    a = TSProduct(article_id=101, article_amount=10, craft_time=60)
+    b = TSProduct(article_id=102, article_amount=10, craft_time=120)
+
+    plan = plan_factory_orders(
+        player_factory=player_factory,
+        products=[a, b],
+        completed=[PlayerFactoryProductOrder(article_id=101, amount=10, craft_time=60)],
+        processing=[],
+        waiting=[],
+        demand={},
+        now=now,
+    )
+
+    # 필요 수량이 없어도 slot 을 놀리지 않는다. (주문 수가 적은 제품부터)
+    assert plan.article_count == {101: 1, 102: 1}
+    assert plan.busy_until == now
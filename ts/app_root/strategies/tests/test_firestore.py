@@ -0,0 +1,175 @@
+import json
+import sys
+from unittest import mock
+
+import pytest
+
+from app_root.players.models import PlayerJob
+from app_root.servers.models import RunVersion, TSJobLocation
+from app_root.strategies import firestore
+from app_root.strategies.firestore import (
+    FirestoreSidecar,
+    FirestoreSidecarError,
+    fetch_guild_jobs,
+    get_max_region,
+    merge_guild_jobs,
+)
+from app_root.strategies.simulator import prepare_version
+from app_root.users.models import User
+
+# sidecar.ts 와 같은 protocol 의 stand-in
+FAKE_SIDECAR = """
+import json, sys, time
+for line in sys.stdin:
+    request = json.loads(line)
+    method = request["method"]
+    if method == "crash":
+        sys.exit(1)
+    if method == "sleep":
+        time.sleep(10)
+    if method == "getJobs":
+        response = {"result": [{"JobLocationId": 1, "GuildId": request["params"]["guildId"]}]}
+    elif method == "ping":
+        response = {"result": "pong"}
+    else:
+        response = {"error": {"code": -32601, "message": "Method not found"}}
+    response.update({"jsonrpc": "2.0", "id": request["id"]})
+    sys.stdout.write(json.dumps(response) + "\\n")
+    sys.stdout.flush()
+"""
+
+COMPLETED_AT = "2023-02-07T01:00:00Z"
+
+
+@pytest.fixture
+def sidecar(settings, tmp_path):
+    settings.LOG_PATH = tmp_path
+    instance = FirestoreSidecar(command=[sys.executable, "-c", FAKE_SIDECAR])
+    yield instance
+    instance.stop()
+
+
+def test_firestore_sidecar(sidecar):
+    assert sidecar.call("ping") == "pong"
+    assert sidecar.call("ping") == "pong"
+    assert sidecar.starts == 1
+
+    with pytest.raises(FirestoreSidecarError):
+        sidecar.call("unknown")
+    assert sidecar.is_alive()
+
+    # 죽으면 다음 요청에서 다시 띄운다.
+    with pytest.raises(FirestoreSidecarError):
+        sidecar.call("crash")
+    assert sidecar.call("ping") == "pong"
+    assert sidecar.starts == 2
+
+    # 응답이 없으면 다시 띄운다.
+    with pytest.raises(FirestoreSidecarError):
+        sidecar.call("sleep", timeout=0.5)
+    assert sidecar.call("ping") == "pong"
+    assert sidecar.starts == 3
+
+
+@pytest.mark.django_db
+def test_fetch_guild_jobs(multidb, settings, tmp_path, sidecar):
+    settings.SITE_PATH = tmp_path
+    user = User.objects.create_user(username="test", android_id="test")
+    version = RunVersion.objects.create(
+        user_id=user.id, level_id=1, guild_id="guild", firebase_token="token"
+    )
+
+    with mock.patch.object(firestore, "_sidecar", sidecar):
+        fetch_guild_jobs(version=version)
+
+    jobs = json.loads((version.get_account_path() / "guild_jobs.json").read_text())
+    assert jobs == [{"JobLocationId": 1, "GuildId": "guild"}]
+
+
+def test_run_nodejs_sidecar_backoff(settings, tmp_path):
+    version = mock.Mock()
+    version.get_account_path.return_value = tmp_path
+
+    with mock.patch.object(firestore, "fetch_guild_jobs") as fetch, mock.patch.object(
+        firestore.subprocess, "run"
+    ) as run_sh, mock.patch.object(firestore, "_sidecar_failed_at", None):
+        # 기본은 꺼져 있다.
+        settings.FIRESTORE_SIDECAR = {}
+        firestore.run_nodejs(version=version)
+        assert fetch.call_count == 0
+        assert run_sh.call_count == 1
+
+        # 실패하면 SIDECAR_RETRY_SECONDS 동안 다시 띄우지 않는다.
+        settings.FIRESTORE_SIDECAR = {"enabled": True}
+        fetch.side_effect = FirestoreSidecarError("cannot start sidecar")
+        firestore.run_nodejs(version=version)
+        firestore.run_nodejs(version=version)
+        assert fetch.call_count == 1
+        assert run_sh.call_count == 3
+
+        with mock.patch.object(
+            firestore.time,
+            "monotonic",
+            return_value=firestore._sidecar_failed_at + firestore.SIDECAR_RETRY_SECONDS,
+        ):
+            firestore.run_nodejs(version=version)
+        assert fetch.call_count == 2
+
+
+@pytest.mark.django_db
+def test_merge_guild_jobs(multidb, settings, tmp_path, django_assert_max_num_queries):
+    settings.SITE_PATH = tmp_path
+    version = prepare_version("guild", ["init_data/gaolious_2023.02.07.json"])
+
+    exists = PlayerJob.objects.filter(version_id=version.id).order_by("id").first()
+    location = (
+        TSJobLocation.objects.exclude(
+            id__in=PlayerJob.objects.filter(version_id=version.id).values_list(
+                "job_location_id", flat=True
+            )
+        )
+        .order_by("id")
+        .first()
+    )
+
+    def guild_job(job_id, location_id, **kwargs):
+        return dict(
+            Id=job_id,
+            JobLocationId=location_id,
+            JobLevel=1,
+            JobType=1,
+            Duration=3600,
+            RequiredArticle={"Id": exists.required_article_id, "Amount": 10},
+            CurrentArticleAmount=0,
+            **kwargs,
+        )
+
+    data = [
+        guild_job(exists.job_id, exists.job_location_id, CompletedAt=COMPLETED_AT),
+        # 같은 location 의 다른 job 은 무시
+        guild_job("other", exists.job_location_id),
+        guild_job(
+            "new", location.id, Requirements=[{"Type": "relative_region", "Value": 1}]
+        ),
+        guild_job("new", location.id, CompletedAt=COMPLETED_AT),
+    ]
+
+    count = PlayerJob.objects.filter(version_id=version.id).count()
+    with django_assert_max_num_queries(12):
+        ret = merge_guild_jobs(version=version, data=data)
+    assert ret == {"inserted": 1, "updated": 1, "matched": 2}
+    assert PlayerJob.objects.filter(version_id=version.id).count() == count + 1
+
+    exists.refresh_from_db()
+    assert exists.completed_at is not None
+
+    new = PlayerJob.objects.get(version_id=version.id, job_id="new")
+    assert new.completed_at is not None
+    requirements = json.loads(new.requirements)
+    assert requirements[0]["Type"] == "region"
+    assert requirements[0]["Value"] == get_max_region(version) + 1
+
+    # 바뀐 게 없으면 쓰지 않는다.
+    data = [guild_job(exists.job_id, exists.job_location_id, CompletedAt=COMPLETED_AT)]
+    ret = merge_guild_jobs(version=version, data=data)
+    assert ret == {"inserted": 0, "updated": 0, "matched": 1}
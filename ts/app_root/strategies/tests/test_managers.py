@@ -1,8 +1,9 @@
 import json
+import math
 import shutil
 from datetime import timedelta
 from pathlib import Path
-from typing import Union, List
+from typing import Union, List, Dict, Tuple, Optional
 from unittest import mock
 
 import pytest
@@ -14,9 +15,18 @@ from app_root.players.models import (
     PlayerFactory,
     PlayerFactoryProductOrder,
     PlayerJob,
+    PlayerWarehouse,
+    PlayerContract,
+    PlayerContractList,
 )
 from app_root.players.utils_import import InitdataHelper
-from app_root.servers.models import RunVersion, SQLDefinition, EndPoint, TSProduct
+from app_root.servers.models import (
+    RunVersion,
+    SQLDefinition,
+    EndPoint,
+    TSProduct,
+    TSArticle,
+)
 from app_root.servers.utils_import import SQLDefinitionHelper
 from app_root.strategies.commands import ShopPurchaseItem
 from app_root.strategies.dumps import ts_dump, ts_dump_factory
@@ -28,6 +38,22 @@ from app_root.strategies.managers import (
     daily_offer_get_slots,
     factory_order_product,
     factory_collect_product,
+    factory_get_queue,
+    factory_find_product_orders,
+    article_find_destination,
+    article_find_product,
+    contract_get_ship,
+    warehouse_get_amount,
+    JobDisptchingMaxProfit,
+    JobDisptchingPrepareBeforeCompetiton,
+)
+from app_root.strategies.data_types import ArticleSource, Material
+from app_root.strategies.strategy_materials import (
+    build_article_sources,
+    build_article_graph,
+    build_factory_strategy,
+    command_factory_strategy,
+    check_all_has_in_warehouse,
 )
 from app_root.strategies.utils import Strategy
 from app_root.users.models import User
@@ -247,6 +273,27 @@ def test_dump(
         ts_dump(version=version)
 
 
+@pytest.mark.django_db
+def test_check_all_has_in_warehouse(multidb, django_assert_num_queries):
+    user = User.objects.create_user(
+        username="test", android_id="test", game_access_token="1", player_id="1"
+    )
+    version = RunVersion.objects.create(user_id=user.id, level_id=1)
+    PlayerWarehouse.objects.create(version=version, article_id=1, amount=10)
+    PlayerWarehouse.objects.create(version=version, article_id=2, amount=3)
+
+    requires = Material()
+    with django_assert_num_queries(0):
+        assert check_all_has_in_warehouse(version=version, requires=requires)
+
+    requires.add_dict({1: 10, 2: 3})
+    with django_assert_num_queries(1):
+        assert check_all_has_in_warehouse(version=version, requires=requires)
+
+    requires.add(3, 1)
+    assert not check_all_has_in_warehouse(version=version, requires=requires)
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "init_filename",
@@ -380,7 +427,7 @@ def convert_text(txt: str):
 
 @pytest.fixture(scope="function")
 def fixture_endpoint():
-    with mock.patch("app_root.strategies.utils.EndpointHelper.get") as patch:
+    with mock.patch("app_root.servers.utils_import.EndpointHelper.get") as patch:
         patch.return_value = convert_text(
             (
                 settings.DJANGO_PATH
@@ -394,7 +441,7 @@ def fixture_endpoint():
 
 @pytest.fixture(scope="function")
 def fixture_login():
-    with mock.patch("app_root.strategies.utils.LoginHelper.post") as patch:
+    with mock.patch("app_root.servers.utils_import.LoginHelper.post") as patch:
         patch.return_value = convert_text(
             (
                 settings.DJANGO_PATH
@@ -415,7 +462,7 @@ def fixture_definition():
         shutil.copy(sqllite_filepath, download_filename)
         return 1_000_000
 
-    with mock.patch("app_root.strategies.utils.SQLDefinitionHelper.get") as patch:
+    with mock.patch("app_root.servers.utils_import.SQLDefinitionHelper.get") as patch:
         patch.return_value = convert_text(
             (
                 settings.DJANGO_PATH
@@ -426,7 +473,7 @@ def fixture_definition():
         )
 
         with mock.patch(
-            "app_root.strategies.utils.SQLDefinitionHelper.download_data"
+            "app_root.servers.utils_import.SQLDefinitionHelper.download_data"
         ) as dn:
             dn.side_effect = FakeDownload
             yield dn
@@ -435,7 +482,7 @@ def fixture_definition():
 @pytest.fixture(scope="function")
 def fixture_init_20230207():
     filename = "gaolious_2023.02.07.json"
-    with mock.patch("app_root.strategies.utils.InitdataHelper.get") as patch:
+    with mock.patch("app_root.players.utils_import.InitdataHelper.get") as patch:
         patch.side_effect = [
             convert_text(
                 (settings.DJANGO_PATH / "fixtures" / "init_data" / filename).read_text(
@@ -450,7 +497,7 @@ def fixture_init_20230207():
 @pytest.fixture(scope="function")
 def fixture_init_20230210():
     filename = "gaolious_2023.02.10.json"
-    with mock.patch("app_root.strategies.utils.InitdataHelper.get") as patch:
+    with mock.patch("app_root.players.utils_import.InitdataHelper.get") as patch:
         patch.side_effect = [
             convert_text(
                 (settings.DJANGO_PATH / "fixtures" / "init_data" / filename).read_text(
@@ -680,3 +727,504 @@ def test_create_player_job():
     now = CompletableFrom + timedelta(minutes=1)
     assert job.is_completed(now)
     assert job.is_collectable(now)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "init_filename",
+    [
+        "init_data/gaolious_2023.01.14_fulltest.json",
+        "init_data/gaolious_2023.02.07.json",
+    ],
+)
+def test_article_graph(multidb, init_filename):
+    ###########################################################################
+    # prepare
+    initdata_filepath = settings.DJANGO_PATH / "fixtures" / init_filename
+
+    version = prepare(initdata_filepath=initdata_filepath)
+    version.now = timezone.now()
+
+    article_source = build_article_sources(version=version)
+    graph = build_article_graph(article_source=article_source)
+
+    # 재료 article 은 항상 소비하는 article 보다 뒤에 온다.
+    assert graph.order
+    rank = {article_id: idx for idx, article_id in enumerate(graph.order)}
+    assert set(rank) == set(graph.products)
+    for article_id, inputs in graph.inputs.items():
+        for input_article_id in inputs:
+            if graph.is_product(input_article_id):
+                assert rank[article_id] < rank[input_article_id]
+
+    # 모든 단계를 한번에 전개한다.
+    for article_id in graph.order:
+        product = graph.products[article_id]
+        demand, crafts = graph.expand(requires={article_id: product.article_amount})
+        assert crafts[article_id] == 1
+        for input_article_id, amount in product.conditions_to_article_dict.items():
+            assert demand[input_article_id] >= amount
+        for crafted_article_id, cnt in crafts.items():
+            assert cnt * graph.products[crafted_article_id].article_amount >= (
+                demand[crafted_article_id]
+            )
+
+        # 이미 확보된 수량은 전개하지 않는다.
+        demand, crafts = graph.expand(
+            requires={article_id: product.article_amount},
+            available={article_id: product.article_amount},
+        )
+        assert not crafts
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "init_filename, factory_id",
+    [
+        ("init_data/gaolious_2023.01.09_contract.json", 1),
+    ],
+)
+def test_factory_queue(multidb, init_filename, factory_id):
+    ###########################################################################
+    # prepare
+    initdata_filepath = settings.DJANGO_PATH / "fixtures" / init_filename
+
+    version = prepare(initdata_filepath=initdata_filepath)
+
+    queue = factory_get_queue(version=version, factory_id=factory_id)
+    slot_count = queue.player_factory.slot_count
+    assert len(queue.orders) > slot_count
+    assert queue.waiting
+
+    def db_orders():
+        return list(
+            PlayerFactoryProductOrder.objects.filter(
+                player_factory=queue.player_factory
+            )
+            .order_by("index")
+            .values_list("id", "index", "finish_time")
+        )
+
+    first = queue.orders[0]
+    version.now = first.finish_time
+    assert queue.next_finish_time(now=version.now) == queue.orders[1].finish_time
+
+    completed, processing, waiting = factory_find_product_orders(
+        version=version, factory_id=factory_id
+    )
+    assert first in completed
+
+    factory_collect_product(version=version, order=first)
+
+    # 메모리의 대기열과 DB 가 같아야 한다.
+    assert [(o.id, o.index, o.finish_time) for o in queue.orders] == db_orders()
+    assert queue.order_ids == {o.id for o in queue.orders}
+    assert queue.next_finish_time(now=version.now) == queue.orders[0].finish_time
+    assert [o.index for o in queue.orders] == list(range(1, len(queue.orders) + 1))
+    assert all(o.finish_time for o in queue.orders[:slot_count])
+    assert all(not o.finish_time for o in queue.waiting)
+
+
+#
+# baseline 의 article 별 조회. (managers 의 구현이 바뀌어도 기대값은 그대로)
+#
+def legacy_warehouse_countable(
+    version: RunVersion, basic: bool, event: bool, union: bool
+) -> Dict[int, Tuple[TSArticle, int]]:
+    def get_amount(article_id):
+        instance = PlayerWarehouse.objects.filter(
+            version_id=version.id, article_id=article_id
+        ).first()
+        return instance.amount if instance else 0
+
+    ret = {}
+    for article in TSArticle.objects.all():
+        if not article.is_take_up_space:
+            continue
+        if article.level_req > version.level_id:
+            continue
+        if article.level_from > version.level_id:
+            continue
+
+        if (
+            (basic and article.is_basic)
+            or (event and article.is_event)
+            or (union and article.is_union)
+        ):
+            ret.update({article.id: (article, get_amount(article.id))})
+
+    return ret
+
+
+def legacy_article_find_contract(
+    version: RunVersion, article_id=None, available_only=True
+) -> Dict[int, List[PlayerContract]]:
+    delta = timedelta(minutes=1)
+
+    ret = {}
+    for contract_list in PlayerContractList.objects.filter(version_id=version.id).all():
+        if available_only:
+            if (
+                contract_list.available_to
+                and version.now + delta >= contract_list.available_to
+            ):
+                continue
+
+        for contract in PlayerContract.objects.filter(
+            contract_list_id=contract_list.id
+        ).all():
+            if available_only:
+                if contract.usable_from and contract.usable_from > version.now:
+                    continue
+                if contract.available_from and contract.available_from > version.now:
+                    continue
+
+            if contract.available_to and version.now + delta >= contract.available_to:
+                continue
+            if contract.expires_at and version.now + delta >= contract.expires_at:
+                continue
+
+            for reward_article_id in contract.reward_to_article_dict.keys():
+                if article_id and article_id != reward_article_id:
+                    continue
+                ret.setdefault(reward_article_id, []).append(contract)
+
+    if version.level_id >= 100:
+        for key in ret.keys():
+            ret[key] = sorted(
+                ret[key],
+                reverse=True,
+                key=lambda x: x.reward_to_article_dict.get(key, 0),
+            )
+
+    return ret
+
+
+def legacy_contract_get_ship(version: RunVersion) -> Optional[PlayerContract]:
+    for contract_list in PlayerContractList.objects.filter(
+        version_id=version.id, contract_list_id=3
+    ).all():
+        for contract in PlayerContract.objects.filter(
+            contract_list_id=contract_list.id
+        ).all():
+            if contract.is_available(now=version.now):
+                return contract
+
+
+def legacy_build_article_sources(version: RunVersion):
+    """
+    article 마다 contract / destination / product 를 조회하던 이전 구현.
+    (destination / product 는 baseline 과 같은 managers 함수)
+    """
+    countables = legacy_warehouse_countable(
+        version=version,
+        basic=True,
+        event=version.do_event_quest,
+        union=version.do_union_quest,
+    )
+    article_source = {}
+
+    for article_id, (article, amount) in countables.items():
+        article_source[article_id] = ArticleSource(article=article)
+
+        for contract in legacy_article_find_contract(
+            version=version, article_id=article_id, available_only=False
+        ).get(article_id, []):
+            article_source[article_id].add_contract(contract=contract)
+
+        for destination in article_find_destination(
+            version=version, article_id=article_id
+        ).get(article_id, []):
+            article_source[article_id].add_destination(dest=destination)
+
+        for product in article_find_product(version=version, article_id=article_id).get(
+            article_id, []
+        ):
+            article_source[article_id].add_product(product=product)
+
+    return article_source
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "init_filename",
+    [
+        "init_data/gaolious1_2022.12.29.json",
+        "init_data/gaolious_2023.01.09_contract.json",
+        "init_data/gaolious_2023.01.14_fulltest.json",
+        "init_data/gaolious_2023.02.07.json",
+        "init_data/levelup.json",
+    ],
+)
+def test_build_article_sources(multidb, init_filename):
+    ###########################################################################
+    # prepare
+    initdata_filepath = settings.DJANGO_PATH / "fixtures" / init_filename
+
+    version = prepare(initdata_filepath=initdata_filepath)
+    version.now = timezone.now()
+
+    expected = legacy_build_article_sources(version=version)
+    article_source = build_article_sources(version=version)
+
+    assert list(article_source.keys()) == list(expected.keys())
+    for article_id, source in article_source.items():
+        assert source.article.id == expected[article_id].article.id
+        assert [c.id for c in source.contracts] == [
+            c.id for c in expected[article_id].contracts
+        ]
+        assert [d.id for d in source.destinations] == [
+            d.id for d in expected[article_id].destinations
+        ]
+        assert [p.id for p in source.products] == [
+            p.id for p in expected[article_id].products
+        ]
+
+    ship = contract_get_ship(version=version)
+    expected_ship = legacy_contract_get_ship(version=version)
+    assert (ship and ship.id) == (expected_ship and expected_ship.id)
+
+
+class LegacyJobDispatching:
+    """
+    train / job id 를 dict 로 탐색하던 이전 dispatcher.
+    (JobDisptchingMaxProfit / JobDisptchingPrepareBeforeCompetiton 의 recur / get_score)
+    """
+
+    def __init__(self, dispatcher, with_article_count: bool):
+        self.number_of_dispatchers = dispatcher
+        self.with_article_count = with_article_count
+        self.trains = {}
+        self.jobs = {}
+        self.warehouse = {}
+        self.train_job_relation = {}
+
+    def add_job_train(self, job: PlayerJob, trains):
+        self.jobs.update(
+            {
+                job.id: (
+                    job.required_article_id,
+                    job.required_amount,
+                    job.current_progress,
+                    job.reward_to_article_dict.get(100003, 0)
+                    or job.reward_to_article_dict.get(100000, 0),
+                )
+            }
+        )
+        for train in trains:
+            self.trains.update({train.id: train.capacity()})
+            self.train_job_relation.setdefault(train.id, []).append(job.id)
+
+    def add_warehouse(self, article_id, amount):
+        self.warehouse.update({article_id: amount})
+
+    def get_score(self):
+        ret = 0
+        count = {}
+        for job_id, (article_id, total, curr, sp) in self.jobs.items():
+            count.update({job_id: 0})
+            remain = total - min(total, curr)
+            if remain < 1:
+                continue
+            if self.assigned_job_amount[job_id] < 1:
+                count.update({job_id: 1000000})
+            else:
+                count.update(
+                    {job_id: math.ceil(remain / self.assigned_job_amount[job_id])}
+                )
+            ret += sp / remain * self.assigned_job_amount[job_id]
+
+        article_count = len({o[0] for o in self.jobs.values()})
+        return (
+            article_count if self.with_article_count else 0,
+            ret,
+            -min(count.values()),
+        )
+
+    def recur(self, idx, used_dispatcher, with_warehouse_limit, depth=0):
+        if used_dispatcher > 0:
+            score = self.get_score()
+            if not self.best_score or self.best_score < score:
+                self.best_score = score
+                self.best_assign = list(self.assign)
+
+        if used_dispatcher >= self.number_of_dispatchers:
+            return
+        if idx >= len(self.train_id_list) or depth >= 7:
+            return
+
+        train_id = self.train_id_list[idx]
+        for job_id in self.train_job_relation[train_id]:
+            article_id, total, curr, sp = self.jobs[job_id]
+            curr = min(total, curr + self.assigned_job_amount[job_id])
+            if curr >= total:
+                continue
+
+            amount = min(total - curr, self.trains[train_id])
+            if with_warehouse_limit:
+                available = self.warehouse.get(article_id, 0)
+                amount = min(
+                    max(0, available - self.assigned_job_amount[job_id]), amount
+                )
+            if amount <= 0:
+                continue
+
+            self.assigned_job_amount[job_id] += amount
+            self.assign.append((train_id, job_id, amount))
+            self.recur(idx + 1, used_dispatcher + 1, with_warehouse_limit, depth + 1)
+            self.assigned_job_amount[job_id] -= amount
+            del self.assign[-1]
+
+        self.recur(idx + 1, used_dispatcher, with_warehouse_limit)
+
+    def dispatching(self, with_warehouse_limit: bool):
+        self.train_id_list = sorted(
+            self.train_job_relation.keys(), key=lambda k: self.trains[k], reverse=True
+        )[:15]
+        self.best_score = None
+        self.assigned_job_amount = {job_id: 0 for job_id in self.jobs}
+        self.best_assign = []
+        self.assign = []
+        self.recur(0, 0, with_warehouse_limit)
+        return self.best_assign
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "init_filename",
+    [
+        "init_data/gaolious_2023.01.11_jobs.json",
+        "init_data/gaolious_2023.02.07.json",
+    ],
+)
+@pytest.mark.parametrize(
+    "dispatcher_class, with_article_count",
+    [
+        (JobDisptchingMaxProfit, False),
+        (JobDisptchingPrepareBeforeCompetiton, True),
+    ],
+)
+@pytest.mark.parametrize("with_warehouse_limit", [False, True])
+def test_job_dispatching(
+    multidb, init_filename, dispatcher_class, with_article_count, with_warehouse_limit
+):
+    ###########################################################################
+    # prepare
+    initdata_filepath = settings.DJANGO_PATH / "fixtures" / init_filename
+
+    version = prepare(initdata_filepath=initdata_filepath)
+    version.now = convert_datetime(
+        json.loads(initdata_filepath.read_text(encoding="utf-8"), strict=False)["Time"]
+    )
+
+    # union job 이 없는 계정은 story job 으로 비교한다.
+    jobs = list(jobs_find(version, union_jobs=True, expired_jobs=False)) or list(
+        jobs_find(version, story_jobs=True, expired_jobs=False)
+    )
+    assert jobs
+
+    dispatcher = 4
+    finder = dispatcher_class(dispatcher=dispatcher)
+    legacy = LegacyJobDispatching(
+        dispatcher=dispatcher, with_article_count=with_article_count
+    )
+    for job in jobs:
+        trains = trains_find_match_with_job(version=version, job=job)
+        # 창고 수량이 모자라도록 줄인다. (with_warehouse_limit 비교)
+        amount = (
+            warehouse_get_amount(version=version, article_id=job.required_article_id)
+            // 3
+        )
+        for instance in (finder, legacy):
+            instance.add_job_train(job, trains)
+            instance.add_warehouse(article_id=job.required_article_id, amount=amount)
+
+    expected = legacy.dispatching(with_warehouse_limit)
+    assert finder.dispatching(with_warehouse_limit) == expected
+    assert finder.best_score == legacy.best_score
+
+
+@pytest.mark.django_db
+def test_article_graph_extend(multidb):
+    ###########################################################################
+    # prepare
+    initdata_filepath = (
+        settings.DJANGO_PATH / "fixtures" / "init_data/gaolious_2023.02.07.json"
+    )
+
+    version = prepare(initdata_filepath=initdata_filepath)
+    version.now = timezone.now()
+
+    article_source = build_article_sources(version=version)
+    graph = build_article_graph(article_source=article_source)
+
+    # contract / destination 으로 공급되지만 factory 에서도 만들 수 있는 article
+    products = {
+        article_id: source.products[0]
+        for article_id, source in article_source.items()
+        if source.products and not graph.is_product(article_id)
+    }
+    assert products
+
+    extended = graph.extend(products)
+    assert extended.extend(products) is extended
+    assert not any(graph.is_product(article_id) for article_id in products)
+    assert set(extended.order) == set(graph.order) | set(products)
+
+    rank = {article_id: idx for idx, article_id in enumerate(extended.order)}
+    for article_id, product in products.items():
+        demand, crafts = extended.expand(requires={article_id: product.article_amount})
+        assert crafts[article_id] == 1
+        for input_article_id, amount in product.conditions_to_article_dict.items():
+            assert demand[input_article_id] >= amount
+            if extended.is_product(input_article_id):
+                assert rank[article_id] < rank[input_article_id]
+
+
+@pytest.mark.django_db
+def test_factory_strategy_collect_surplus(multidb):
+    ###########################################################################
+    # prepare
+    initdata_filepath = (
+        settings.DJANGO_PATH
+        / "fixtures"
+        / "init_data/gaolious_2023.01.09_contract.json"
+    )
+    factory_id = 1
+
+    version = prepare(initdata_filepath=initdata_filepath)
+    queue = factory_get_queue(version=version, factory_id=factory_id)
+    version.now = queue.orders[0].finish_time
+
+    strategy = build_factory_strategy(version=version)[factory_id]
+    completed = strategy.completed_article_count
+    assert completed
+
+    def run(demand_article_count):
+        strategy.demand_article_count = demand_article_count
+        with mock.patch(
+            "app_root.strategies.strategy_materials.command_collect_factory"
+        ) as collect, mock.patch(
+            "app_root.strategies.strategy_materials.command_order_product_in_factory"
+        ):
+            command_factory_strategy(
+                version=version,
+                factory_strategy_dict={factory_id: strategy},
+                article_source={},
+            )
+        return {
+            int(call.kwargs["product"].article_id): call.kwargs["count"]
+            for call in collect.call_args_list
+        }
+
+    # 필요 수량이 없으면 완료된 주문을 모두 수령한다.
+    assert run({}) == completed
+
+    # 필요 수량을 채우는 주문은 남긴다.
+    queued = {
+        article_id: strategy.completed_article_count.get(article_id, 0)
+        + strategy.processing_article_count.get(article_id, 0)
+        + strategy.waiting_article_count.get(article_id, 0)
+        for article_id in completed
+    }
+    assert run(queued) == {}
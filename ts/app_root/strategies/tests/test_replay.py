@@ -0,0 +1,86 @@
+from datetime import datetime, timezone as dt_timezone
+
+import pytest
+
+from app_root.servers.models import RunVersion, EndPoint
+from app_root.strategies.commands import HeartBeat, send_commands, GameSleep
+from app_root.strategies.replay import ReplaySession, ReplayExhausted
+from app_root.users.models import User
+from core.utils import hash10
+
+
+def response(server_time):
+    return (
+        '{"Success":true,"RequestId":"a","Time":"%s",'
+        '"Data":{"CollectionId":1,"Commands":[]}}' % server_time
+    )
+
+
+@pytest.mark.django_db
+def test_replay(multidb, settings, tmp_path):
+    settings.SITE_PATH = tmp_path
+    user = User.objects.create_user(
+        username="test", android_id="test", game_access_token="1", player_id="1"
+    )
+    EndPoint.objects.create(
+        name=EndPoint.ENDPOINT_COMMAND_PROCESSING,
+        name_hash=hash10(EndPoint.ENDPOINT_COMMAND_PROCESSING),
+        url="a",
+    )
+    start = datetime(2023, 1, 23, 12, 0, 0, tzinfo=dt_timezone.utc)
+    source = RunVersion.objects.create(
+        user_id=user.id, level_id=1, login_server=start, now=start
+    )
+    store = source.get_record_store("helper_post")
+    store.append(response("2023-01-23T12:00:10Z"))
+    store.append(response("2023-01-23T12:00:20Z"))
+
+    target = RunVersion.objects.create(user_id=user.id, level_id=1, now=start)
+    command_no = target.command_no
+
+    def runner():
+        send_commands(HeartBeat(version=target))
+        # sleep 은 가상 시계만 움직인다.
+        send_commands(GameSleep(version=target, sleep_seconds=3600))
+        send_commands(HeartBeat(version=target))
+
+    session = ReplaySession(source=source)
+    report = session.run(runner=runner)
+
+    assert [(o.name, o.idx) for o in report.steps] == [
+        ("helper_post", 0),
+        ("helper_post", 1),
+        ("helper_post", 2),
+        ("finish", 0),
+    ]
+    assert report.steps[1].server_time == datetime(
+        2023, 1, 23, 12, 0, 20, tzinfo=dt_timezone.utc
+    )
+    assert report.queries > 0
+    assert isinstance(report.error, ReplayExhausted)
+
+    target.refresh_from_db()
+    assert target.command_no == command_no + 2
+    assert target.now == datetime(2023, 1, 23, 13, 0, 20, tzinfo=dt_timezone.utc)
+    # RunCommand 의 대기 시간도 가상 시계만 움직인다.
+    assert session.clock.now() >= target.now
+
+
+@pytest.mark.django_db
+def test_replay_default_runner(multidb, settings, tmp_path):
+    settings.SITE_PATH = tmp_path
+    user = User.objects.create_user(
+        username="test", android_id="test", game_access_token="1", player_id="1"
+    )
+    source = RunVersion.objects.create(user_id=user.id, level_id=1)
+    path = settings.DJANGO_PATH / "fixtures" / "init_data" / "gaolious_2023.02.07.json"
+    source.get_record_store("init_data_get").append(path.read_text("utf-8"))
+
+    report = ReplaySession(source=source).run()
+
+    # source 계정에는 version 이 생기지 않는다.
+    assert list(RunVersion.objects.filter(user_id=user.id)) == [source]
+    replay = RunVersion.objects.get(user__username=f"replay-{source.id}")
+    assert replay.is_processing_task
+    # 녹화된 command 응답이 없다.
+    assert isinstance(report.error, ReplayExhausted)
@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from app_root.servers.models import RunVersion, EndPoint, SQLDefinition
+from app_root.strategies.sessions import (
+    SessionHelper,
+    decode_jwt_expires_at,
+)
+from app_root.users.models import User
+from core.utils import hash10
+
+
+def jwt(exp: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode("utf-8"))
+    return f"e30.{payload.decode('utf-8').rstrip('=')}.sig"
+
+
+def test_decode_jwt_expires_at():
+    now = timezone.now().replace(microsecond=0)
+    assert decode_jwt_expires_at(jwt(now.timestamp())) == now
+    assert decode_jwt_expires_at("invalid") is None
+
+
+@pytest.mark.django_db
+def test_session_reuse(multidb):
+    now = timezone.now()
+    user = User.objects.create_user(
+        username="test", android_id="test", game_access_token="1", player_id="1"
+    )
+    for name in (
+        EndPoint.ENDPOINT_LOGIN,
+        EndPoint.ENDPOINT_DEFINITION,
+        EndPoint.ENDPOINT_INIT_DATA_URLS,
+    ):
+        EndPoint.objects.create(name=name, name_hash=hash10(name), url="a")
+    SQLDefinition.objects.create(
+        version="1", checksum="1", url="https://a", download_path="a"
+    )
+
+    previous = RunVersion.objects.create(
+        user_id=user.id,
+        level_id=1,
+        ep_recv=now - timedelta(minutes=10),
+        login_recv=now - timedelta(minutes=10),
+        sd_recv=now - timedelta(minutes=10),
+    )
+    version = RunVersion.objects.create(user_id=user.id, level_id=1)
+    session = SessionHelper(version=version)
+
+    assert session.has_valid_endpoints(now)
+    assert session.has_valid_login(now)
+    assert session.has_valid_definition(now)
+    # login 은 시간이 지나도 다시 하지 않는다.
+    assert session.has_valid_login(previous.login_recv + timedelta(days=7))
+
+    # 만료된 session 은 다시 login.
+    session.invalidate()
+    assert not session.has_valid_login(now)
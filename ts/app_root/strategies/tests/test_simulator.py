@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import pytest
+
+from app_root.strategies.simulator import EventHeap, Simulator, prepare_version
+
+
+def test_event_heap():
+    now = datetime(2023, 2, 7, 12, 0, 0, tzinfo=dt_timezone.utc)
+    heap = EventHeap()
+    heap.push(now + timedelta(minutes=10), "train_arrival", "1")
+    heap.push(now + timedelta(minutes=10), "train_arrival", "1")
+    heap.push(now - timedelta(minutes=1), "factory", "2")
+    heap.push(now + timedelta(minutes=5), "contract", "3")
+    heap.push(None, "job", "4")
+
+    assert len(heap) == 3
+    # now 이전의 event 는 버린다.
+    assert heap.pop_after(now) == (now + timedelta(minutes=5), "contract", "3")
+    assert heap.pop_after(now) == (now + timedelta(minutes=10), "train_arrival", "1")
+    assert heap.pop_after(now) is None
+
+
+@pytest.mark.django_db
+def test_simulator(multidb, settings, tmp_path):
+    settings.SITE_PATH = tmp_path
+    version = prepare_version("simulator", ["init_data/gaolious_2023.02.07.json"])
+    started_at = version.now
+
+    report = Simulator(version=version, name="test", days=1, max_iterations=2).run()
+
+    assert report.error is None
+    assert report.iterations == 2
+    assert report.started_at == started_at
+    assert report.finished_at > started_at
+    assert sum(report.commands.values()) > 0
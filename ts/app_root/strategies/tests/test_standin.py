@@ -0,0 +1,109 @@
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+import pytest
+from django.db import connection
+from urllib3.connectionpool import HTTPConnectionPool
+
+from app_root.exceptions import TsRespInvalidOrExpiredSession
+from app_root.servers.models import RunVersion, EndPoint
+from app_root.servers.utils_import import EndpointHelper, LoginHelper
+from app_root.strategies.commands import HeartBeat, send_commands
+from app_root.players.models import PlayerWarehouse
+from app_root.strategies.loadtest import (
+    percentile,
+    LoadDriver,
+    LoadTestDatabaseError,
+)
+from app_root.strategies.standin import StandInServer, StandInAccount
+from app_root.users.models import User
+
+# http_connection_pool fixture 가 막기 전의 urlopen. (local stand-in 서버에만 연결한다)
+URLOPEN = HTTPConnectionPool.urlopen
+
+
+def test_percentile():
+    values = [0.1 * i for i in range(1, 101)]
+    assert percentile(values, 50) == pytest.approx(5.0)
+    assert percentile(values, 99) == pytest.approx(9.9)
+    assert percentile([], 50) == 0.0
+
+
+@pytest.mark.django_db
+def test_load_driver_database(multidb, settings):
+    driver = LoadDriver(accounts=2)
+
+    # 운영 DB (MySQL) 에서는 실행하지 않는다.
+    settings.LOADTEST_DATABASE = False
+    with mock.patch.object(connection, "vendor", "mysql"):
+        with pytest.raises(LoadTestDatabaseError):
+            driver.run()
+
+    # synthetic 계정의 version / Player* row 도 지운다.
+    users = driver.create_users()
+    for user in users:
+        version = RunVersion.objects.create(user_id=user.id, level_id=1)
+        PlayerWarehouse.objects.create(version=version, article_id=1, amount=1)
+    driver.delete_users(users)
+    assert not User.objects.filter(id__in=[o.id for o in users]).exists()
+    assert not RunVersion.objects.filter(user_id__in=[o.id for o in users]).exists()
+    assert not PlayerWarehouse.objects.exists()
+
+
+def test_standin_account_commands():
+    server = StandInServer()
+    now = datetime(2023, 2, 7, 0, 0, 0, tzinfo=dt_timezone.utc)
+    seed = {
+        "Data": [
+            {
+                "Type": "trains",
+                "Data": {
+                    "Trains": [{"InstanceId": 1, "TrainLoad": {"Id": 5, "Amount": 10}}]
+                },
+            },
+            {"Type": "warehouse", "Data": {"Articles": [{"Id": 5, "Amount": 1}]}},
+        ]
+    }
+    account = StandInAccount(player_id="1", device_token="a", seed=seed)
+
+    account.apply(
+        {"Command": "Train:Unload", "Parameters": {"TrainId": 1}},
+        now=now,
+        definition=server.definition,
+    )
+    account.apply({"Command": "Unknown:Command"}, now=now, definition=server.definition)
+
+    assert account.sections["warehouse"]["Articles"] == [{"Id": 5, "Amount": 11}]
+    assert "TrainLoad" not in account.sections["trains"]["Trains"][0]
+    assert account.commands == 2
+    assert account.unhandled == {"Unknown:Command": 1}
+
+
+@pytest.mark.django_db
+def test_standin_server(multidb, settings):
+    server = StandInServer().start()
+    settings.GAME_SERVER_URL = server.url
+    user = User.objects.create_user(username="test", android_id="test")
+    version = RunVersion.objects.create(user_id=user.id, level_id=1)
+
+    with mock.patch.object(HTTPConnectionPool, "urlopen", URLOPEN):
+        try:
+            EndpointHelper(version=version).run()
+            assert EndPoint.get_login_urls() == [f"{server.url}/login"]
+
+            LoginHelper(version=version).run()
+            user.refresh_from_db()
+            account = server.accounts[user.player_id]
+            assert user.game_access_token == account.game_access_token
+
+            send_commands(HeartBeat(version=version))
+            assert account.commands == 1
+
+            version.user.game_access_token = "expired"
+            with pytest.raises(TsRespInvalidOrExpiredSession):
+                send_commands(HeartBeat(version=version))
+            assert account.commands == 1
+        finally:
+            server.stop()
+
+    assert len(server.stats()["/api/v2/command-processing/run-collection"]) == 2
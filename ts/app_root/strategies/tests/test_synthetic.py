@@ -0,0 +1,58 @@
+import pytest
+
+from app_root.players.models import PlayerTrain, PlayerJob, PlayerFactory
+from app_root.servers.models import TSJobLocation, TSTrain
+from app_root.strategies.benchmark import run_scaling, DEFINITION_PATH
+from app_root.strategies.simulator import prepare_version
+from app_root.strategies.synthetic import SyntheticAccount
+
+
+@pytest.mark.django_db
+def test_synthetic_account(multidb):
+    generator = SyntheticAccount(definition=DEFINITION_PATH.stem, seed=1)
+    text = generator.generate_text(
+        trains=120, jobs=5, union_jobs=20, factories=3, slot_count=4
+    )
+    # 같은 seed 면 같은 init data
+    assert text == SyntheticAccount(
+        definition=DEFINITION_PATH.stem, seed=1
+    ).generate_text(trains=120, jobs=5, union_jobs=20, factories=3, slot_count=4)
+
+    version = prepare_version(
+        "synthetic", [], definition=DEFINITION_PATH, init_texts=[text]
+    )
+
+    trains = PlayerTrain.objects.filter(version_id=version.id)
+    assert trains.count() == 120
+    assert set(trains.values_list("train_id", flat=True)) <= set(
+        TSTrain.objects.values_list("id", flat=True)
+    )
+
+    jobs = PlayerJob.objects.filter(version_id=version.id)
+    assert jobs.count() == 25
+    assert set(jobs.values_list("job_location_id", flat=True)) <= set(
+        TSJobLocation.objects.values_list("id", flat=True)
+    )
+    union_jobs = [o for o in jobs if o.is_union_job]
+    assert len(union_jobs) == 20
+    assert len({o.job_location_id for o in union_jobs}) == 20
+
+    with pytest.raises(ValueError):
+        generator.generate(union_jobs=1000)
+
+    factories = PlayerFactory.objects.filter(version_id=version.id)
+    assert factories.count() == 3
+    assert {o.slot_count for o in factories} == {4}
+
+
+@pytest.mark.django_db
+def test_run_scaling(multidb, settings, tmp_path):
+    settings.SITE_PATH = tmp_path
+    results = run_scaling(trains=[5, 10], union_jobs=3, max_wall=600)
+
+    assert [o.trains for o in results] == [5, 10]
+    for result in results:
+        assert result.error is None
+        assert result.queries > 0
+        assert result.phases["build_article_sources"]["calls"] == 1
+        assert result.phases["jobs_find_union_priority"]["calls"] >= 1
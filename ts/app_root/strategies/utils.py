@@ -5,18 +5,12 @@ from django.conf import settings
 from django.utils import timezone
 
 from app_root.exceptions import TsRespInvalidOrExpiredSession
-from app_root.players.utils_import import InitdataHelper, LeaderboardHelper
+from app_root.players.utils_import import LeaderboardHelper
 from app_root.servers.models import RunVersion
-from app_root.servers.utils_import import (
-    EndpointHelper,
-    LoginHelper,
-    SQLDefinitionHelper,
-)
 from app_root.strategies.commands import (
     HeartBeat,
     StartGame,
     send_commands,
-    FirebaseAuthToken,
 )
 from app_root.strategies.data_types import (
     JobPriority,
@@ -24,8 +18,9 @@ from app_root.strategies.data_types import (
     Material,
     FactoryStrategy,
     MaterialStrategy,
+    ArticleGraph,
 )
-from app_root.strategies.dumps import ts_dump
+from app_root.strategies.dumps import ts_dump, is_dump_enabled
 from app_root.strategies.firestore import execute_firestore
 from app_root.strategies.managers import (
     jobs_find,
@@ -53,9 +48,11 @@ from app_root.strategies.strategy_collect_rewards import (
     check_building,
     check_union_job_complete,
 )
+from app_root.strategies.sessions import SessionHelper
 from app_root.strategies.strategy_materials import (
     get_ship_materials,
     build_article_sources,
+    build_article_graph,
     build_factory_strategy,
     get_destination_materials,
     get_factory_materials,
@@ -70,6 +67,16 @@ from app_root.strategies.strategy_union_quest import (
     strategy_dispatching_gold_destinations,
     dispatching_job,
 )
+from app_root.servers.leases import (
+    get_worker_name,
+    worker_heartbeat,
+    worker_cleanup,
+    lease_acquire,
+    lease_attach,
+    lease_check,
+    LeaseKeeper,
+    LeaseLost,
+)
 from app_root.utils import get_curr_server_datetime
 
 USE_CACHE = False
@@ -83,6 +90,7 @@ class Strategy(object):
 
     # contract_material_manager: ContractMaterialStrategy
     article_source: Dict[int, ArticleSource]
+    article_graph: Optional[ArticleGraph]
 
     ship_material: Material
     union_job_material: Material
@@ -93,13 +101,16 @@ class Strategy(object):
 
     factory_strategy: Dict[int, FactoryStrategy]
 
-    def __init__(self, user_id):
+    def __init__(self, user_id, worker_name: Optional[str] = None):
         self.user_id = user_id
+        self.worker_name = worker_name or get_worker_name()
+        self.lease_keeper = None
         self.version = None
         self.union_job_dispatching_priority = []
         self.event_job_dispatching_priority = []
         self.job_dispatching_priority = []
         self.article_source = {}
+        self.article_graph = None
         self.ship_material = Material()
         self.union_job_material = Material()
         self.event_job_material = Material()
@@ -109,6 +120,10 @@ class Strategy(object):
         self.destination_strategy = {}
 
     def create_version(self):
+        """
+            lease 를 획득한 상태에서 호출. (run)
+        :return:
+        """
         instance = (
             RunVersion.objects.filter(user_id=self.user_id).order_by("-pk").first()
         )
@@ -185,20 +200,9 @@ class Strategy(object):
         return instance
 
     def on_queued_status(self):
-        ep_helper = EndpointHelper(version=self.version, use_cache=USE_CACHE)
-        ep_helper.run()
-
-        login_helper = LoginHelper(version=self.version, use_cache=USE_CACHE)
-        login_helper.run()
-
-        sd_helper = SQLDefinitionHelper(version=self.version, use_cache=USE_CACHE)
-        sd_helper.run()
-
-        init_helper = InitdataHelper(version=self.version, use_cache=USE_CACHE)
-        init_helper.run()
-
-        firebase = FirebaseAuthToken(version=self.version, use_cache=USE_CACHE)
-        firebase.run()
+        # endpoint / login / definition / firebase 는 유효하면 재사용.
+        session = SessionHelper(version=self.version, use_cache=USE_CACHE)
+        session.run()
 
         execute_firestore(version=self.version)
 
@@ -207,8 +211,6 @@ class Strategy(object):
 
         self.update_union_progress(True)
 
-        ts_dump(version=self.version)
-
     def dump_material(self, title: str, material: Material):
         ret = []
         ret.append(f"# [Prepare Condition] - {title}")
@@ -267,6 +269,16 @@ class Strategy(object):
                 ret.append(
                     f"""   #{article.id:7d}|{article.name[:15]:15s}[{amount:4d}]|{required:4d}|{waiting:4d}|{processing:4d}|{completed:4d}"""
                 )
+
+            plan = strategy.plan
+            if plan and plan.orders:
+                ret.append(
+                    f"""   Plan: {len(plan.orders)} orders / makespan {plan.makespan}s / {plan.output_per_hour:.2f} orders/h"""
+                )
+                for product, finish_time in plan.orders:
+                    ret.append(
+                        f"""     - #{product.article_id:7d}[{product.article_amount:4d}] finish at {finish_time}"""
+                    )
         ret.append("")
         print("\n".join(ret))
 
@@ -447,6 +459,7 @@ class Strategy(object):
                         requires=self.job_material,
                         article_source=self.article_source,
                         strategy=strategy,
+                        article_graph=self.article_graph,
                     )
 
                     command_material_strategy(version=self.version, strategy=strategy)
@@ -525,6 +538,7 @@ class Strategy(object):
                 requires=material,
                 article_source=self.article_source,
                 strategy=strategy,
+                article_graph=self.article_graph,
             )
             command_material_strategy(version=self.version, strategy=strategy)
 
@@ -554,6 +568,7 @@ class Strategy(object):
             requires=self.ship_material,
             article_source=self.article_source,
             strategy=strategy,
+            article_graph=self.article_graph,
         )
 
         # Step 1. contract. / union quest materials.
@@ -583,6 +598,7 @@ class Strategy(object):
                 requires=self.union_job_material,
                 article_source=self.article_source,
                 strategy=strategy,
+                article_graph=self.article_graph,
             )
             command_material_strategy(version=self.version, strategy=strategy)
 
@@ -597,6 +613,19 @@ class Strategy(object):
             article_source=self.article_source,
         )
 
+        # ship / union quest / story quest 재료를 공장 생산 계획에 더한다.
+        requires = Material()
+        for material in (
+            self.ship_material,
+            self.union_job_material,
+            self.job_material,
+        ):
+            requires.add_dict(material.required_articles)
+        self.factory_strategy = build_factory_strategy(
+            version=self.version, requires=requires, article_graph=self.article_graph
+        )
+        self.dump_factory_strategies()
+
         print("# 공장 제품중 창고 부족분 채우기.")
         command_collect_factory_product_redundancy(
             version=self.version,
@@ -666,36 +695,73 @@ class Strategy(object):
         #     )
         return ret
 
+    def process(self) -> Optional[datetime]:
+        """
+            현재 state 로 전략을 1번 실행한다. (run_with_lease, simulator)
+        :return: 다음 event 시간
+        """
+        ret = None
+
+        # build_possible_location(version=self.version)
+        self.article_source = build_article_sources(version=self.version)
+        self.article_graph = build_article_graph(article_source=self.article_source)
+
+        if self.version.is_processing_task:
+            lease_check(version=self.version)
+            next_dt = self.on_processing_status()
+            ret = update_next_event_time(previous=ret, event_time=next_dt)
+
+        lease_check(version=self.version)
+        next_dt = self.on_finally()
+        ret = update_next_event_time(previous=ret, event_time=next_dt)
+        return ret
+
     def run(self):
+        worker_heartbeat(worker_name=self.worker_name)
+        worker_cleanup()
+        lease = lease_acquire(user_id=self.user_id, worker_name=self.worker_name)
+        if not lease:
+            print(f"""[Lease] user_id={self.user_id} is owned by other worker | PASS""")
+            return
+
+        with LeaseKeeper(lease=lease) as keeper:
+            self.lease_keeper = keeper
+            try:
+                self.run_with_lease()
+            finally:
+                self.lease_keeper = None
+
+    def run_with_lease(self):
         self.version = self.create_version()
 
         if not self.version:
             return
 
+        if self.lease_keeper:
+            lease_attach(version=self.version, keeper=self.lease_keeper)
+
         try:
-            ret = None
             if self.version.is_queued_task:
+                lease_check(version=self.version)
                 self.on_queued_status()
                 self.version.set_processing(save=True, update_fields=[])
 
-            # build_possible_location(version=self.version)
-            self.article_source = build_article_sources(version=self.version)
-            self.factory_strategy = build_factory_strategy(version=self.version)
-            self.dump_factory_strategies()
-
-            if self.version.is_processing_task:
-                next_dt = self.on_processing_status()
-                ret = update_next_event_time(previous=ret, event_time=next_dt)
-
-            next_dt = self.on_finally()
-            ret = update_next_event_time(previous=ret, event_time=next_dt)
+            ret = self.process()
 
+            # lease 를 잃었으면 다음 event 시간도 새 worker 가 정한다.
+            lease_check(version=self.version)
             self.version.next_event_datetime = ret
             self.version.save(update_fields=["next_event_datetime"])
-            ts_dump(version=self.version)
+            if is_dump_enabled():
+                ts_dump(version=self.version)
+
+        except LeaseLost as e:
+            # version 은 그대로 두고 lease 를 가져간 worker 가 이어서 처리한다.
+            print(f"""[Lease] {e} | Abort""")
 
         except TsRespInvalidOrExpiredSession as e:
             if self.version:
+                SessionHelper(version=self.version).invalidate()
                 now = get_curr_server_datetime(version=self.version)
                 self.version.next_event_datetime = now + timedelta(minutes=10)
                 self.version.set_completed(
@@ -706,3 +772,6 @@ class Strategy(object):
             if self.version:
                 self.version.set_error(save=True, msg=str(e), update_fields=[])
             raise e
+
+        finally:
+            self.version.close_record_stores()
@@ -239,6 +239,9 @@ DATABASES = {
     },
 }
 
+# archive_open() 안에서 RunVersion / Player* 조회를 archive 로 보낸다.
+DATABASE_ROUTERS = ["app_root.servers.archives.ArchiveRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -299,4 +302,7 @@ CLIENT_INFORMATION_STORE = "google_play"
 CLIENT_INFORMATION_VERSION = "2.8.5.4238"
 CLIENT_INFORMATION_LANGUAGE = "en"
 
+# get-endpoints 를 요청할 서버. (나머지 url 은 get-endpoints 응답을 따른다)
+GAME_SERVER_URL = "https://game.trainstation2.com"
+
 WHISTLE_INTERVAL_SECOND = 10 * 60
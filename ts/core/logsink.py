@@ -0,0 +1,301 @@
+"""
+    core > logsink
+
+    파일 로그를 background thread 에서 쓴다.
+
+    - emit() 은 queue 에 넣기만 한다. (level 이 꺼져 있으면 아무것도 하지 않는다)
+    - writer thread 가 모아서 한 줄 JSON (NDJSON) 으로 쓴다.
+    - flush 는 batch 마다, fsync 는 fsync_interval 마다.
+    - 파일이 max_bytes 를 넘으면 gzip 으로 rotate. (파일 별 writer 는 1개이므로 RotatingFileHandler 의 문제가 없다)
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date, time as dt_time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Optional, IO, List, Any
+from uuid import UUID
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+_logger = logging.getLogger("default")
+
+FLUSH_INTERVAL = 0.5
+FSYNC_INTERVAL = 5.0
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+MAX_OPEN_FILES = 32
+MAX_QUEUE_SIZE = 100000
+BATCH_SIZE = 1000
+
+# writer thread 에 그대로 넘겨도 되는 값. (immutable)
+IMMUTABLE_TYPES = (
+    str,
+    bytes,
+    int,
+    float,
+    bool,
+    type(None),
+    datetime,
+    date,
+    dt_time,
+    timedelta,
+    Decimal,
+    UUID,
+)
+
+
+def snapshot(value: Any) -> Any:
+    """
+        emit 한 후에 caller 가 값을 바꿔도 로그가 바뀌지 않도록 복사한다.
+        - dict / list / tuple / set : 안의 값까지 복사
+        - 그 외의 mutable 객체 : caller thread 에서 str 로 변환
+    :param value:
+    :return:
+    """
+    if isinstance(value, IMMUTABLE_TYPES):
+        return value
+    if isinstance(value, dict):
+        return {k: snapshot(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [snapshot(v) for v in value]
+    return str(value)
+
+
+class LogSink:
+    """
+    NDJSON 비동기 파일 로그.
+
+        sink = LogSink()
+        sink.emit(path, {"msg": "hello"})
+        sink.flush()
+    """
+
+    level: int
+    queue: queue.Queue
+    files: "OrderedDict[Path, IO]"
+    sizes: Dict[Path, int]
+    dirty: set
+
+    def __init__(
+        self,
+        level: int = logging.DEBUG,
+        flush_interval: float = FLUSH_INTERVAL,
+        fsync_interval: float = FSYNC_INTERVAL,
+        max_bytes: int = MAX_BYTES,
+        backup_count: int = BACKUP_COUNT,
+        max_open_files: int = MAX_OPEN_FILES,
+        max_queue_size: int = MAX_QUEUE_SIZE,
+    ):
+        self.level = level
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_open_files = max_open_files
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.files = OrderedDict()
+        self.sizes = {}
+        self.dirty = set()
+        self.fsynced_at = time.monotonic()
+
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+
+    ###########################################################################
+    # caller
+    ###########################################################################
+    def is_enabled(self, level: int) -> bool:
+        return not self.closed and level >= self.level
+
+    def emit(self, path: Path, record: Dict, level: int = logging.INFO):
+        """
+            record 는 snapshot 으로 복사한 후 writer thread 에서 JSON 으로 변환된다.
+        :param path:
+        :param record:
+        :param level:
+        :return:
+        """
+        if not self.is_enabled(level):
+            return
+
+        self._start()
+        self.queue.put((path, snapshot(record)))
+
+    def flush(self, timeout: Optional[float] = None):
+        """
+        queue 에 있는 로그를 모두 쓰고 fsync 할 때 까지 기다린다.
+        """
+        if not self.thread:
+            return
+        event = threading.Event()
+        self.queue.put((None, event))
+        event.wait(timeout)
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        if self.thread:
+            self.queue.put((None, None))
+            self.thread.join()
+            self.thread = None
+
+    def _start(self):
+        if self.thread:
+            return
+        with self.lock:
+            if not self.thread:
+                self.thread = threading.Thread(
+                    target=self._run, name="LogSink", daemon=True
+                )
+                self.thread.start()
+
+    ###########################################################################
+    # writer thread
+    ###########################################################################
+    def _run(self):
+        while True:
+            try:
+                items = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                items = []
+
+            while items and len(items) < BATCH_SIZE:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            events = []
+            lines: Dict[Path, List[str]] = {}
+            for path, record in items:
+                if path is None:
+                    if record is None:
+                        stop = True
+                    else:
+                        events.append(record)
+                    continue
+                try:
+                    line = json.dumps(
+                        record,
+                        cls=DjangoJSONEncoder,
+                        ensure_ascii=False,
+                        separators=(",", ":"),
+                    )
+                except Exception as e:
+                    line = json.dumps({"error": f"{e}", "record": repr(record)})
+                lines.setdefault(path, []).append(line)
+
+            try:
+                for path, rows in lines.items():
+                    self._write(path, rows)
+                self._flush(fsync=bool(events) or stop)
+            except Exception as e:
+                _logger.exception(f"[LogSink] write failed : {e}")
+
+            for event in events:
+                event.set()
+
+            if stop:
+                for fout in self.files.values():
+                    fout.close()
+                self.files.clear()
+                return
+
+    def _open(self, path: Path) -> IO:
+        fout = self.files.get(path)
+        if fout:
+            self.files.move_to_end(path)
+            return fout
+
+        if len(self.files) >= self.max_open_files:
+            old_path, old = self.files.popitem(last=False)
+            self._sync(old_path, old)
+            old.close()
+
+        path.parent.mkdir(0o755, True, exist_ok=True)
+        fout = open(path, "ab")
+        self.files[path] = fout
+        self.sizes[path] = fout.tell()
+        return fout
+
+    def _write(self, path: Path, rows: List[str]):
+        data = ("\n".join(rows) + "\n").encode("utf-8")
+        fout = self._open(path)
+        size = self.sizes[path]
+        # 빈 파일은 rotate 하지 않는다. (한 batch 가 max_bytes 보다 큰 경우)
+        if self.max_bytes and size and size + len(data) > self.max_bytes:
+            self._rotate(path)
+            fout = self._open(path)
+
+        fout.write(data)
+        self.sizes[path] += len(data)
+        self.dirty.add(path)
+
+    def _sync(self, path: Path, fout: IO):
+        fout.flush()
+        if path in self.dirty:
+            os.fsync(fout.fileno())
+            self.dirty.discard(path)
+
+    def _flush(self, fsync: bool):
+        for fout in self.files.values():
+            fout.flush()
+
+        now = time.monotonic()
+        if fsync or now - self.fsynced_at >= self.fsync_interval:
+            for path, fout in self.files.items():
+                self._sync(path, fout)
+            self.fsynced_at = now
+
+    def _rotate(self, path: Path):
+        fout = self.files.pop(path, None)
+        if fout:
+            self._sync(path, fout)
+            fout.close()
+        self.sizes[path] = 0
+
+        if not path.exists() or path.stat().st_size == 0:
+            return
+
+        rotated = path.with_name(f"{path.name}.{datetime.now():%Y%m%d%H%M%S%f}.gz")
+        with open(path, "rb") as fin, gzip.open(rotated, "wb") as gz:
+            shutil.copyfileobj(fin, gz)
+        path.unlink()
+
+        backups = sorted(path.parent.glob(f"{path.name}.*.gz"))
+        for old in backups[: max(0, len(backups) - self.backup_count)]:
+            old.unlink()
+
+
+_sink: Optional[LogSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_log_sink() -> LogSink:
+    """
+        process 의 LogSink. settings.LOG_SINK 로 설정한다.
+        ex) LOG_SINK = {"level": logging.INFO, "max_bytes": 10 * 1024 * 1024}
+    :return:
+    """
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = LogSink(**getattr(settings, "LOG_SINK", {}))
+                atexit.register(_sink.close)
+    return _sink
@@ -1,7 +1,8 @@
 from decimal import Decimal
-from typing import List, Dict, Type
+from typing import List, Dict, Type, Tuple, Optional
 
 from django.db import models, connections, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from core.models.exceptions import InvalidTaskStatus
@@ -131,6 +132,143 @@ def get_model_differs(src, dest) -> Dict[str, tuple]:
     return ret
 
 
+def sync_instances(
+    model: Type[models.Model],
+    instances: List[models.Model],
+    scope_field: str,
+    prev_scope,
+    curr_scope,
+    keys: Tuple[str, ...] = (),
+    batch_size: int = 100,
+    history_field: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+        이전 scope 의 row 와 비교해서 바뀐 row 만 저장한다.
+
+        - 모든 값이 같은 row : 이전 row 의 scope 만 변경 (carry forward)
+        - keys 가 같은 row : get_model_differs 로 바뀐 필드만 update
+        - 나머지 : insert
+        이전 row 를 재사용한 instance 는 이전 row 의 pk 를 가진다.
+
+        history_field 가 있으면 이전 scope 의 값을 남긴다. (copy on write)
+        - carry forward : history_field 에 row 가 처음 유효한 scope 를 기록
+        - update 대신 새 row 를 insert 하고 이전 row 는 이전 scope 에 남긴다.
+          (이전 scope 의 자식 row 는 계속 이전 row 를 가리킨다)
+        carry forward 된 row 는 curr_scope 로 옮겨지므로, 이전 scope 는 history_field 범위로 읽어야 한다.
+        (ex. BaseVersionQuerySet.at_version)
+
+    Args:
+        model:
+        instances: 저장하지 않은 instance (scope 는 curr_scope)
+        scope_field: ex) 'version_id'
+        prev_scope:
+        curr_scope:
+        keys: 같은 row 로 판단할 필드 (attname)
+        batch_size:
+        history_field: 유효 시작 scope 필드 (attname) ex) 'valid_from_version_id'
+
+    Returns:
+        {'carried': n, 'updated': n, 'inserted': n}
+    """
+    skip = {"id", "pk", "created", "modified", scope_field, history_field}
+    fields = [f for f in model._meta.concrete_fields if f.attname not in skip]
+
+    def signature(instance):
+        ret = []
+        for field in fields:
+            value = getattr(instance, field.attname)
+            try:
+                value = field.get_prep_value(value)
+            except:
+                pass
+            ret.append(value)
+        return tuple(ret)
+
+    # 부모 instance 의 pk 는 부모를 저장(sync)한 후에 정해지므로 FK id 를 다시 읽는다.
+    relations = [f for f in model._meta.concrete_fields if f.many_to_one]
+    for instance in instances:
+        for field in relations:
+            if not field.is_cached(instance):
+                continue
+            parent = field.get_cached_value(instance)
+            if parent is not None:
+                setattr(instance, field.attname, parent.pk)
+
+    prev_rows = list(model.objects.filter(**{scope_field: prev_scope}).all())
+
+    by_signature: Dict[tuple, List[models.Model]] = {}
+    for row in prev_rows:
+        by_signature.setdefault(signature(row), []).append(row)
+
+    carried, remains = [], []
+    for instance in instances:
+        rows = by_signature.get(signature(instance))
+        if rows:
+            row = rows.pop()
+            instance.pk = row.pk
+            instance.created = row.created
+            instance.modified = row.modified
+            if history_field:
+                setattr(
+                    instance,
+                    history_field,
+                    getattr(row, history_field) or getattr(row, scope_field),
+                )
+            carried.append(instance)
+        else:
+            remains.append(instance)
+
+    used = {instance.pk for instance in carried}
+    by_key: Dict[tuple, List[models.Model]] = {}
+    if keys:
+        for row in prev_rows:
+            if row.pk not in used:
+                by_key.setdefault(tuple(getattr(row, k) for k in keys), []).append(row)
+
+    updated, inserted = [], []
+    update_fields = set()
+    for instance in remains:
+        rows = by_key.get(tuple(getattr(instance, k) for k in keys)) if keys else None
+        if rows:
+            row = rows.pop()
+            if history_field:
+                setattr(instance, history_field, None)
+                updated.append(instance)
+                continue
+            update_fields.update(
+                k for k in get_model_differs(src=instance, dest=row) if k not in skip
+            )
+            instance.pk = row.pk
+            instance.created = row.created
+            updated.append(instance)
+        else:
+            inserted.append(instance)
+
+    db_alias = model.objects.db
+    with transaction.atomic(using=db_alias):
+        values = {scope_field: curr_scope}
+        if history_field:
+            # MySQL 은 SET 을 왼쪽부터 적용하므로 history_field 를 먼저 둔다.
+            values = {history_field: Coalesce(history_field, scope_field), **values}
+        for chunk in chunk_list([o.pk for o in carried], 1000):
+            model.objects.filter(pk__in=chunk).update(**values)
+
+        if updated and history_field:
+            model.objects.bulk_create(updated, batch_size)
+        elif updated:
+            fields = sorted(update_fields) + [scope_field, "modified"]
+            model.objects.bulk_update(updated, fields=fields, batch_size=batch_size)
+
+        if inserted:
+            model.objects.bulk_create(inserted, batch_size)
+
+    return {
+        "carried": len(carried),
+        "updated": len(updated),
+        "inserted": len(inserted),
+    }
+
+
 # def chunk_queryset(queryset, chunk_size):
 #
 #     last_pk = None
@@ -0,0 +1,140 @@
+"""
+    core > recordstore
+
+    append-only record 파일.
+
+    - {name}.dat : record 를 이어 붙인 파일
+    - {name}.idx : record 마다 (offset, length) 16 bytes (little endian uint64 x 2)
+    - 읽을 때는 mmap 으로 idx 번째 record 를 바로 찾는다. (record 에 줄바꿈이 있어도 된다)
+    - 예전 형식 ({name}.txt, 한 줄에 record 1개) 은 처음 읽을 때 변환한다.
+"""
+import mmap
+import struct
+from pathlib import Path
+from typing import Optional, Union, List, Iterator
+
+INDEX_FORMAT = "<QQ"
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+
+
+class RecordStore:
+    """
+    store = RecordStore(path / "login_get")
+    store.append('{"Success":true}')
+    store.get(0)
+    """
+
+    path: Path
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data_path = path.with_name(f"{path.name}.dat")
+        self.index_path = path.with_name(f"{path.name}.idx")
+        self.legacy_path = path.with_name(f"{path.name}.txt")
+
+        self._data_map: Optional[mmap.mmap] = None
+        self._index_map: Optional[mmap.mmap] = None
+
+    ###########################################################################
+    # write
+    ###########################################################################
+    def append(self, data: Union[str, bytes]) -> int:
+        """
+            data 를 먼저 쓰고 index 를 쓴다. (index 에 있는 record 는 항상 완전하다)
+        :param data:
+        :return: record index
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        self.path.parent.mkdir(0o755, True, exist_ok=True)
+        with open(self.data_path, "ab") as fout:
+            offset = fout.tell()
+            fout.write(data)
+
+        with open(self.index_path, "ab") as fout:
+            idx = fout.tell() // INDEX_SIZE
+            fout.write(struct.pack(INDEX_FORMAT, offset, len(data)))
+
+        return idx
+
+    def extend(self, records: List[Union[str, bytes]]):
+        if not records:
+            return
+
+        data_list = [o.encode("utf-8") if isinstance(o, str) else o for o in records]
+        self.path.parent.mkdir(0o755, True, exist_ok=True)
+        with open(self.data_path, "ab") as fout:
+            offset = fout.tell()
+            fout.write(b"".join(data_list))
+
+        index = bytearray()
+        for data in data_list:
+            index += struct.pack(INDEX_FORMAT, offset, len(data))
+            offset += len(data)
+        with open(self.index_path, "ab") as fout:
+            fout.write(index)
+
+    ###########################################################################
+    # read
+    ###########################################################################
+    def exists(self) -> bool:
+        return self.index_path.exists() or self.legacy_path.exists()
+
+    def _convert_legacy(self):
+        if self.index_path.exists() or not self.legacy_path.exists():
+            return
+        self.extend(self.legacy_path.read_text(encoding="UTF-8").split("\n"))
+
+    def _map(self):
+        """
+        파일이 커졌으면 다시 mmap.
+        """
+        self._convert_legacy()
+
+        index_size = self.index_path.stat().st_size if self.index_path.exists() else 0
+        if self._index_map is not None and len(self._index_map) == index_size:
+            return
+
+        self.close()
+        if index_size == 0:
+            return
+
+        with open(self.index_path, "rb") as fin:
+            self._index_map = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data_path.stat().st_size:
+            with open(self.data_path, "rb") as fin:
+                self._data_map = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        self._map()
+        return len(self._index_map) // INDEX_SIZE if self._index_map else 0
+
+    def get_bytes(self, idx: int) -> bytes:
+        size = len(self)
+        if idx < 0:
+            idx += size
+        if not 0 <= idx < size:
+            raise IndexError(f"record index out of range : {idx} / {size}")
+
+        offset, length = struct.unpack_from(
+            INDEX_FORMAT, self._index_map, idx * INDEX_SIZE
+        )
+        if not length:
+            return b""
+        return self._data_map[offset : offset + length]
+
+    def get(self, idx: int) -> str:
+        return self.get_bytes(idx).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for idx in range(len(self)):
+            yield self.get(idx)
+
+    def close(self):
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_map = None
+        if self._data_map is not None:
+            self._data_map.close()
+            self._data_map = None
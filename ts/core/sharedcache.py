@@ -0,0 +1,137 @@
+"""
+    core > sharedcache
+
+    계정 (process / thread) 이 같이 쓰는 TTL cache. (django cache 사용)
+
+    - get_or_fetch() : cache 에 없으면 fetch() 를 1번만 실행한다. (single-flight)
+        . 같은 process 의 thread 는 key 별 lock 으로 기다린다.
+        . process 끼리는 cache.add 로 lock 을 잡는다. lock 을 못 잡으면 값이 생길 때 까지 기다리고,
+          lock_timeout 이 지나면 (lock 을 잡은 process 가 죽었다) 직접 가져온다.
+    - fetch() 가 None 을 돌려주거나 예외가 나면 cache 하지 않는다.
+    - process 끼리 공유하려면 settings.CACHES 가 공유되는 backend (redis, memcached, db) 여야 한다.
+      (기본 LocMemCache 는 process 안에서만)
+"""
+import threading
+import time
+from typing import Callable, Any, Optional, Dict
+
+from django.conf import settings
+from django.core.cache import caches
+
+TTL = 60
+LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.1
+
+
+class SharedCache:
+    """
+    cache = SharedCache(ttl=60)
+    data = cache.get_or_fetch(key="guild:{guild_id}:jobs", fetch=lambda: ...)
+    """
+
+    alias: str
+    ttl: int
+    lock_timeout: int
+    hits: int
+    fetches: int
+
+    def __init__(
+        self,
+        alias: str = "default",
+        prefix: str = "shared",
+        ttl: int = TTL,
+        lock_timeout: int = LOCK_TIMEOUT,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.alias = alias
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+        self.hits = 0
+        self.fetches = 0
+
+        self.lock = threading.Lock()
+        self.key_locks: Dict[str, threading.Lock] = {}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def _hit(self, value: Any) -> Any:
+        with self.lock:
+            self.hits += 1
+        return value
+
+    def get(self, key: str) -> Any:
+        return self.cache.get(f"{self.prefix}:{key}")
+
+    def delete(self, key: str):
+        self.cache.delete(f"{self.prefix}:{key}")
+
+    def get_or_fetch(
+        self, key: str, fetch: Callable[[], Any], ttl: Optional[int] = None
+    ) -> Any:
+        """
+        :param key:
+        :param fetch: cache 에 없을 때 값을 가져오는 함수.
+        :param ttl: 초. None 이면 self.ttl
+        :return:
+        """
+        cache = self.cache
+        cache_key = f"{self.prefix}:{key}"
+        lock_key = f"{cache_key}:lock"
+
+        value = cache.get(cache_key)
+        if value is not None:
+            return self._hit(value)
+
+        with self._key_lock(cache_key):
+            value = cache.get(cache_key)
+            if value is not None:
+                return self._hit(value)
+
+            deadline = time.monotonic() + self.lock_timeout
+            owner = cache.add(lock_key, 1, timeout=self.lock_timeout)
+            while not owner and time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                value = cache.get(cache_key)
+                if value is not None:
+                    return self._hit(value)
+                owner = cache.add(lock_key, 1, timeout=self.lock_timeout)
+
+            try:
+                value = fetch()
+                with self.lock:
+                    self.fetches += 1
+                if value is not None:
+                    cache.set(
+                        cache_key, value, timeout=self.ttl if ttl is None else ttl
+                    )
+            finally:
+                if owner:
+                    cache.delete(lock_key)
+            return value
+
+
+_shared_cache: Optional[SharedCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """
+        process 의 SharedCache. settings.SHARED_CACHE 로 설정한다.
+        ex) SHARED_CACHE = {"alias": "default", "ttl": 60, "lock_timeout": 30}
+    :return:
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SharedCache(**getattr(settings, "SHARED_CACHE", {}))
+    return _shared_cache
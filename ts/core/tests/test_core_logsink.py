@@ -0,0 +1,60 @@
+import gzip
+import json
+import logging
+from datetime import datetime
+
+from core.logsink import LogSink
+
+
+def test_log_sink(tmp_path):
+    path = tmp_path / "a" / "RunVersion.ndjson"
+    sink = LogSink(level=logging.INFO)
+
+    sink.emit(path, {"msg": "hello", "now": datetime(2023, 1, 1)})
+    sink.emit(path, {"msg": "debug"}, level=logging.DEBUG)
+    sink.emit(path, {"msg": "한글", "data": {"a": 1}})
+    sink.flush()
+
+    rows = [json.loads(o) for o in path.read_text("utf-8").splitlines()]
+    assert rows == [
+        {"msg": "hello", "now": "2023-01-01T00:00:00"},
+        {"msg": "한글", "data": {"a": 1}},
+    ]
+
+    sink.close()
+    assert not sink.is_enabled(logging.INFO)
+
+
+def test_log_sink_snapshot(tmp_path):
+    path = tmp_path / "RunVersion.ndjson"
+    sink = LogSink(level=logging.INFO)
+
+    # caller 가 emit 후에 바꾸는 값. (ex. 요청 headers / payload)
+    headers = {"a": "1", "items": [1]}
+    sink.emit(path, {"msg": "hello", "data": {"headers": headers, "ids": {3}}})
+    headers["a"] = "2"
+    headers["items"].append(2)
+    sink.close()
+
+    rows = [json.loads(o) for o in path.read_text("utf-8").splitlines()]
+    assert rows == [
+        {"msg": "hello", "data": {"headers": {"a": "1", "items": [1]}, "ids": [3]}}
+    ]
+
+
+def test_log_sink_rotate(tmp_path):
+    path = tmp_path / "RunVersion.ndjson"
+    sink = LogSink(max_bytes=100, backup_count=2)
+
+    for i in range(20):
+        sink.emit(path, {"msg": "x" * 40, "i": i})
+        sink.flush()
+    sink.close()
+
+    backups = sorted(tmp_path.glob("RunVersion.ndjson.*.gz"))
+    assert len(backups) == 2
+    assert path.stat().st_size <= 100
+
+    lines = gzip.decompress(backups[-1].read_bytes()).decode("utf-8").splitlines()
+    last = json.loads(path.read_text("utf-8").splitlines()[0])
+    assert json.loads(lines[-1])["i"] == last["i"] - 1
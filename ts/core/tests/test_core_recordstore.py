@@ -0,0 +1,50 @@
+import mmap
+from unittest import mock
+
+import pytest
+
+from core.recordstore import RecordStore
+
+
+def test_record_store(tmp_path):
+    store = RecordStore(tmp_path / "a" / "login_get")
+    assert not store.exists()
+    assert len(store) == 0
+
+    assert store.append('{"a":\n1}') == 0
+    assert store.append("") == 1
+    assert store.append("한글") == 2
+
+    assert store.exists()
+    assert len(store) == 3
+    assert store.get(0) == '{"a":\n1}'
+    assert store.get(1) == ""
+    assert store.get(2) == "한글"
+    assert store.get(-1) == "한글"
+    with pytest.raises(IndexError):
+        store.get(3)
+
+    # 다시 mmap.
+    store.append("b")
+    assert list(store) == ['{"a":\n1}', "", "한글", "b"]
+    store.close()
+
+
+def test_record_store_legacy(tmp_path):
+    (tmp_path / "startgame_post.txt").write_text("a\nb\n", encoding="UTF-8")
+    store = RecordStore(tmp_path / "startgame_post")
+
+    assert list(store) == ["a", "b", ""]
+    assert (tmp_path / "startgame_post.idx").exists()
+    store.close()
+
+
+def test_record_store_get_without_read(tmp_path):
+    store = RecordStore(tmp_path / "init_data")
+    store.extend(["x" * 10000] * 2000)
+
+    # 처음 한 번만 mmap 하고, 이후 get 은 파일을 다시 읽지 않는다.
+    with mock.patch("core.recordstore.mmap.mmap", wraps=mmap.mmap) as mmap_mock:
+        assert [store.get(i) for i in range(len(store))] == ["x" * 10000] * 2000
+    assert mmap_mock.call_count == 2
+    store.close()
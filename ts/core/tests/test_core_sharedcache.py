@@ -0,0 +1,56 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.sharedcache import SharedCache
+
+
+def test_shared_cache_single_flight():
+    cache = SharedCache(prefix="test-single-flight", ttl=60)
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return "jobs"
+
+    def worker(_):
+        barrier.wait()
+        return cache.get_or_fetch(key="guild:1:jobs", fetch=fetch)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(worker, range(8)))
+
+    assert results == ["jobs"] * 8
+    assert len(calls) == 1
+    assert cache.fetches == 1
+    assert cache.hits == 7
+
+    # guild 가 다르면 따로 가져온다.
+    assert cache.get_or_fetch(key="guild:2:jobs", fetch=fetch) == "jobs"
+    assert len(calls) == 2
+
+
+def test_shared_cache_ttl():
+    cache = SharedCache(prefix="test-ttl", ttl=1)
+    values = iter(["a", "b"])
+
+    assert cache.get_or_fetch(key="k", fetch=lambda: next(values)) == "a"
+    assert cache.get_or_fetch(key="k", fetch=lambda: next(values)) == "a"
+    time.sleep(1.1)
+    assert cache.get_or_fetch(key="k", fetch=lambda: next(values)) == "b"
+
+    # None 은 cache 하지 않는다.
+    assert cache.get_or_fetch(key="none", fetch=lambda: None) is None
+    assert cache.get_or_fetch(key="none", fetch=lambda: "c") == "c"
+
+
+def test_shared_cache_lock_timeout():
+    cache = SharedCache(prefix="test-lock", lock_timeout=1, poll_interval=0.05)
+    # 다른 process 가 lock 을 잡고 죽었다.
+    cache.cache.add("test-lock:k:lock", 1, timeout=60)
+
+    started = time.monotonic()
+    assert cache.get_or_fetch(key="k", fetch=lambda: "a") == "a"
+    assert time.monotonic() - started >= 1
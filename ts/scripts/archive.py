@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from app_root.servers.archives import Archiver
+
+
+def run(*args, **kwargs):
+    """
+    python manage.py runscript archive --script-args days=3
+
+        days 이전에 생성된 version 을 계정 / 일자 별 SQLite archive 로 옮긴다. (app_root.servers.archives)
+    """
+    days = 3
+    for arg in args:
+        if arg.startswith("days="):
+            days = int(arg.split("=", 1)[1])
+
+    archiver = Archiver(cutoff=timezone.now() - timedelta(days=days))
+    archiver.run()
+    for name, count in archiver.stats.items():
+        print(f"{name} : {count} rows")
@@ -0,0 +1,96 @@
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from app_root.strategies.benchmark import (
+    BASELINE_PATH,
+    REPEAT,
+    THRESHOLD,
+    compare_baseline,
+    dump_scaling,
+    load_results,
+    run_benchmarks,
+    run_scaling,
+    save_results,
+    save_scaling,
+    update_baseline,
+)
+
+
+def run(*args, **kwargs):
+    """
+    python manage.py runscript bench --script-args names=read_sqlite,ts_dump repeat=5 threshold=0.2
+    python manage.py runscript bench --script-args scaling=10,50,100,250,500 union_jobs=20 max_wall=600
+
+        fixtures 로 hot path 벤치마크를 실행하고 결과를 LOG_PATH/benchmark/ 에 json 으로 저장한다.
+        baseline 보다 나빠진 항목이 있으면 출력하고 exit code 1 로 끝난다.
+        - update : 결과를 baseline 으로 저장한다. (baseline 은 측정한 machine 기준이다)
+        - baseline=<path>, output=<path> : 기본은 fixtures/benchmark/baseline.json, LOG_PATH/benchmark/<datetime>.json
+        - scaling=<기차 수,...> : synthetic 계정으로 Strategy.process 의 phase 별 시간 / query 수를 출력하고
+          LOG_PATH/benchmark/scaling_<datetime>.json 에 저장한다. (baseline 과 비교하지 않는다)
+        (definition / 계정을 만들므로 운영 DB 에서 실행하지 않는다)
+    """
+    names = None
+    repeat = REPEAT
+    threshold = THRESHOLD
+    baseline_path = BASELINE_PATH
+    output_path = None
+    update = False
+    scaling = None
+    scaling_params = {}
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key == "names":
+            names = [o for o in value.split(",") if o]
+        elif key == "repeat":
+            repeat = int(value)
+        elif key == "threshold":
+            threshold = float(value)
+        elif key == "baseline":
+            baseline_path = Path(value)
+        elif key == "output":
+            output_path = Path(value)
+        elif key == "update":
+            update = True
+        elif key == "scaling":
+            scaling = [int(o) for o in value.split(",") if o]
+        elif key in ("union_jobs", "jobs", "contracts", "factories", "slot_count"):
+            scaling_params[key] = int(value)
+        elif key == "max_wall":
+            scaling_params[key] = float(value)
+
+    str_dt = timezone.now().strftime("%Y%m%d_%H%M%S")
+
+    if scaling:
+        results = run_scaling(trains=scaling, **scaling_params)
+        dump_scaling(results)
+
+        output_path = output_path or (
+            settings.LOG_PATH / "benchmark" / f"scaling_{str_dt}.json"
+        )
+        save_scaling(output_path, results)
+        print(f"saved : {output_path}")
+        return
+
+    results = run_benchmarks(names=names, repeat=repeat)
+    for result in results:
+        result.dump()
+
+    output_path = output_path or settings.LOG_PATH / "benchmark" / f"{str_dt}.json"
+    save_results(output_path, results)
+    print(f"saved : {output_path}")
+
+    if update:
+        update_baseline(baseline_path, results)
+        print(f"baseline updated : {baseline_path}")
+        return
+
+    regressions = compare_baseline(
+        results, load_results(baseline_path), threshold=threshold
+    )
+    for regression in regressions:
+        print(f"[REGRESSION] {regression}")
+    if regressions:
+        sys.exit(1)
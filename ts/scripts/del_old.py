@@ -2,77 +2,49 @@ from datetime import timedelta
 
 from django.utils import timezone
 
-from app_root.players.models import (
-    PlayerBuilding,
-    PlayerDestination,
-    PlayerFactory,
-    PlayerFactoryProductOrder,
-    PlayerJob,
-    PlayerContractList,
-    PlayerContract,
-    PlayerGift,
-    PlayerLeaderBoard,
-    PlayerLeaderBoardProgress,
-    PlayerTrain,
-    PlayerWarehouse,
-    PlayerWhistle,
-    PlayerWhistleItem,
-    PlayerAchievement,
-    PlayerDailyReward,
-    PlayerMap,
-    PlayerQuest,
-    PlayerVisitedRegion,
-    PlayerShipOffer,
-    PlayerCompetition,
-    PlayerUnlockedContent,
-    PlayerDailyOfferContainer,
-    PlayerDailyOffer,
-    PlayerDailyOfferItem,
-    PlayerCityLoopParcel,
-    PlayerCityLoopTask,
+from app_root.servers.retention import (
+    Retention,
+    retention_bound,
+    retention_models,
+    partition_create,
+    partition_extend,
+    VERSIONS_PER_BATCH,
+    THROTTLE,
 )
-from app_root.servers.models import RunVersion
 
 
 def run(*args, **kwargs):
-    now = timezone.now() - timedelta(days=3)
-    version_id_list = list(
-        RunVersion.objects.filter(created__lte=now)
-        .order_by("id")
-        .values_list("id", flat=True)
-    )
+    """
+    python manage.py runscript del_old --script-args days=3 batch=20 throttle=1.0 partition
 
-    MODEL_LIST = [
-        PlayerBuilding,
-        PlayerDestination,
-        PlayerFactory,
-        PlayerFactoryProductOrder,
-        PlayerJob,
-        PlayerContractList,
-        PlayerContract,
-        PlayerGift,
-        PlayerLeaderBoard,
-        PlayerLeaderBoardProgress,
-        PlayerTrain,
-        PlayerWarehouse,
-        PlayerWhistle,
-        PlayerWhistleItem,
-        PlayerAchievement,
-        PlayerDailyReward,
-        PlayerMap,
-        PlayerQuest,
-        PlayerVisitedRegion,
-        PlayerShipOffer,
-        PlayerCompetition,
-        PlayerUnlockedContent,
-        PlayerDailyOfferContainer,
-        PlayerDailyOffer,
-        PlayerDailyOfferItem,
-        PlayerCityLoopParcel,
-        PlayerCityLoopTask,
-    ]
-    for version_id in version_id_list:
-        for model in MODEL_LIST:
-            print(f"{version_id} - {model}")
-            model.objects.filter(version_id=version_id).delete()
-        RunVersion.objects.filter(id=version_id).delete()
+        days : 보관 기간
+        batch : 1번의 DELETE 에 포함할 version 수
+        throttle : 지우는데 걸린 시간 * throttle 만큼 쉰다.
+        partition : (MySQL) Player* table 을 version_id 범위로 partition. 이후에는 partition 을 DROP 한다.
+    """
+    days = 3
+    batch = VERSIONS_PER_BATCH
+    throttle = THROTTLE
+    partition = False
+    for arg in args:
+        if arg.startswith("days="):
+            days = int(arg.split("=", 1)[1])
+        elif arg.startswith("batch="):
+            batch = int(arg.split("=", 1)[1])
+        elif arg.startswith("throttle="):
+            throttle = float(arg.split("=", 1)[1])
+        elif arg == "partition":
+            partition = True
+
+    for model in retention_models():
+        if partition:
+            partition_create(model)
+        partition_extend(model)
+
+    bound = retention_bound(timezone.now() - timedelta(days=days))
+    if not bound:
+        print("nothing to delete")
+        return
+
+    print(f"delete versions <= {bound} : batch={batch} throttle={throttle}")
+    Retention(bound=bound, versions_per_batch=batch, throttle=throttle).run()
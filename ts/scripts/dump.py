@@ -1,11 +1,26 @@
 from unittest import mock
 
+from app_root.servers.archives import archive_open
 from app_root.servers.models import RunVersion
 from app_root.strategies.dumps import ts_dump
 from app_root.users.models import User
 
 
-def run():
+def run(*args):
+    """
+    python manage.py runscript dump --script-args sections=default,factory json=0
+
+        계정 별 마지막 version 을 바로 dump 한다. (settings.TS_DUMP 의 enabled / background 와 관계 없다)
+    """
+    sections = None
+    to_json = None
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key == "sections":
+            sections = [o for o in value.split(",") if o]
+        elif key == "json":
+            to_json = value not in ("0", "false", "False")
+
     for user in User.objects.all():
         print(f"[dump for user : {user.username} - {user.android_id}]")
 
@@ -13,6 +28,8 @@ def run():
         if not version:
             continue
 
-        with mock.patch("django.utils.timezone.now") as p:
+        with mock.patch("django.utils.timezone.now") as p, archive_open(version):
             p.return_value = version.init_server_1
-            ts_dump(version=version)
+            ts_dump(
+                version=version, sections=sections, background=False, to_json=to_json
+            )
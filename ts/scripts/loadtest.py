@@ -0,0 +1,21 @@
+from app_root.strategies.loadtest import LoadDriver
+
+
+def run(*args, **kwargs):
+    """
+    python manage.py runscript loadtest --script-args accounts=100 workers=8 rounds=1
+
+        local stand-in 서버에 synthetic 계정으로 Strategy.run 을 실행하고 처리량 / latency / DB 부하를 출력한다.
+        (EndPoint 와 계정을 만들고 지우므로 settings.LOADTEST_DATABASE 인 DB 또는 sqlite 에서만 실행한다. workers > 1 은 MySQL 에서)
+    """
+    params = {"accounts": 10, "workers": 4, "rounds": 1}
+    keep = False
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key in params:
+            params[key] = int(value)
+        elif key == "keep":
+            keep = True
+
+    report = LoadDriver(keep=keep, **params).run()
+    report.dump()
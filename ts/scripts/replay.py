@@ -0,0 +1,23 @@
+from app_root.servers.models import RunVersion
+from app_root.strategies.replay import ReplaySession
+
+
+def run(*args, **kwargs):
+    """
+    python manage.py runscript replay --script-args version=123
+
+        녹화된 version 의 응답으로 Strategy 를 다시 실행하고 step 별 CPU / query 수를 출력한다.
+        (replay-<version> 계정과 RunVersion 이 생성되므로 운영 DB 에서 실행하지 않는다)
+    """
+    version_id = None
+    for arg in args:
+        if arg.startswith("version="):
+            version_id = int(arg.split("=", 1)[1])
+
+    source = RunVersion.objects.filter(id=version_id).first()
+    if not source:
+        print(f"version not found : {version_id}")
+        return
+
+    report = ReplaySession(source=source).run()
+    report.dump()
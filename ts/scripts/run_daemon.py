@@ -0,0 +1,35 @@
+from app_root.multies.utils import MultiStrategy
+from app_root.servers.leases import get_worker_name
+from app_root.users.models import User
+
+
+def run(*args, **kwargs):
+    """
+    python manage.py runscript run_daemon --script-args workers=4 user1 user2
+
+    username 을 지정하지 않으면 모든 계정.
+    여러 host 에서 실행하면 계정은 살아있는 worker 들에 나누어 할당된다. (app_root.servers.leases)
+    """
+    workers = 4
+    usernames = []
+    for arg in args:
+        if arg.startswith("workers="):
+            workers = int(arg.split("=", 1)[1])
+        else:
+            usernames.append(arg)
+
+    queryset = User.objects.filter(is_active=True, has_error=False)
+    if usernames:
+        queryset = queryset.filter(username__in=usernames)
+
+    worker_name = get_worker_name()
+    print(
+        f"run daemon : worker={worker_name} workers={workers} users={usernames or 'all'}"
+    )
+    scheduler = MultiStrategy(
+        queryset=queryset, workers=workers, worker_name=worker_name
+    )
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
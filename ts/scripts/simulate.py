@@ -0,0 +1,26 @@
+from app_root.strategies.simulator import compare
+
+
+def run(*args, **kwargs):
+    """
+    python manage.py runscript simulate --script-args days=7 init=init_data/gaolious_2023.02.07.json
+
+        fixtures 의 init data 로 전략을 days 일 동안 simulation 하고 결과를 출력한다.
+        (simulation 용 계정 / version 이 생성되므로 운영 DB 에서 실행하지 않는다)
+    """
+    days = 7.0
+    init_files = []
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key == "days":
+            days = float(value)
+        elif key == "init":
+            init_files.append(value)
+
+    reports = compare(
+        init_files=init_files or ["init_data/gaolious_2023.02.07.json"],
+        variants={"default": {}},
+        days=days,
+    )
+    for report in reports:
+        report.dump()
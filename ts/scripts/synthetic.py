@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from app_root.strategies.synthetic import SyntheticAccount
+
+
+def run(*args, **kwargs):
+    """
+    python manage.py runscript synthetic --script-args trains=500 union_jobs=20 out=/tmp/synthetic_500.json
+
+        scaling test 용 큰 계정의 init data 를 파일로 저장한다. (DB 는 건드리지 않는다)
+        - trains, jobs, union_jobs, contracts, factories, slot_count, warehouse_level, warehouse_amount
+        - template=<fixtures/init_data 파일 이름>, definition=<definition version>, seed=<int>
+    """
+    params = {}
+    account = {}
+    out = None
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key in (
+            "trains",
+            "jobs",
+            "union_jobs",
+            "contracts",
+            "factories",
+            "slot_count",
+            "warehouse_level",
+            "warehouse_amount",
+        ):
+            params[key] = int(value)
+        elif key in ("template", "definition"):
+            account[key] = value
+        elif key == "seed":
+            account[key] = int(value)
+        elif key == "out":
+            out = Path(value)
+
+    text = SyntheticAccount(**account).generate_text(**params)
+    if out:
+        out.write_text(text, encoding="utf-8")
+        print(f"saved : {out} ({len(text)} bytes)")
+    else:
+        print(text)